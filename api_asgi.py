@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+API LeIA em ASGI (asyncio), ao lado da API Flask de api_json_final.py
+
+    uvicorn api_asgi:app --host 0.0.0.0 --port 5000
+
+O pipeline de /pergunta é o mesmo da API Flask, mas cada etapa é aguardada sem
+prender uma thread por pergunta:
+- banco: as pesquisas (psycopg2 + pool) rodam num executor de threads limitado ao
+  tamanho do pool, então perguntas excedentes esperam na fila e não no pool
+- embeddings e LLM: chamadas assíncronas do LangChain (aembed_*/ainvoke)
+Cada etapa tem seu timeout; um processo segura centenas de perguntas em andamento
+enquanto elas aguardam o Gemini. A latência de cada etapa vai para os mesmos histogramas
+da API Flask (GET /metrics).
+"""
+
+import asyncio
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+import api_json_final
+import cache_embeddings
+import cache_resultados
+import clientes
+import consultas_preparadas
+import metricas
+import pool_conexoes
+import rastreamento
+import registro_esquema
+import visoes_materializadas
+from main import responder_com_rag_async
+
+# Timeouts por etapa (segundos)
+TIMEOUT_BANCO = float(os.getenv('LEIA_TIMEOUT_BANCO', '30'))
+TIMEOUT_EMBEDDINGS = float(os.getenv('LEIA_TIMEOUT_EMBEDDINGS', '20'))
+TIMEOUT_LLM = float(os.getenv('LEIA_TIMEOUT_LLM', '60'))
+
+# Threads para as pesquisas no banco: acima do tamanho do pool elas só esperariam por conexão
+THREADS_BANCO = int(os.getenv('LEIA_ASGI_THREADS_BANCO', os.getenv('DB_POOL_MAX', '10')))
+
+_executor_banco = {'executor': None}
+
+
+def _timestamp():
+    return time.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def resposta_erro(mensagem, status):
+    return JSONResponse({"sucesso": False, "erro": mensagem, "timestamp": _timestamp()}, status_code=status)
+
+
+async def executar_no_banco(funcao, *args):
+    """Roda uma função bloqueante de banco no executor dedicado, com TIMEOUT_BANCO.
+
+    No timeout a pergunta é liberada; se a pesquisa ainda estava na fila ela é descartada,
+    se já estava rodando termina em segundo plano e devolve a conexão ao pool.
+    """
+    loop = asyncio.get_running_loop()
+    # Roda no contexto da pergunta para as etapas do banco entrarem na coleta de métricas
+    contexto = contextvars.copy_context()
+    futuro = loop.run_in_executor(_executor_banco['executor'], contexto.run, funcao, *args)
+    return await asyncio.wait_for(futuro, TIMEOUT_BANCO)
+
+
+async def aguardar_prontidao():
+    """Espera o worker terminar de inicializar (sem ocupar threads); False se passar do limite"""
+    if api_json_final.worker_pronto.is_set():
+        return True
+    limite = time.monotonic() + float(os.getenv('LEIA_PRONTIDAO_TIMEOUT', '60'))
+    while time.monotonic() < limite:
+        await asyncio.sleep(0.05)
+        if api_json_final.worker_pronto.is_set():
+            return True
+    return False
+
+
+async def processar_pergunta_async(dados_json):
+    """Pipeline de /pergunta: banco -> (embeddings -> LLM) com fallback para os dados brutos.
+
+    Retorna (dict da resposta, status HTTP).
+    """
+    pergunta, erro = api_json_final.processar_entrada_json(dados_json)
+    if erro:
+        return api_json_final.montar_resposta_json("", "", False, erro), 200
+    if not pergunta.strip():
+        return api_json_final.montar_resposta_json("Por favor, digite uma pergunta válida.", pergunta, False), 200
+
+    try:
+        dados_banco = await executar_no_banco(api_json_final.pesquisar_no_banco_api, pergunta)
+    except asyncio.TimeoutError:
+        return api_json_final.montar_resposta_json(
+            f"Tempo limite da consulta ao banco excedido ({TIMEOUT_BANCO:g}s)", pergunta, False
+        ), 504
+
+    if dados_banco.ja_formatada:
+        return api_json_final.montar_resposta_json(dados_banco.resposta, pergunta, True), 200
+
+    llm, embeddings = api_json_final.llm_global, api_json_final.embeddings_global
+    if not (llm and embeddings):
+        return api_json_final.montar_resposta_json(f"Dados do banco de dados:\n\n{dados_banco}", pergunta, True), 200
+
+    try:
+        resposta = await responder_com_rag_async(
+            pergunta, dados_banco, llm, embeddings, top_k=6,
+            timeout_embeddings=TIMEOUT_EMBEDDINGS, timeout_llm=TIMEOUT_LLM,
+        )
+        return api_json_final.montar_resposta_json(resposta, pergunta, True), 200
+    except asyncio.TimeoutError:
+        erro_ia = f"Tempo limite do LLM excedido ({TIMEOUT_LLM:g}s)"
+    except Exception as e:
+        erro_ia = str(e)
+    return api_json_final.montar_resposta_json(
+        f"Dados do banco (sem processamento IA):\n\n{dados_banco}", pergunta, True, {"erro_ia": erro_ia}
+    ), 200
+
+
+async def pergunta(request):
+    """Endpoint principal (mesmo contrato de POST /pergunta da API Flask)"""
+    if 'application/json' not in request.headers.get('content-type', ''):
+        return resposta_erro("Content-Type deve ser application/json", 400)
+    try:
+        dados_json = await request.json()
+    except ValueError:
+        dados_json = None
+    if not dados_json:
+        return resposta_erro("JSON vazio ou inválido", 400)
+
+    if not await aguardar_prontidao():
+        resposta = resposta_erro("Serviço inicializando, tente novamente em instantes", 503)
+        resposta.headers['Retry-After'] = '5'
+        return resposta
+
+    span_requisicao, token = rastreamento.abrir_span_requisicao(
+        "POST /pergunta", request.headers, {'http.method': 'POST', 'http.route': '/pergunta'},
+    )
+    status, erro = 500, None
+    try:
+        with metricas.coletar() as tempos:
+            corpo, status = await processar_pergunta_async(dados_json)
+        if metricas.tempos_pedidos(dados_json):
+            corpo.setdefault("dados_extras", {})["tempos_etapas"] = metricas.tempos_etapas(tempos)
+        with metricas.medir_etapa('json'):
+            return JSONResponse(corpo, status_code=status)
+    except Exception as e:
+        erro = e
+        return resposta_erro(f"Erro interno do servidor: {str(e)}", 500)
+    finally:
+        rastreamento.encerrar_span_requisicao(span_requisicao, token, status, erro)
+
+
+async def prontidao(request):
+    """Readiness: 200 quando o worker terminou de inicializar, 503 enquanto inicializa"""
+    pronto = api_json_final.worker_pronto.is_set()
+    return JSONResponse({
+        "pronto": pronto,
+        "llm_disponivel": api_json_final.llm_global is not None,
+        "erro_inicializacao": api_json_final._inicializacao['erro'],
+        "timestamp": _timestamp()
+    }, status_code=200 if pronto else 503)
+
+
+async def saude(request):
+    """Health check com as mesmas métricas da API Flask"""
+    return JSONResponse({
+        "status": "ok",
+        "timestamp": _timestamp(),
+        "versao": "1.0",
+        "servidor": "asgi",
+        "llm_disponivel": api_json_final.llm_global is not None,
+        "pronto": api_json_final.worker_pronto.is_set(),
+        "timeouts": {"banco": TIMEOUT_BANCO, "embeddings": TIMEOUT_EMBEDDINGS, "llm": TIMEOUT_LLM},
+        "pool_banco": pool_conexoes.estatisticas_pools(),
+        "consultas_preparadas": consultas_preparadas.estatisticas_consultas(),
+        "cache_resultados": cache_resultados.estatisticas_cache(),
+        "cache_embeddings": cache_embeddings.estatisticas_embeddings(),
+        "visoes_materializadas": visoes_materializadas.estatisticas_visoes(),
+        "clientes": clientes.estatisticas_clientes(api_json_final.conectar_postgres_api),
+        "etapas": metricas.estatisticas_metricas(),
+        "rastreamento": rastreamento.estatisticas_rastreamento()
+    })
+
+
+async def exportar_metricas(request):
+    """Histogramas de latência por etapa no formato de texto do Prometheus"""
+    return Response(metricas.exposicao(), media_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@asynccontextmanager
+async def ciclo_de_vida(app):
+    """Inicializa o worker em segundo plano ao subir e fecha pool e escuta ao encerrar"""
+    _executor_banco['executor'] = ThreadPoolExecutor(max_workers=THREADS_BANCO, thread_name_prefix="leia-banco")
+    api_json_final.iniciar_inicializacao_worker()
+    try:
+        yield
+    finally:
+        _executor_banco['executor'].shutdown(wait=False, cancel_futures=True)
+        registro_esquema.parar_escuta_invalidacao()
+        pool_conexoes.fechar_pools()
+
+
+app = Starlette(
+    routes=[
+        Route('/pergunta', pergunta, methods=['POST']),
+        Route('/ready', prontidao, methods=['GET']),
+        Route('/health', saude, methods=['GET']),
+        Route('/metrics', exportar_metricas, methods=['GET']),
+    ],
+    lifespan=ciclo_de_vida,
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    print("🚀 Inicializando LeIA API (ASGI)...")
+    api_json_final.verificar_configuracao_banco()
+    uvicorn.run(app, host=os.getenv('API_HOST', '0.0.0.0'), port=int(os.getenv('API_PORT', 5000)))
@@ -5,13 +5,35 @@ API JSON para LeIA - Assistente Virtual (Versão Final)
 """
 
 import os
-import sys
 import json
 import time
-from flask import Flask, request, jsonify
+import hmac
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
 
+import pool_conexoes
+import registro_esquema
+import visoes_materializadas
+import clientes
+import roteador
+import resultado_pesquisa
+import exportacao
+import consultas_preparadas
+import cache_resultados
+import cache_embeddings
+import metricas
+import rastreamento
+from main import (
+    construir_filtro_cliente, construir_filtro_mes, criar_roteador, executar_query_direta,
+    formatar_inteiro_ptbr, formatar_moeda,
+    chave_intencao, pesquisar_com_cache, pesquisar_lote_com_cache, precarregar_modulos, preparar_llm_e_embeddings,
+    responder_com_rag, responder_com_rag_lote, responder_com_rag_stream
+)
+
 # Carregar variáveis de ambiente do arquivo .env
 load_dotenv()
 
@@ -39,425 +61,274 @@ def verificar_configuracao_banco():
     return API_DB_CONFIG
 
 def conectar_postgres_api():
-    """Conecta ao banco de dados PostgreSQL usando configurações da API"""
+    """Obtém uma conexão do pool PostgreSQL da API (conn.close() devolve ao pool)"""
     try:
-        import psycopg2
-        conn = psycopg2.connect(**API_DB_CONFIG)
+        with rastreamento.span('conectar_postgres_api', {'db.system': 'postgresql', 'db.name': API_DB_CONFIG['database']}):
+            conn = pool_conexoes.obter_conexao(API_DB_CONFIG)
         return conn
     except Exception as e:
         print(f"Erro ao conectar com o PostgreSQL: {e}")
         return None
 
-def pesquisar_no_banco_api(pergunta):
+# Roteador da API: o dicionário de clientes vem do banco da API, não do DB_CONFIG de main
+ROTEADOR = criar_roteador(conectar_postgres_api)
+
+def pesquisar_no_banco_api(pergunta, intencao=None):
+    """Pesquisa inteligente no banco de dados usando configurações da API, com cache de resultados por intenção
+    (intencao: a pergunta já roteada pelo ROTEADOR da API)"""
+    return pesquisar_com_cache(pergunta, _pesquisar_no_banco_api, 'api', ROTEADOR, intencao)
+
+def _pesquisar_no_banco_api(pergunta, intencao=None):
     """Pesquisa inteligente no banco de dados usando configurações da API"""
-    pergunta_lower = pergunta.lower()
-    
-    # Verificar PRIMEIRO se a pergunta é sobre termos de linhas (prioridade)
-    termos_termos = ['termo', 'termos', 'possui termo', 'não possuem termo', 'nao possuem termo', 'sem termo']
-    if any(termo in pergunta_lower for termo in termos_termos):
-        return pesquisar_termos_linhas_api(pergunta)
-    
-    # Verificar se a pergunta é sobre custos por usuários
-    padroes_custos_usuarios = [
-        'usuário.*maior.*custo', 'usuario.*maior.*custo', 
-        'maior.*custo.*usuário', 'maior.*custo.*usuario',
-        'custo.*usuário', 'custo.*usuario', 'usuário.*custo', 'usuario.*custo'
-    ]
-    
-    import re
-    for padrao in padroes_custos_usuarios:
-        if re.search(padrao, pergunta_lower):
-            return pesquisar_custos_usuarios_api(pergunta)
-    
-    # Verificar também termos simples
-    termos_custos_usuarios = ['usuário', 'usuario']
-    if any(termo in pergunta_lower for termo in termos_custos_usuarios) and 'custo' in pergunta_lower:
-        return pesquisar_custos_usuarios_api(pergunta)
-    
-    # Verificar se a pergunta é sobre linhas ociosas
-    termos_ociosas = ['ociosa', 'ociosas', 'ocioso', 'ociosos']
-    for termo in termos_ociosas:
-        if termo in pergunta_lower:
-            return pesquisar_linhas_ociosas_api(pergunta)
-    
-    # Verificar se a pergunta é sobre linhas normais
-    if any(termo in pergunta_lower for termo in ['linha', 'licenca', 'status', 'ativa', 'bloqueada', 'cancelada', 'total_linhas']):
-        return pesquisar_linhas_api(pergunta)
-    
-    # Se não for sobre linhas, usa a lógica de custos
-    return pesquisar_custos_fornecedor_api(pergunta)
+    intencao = intencao if intencao is not None else ROTEADOR.rotear(pergunta)
+    pesquisa = {
+        roteador.ROTA_TERMOS: pesquisar_termos_linhas_api,
+        roteador.ROTA_CUSTOS_USUARIOS: pesquisar_custos_usuarios_api,
+        roteador.ROTA_LINHAS_OCIOSAS: pesquisar_linhas_ociosas_api,
+        roteador.ROTA_CUSTOS_FORNECEDOR: pesquisar_custos_fornecedor_api,
+        roteador.ROTA_LINHAS: pesquisar_linhas_api,
+    }
+    return pesquisa[intencao.rota](pergunta, intencao)
 
-def pesquisar_termos_linhas_api(pergunta):
+def pesquisar_termos_linhas_api(pergunta, intencao=None):
     """Pesquisa específica para a tabela ia_termos_numeros usando configurações da API"""
+    intencao = intencao if intencao is not None else ROTEADOR.rotear(pergunta)
     try:
         conn = conectar_postgres_api()
         if not conn:
-            return "Não foi possível conectar ao banco de dados."
-        
-        # Importar funções necessárias
-        from main import (
-            extrair_cliente_pergunta, formatar_inteiro_ptbr, executar_query_direta
-        )
+            return resultado_pesquisa.erro("Não foi possível conectar ao banco de dados.")
         
         resultados = []
         tempo_inicio = time.time()
         
-        with conn.cursor() as cursor:
-            # Verificar se a tabela ia_termos_numeros existe
-            cursor.execute("""
-                SELECT COUNT(*) 
-                FROM information_schema.tables 
-                WHERE table_name = 'ia_termos_numeros'
-            """)
-            tabela_existe = cursor.fetchone()[0]
-            
-            if tabela_existe == 0:
-                return "A tabela 'ia_termos_numeros' não existe no banco de dados."
-            
-            # Descobrir a estrutura real da tabela
-            cursor.execute("""
-                SELECT column_name, data_type 
-                FROM information_schema.columns 
-                WHERE table_name = 'ia_termos_numeros'
-                ORDER BY ordinal_position
-            """)
-            colunas_tabela = cursor.fetchall()
-        
-        # Encontrar nomes reais das colunas
-        coluna_cliente = None
-        coluna_possui_termo = None
-        coluna_tipo_linha = None
-        coluna_status_linha = None
-        
-        for coluna, tipo in colunas_tabela:
-            coluna_lower = coluna.lower()
-            if 'cliente' in coluna_lower:
-                coluna_cliente = coluna
-            elif 'possui_termo' in coluna_lower:
-                coluna_possui_termo = coluna
-            elif 'tipo_linha' in coluna_lower:
-                coluna_tipo_linha = coluna
-            elif 'status_linha' in coluna_lower:
-                coluna_status_linha = coluna
-        
-        # Extrair informações da pergunta
-        cliente_extraido = extrair_cliente_pergunta(pergunta)
-        pergunta_lower = pergunta.lower()
+        # Estrutura da tabela (registro de esquema em cache)
+        esquema = registro_esquema.obter_esquema(conn, 'ia_termos_numeros')
+        
+        if esquema is None:
+            return resultado_pesquisa.dados(["A tabela 'ia_termos_numeros' não existe no banco de dados."])
+        
+        # Nomes reais das colunas
+        coluna_cliente = esquema['cliente']
+        coluna_possui_termo = esquema['possui_termo']
+        coluna_tipo_linha = esquema['tipo_linha']
+        coluna_status_linha = esquema['status_linha']
+        
+        # Contagem sai da visão materializada quando disponível
+        fonte_termos = visoes_materializadas.fonte(conn, 'ia_mv_termos_tipo_status')
+        
+        # Informações da pergunta, extraídas uma vez pelo roteador
+        cliente_extraido = intencao.cliente
+        marcadores = set(intencao.marcadores)
         
         # Configurar filtros
-        cliente_capitalizado = cliente_extraido.capitalize() if cliente_extraido else None
-        filtro_cliente = f"{coluna_cliente} = '{cliente_capitalizado}'" if cliente_capitalizado else f"{coluna_cliente} IS NOT NULL"
-        nome_cliente_filtro = cliente_capitalizado if cliente_capitalizado else "todos os clientes"
+        filtro_cliente, params_cliente = construir_filtro_cliente(coluna_cliente, cliente_extraido, conectar_postgres_api)
+        nome_cliente_filtro = cliente_extraido if cliente_extraido else "todos os clientes"
         
         # Pergunta 1: Quantas linhas não possuem termo
-        if 'não possuem termo' in pergunta_lower or 'nao possuem termo' in pergunta_lower or 'sem termo' in pergunta_lower:
+        if 'não possuem termo' in marcadores or 'nao possuem termo' in marcadores or 'sem termo' in marcadores:
             query_linhas_sem_termo = f"""
-            SELECT COUNT(*) as total_sem_termo
-            FROM ia_termos_numeros
+            SELECT {fonte_termos.contagem} as total_sem_termo
+            FROM {fonte_termos.tabela}
             WHERE {filtro_cliente}
             AND ({coluna_possui_termo} = 'N' OR {coluna_possui_termo} = 'Não' OR {coluna_possui_termo} = 'NAO' OR {coluna_possui_termo} = 'NÃO' OR {coluna_possui_termo} IS NULL OR {coluna_possui_termo} = '')
             """
             
-            resultado_sem_termo = executar_query_direta(conn, query_linhas_sem_termo)
+            resultado_sem_termo = executar_query_direta(conn, query_linhas_sem_termo, params_cliente)
             if resultado_sem_termo is not None and not resultado_sem_termo.empty:
-                total_sem_termo = resultado_sem_termo.iloc[0]['total_sem_termo'] or 0
-                return f"O Cliente {nome_cliente_filtro} possui {formatar_inteiro_ptbr(total_sem_termo)} linhas sem termos."
+                total_sem_termo = resultado_sem_termo.valor('total_sem_termo') or 0
+                return resultado_pesquisa.pronta(f"O Cliente {nome_cliente_filtro} possui {formatar_inteiro_ptbr(total_sem_termo)} linhas sem termos.")
             else:
-                return f"O Cliente {nome_cliente_filtro} possui 0 linhas sem termos."
+                return resultado_pesquisa.pronta(f"O Cliente {nome_cliente_filtro} possui 0 linhas sem termos.")
         
-        return f"Não foi possível processar a pergunta sobre termos para o Cliente {nome_cliente_filtro}."
+        return resultado_pesquisa.dados([f"Não foi possível processar a pergunta sobre termos para o Cliente {nome_cliente_filtro}."])
                     
     except Exception as e:
-        return f"Erro durante a pesquisa de termos: {e}"
+        return resultado_pesquisa.erro(f"Erro durante a pesquisa de termos: {e}")
     finally:
         if 'conn' in locals():
             conn.close()
 
-def pesquisar_custos_usuarios_api(pergunta):
+def pesquisar_custos_usuarios_api(pergunta, intencao=None):
     """Pesquisa específica para a tabela ia_custo_usuarios_linhas usando configurações da API"""
+    intencao = intencao if intencao is not None else ROTEADOR.rotear(pergunta)
     try:
         conn = conectar_postgres_api()
         if not conn:
-            return "Não foi possível conectar ao banco de dados."
-        
-        # Importar funções necessárias
-        from main import (
-            extrair_mes_ano, extrair_cliente_pergunta, formatar_moeda,
-            construir_filtro_mes, executar_query_direta, extrair_quantidade_meses
-        )
+            return resultado_pesquisa.erro("Não foi possível conectar ao banco de dados.")
         
         resultados = []
         tempo_inicio = time.time()
         
-        with conn.cursor() as cursor:
-            # Verificar se a tabela existe
-            cursor.execute("""
-                SELECT COUNT(*) 
-                FROM information_schema.tables 
-                WHERE table_name = 'ia_custo_usuarios_linhas'
-            """)
-            tabela_existe = cursor.fetchone()[0]
-            
-            if tabela_existe == 0:
-                return "A tabela 'ia_custo_usuarios_linhas' não existe no banco de dados."
-            
-            # Descobrir a estrutura real da tabela
-            cursor.execute("""
-                SELECT column_name, data_type 
-                FROM information_schema.columns 
-                WHERE table_name = 'ia_custo_usuarios_linhas'
-                ORDER BY ordinal_position
-            """)
-            colunas_tabela = cursor.fetchall()
-        
-        # Encontrar nomes reais das colunas
-        coluna_cliente = None
-        coluna_nome_usuario = None
-        coluna_total = None
-        coluna_mes_referencia = None
-        tipo_mes_referencia = None
-        
-        for coluna, tipo in colunas_tabela:
-            coluna_lower = coluna.lower()
-            if 'cliente' in coluna_lower:
-                coluna_cliente = coluna
-            elif 'nome_usuario' in coluna_lower or 'usuario' in coluna_lower:
-                coluna_nome_usuario = coluna
-            elif 'total' in coluna_lower or 'custo' in coluna_lower or 'valor' in coluna_lower:
-                coluna_total = coluna
-            elif 'mes' in coluna_lower or 'referencia' in coluna_lower or 'data' in coluna_lower:
-                coluna_mes_referencia = coluna
-                tipo_mes_referencia = tipo
-        
-        # Extrair informações da pergunta
-        ano, mes_numero, mes_nome = extrair_mes_ano(pergunta)
-        cliente_extraido = extrair_cliente_pergunta(pergunta)
-        pergunta_lower = pergunta.lower()
+        # Estrutura da tabela (registro de esquema em cache)
+        esquema = registro_esquema.obter_esquema(conn, 'ia_custo_usuarios_linhas')
+        
+        if esquema is None:
+            return resultado_pesquisa.dados(["A tabela 'ia_custo_usuarios_linhas' não existe no banco de dados."])
+        
+        # Nomes reais das colunas
+        coluna_cliente = esquema['cliente']
+        coluna_nome_usuario = esquema['nome_usuario']
+        coluna_total = esquema['total']
+        coluna_mes_referencia = esquema['mes_referencia']
+        tipo_mes_referencia = esquema['tipo_mes_referencia']
+        
+        # Informações da pergunta, extraídas uma vez pelo roteador
+        ano, mes_numero, mes_nome = intencao.ano, intencao.mes, intencao.mes_nome
+        cliente_extraido = intencao.cliente
+        marcadores = set(intencao.marcadores)
         
         # Configurar filtros
-        cliente_capitalizado = cliente_extraido.capitalize() if cliente_extraido else None
-        filtro_cliente = f"{coluna_cliente} = '{cliente_capitalizado}'" if cliente_capitalizado else f"{coluna_cliente} IS NOT NULL"
-        nome_cliente_filtro = cliente_capitalizado if cliente_capitalizado else "todos os clientes"
+        filtro_cliente, params_cliente = construir_filtro_cliente(coluna_cliente, cliente_extraido, conectar_postgres_api)
+        nome_cliente_filtro = cliente_extraido if cliente_extraido else "todos os clientes"
         
         # Detectar tipo de pergunta
-        if 'atualmente' in pergunta_lower or 'mês atual' in pergunta_lower:
+        if 'atualmente' in marcadores or 'mês atual' in marcadores:
             # Maior custo no mês atual
             from datetime import datetime
             hoje = datetime.now()
             ano_atual = str(hoje.year)
             mes_atual = str(hoje.month).zfill(2)
-            filtro_mes = construir_filtro_mes(coluna_mes_referencia, tipo_mes_referencia, ano_atual, mes_atual)
+            filtro_mes, params_mes = construir_filtro_mes(coluna_mes_referencia, tipo_mes_referencia, ano_atual, mes_atual)
+            
+            # Ranking por cliente/mês pré-calculado na visão materializada quando disponível
+            fonte_ranking = visoes_materializadas.fonte(conn, 'ia_mv_custo_usuarios_ranking', limite=1)
             
             query_maior_custo_atual = f"""
             SELECT 
                 {coluna_nome_usuario} as nome_usuario,
                 {coluna_total} as total,
                 {coluna_mes_referencia} as mes_referencia
-            FROM ia_custo_usuarios_linhas
+            FROM {fonte_ranking.tabela}
             WHERE {filtro_cliente}
             {filtro_mes}
             ORDER BY {coluna_total} DESC
             LIMIT 1
             """
             
-            resultado_atual = executar_query_direta(conn, query_maior_custo_atual)
+            resultado_atual = executar_query_direta(conn, query_maior_custo_atual, params_cliente + params_mes)
             if resultado_atual is not None and not resultado_atual.empty:
-                usuario = resultado_atual.iloc[0]['nome_usuario']
-                total = resultado_atual.iloc[0]['total']
+                usuario = resultado_atual.valor('nome_usuario')
+                total = resultado_atual.valor('total')
                 total_formatado = formatar_moeda(total)
                 mes_formatado = f"{mes_atual}/{ano_atual}"
-                return f"O Usuário {usuario} possui o custo no valor de {total_formatado} no mês atual ({mes_formatado})."
+                return resultado_pesquisa.pronta(f"O Usuário {usuario} possui o custo no valor de {total_formatado} no mês atual ({mes_formatado}).")
             else:
-                return f"Não foram encontrados dados de custos para o Cliente {nome_cliente_filtro} no mês atual."
+                return resultado_pesquisa.pronta(f"Não foram encontrados dados de custos para o Cliente {nome_cliente_filtro} no mês atual.")
         
-        return f"Não foi possível processar a pergunta sobre custos por usuários para o Cliente {nome_cliente_filtro}."
+        return resultado_pesquisa.dados([f"Não foi possível processar a pergunta sobre custos por usuários para o Cliente {nome_cliente_filtro}."])
                     
     except Exception as e:
-        return f"Erro durante a pesquisa de custos por usuários: {e}"
+        return resultado_pesquisa.erro(f"Erro durante a pesquisa de custos por usuários: {e}")
     finally:
         if 'conn' in locals():
             conn.close()
 
-def pesquisar_linhas_ociosas_api(pergunta):
+def pesquisar_linhas_ociosas_api(pergunta, intencao=None):
     """Pesquisa específica para a tabela ia_linhas_ociosas usando configurações da API"""
+    intencao = intencao if intencao is not None else ROTEADOR.rotear(pergunta)
     try:
         conn = conectar_postgres_api()
         if not conn:
-            return "Não foi possível conectar ao banco de dados."
-        
-        # Importar funções necessárias
-        from main import (
-            extrair_mes_ano, extrair_cliente_pergunta, formatar_inteiro_ptbr,
-            construir_filtro_mes, executar_query_direta, extrair_quantidade_meses
-        )
+            return resultado_pesquisa.erro("Não foi possível conectar ao banco de dados.")
         
         resultados = []
         tempo_inicio = time.time()
         
-        with conn.cursor() as cursor:
-            # Verificar se a tabela existe
-            cursor.execute("""
-                SELECT COUNT(*) 
-                FROM information_schema.tables 
-                WHERE table_name = 'ia_linhas_ociosas'
-            """)
-            tabela_existe = cursor.fetchone()[0]
-            
-            if tabela_existe == 0:
-                return "A tabela 'ia_linhas_ociosas' não existe no banco de dados."
-            
-            # Descobrir a estrutura real da tabela
-            cursor.execute("""
-                SELECT column_name, data_type 
-                FROM information_schema.columns 
-                WHERE table_name = 'ia_linhas_ociosas'
-                ORDER BY ordinal_position
-            """)
-            colunas_tabela = cursor.fetchall()
-        
-        # Encontrar nomes reais das colunas
-        coluna_cliente = None
-        coluna_operadora = None
-        coluna_mes_referencia = None
-        coluna_quantidade = None
-        tipo_mes_referencia = None
-        
-        for coluna, tipo in colunas_tabela:
-            coluna_lower = coluna.lower()
-            if 'cliente' in coluna_lower:
-                coluna_cliente = coluna
-            elif 'operadora' in coluna_lower or 'fornecedor' in coluna_lower:
-                coluna_operadora = coluna
-            elif 'mes' in coluna_lower or 'referencia' in coluna_lower or 'data' in coluna_lower:
-                coluna_mes_referencia = coluna
-                tipo_mes_referencia = tipo
-            elif 'quantidade' in coluna_lower or 'total' in coluna_lower or 'qtd' in coluna_lower:
-                coluna_quantidade = coluna
-        
-        # Extrair informações da pergunta
-        ano, mes_numero, mes_nome = extrair_mes_ano(pergunta)
-        cliente_extraido = extrair_cliente_pergunta(pergunta)
-        pergunta_lower = pergunta.lower()
+        # Estrutura da tabela (registro de esquema em cache)
+        esquema = registro_esquema.obter_esquema(conn, 'ia_linhas_ociosas')
+        
+        if esquema is None:
+            return resultado_pesquisa.dados(["A tabela 'ia_linhas_ociosas' não existe no banco de dados."])
+        
+        # Nomes reais das colunas
+        coluna_cliente = esquema['cliente']
+        coluna_operadora = esquema['operadora']
+        coluna_mes_referencia = esquema['mes_referencia']
+        coluna_quantidade = esquema['quantidade']
+        tipo_mes_referencia = esquema['tipo_mes_referencia']
+        
+        # Contagem sai da visão materializada quando disponível
+        fonte_ociosas = visoes_materializadas.fonte(conn, 'ia_mv_ociosas_mes_operadora')
+        
+        # Informações da pergunta, extraídas uma vez pelo roteador
+        ano, mes_numero, mes_nome = intencao.ano, intencao.mes, intencao.mes_nome
+        cliente_extraido = intencao.cliente
+        marcadores = set(intencao.marcadores)
         
         # Configurar filtros
-        cliente_capitalizado = cliente_extraido.capitalize() if cliente_extraido else None
-        filtro_cliente = f"{coluna_cliente} = '{cliente_capitalizado}'" if cliente_capitalizado else f"{coluna_cliente} IS NOT NULL"
-        nome_cliente_filtro = cliente_capitalizado if cliente_capitalizado else "todos os clientes"
+        filtro_cliente, params_cliente = construir_filtro_cliente(coluna_cliente, cliente_extraido, conectar_postgres_api)
+        nome_cliente_filtro = cliente_extraido if cliente_extraido else "todos os clientes"
         
         # Detectar tipo de pergunta
-        if 'atualmente' in pergunta_lower or 'mês atual' in pergunta_lower:
+        if 'atualmente' in marcadores or 'mês atual' in marcadores:
             # Mês atual
             from datetime import datetime
             hoje = datetime.now()
             ano_atual = str(hoje.year)
             mes_atual = str(hoje.month).zfill(2)
-            filtro_mes = construir_filtro_mes(coluna_mes_referencia, tipo_mes_referencia, ano_atual, mes_atual)
+            filtro_mes, params_mes = construir_filtro_mes(coluna_mes_referencia, tipo_mes_referencia, ano_atual, mes_atual)
             
             query_total_atual = f"""
-            SELECT COUNT(*) as total_ociosas
-            FROM ia_linhas_ociosas
+            SELECT {fonte_ociosas.contagem} as total_ociosas
+            FROM {fonte_ociosas.tabela}
             WHERE {filtro_cliente}
             {filtro_mes}
             """
             
-            resultado_atual = executar_query_direta(conn, query_total_atual)
+            resultado_atual = executar_query_direta(conn, query_total_atual, params_cliente + params_mes)
             if resultado_atual is not None and not resultado_atual.empty:
-                total = resultado_atual.iloc[0]['total_ociosas'] or 0
+                total = resultado_atual.valor('total_ociosas') or 0
                 if total == 1:
-                    return f"O Cliente {nome_cliente_filtro} possui atualmente {total} linha ociosa."
+                    return resultado_pesquisa.pronta(f"O Cliente {nome_cliente_filtro} possui atualmente {total} linha ociosa.")
                 else:
-                    return f"O Cliente {nome_cliente_filtro} possui atualmente {total} linhas ociosas."
+                    return resultado_pesquisa.pronta(f"O Cliente {nome_cliente_filtro} possui atualmente {total} linhas ociosas.")
             else:
-                return f"O Cliente {nome_cliente_filtro} possui atualmente 0 linhas ociosas."
+                return resultado_pesquisa.pronta(f"O Cliente {nome_cliente_filtro} possui atualmente 0 linhas ociosas.")
         
-        return f"Não foi possível processar a pergunta sobre linhas ociosas para o Cliente {nome_cliente_filtro}."
+        return resultado_pesquisa.dados([f"Não foi possível processar a pergunta sobre linhas ociosas para o Cliente {nome_cliente_filtro}."])
                     
     except Exception as e:
-        return f"Erro durante a pesquisa de linhas ociosas: {e}"
+        return resultado_pesquisa.erro(f"Erro durante a pesquisa de linhas ociosas: {e}")
     finally:
         if 'conn' in locals():
             conn.close()
 
-def pesquisar_linhas_api(pergunta):
+def pesquisar_linhas_api(pergunta, intencao=None):
     """Pesquisa específica para a tabela ia_linhas usando configurações da API"""
+    intencao = intencao if intencao is not None else ROTEADOR.rotear(pergunta)
     try:
         conn = conectar_postgres_api()
         if not conn:
-            return "Não foi possível conectar ao banco de dados."
-        
-        # Importar funções necessárias
-        from main import (
-            extrair_mes_ano, extrair_cliente_pergunta, formatar_inteiro_ptbr,
-            construir_filtro_mes, executar_query_direta
-        )
+            return resultado_pesquisa.erro("Não foi possível conectar ao banco de dados.")
         
         resultados = []
         tempo_inicio = time.time()
         
-        with conn.cursor() as cursor:
-            # Verificar se a tabela existe
-            cursor.execute("""
-                SELECT COUNT(*) 
-                FROM information_schema.tables 
-                WHERE table_name = 'ia_linhas'
-            """)
-            tabela_existe = cursor.fetchone()[0]
-            
-            if tabela_existe == 0:
-                return "A tabela 'ia_linhas' não existe no banco de dados."
-            
-            # Descobrir a estrutura real da tabela
-            cursor.execute("""
-                SELECT column_name, data_type 
-                FROM information_schema.columns 
-                WHERE table_name = 'ia_linhas'
-                ORDER BY ordinal_position
-            """)
-            colunas_tabela = cursor.fetchall()
-        
-        # Encontrar nomes reais das colunas
-        coluna_cliente = None
-        coluna_status_licenca = None
-        coluna_fornecedor = None
-        coluna_total_linhas = None
-        coluna_mes_referencia = None
-        tipo_mes_referencia = None
-        coluna_tipo_contrato = None
-        
-        for coluna, tipo in colunas_tabela:
-            coluna_lower = coluna.lower()
-            if 'cliente' in coluna_lower:
-                coluna_cliente = coluna
-            elif 'status' in coluna_lower and 'licenca' in coluna_lower:
-                coluna_status_licenca = coluna
-            elif 'fornecedor' in coluna_lower:
-                coluna_fornecedor = coluna
-            elif 'total_linhas' in coluna_lower or ('total' in coluna_lower and 'linha' in coluna_lower):
-                coluna_total_linhas = coluna
-            elif 'mes' in coluna_lower or 'referencia' in coluna_lower or 'data' in coluna_lower:
-                coluna_mes_referencia = coluna
-                tipo_mes_referencia = tipo
-            elif 'tipo' in coluna_lower and 'contrato' in coluna_lower:
-                coluna_tipo_contrato = coluna
-        
-        # Extrair informações da pergunta
-        ano, mes_numero, mes_nome = extrair_mes_ano(pergunta)
-        cliente_extraido = extrair_cliente_pergunta(pergunta)
-        
-        # Extrair status da licença da pergunta
-        status_extraido = None
-        status_opcoes = ['ativa', 'bloqueada', 'cancelada']
-        pergunta_lower = pergunta.lower()
-        
-        for status in status_opcoes:
-            if status in pergunta_lower:
-                status_extraido = status
-                break
+        # Estrutura da tabela (registro de esquema em cache)
+        esquema = registro_esquema.obter_esquema(conn, 'ia_linhas')
+        
+        if esquema is None:
+            return resultado_pesquisa.dados(["A tabela 'ia_linhas' não existe no banco de dados."])
+        
+        # Nomes reais das colunas
+        coluna_cliente = esquema['cliente']
+        coluna_status_licenca = esquema['status_licenca']
+        coluna_fornecedor = esquema['fornecedor']
+        coluna_total_linhas = esquema['total_linhas']
+        coluna_mes_referencia = esquema['mes_referencia']
+        tipo_mes_referencia = esquema['tipo_mes_referencia']
+        coluna_tipo_contrato = esquema['tipo_contrato']
+        
+        # Informações da pergunta, extraídas uma vez pelo roteador
+        ano, mes_numero, mes_nome = intencao.ano, intencao.mes, intencao.mes_nome
+        cliente_extraido = intencao.cliente
+        status_extraido = intencao.status
         
         # Configurar filtros
-        filtro_cliente = f"{coluna_cliente} ILIKE '%{cliente_extraido}%'" if cliente_extraido else f"{coluna_cliente} IS NOT NULL"
-        filtro_status = f"AND {coluna_status_licenca} ILIKE '%{status_extraido}%'" if status_extraido else ""
-        filtro_mes = construir_filtro_mes(coluna_mes_referencia, tipo_mes_referencia, ano, mes_numero) if (mes_numero and ano) else ""
+        filtro_cliente, params_cliente = construir_filtro_cliente(coluna_cliente, cliente_extraido, conectar_postgres_api)
+        filtro_status = f"AND {coluna_status_licenca} ILIKE %s" if status_extraido else ""
+        params_status = [f"%{status_extraido}%"] if status_extraido else []
+        filtro_mes, params_mes = construir_filtro_mes(coluna_mes_referencia, tipo_mes_referencia, ano, mes_numero)
         
         nome_cliente_filtro = cliente_extraido if cliente_extraido else "todos os clientes"
         
@@ -477,89 +348,56 @@ def pesquisar_linhas_api(pergunta):
         LIMIT 20
         """
         
-        resultado_bruto = executar_query_direta(conn, query_dados_brutos)
+        resultado_bruto = executar_query_direta(conn, query_dados_brutos, params_cliente + params_status + params_mes)
         if resultado_bruto is not None and not resultado_bruto.empty:
             # Calcular total manualmente
-            if coluna_total_linhas in resultado_bruto.columns:
-                total_calculado = resultado_bruto[coluna_total_linhas].sum()
-                return f"O Cliente {nome_cliente_filtro} possui {formatar_inteiro_ptbr(total_calculado)} linhas."
+            if coluna_total_linhas in resultado_bruto.colunas:
+                return _resposta_linhas(nome_cliente_filtro, resultado_bruto.coluna(coluna_total_linhas))
         
-        return f"Não foram encontrados dados de linhas para o Cliente {nome_cliente_filtro}."
+        return _resposta_linhas(nome_cliente_filtro, [])
                     
     except Exception as e:
-        return f"Erro durante a pesquisa de linhas: {e}"
+        return resultado_pesquisa.erro(f"Erro durante a pesquisa de linhas: {e}")
     finally:
         if 'conn' in locals():
             conn.close()
 
-def pesquisar_custos_fornecedor_api(pergunta):
+def pesquisar_custos_fornecedor_api(pergunta, intencao=None):
     """Pesquisa específica para a tabela ia_custo_fornecedor usando configurações da API"""
+    intencao = intencao if intencao is not None else ROTEADOR.rotear(pergunta)
     try:
         conn = conectar_postgres_api()
         if not conn:
-            return "Não foi possível conectar ao banco de dados."
-        
-        # Importar funções necessárias
-        from main import (
-            extrair_mes_ano, extrair_cliente_pergunta, formatar_moeda,
-            construir_filtro_mes, executar_query_direta
-        )
+            return resultado_pesquisa.erro("Não foi possível conectar ao banco de dados.")
         
         resultados = []
         tempo_inicio = time.time()
         
-        with conn.cursor() as cursor:
-            # Verificar se a tabela existe
-            cursor.execute("""
-                SELECT COUNT(*) 
-                FROM information_schema.tables 
-                WHERE table_name = 'ia_custo_fornecedor'
-            """)
-            tabela_existe = cursor.fetchone()[0]
-            
-            if tabela_existe == 0:
-                return "A tabela 'ia_custo_fornecedor' não existe no banco de dados."
-            
-            # Descobrir a estrutura real da tabela
-            cursor.execute("""
-                SELECT column_name, data_type 
-                FROM information_schema.columns 
-                WHERE table_name = 'ia_custo_fornecedor'
-                ORDER BY ordinal_position
-            """)
-            colunas_tabela = cursor.fetchall()
-        
-        # Encontrar nomes reais das colunas
-        coluna_cliente = None
-        coluna_fornecedor = None
-        coluna_custo = None
-        coluna_mes_referencia = None
-        coluna_tipo_contrato = None
-        
-        for coluna, tipo in colunas_tabela:
-            coluna_lower = coluna.lower()
-            if 'cliente' in coluna_lower:
-                coluna_cliente = coluna
-            elif 'fornecedor' in coluna_lower:
-                coluna_fornecedor = coluna
-            elif coluna_lower == 'total' or 'custo' in coluna_lower or 'valor' in coluna_lower or tipo in ['numeric', 'decimal', 'money', 'double precision']:
-                coluna_custo = coluna
-            elif 'mes' in coluna_lower or 'referencia' in coluna_lower or 'data' in coluna_lower or tipo in ['date', 'timestamp', 'varchar', 'text']:
-                coluna_mes_referencia = coluna
-            elif 'tipo' in coluna_lower and 'contrato' in coluna_lower:
-                coluna_tipo_contrato = coluna
-        
-        # Extrair informações da pergunta
-        ano, mes_numero, mes_nome = extrair_mes_ano(pergunta)
-        cliente_extraido = extrair_cliente_pergunta(pergunta)
+        # Estrutura da tabela (registro de esquema em cache)
+        esquema = registro_esquema.obter_esquema(conn, 'ia_custo_fornecedor')
+        
+        if esquema is None:
+            return resultado_pesquisa.dados(["A tabela 'ia_custo_fornecedor' não existe no banco de dados."])
+        
+        # Nomes reais das colunas
+        coluna_cliente = esquema['cliente']
+        coluna_fornecedor = esquema['fornecedor']
+        coluna_custo = esquema['custo']
+        coluna_mes_referencia = esquema['mes_referencia']
+        tipo_mes_referencia = esquema['tipo_mes_referencia']
+        coluna_tipo_contrato = esquema['tipo_contrato']
+        
+        # Informações da pergunta, extraídas uma vez pelo roteador
+        ano, mes_numero, mes_nome = intencao.ano, intencao.mes, intencao.mes_nome
+        cliente_extraido = intencao.cliente
         
         # Se não extraiu cliente, usar 'safra' como padrão ou buscar todos
-        filtro_cliente = f"{coluna_cliente} ILIKE '%{cliente_extraido}%'" if cliente_extraido else f"{coluna_cliente} IS NOT NULL"
+        filtro_cliente, params_cliente = construir_filtro_cliente(coluna_cliente, cliente_extraido, conectar_postgres_api)
         nome_cliente_filtro = cliente_extraido if cliente_extraido else "todos os clientes"
         
         # CONSULTA PRINCIPAL: Para o mês específico solicitado
         if mes_numero and ano and coluna_mes_referencia and coluna_cliente and coluna_fornecedor and coluna_custo:
-            filtro_mes = construir_filtro_mes(coluna_mes_referencia, None, ano, mes_numero)
+            filtro_mes, params_mes = construir_filtro_mes(coluna_mes_referencia, tipo_mes_referencia, ano, mes_numero)
             
             # Incluir tipo_contrato se a coluna existir
             campos_select = f"""
@@ -581,40 +419,212 @@ def pesquisar_custos_fornecedor_api(pergunta):
             LIMIT 1
             """
             
-            resultado_mes_exato = executar_query_direta(conn, query_mes_exato)
+            resultado_mes_exato = executar_query_direta(conn, query_mes_exato, params_cliente + params_mes)
             if resultado_mes_exato is not None and not resultado_mes_exato.empty:
-                fornecedor = resultado_mes_exato.iloc[0]['fornecedor']
-                custo = resultado_mes_exato.iloc[0]['custo']
-                tipo_contrato = resultado_mes_exato.iloc[0].get('tipo_contrato', 'N/A')
-                
-                custo_formatado = formatar_moeda(custo)
-                return f"O Cliente {nome_cliente_filtro}, o fornecedor com o maior custo no mês de {mes_nome} de {ano} é {fornecedor}, com um custo total de {custo_formatado}, tipo de contrato {tipo_contrato}."
-        
-        return f"Não foram encontrados dados de custos para o Cliente {nome_cliente_filtro}."
+                return _resposta_custo_fornecedor(nome_cliente_filtro, mes_nome, ano, resultado_mes_exato.primeira())
+        
+        return _resposta_custo_fornecedor(nome_cliente_filtro, mes_nome, ano, None)
                     
     except Exception as e:
-        return f"Erro durante a pesquisa de custos: {e}"
+        return resultado_pesquisa.erro(f"Erro durante a pesquisa de custos: {e}")
     finally:
         if 'conn' in locals():
             conn.close()
 
+def _resposta_linhas(nome_cliente_filtro, totais):
+    """Resposta de linhas a partir do total_linhas das (até 20) maiores linhas do cliente; [] sem dados"""
+    if totais:
+        total_calculado = sum(total for total in totais if total is not None)
+        return resultado_pesquisa.pronta(f"O Cliente {nome_cliente_filtro} possui {formatar_inteiro_ptbr(total_calculado)} linhas.")
+    return resultado_pesquisa.dados([f"Não foram encontrados dados de linhas para o Cliente {nome_cliente_filtro}."])
+
+def _resposta_custo_fornecedor(nome_cliente_filtro, mes_nome, ano, registro):
+    """Resposta do maior custo por fornecedor a partir da linha de maior custo do mês; None sem dados"""
+    if registro is None:
+        return resultado_pesquisa.pronta(f"Não foram encontrados dados de custos para o Cliente {nome_cliente_filtro}.")
+    custo_formatado = formatar_moeda(registro['custo'])
+    tipo_contrato = registro.get('tipo_contrato', 'N/A')
+    return resultado_pesquisa.pronta(f"O Cliente {nome_cliente_filtro}, o fornecedor com o maior custo no mês de {mes_nome} de {ano} é {registro['fornecedor']}, com um custo total de {custo_formatado}, tipo de contrato {tipo_contrato}.")
+
+def _ordem_desc(valor):
+    """Chave de sorted(reverse=True) igual ao ORDER BY ... DESC do PostgreSQL (nulos primeiro)"""
+    return (valor is None, valor if valor is not None else 0)
+
+def _grafias_por_intencao(intencoes):
+    """Grafias de cada cliente no dicionário da API; None se algum cliente ficou fora dele"""
+    grafias = [clientes.grafias_cliente(intencao.cliente, conectar_postgres_api) for intencao in intencoes]
+    return grafias if all(grafias) else None
+
+def pesquisar_linhas_lote_api(intencoes):
+    """pesquisar_linhas_api para várias intenções do mesmo período e status, uma por cliente do dicionário.
+
+    Uma única consulta com cliente = ANY(%s) traz as 20 maiores linhas de cada grafia; a soma é refeita
+    por intenção com as mesmas 20 linhas da consulta unitária. Retorna um Resultado por intenção, ou
+    None quando o lote não se aplica (quem chama cai na pesquisa unitária).
+    """
+    grafias = _grafias_por_intencao(intencoes)
+    if grafias is None:
+        return None
+    ano, mes_numero, status_extraido = intencoes[0].ano, intencoes[0].mes, intencoes[0].status
+    conn = conectar_postgres_api()
+    if not conn:
+        return None
+    try:
+        esquema = registro_esquema.obter_esquema(conn, 'ia_linhas')
+        # A consulta unitária só soma quando a coluna real se chama total_linhas (o apelido da consulta)
+        if esquema is None or esquema['total_linhas'] != 'total_linhas':
+            return None
+        
+        coluna_cliente = esquema['cliente']
+        coluna_total_linhas = esquema['total_linhas']
+        filtro_status = f"AND {esquema['status_licenca']} ILIKE %s" if status_extraido else ""
+        params_status = [f"%{status_extraido}%"] if status_extraido else []
+        filtro_mes, params_mes = construir_filtro_mes(esquema['mes_referencia'], esquema['tipo_mes_referencia'], ano, mes_numero)
+        
+        query_lote = f"""
+        SELECT cliente, total_linhas FROM (
+            SELECT
+                {coluna_cliente} as cliente,
+                {coluna_total_linhas} as total_linhas,
+                ROW_NUMBER() OVER (PARTITION BY {coluna_cliente} ORDER BY {coluna_total_linhas} DESC) as posicao
+            FROM ia_linhas
+            WHERE {coluna_cliente} = ANY(%s)
+            {filtro_status}
+            {filtro_mes}
+        ) maiores
+        WHERE posicao <= 20
+        """
+        todas = sorted({grafia for lista in grafias for grafia in lista})
+        resultado = executar_query_direta(conn, query_lote, [todas] + params_status + params_mes)
+        
+        por_grafia = {}
+        for registro in (resultado.registros() if resultado is not None else ()):
+            por_grafia.setdefault(registro['cliente'], []).append(registro['total_linhas'])
+        respostas = []
+        for intencao, lista in zip(intencoes, grafias):
+            totais = sorted((total for grafia in lista for total in por_grafia.get(grafia, ())), key=_ordem_desc, reverse=True)
+            respostas.append(_resposta_linhas(intencao.cliente, totais[:20]))
+        return respostas
+    finally:
+        conn.close()
+
+def pesquisar_custos_fornecedor_lote_api(intencoes):
+    """pesquisar_custos_fornecedor_api para várias intenções do mesmo mês, uma por cliente do dicionário.
+
+    Uma única consulta com cliente = ANY(%s) traz a linha de maior custo de cada grafia; a de cada
+    intenção é a maior entre as suas grafias. Retorna um Resultado por intenção, ou None quando o
+    lote não se aplica (quem chama cai na pesquisa unitária).
+    """
+    grafias = _grafias_por_intencao(intencoes)
+    ano, mes_numero, mes_nome = intencoes[0].ano, intencoes[0].mes, intencoes[0].mes_nome
+    if grafias is None or not (ano and mes_numero):
+        return None
+    conn = conectar_postgres_api()
+    if not conn:
+        return None
+    try:
+        esquema = registro_esquema.obter_esquema(conn, 'ia_custo_fornecedor')
+        if esquema is None or not all(esquema[campo] for campo in ('cliente', 'fornecedor', 'custo', 'mes_referencia')):
+            return None
+        
+        coluna_cliente = esquema['cliente']
+        coluna_custo = esquema['custo']
+        filtro_mes, params_mes = construir_filtro_mes(esquema['mes_referencia'], esquema['tipo_mes_referencia'], ano, mes_numero)
+        campos_select = f"""
+            {coluna_cliente} as cliente,
+            {esquema['fornecedor']} as fornecedor,
+            {esquema['mes_referencia']} as mes_referencia,
+            {coluna_custo} as custo"""
+        if esquema['tipo_contrato']:
+            campos_select += f",\n            {esquema['tipo_contrato']} as tipo_contrato"
+        
+        query_lote = f"""
+        SELECT DISTINCT ON ({coluna_cliente})
+            {campos_select}
+        FROM ia_custo_fornecedor
+        WHERE {coluna_cliente} = ANY(%s)
+        {filtro_mes}
+        ORDER BY {coluna_cliente}, {coluna_custo} DESC
+        """
+        todas = sorted({grafia for lista in grafias for grafia in lista})
+        resultado = executar_query_direta(conn, query_lote, [todas] + params_mes)
+        
+        por_grafia = {registro['cliente']: registro for registro in (resultado.registros() if resultado is not None else ())}
+        respostas = []
+        for intencao, lista in zip(intencoes, grafias):
+            registros = [por_grafia[grafia] for grafia in lista if grafia in por_grafia]
+            maior = max(registros, key=lambda registro: _ordem_desc(registro['custo'])) if registros else None
+            respostas.append(_resposta_custo_fornecedor(intencao.cliente, mes_nome, ano, maior))
+        return respostas
+    finally:
+        conn.close()
+
+# Rotas quentes do /perguntas/batch: intenções que só diferem pelo cliente viram uma consulta
+PESQUISAS_EM_LOTE = {
+    roteador.ROTA_LINHAS: pesquisar_linhas_lote_api,
+    roteador.ROTA_CUSTOS_FORNECEDOR: pesquisar_custos_fornecedor_lote_api,
+}
+
+def chave_lote(intencao):
+    """Intenções que cabem na mesma consulta em lote: mesma rota e período (e status, nas linhas)"""
+    status = intencao.status if intencao.rota == roteador.ROTA_LINHAS else None
+    return (intencao.rota, intencao.ano, intencao.mes, status)
+
 # Configurar Flask
 app = Flask(__name__)
 CORS(app)
 
+# Um span por requisição (LEIA_RASTREAMENTO); desligado, os hooks nem são registrados
+if rastreamento.HABILITADO:
+    @app.before_request
+    def abrir_span_requisicao():
+        rota = request.url_rule.rule if request.url_rule is not None else request.path
+        g.span_requisicao = rastreamento.abrir_span_requisicao(
+            f"{request.method} {rota}", request.headers,
+            {'http.method': request.method, 'http.route': rota, 'http.target': request.full_path},
+        )
+
+    @app.after_request
+    def registrar_status_span(resposta):
+        g.status_requisicao = resposta.status_code
+        if resposta.is_streamed and 'span_requisicao' in g:
+            # Streaming (SSE, /exportar): o span fecha quando o servidor termina de enviar o corpo
+            span_requisicao, token = g.pop('span_requisicao')
+            status = resposta.status_code
+            resposta.call_on_close(lambda: rastreamento.encerrar_span_requisicao(span_requisicao, token, status))
+        return resposta
+
+    @app.teardown_request
+    def encerrar_span_requisicao(erro=None):
+        span_requisicao, token = g.pop('span_requisicao', (None, None))
+        rastreamento.encerrar_span_requisicao(span_requisicao, token, g.pop('status_requisicao', None), erro)
+
 # Variáveis globais
 llm_global = None
 embeddings_global = None
 llm_initialized = False
 
+# Prontidão do worker: as perguntas aguardam até a inicialização (LLM, pool, esquema) terminar
+worker_pronto = threading.Event()
+_inicializacao = {'thread': None, 'erro': None}
+_inicializacao_lock = threading.Lock()
+
+# Tabelas cujo esquema é carregado antes de liberar o tráfego
+TABELAS_AQUECIMENTO = list(registro_esquema.RESOLVEDORES_PAPEIS)
+
+# Lote de perguntas (/perguntas/batch): tamanho máximo e pesquisas/chamadas ao LLM simultâneas
+LOTE_MAX = int(os.getenv('LEIA_LOTE_MAX', '500'))
+LOTE_CONCORRENCIA = int(os.getenv('LEIA_LOTE_CONCORRENCIA', '4'))
+
+# Endpoints que respondem mesmo antes do worker ficar pronto
+ENDPOINTS_SEM_PRONTIDAO = {'health_check', 'verificar_prontidao', 'home', 'obter_exemplos', 'verificar_config', 'exportar_metricas'}
+
 def inicializar_llm():
     """Inicializa o LLM e embeddings globalmente"""
     global llm_global, embeddings_global, llm_initialized
     
     if not llm_initialized:
         try:
-            # Importar apenas quando necessário
-            from main import preparar_llm_e_embeddings
             llm_global, embeddings_global = preparar_llm_e_embeddings()
             llm_initialized = True
             print("✅ LLM e embeddings inicializados com sucesso!")
@@ -624,6 +634,37 @@ def inicializar_llm():
             llm_global, embeddings_global = None, None
             llm_initialized = True
 
+def inicializar_worker():
+    """Inicializa o worker: módulos pesados (LLM, numpy, pandas), LLM/embeddings, pool de conexões
+    e esquema das tabelas; as rotas não importam nada pesado depois disso"""
+    try:
+        precarregar_modulos()
+        inicializar_llm()
+        conn = conectar_postgres_api()
+        if conn is not None:
+            try:
+                for tabela in TABELAS_AQUECIMENTO:
+                    registro_esquema.obter_esquema(conn, tabela)
+            finally:
+                conn.close()
+        if os.getenv('LEIA_ESQUEMA_ESCUTAR', 'False').lower() == 'true':
+            registro_esquema.iniciar_escuta_invalidacao(API_DB_CONFIG)
+    except Exception as e:
+        # O worker atende mesmo assim (sem LLM ou reconectando ao banco a cada pergunta)
+        _inicializacao['erro'] = str(e)
+        print(f"⚠️ Aviso: inicialização do worker incompleta: {e}")
+    finally:
+        worker_pronto.set()
+
+def iniciar_inicializacao_worker():
+    """Dispara inicializar_worker em segundo plano (uma vez por processo)"""
+    with _inicializacao_lock:
+        if _inicializacao['thread'] is None:
+            thread = threading.Thread(target=inicializar_worker, name="leia-inicializacao", daemon=True)
+            _inicializacao['thread'] = thread
+            thread.start()
+    return _inicializacao['thread']
+
 def processar_entrada_json(entrada_json):
     """Processa entrada JSON e extrai a pergunta"""
     try:
@@ -645,21 +686,27 @@ def processar_entrada_json(entrada_json):
     except Exception as e:
         return None, {"erro": f"Erro ao processar entrada: {str(e)}"}
 
+def montar_resposta_json(resposta_texto, pergunta, sucesso=True, dados_extras=None):
+    """Monta o dicionário de resposta (usado pela API Flask e pela API ASGI)"""
+    resposta_json = {
+        "sucesso": sucesso,
+        "pergunta": pergunta,
+        "resposta": resposta_texto,
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "versao": "1.0"
+    }
+    
+    if dados_extras:
+        resposta_json["dados_extras"] = dados_extras
+    
+    return resposta_json
+
 def formatar_resposta_json(resposta_texto, pergunta, sucesso=True, dados_extras=None):
     """Formata resposta em JSON"""
     try:
-        resposta_json = {
-            "sucesso": sucesso,
-            "pergunta": pergunta,
-            "resposta": resposta_texto,
-            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
-            "versao": "1.0"
-        }
-        
-        if dados_extras:
-            resposta_json["dados_extras"] = dados_extras
-        
-        return json.dumps(resposta_json, ensure_ascii=False, indent=2)
+        resposta_json = montar_resposta_json(resposta_texto, pergunta, sucesso, dados_extras)
+        with metricas.medir_etapa('json'):
+            return json.dumps(resposta_json, ensure_ascii=False, indent=2)
     
     except Exception as e:
         erro_json = {
@@ -682,68 +729,54 @@ def processar_pergunta_json_api(entrada_json):
         if not pergunta.strip():
             return formatar_resposta_json("Por favor, digite uma pergunta válida.", pergunta, False)
         
-        # Importar funções necessárias
-        from main import (
-            extrair_palavras_chave, pesquisar_tabela_especifica,
-            executar_query_direta, extrair_cliente_pergunta, extrair_mes_ano,
-            formatar_moeda, formatar_dataframe_moeda, formatar_valores_monetarios_no_texto,
-            formatar_inteiro_ptbr, construir_filtro_mes, detectar_tabela_e_campos,
-            pesquisar_linhas, pesquisar_custos_usuarios, pesquisar_linhas_ociosas,
-            pesquisar_termos_linhas, _cosine_similarity, construir_rag_prompt,
-            responder_com_rag
-        )
-        
         # Pesquisar no banco de dados usando configurações da API
         dados_banco = pesquisar_no_banco_api(pergunta)
         
-        # Verificar se é uma resposta já formatada (custos por usuários, linhas ociosas, termos)
-        if (dados_banco.startswith("O Usuário") or 
-            dados_banco.startswith("Nos últimos") or 
-            dados_banco.startswith("No último mês") or
-            dados_banco.startswith("Não foram encontrados dados de custos") or 
-            dados_banco.startswith("--- INFORMAÇÕES EXTRAÍDAS DA PERGUNTA ---")):
-            return formatar_resposta_json(dados_banco, pergunta, True)
-        
-        # Verificar se é uma resposta de linhas ociosas (já formatada)
-        elif (dados_banco.startswith("O Cliente") and 
-            ("linhas ociosas" in dados_banco or "linha ociosa" in dados_banco or 
-             "possui atualmente" in dados_banco or "possuiu em" in dados_banco or 
-             "possuiu nos últimos" in dados_banco)):
-            return formatar_resposta_json(dados_banco, pergunta, True)
-        
-        # Verificar se é uma resposta sobre termos de linhas (já formatada)
-        elif (dados_banco.startswith("O Cliente") and 
-            ("linhas sem termos" in dados_banco or "linha sem termo" in dados_banco or 
-             "são do tipo" in dados_banco or "estão Ativas são do tipo" in dados_banco)):
-            return formatar_resposta_json(dados_banco, pergunta, True)
-        
-        # Verificar se é uma resposta de linhas normais (deve passar pelo RAG)
-        elif ("--- LINHAS POR FORNECEDOR" in dados_banco or 
-              "--- TOTAL POR FORNECEDOR" in dados_banco or
-              "--- DADOS BRUTOS" in dados_banco or
-              "--- DEBUG:" in dados_banco):
-            # Passar pelo RAG para formatar a resposta
-            if llm_global and embeddings_global:
-                try:
-                    resposta = responder_com_rag(pergunta, dados_banco, llm_global, embeddings_global, top_k=6)
-                    return formatar_resposta_json(resposta, pergunta, True)
-                except Exception as e:
-                    return formatar_resposta_json(f"Dados do banco (sem processamento IA):\n\n{dados_banco}", pergunta, True, {"erro_ia": str(e)})
-            else:
-                return formatar_resposta_json(f"Dados do banco de dados:\n\n{dados_banco}", pergunta, True)
+        # Resposta já formatada não passa pelo RAG
+        if dados_banco.ja_formatada:
+            return formatar_resposta_json(dados_banco.resposta, pergunta, True)
+        
+        # Demais resultados passam pelo RAG para formatar a resposta
+        if llm_global and embeddings_global:
+            try:
+                resposta = responder_com_rag(pergunta, dados_banco, llm_global, embeddings_global, top_k=6)
+                return formatar_resposta_json(resposta, pergunta, True)
+            except Exception as e:
+                return formatar_resposta_json(f"Dados do banco (sem processamento IA):\n\n{dados_banco}", pergunta, True, {"erro_ia": str(e)})
         else:
-            if llm_global and embeddings_global:
-                try:
-                    resposta = responder_com_rag(pergunta, dados_banco, llm_global, embeddings_global, top_k=6)
-                    return formatar_resposta_json(resposta, pergunta, True)
-                except Exception as e:
-                    return formatar_resposta_json(f"Dados do banco (sem processamento IA):\n\n{dados_banco}", pergunta, True, {"erro_ia": str(e)})
-            else:
-                return formatar_resposta_json(f"Dados do banco de dados:\n\n{dados_banco}", pergunta, True)
+            return formatar_resposta_json(f"Dados do banco de dados:\n\n{dados_banco}", pergunta, True)
     
     except Exception as e:
         return formatar_resposta_json(f"Erro interno: {str(e)}", pergunta if 'pergunta' in locals() else "", False)
 
+@app.before_request
+def aguardar_prontidao():
+    """Segura as requisições até o worker terminar de inicializar (503 se passar do limite)"""
+    if worker_pronto.is_set() or request.endpoint in ENDPOINTS_SEM_PRONTIDAO:
+        return None
+    # Fora do gunicorn (sem post_fork) a inicialização começa na primeira requisição
+    iniciar_inicializacao_worker()
+    if worker_pronto.wait(float(os.getenv('LEIA_PRONTIDAO_TIMEOUT', '60'))):
+        return None
+    resposta = jsonify({
+        "sucesso": False,
+        "erro": "Serviço inicializando, tente novamente em instantes",
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+    })
+    resposta.headers['Retry-After'] = '5'
+    return resposta, 503
+
+@app.route('/ready', methods=['GET'])
+def verificar_prontidao():
+    """Readiness: 200 quando o worker terminou de inicializar, 503 enquanto inicializa"""
+    pronto = worker_pronto.is_set()
+    return jsonify({
+        "pronto": pronto,
+        "llm_disponivel": llm_global is not None,
+        "erro_inicializacao": _inicializacao['erro'],
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+    }), (200 if pronto else 503)
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Endpoint de verificação de saúde da API"""
@@ -751,9 +784,23 @@ def health_check():
         "status": "ok",
         "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
         "versao": "1.0",
-        "llm_disponivel": llm_global is not None
+        "llm_disponivel": llm_global is not None,
+        "pronto": worker_pronto.is_set(),
+        "pool_banco": pool_conexoes.estatisticas_pools(),
+        "consultas_preparadas": consultas_preparadas.estatisticas_consultas(),
+        "cache_resultados": cache_resultados.estatisticas_cache(),
+        "cache_embeddings": cache_embeddings.estatisticas_embeddings(),
+        "visoes_materializadas": visoes_materializadas.estatisticas_visoes(),
+        "clientes": clientes.estatisticas_clientes(conectar_postgres_api),
+        "etapas": metricas.estatisticas_metricas(),
+        "rastreamento": rastreamento.estatisticas_rastreamento()
     })
 
+@app.route('/metrics', methods=['GET'])
+def exportar_metricas():
+    """Histogramas de latência por etapa no formato de texto do Prometheus"""
+    return Response(metricas.exposicao(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/config', methods=['GET'])
 def verificar_config():
     """Endpoint para verificar configurações do banco de dados"""
@@ -792,11 +839,14 @@ def processar_pergunta():
                 "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
             }), 400
         
-        # Processar pergunta
-        resposta_json = processar_pergunta_json_api(dados_json)
+        # Processar pergunta (somando os segundos de cada etapa)
+        with metricas.coletar() as tempos:
+            resposta_json = processar_pergunta_json_api(dados_json)
         
         # Converter resposta JSON string para dict
         resposta_dict = json.loads(resposta_json)
+        if metricas.tempos_pedidos(dados_json):
+            resposta_dict.setdefault("dados_extras", {})["tempos_etapas"] = metricas.tempos_etapas(tempos)
         
         # Retornar resposta
         return jsonify(resposta_dict)
@@ -808,6 +858,404 @@ def processar_pergunta():
             "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
         }), 500
 
+def processar_lote_api(perguntas):
+    """Responde uma lista de perguntas compartilhando o trabalho de banco, embeddings e LLM.
+
+    Perguntas com a mesma intenção (mesma rota, cliente, período e filtros) fazem uma única
+    pesquisa. Nas rotas de PESQUISAS_EM_LOTE, os grupos do mesmo período que só diferem pelo
+    cliente (do dicionário) fazem uma única consulta com cliente = ANY(%s); as demais pesquisas
+    rodam em paralelo. As que vão para o RAG compartilham uma chamada de embeddings. Retorna os
+    itens na ordem de entrada, com tempos por item.
+    """
+    # 1) Agrupa por intenção: uma pesquisa por grupo
+    grupos = {}
+    intencoes = [ROTEADOR.rotear(pergunta) for pergunta in perguntas]
+    for i, intencao in enumerate(intencoes):
+        chave = cache_resultados.montar_chave(['api', chave_intencao(intencao)])
+        grupos.setdefault(chave, []).append(i)
+
+    # Grupos das rotas quentes com cliente do dicionário, juntados por rota e período
+    lotes = {}
+    for chave, indices in grupos.items():
+        intencao = intencoes[indices[0]]
+        if intencao.rota in PESQUISAS_EM_LOTE and clientes.grafias_cliente(intencao.cliente, conectar_postgres_api):
+            lotes.setdefault(chave_lote(intencao), []).append(chave)
+    lotes = [chaves for chaves in lotes.values() if len(chaves) > 1]
+
+    def _pesquisar_lote(chaves):
+        inicio = time.perf_counter()
+        representantes = [grupos[chave][0] for chave in chaves]
+        try:
+            resultados = pesquisar_lote_com_cache(
+                [perguntas[i] for i in representantes], [intencoes[i] for i in representantes],
+                PESQUISAS_EM_LOTE[intencoes[representantes[0]].rota], 'api'
+            )
+        except Exception as e:
+            print(f"Erro na pesquisa em lote, seguindo item a item: {e}")
+            resultados = [None] * len(chaves)
+        tempo = time.perf_counter() - inicio
+        return {chave: (dados, None, tempo) for chave, dados in zip(chaves, resultados) if dados is not None}
+
+    def _pesquisar(indices):
+        inicio = time.perf_counter()
+        try:
+            return pesquisar_no_banco_api(perguntas[indices[0]], intencoes[indices[0]]), None, time.perf_counter() - inicio
+        except Exception as e:
+            return None, str(e), time.perf_counter() - inicio
+
+    with ThreadPoolExecutor(max_workers=max(1, LOTE_CONCORRENCIA), thread_name_prefix="leia-lote") as executor:
+        pesquisas = {}
+        for feitas in executor.map(_pesquisar_lote, lotes):
+            pesquisas.update(feitas)
+        # O que ficou fora dos lotes (ou o lote não resolveu) segue pela pesquisa unitária
+        restantes = [chave for chave in grupos if chave not in pesquisas]
+        pesquisas.update(zip(restantes, executor.map(_pesquisar, [grupos[chave] for chave in restantes])))
+
+    dados_banco = [None] * len(perguntas)
+    erros = [None] * len(perguntas)
+    tempos = [{'banco': 0.0, 'embeddings': 0.0, 'llm': 0.0} for _ in perguntas]
+    for chave, indices in grupos.items():
+        dados, erro, tempo = pesquisas[chave]
+        representante = perguntas[indices[0]]
+        for i in indices:
+            # Algumas seções repetem a pergunta original
+            if dados is not None and i != indices[0]:
+                dados_banco[i] = dados.trocar_texto(f"Pergunta: {representante}", f"Pergunta: {perguntas[i]}")
+            else:
+                dados_banco[i] = dados
+            erros[i] = erro
+            tempos[i]['banco'] = round(tempo, 4)
+
+    # 2) Respostas prontas, dados brutos (sem LLM) ou RAG
+    itens = [None] * len(perguntas)
+    para_rag = []
+    for i, pergunta in enumerate(perguntas):
+        if erros[i] is not None:
+            itens[i] = montar_resposta_json(f"Erro interno: {erros[i]}", pergunta, False)
+        elif dados_banco[i].ja_formatada:
+            itens[i] = montar_resposta_json(dados_banco[i].resposta, pergunta, True)
+        elif llm_global and embeddings_global:
+            para_rag.append(i)
+        else:
+            itens[i] = montar_resposta_json(f"Dados do banco de dados:\n\n{dados_banco[i]}", pergunta, True)
+
+    # 3) RAG em lote; pares (pergunta, texto dos dados) repetidos geram uma única resposta
+    pares = list(dict.fromkeys((perguntas[i], str(dados_banco[i])) for i in para_rag))
+    if pares:
+        saidas = responder_com_rag_lote(
+            [p for p, _ in pares], [d for _, d in pares], llm_global, embeddings_global,
+            top_k=6, max_concorrencia=LOTE_CONCORRENCIA
+        )
+        saida_por_par = dict(zip(pares, saidas))
+        for i in para_rag:
+            saida = saida_por_par[(perguntas[i], str(dados_banco[i]))]
+            tempos[i].update(saida['tempos'])
+            if saida['erro_ia'] is not None:
+                itens[i] = montar_resposta_json(
+                    f"Dados do banco (sem processamento IA):\n\n{dados_banco[i]}", perguntas[i], True,
+                    {"erro_ia": saida['erro_ia']}
+                )
+            else:
+                itens[i] = montar_resposta_json(saida['resposta'], perguntas[i], True)
+
+    for i, item in enumerate(itens):
+        item['indice'] = i
+        item['tempos'] = tempos[i]
+    return itens, {'grupos_banco': len(grupos), 'respostas_rag': len(pares)}
+
+@app.route('/perguntas/batch', methods=['POST'])
+def processar_perguntas_lote():
+    """Endpoint de lote: {"perguntas": [...]} -> resultados na mesma ordem, com tempos por item"""
+    inicio = time.perf_counter()
+    dados_json = request.get_json(silent=True) if request.is_json else None
+    entradas = dados_json.get('perguntas') if isinstance(dados_json, dict) else None
+    if not isinstance(entradas, list) or not entradas:
+        return jsonify({
+            "sucesso": False,
+            "erro": "Envie um JSON com a lista 'perguntas'",
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+        }), 400
+    if len(entradas) > LOTE_MAX:
+        return jsonify({
+            "sucesso": False,
+            "erro": f"Lote com {len(entradas)} perguntas excede o máximo de {LOTE_MAX}",
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+        }), 413
+
+    # Cada item pode ser o texto da pergunta ou o mesmo JSON aceito por /pergunta
+    perguntas, invalidos = [], {}
+    for i, entrada in enumerate(entradas):
+        pergunta, erro = processar_entrada_json(entrada if isinstance(entrada, dict) else {"pergunta": entrada})
+        if erro or not isinstance(pergunta, str) or not pergunta.strip():
+            invalidos[i] = erro or {"erro": "Pergunta vazia ou inválida"}
+        else:
+            perguntas.append((i, pergunta))
+
+    try:
+        itens, resumo = processar_lote_api([p for _, p in perguntas]) if perguntas else ([], {'grupos_banco': 0, 'respostas_rag': 0})
+    except Exception as e:
+        return jsonify({
+            "sucesso": False,
+            "erro": f"Erro interno do servidor: {str(e)}",
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+        }), 500
+
+    resultados = [None] * len(entradas)
+    for (i, _), item in zip(perguntas, itens):
+        item['indice'] = i
+        resultados[i] = item
+    for i, erro in invalidos.items():
+        item = montar_resposta_json("", "", False, erro)
+        item['indice'] = i
+        resultados[i] = item
+
+    return jsonify({
+        "sucesso": True,
+        "total": len(entradas),
+        "grupos_banco": resumo['grupos_banco'],
+        "respostas_rag": resumo['respostas_rag'],
+        "resultados": resultados,
+        "tempo_total": round(time.perf_counter() - inicio, 4),
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+    })
+
+def evento_sse(evento, dados):
+    """Serializa um evento server-sent events (event + data JSON)"""
+    return f"event: {evento}\ndata: {json.dumps(dados, ensure_ascii=False)}\n\n"
+
+def gerar_eventos_pergunta(pergunta, incluir_tempos=False):
+    """Gera os eventos SSE de uma pergunta: inicio, token (um por trecho da resposta) e fim (ou erro).
+
+    Com incluir_tempos, o evento fim traz dados_extras["tempos_etapas"] (segundos por etapa).
+    """
+    # Primeiro byte sai antes da pesquisa no banco
+    yield evento_sse("inicio", {"pergunta": pergunta, "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")})
+    with metricas.coletar() as tempos:
+        yield from _gerar_eventos_resposta(pergunta, tempos if incluir_tempos else None)
+
+def _gerar_eventos_resposta(pergunta, tempos):
+    """Eventos token e fim (ou erro) de gerar_eventos_pergunta"""
+    try:
+        dados_banco = pesquisar_no_banco_api(pergunta)
+        if dados_banco.ja_formatada:
+            partes = [dados_banco.resposta]
+        elif llm_global and embeddings_global:
+            partes = responder_com_rag_stream(pergunta, dados_banco, llm_global, embeddings_global, top_k=6)
+        else:
+            partes = [f"Dados do banco de dados:\n\n{dados_banco}"]
+
+        texto = []
+        dados_extras = None
+        try:
+            for parte in partes:
+                texto.append(parte)
+                yield evento_sse("token", {"texto": parte})
+        except Exception as e:
+            # Falha do LLM no meio do stream: completa com os dados do banco
+            dados_extras = {"erro_ia": str(e)}
+            fallback = f"Dados do banco (sem processamento IA):\n\n{dados_banco}"
+            parte = f"\n\n{fallback}" if texto else fallback
+            texto = [fallback]
+            yield evento_sse("token", {"texto": parte})
+
+        if tempos is not None:
+            dados_extras = dict(dados_extras or {}, tempos_etapas=metricas.tempos_etapas(tempos))
+        yield evento_sse("fim", montar_resposta_json("".join(texto), pergunta, True, dados_extras))
+    except Exception as e:
+        yield evento_sse("erro", {
+            "sucesso": False,
+            "erro": f"Erro interno do servidor: {str(e)}",
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+        })
+
+@app.route('/pergunta/stream', methods=['GET', 'POST'])
+def processar_pergunta_stream():
+    """Endpoint de streaming (SSE): envia a resposta em trechos conforme os tokens chegam do LLM.
+
+    POST com o mesmo JSON de /pergunta, ou GET ?pergunta=... (para EventSource no navegador).
+    """
+    if request.method == 'GET':
+        dados_json = {"pergunta": request.args.get('pergunta', '')}
+    elif request.is_json:
+        dados_json = request.get_json(silent=True) or {}
+    else:
+        return jsonify({
+            "sucesso": False,
+            "erro": "Content-Type deve ser application/json",
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+        }), 400
+
+    pergunta, erro = processar_entrada_json(dados_json)
+    if erro or not pergunta.strip():
+        return jsonify({
+            "sucesso": False,
+            "erro": erro["erro"] if erro else "Por favor, digite uma pergunta válida.",
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+        }), 400
+
+    eventos = gerar_eventos_pergunta(pergunta, metricas.tempos_pedidos(dados_json))
+    resposta = Response(stream_with_context(eventos), mimetype='text/event-stream')
+    resposta.headers['Cache-Control'] = 'no-cache'
+    # Proxies como o nginx não devem acumular o stream
+    resposta.headers['X-Accel-Buffering'] = 'no'
+    return resposta
+
+@app.route('/exportar', methods=['GET', 'POST'])
+def exportar_dados():
+    """Exporta os dados por trás da resposta de uma pergunta (linhas de detalhe, sem LIMIT).
+
+    POST {"pergunta": ..., "formato": "csv"|"arrow"|"parquet", "copy": false} ou GET com os
+    mesmos campos na query string. O arquivo sai em partes (chunked) conforme os lotes do
+    cursor no servidor; "copy": true usa COPY ... TO STDOUT (só CSV), para extrações grandes.
+    """
+    if request.method == 'GET':
+        dados_json = request.args.to_dict()
+    elif request.is_json:
+        dados_json = request.get_json(silent=True) or {}
+    else:
+        return jsonify({
+            "sucesso": False,
+            "erro": "Content-Type deve ser application/json",
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+        }), 400
+    
+    pergunta, erro = processar_entrada_json(dados_json)
+    formato = str(dados_json.get('formato', 'csv')).lower()
+    via_copy = str(dados_json.get('copy', 'false')).lower() in ('true', '1', 'sim')
+    if erro or not pergunta.strip():
+        erro = erro["erro"] if erro else "Por favor, digite uma pergunta válida."
+    elif formato not in exportacao.FORMATOS:
+        erro = f"Formato inválido: {formato} (use {', '.join(exportacao.FORMATOS)})"
+    elif via_copy and formato != 'csv':
+        erro = "O caminho COPY só gera CSV"
+    if erro:
+        return jsonify({"sucesso": False, "erro": erro, "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")}), 400
+    if formato != 'csv' and not exportacao.pyarrow_disponivel():
+        return jsonify({
+            "sucesso": False,
+            "erro": f"O formato {formato} requer o pacote pyarrow",
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+        }), 501
+    
+    conn = conectar_postgres_api()
+    if conn is None:
+        return jsonify({
+            "sucesso": False,
+            "erro": "Não foi possível conectar ao banco de dados.",
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+        }), 503
+    try:
+        consulta = exportacao.montar_consulta(conn, pergunta, ROTEADOR, conectar_postgres_api)
+    except Exception as e:
+        conn.close()
+        return jsonify({
+            "sucesso": False,
+            "erro": f"Erro ao montar a exportação: {str(e)}",
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+        }), 500
+    if consulta is None:
+        conn.close()
+        return jsonify({
+            "sucesso": False,
+            "erro": "A tabela da pergunta não existe no banco de dados.",
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+        }), 404
+    
+    def gerar_arquivo():
+        # A conexão fica com o stream até o último lote (ou até o cliente desistir)
+        try:
+            if via_copy:
+                yield from exportacao.exportar_csv_copy(conn, consulta)
+            else:
+                yield from exportacao.exportar(conn, consulta, formato)
+        finally:
+            conn.close()
+    
+    resposta = Response(gerar_arquivo(), mimetype=exportacao.FORMATOS[formato][0])
+    resposta.headers['Content-Disposition'] = f'attachment; filename="{consulta.nome_arquivo(formato)}"'
+    resposta.headers['X-Leia-Rota'] = consulta.rota
+    resposta.headers['X-Leia-Periodo'] = quote(consulta.periodo)
+    resposta.headers['X-Accel-Buffering'] = 'no'
+    return resposta
+
+def token_admin_valido():
+    """Confere o header X-Admin-Token com LEIA_ADMIN_TOKEN (endpoints admin ficam desabilitados sem o token)"""
+    token = os.getenv('LEIA_ADMIN_TOKEN', '')
+    token_recebido = request.headers.get('X-Admin-Token', '')
+    return bool(token) and hmac.compare_digest(token, token_recebido)
+
+def resposta_acesso_negado():
+    return jsonify({
+        "sucesso": False,
+        "erro": "Acesso negado (defina LEIA_ADMIN_TOKEN e envie o header X-Admin-Token)",
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+    }), 403
+
+@app.route('/admin/esquema/invalidar', methods=['POST'])
+def invalidar_cache_esquema():
+    """Endpoint administrativo para invalidar o cache de esquema das tabelas ia_*"""
+    if not token_admin_valido():
+        return resposta_acesso_negado()
+    
+    dados_json = request.get_json(silent=True) or {}
+    tabelas_invalidadas = registro_esquema.invalidar_esquema(dados_json.get('tabela'))
+    
+    return jsonify({
+        "sucesso": True,
+        "tabelas_invalidadas": tabelas_invalidadas,
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+    })
+
+@app.route('/admin/cache/invalidar', methods=['POST'])
+def invalidar_cache_resultados():
+    """Endpoint administrativo para limpar o cache de resultados (após a carga mensal dos dados).
+
+    O dicionário de clientes também é recarregado na próxima pergunta (clientes novos na carga).
+    """
+    if not token_admin_valido():
+        return resposta_acesso_negado()
+    
+    clientes.invalidar_clientes()
+    return jsonify({
+        "sucesso": True,
+        "resultados_removidos": cache_resultados.invalidar_cache(),
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+    })
+
+@app.route('/admin/visoes/atualizar', methods=['POST'])
+def atualizar_visoes_materializadas():
+    """Endpoint administrativo para atualizar as visões materializadas após a carga mensal.
+
+    Cria as visões que faltam com {"criar": true}; ao final limpa o cache de resultados.
+    """
+    if not token_admin_valido():
+        return resposta_acesso_negado()
+    
+    dados_json = request.get_json(silent=True) or {}
+    conn = conectar_postgres_api()
+    if conn is None:
+        return jsonify({
+            "sucesso": False,
+            "erro": "Não foi possível conectar ao banco de dados.",
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+        }), 503
+    try:
+        criadas = visoes_materializadas.criar_visoes(conn) if dados_json.get('criar') else None
+        atualizadas = visoes_materializadas.atualizar_visoes(conn)
+    finally:
+        conn.close()
+    
+    clientes.invalidar_clientes()
+    resposta = {
+        "sucesso": True,
+        "visoes_atualizadas": atualizadas,
+        "resultados_removidos": cache_resultados.invalidar_cache(),
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+    }
+    if criadas is not None:
+        resposta["visoes_criadas"] = criadas
+    return jsonify(resposta)
+
 @app.route('/exemplos', methods=['GET'])
 def obter_exemplos():
     """Endpoint para obter exemplos de perguntas"""
@@ -874,9 +1322,17 @@ def home():
         "versao": "1.0",
         "endpoints": {
             "POST /pergunta": "Processar pergunta em JSON",
+            "POST /perguntas/batch": "Processar uma lista de perguntas em lote (resultados na ordem de entrada)",
+            "POST /pergunta/stream": "Processar pergunta com resposta em streaming (server-sent events)",
+            "POST /exportar": "Exportar os dados da pergunta em CSV, Arrow IPC ou Parquet (streaming)",
             "GET /exemplos": "Obter exemplos de perguntas",
             "GET /health": "Verificar status da API",
+            "GET /ready": "Verificar se o worker terminou de inicializar (readiness)",
+            "GET /metrics": "Latência por etapa (rota, SQL, embeddings, LLM...) em histogramas do Prometheus",
             "GET /config": "Verificar configurações do banco de dados",
+            "POST /admin/esquema/invalidar": "Invalidar o cache de esquema (requer X-Admin-Token)",
+            "POST /admin/cache/invalidar": "Limpar o cache de resultados (requer X-Admin-Token)",
+            "POST /admin/visoes/atualizar": "Atualizar as visões materializadas e limpar o cache de resultados (requer X-Admin-Token)",
             "GET /": "Esta página"
         },
         "exemplo_uso": {
@@ -897,8 +1353,8 @@ if __name__ == '__main__':
     # Verificar configurações do banco de dados
     verificar_configuracao_banco()
     
-    # Inicializar LLM
-    inicializar_llm()
+    # Inicializar LLM, pool e esquema (e a escuta de invalidação, se habilitada)
+    inicializar_worker()
     
     # Configurações do servidor
     host = os.getenv('API_HOST', '0.0.0.0')
@@ -24,7 +24,7 @@ try:
         formatar_moeda, formatar_dataframe_moeda, formatar_valores_monetarios_no_texto,
         formatar_inteiro_ptbr, construir_filtro_mes, detectar_tabela_e_campos,
         pesquisar_linhas, pesquisar_custos_usuarios, pesquisar_linhas_ociosas,
-        pesquisar_termos_linhas, pesquisar_no_banco, _cosine_similarity, construir_rag_prompt,
+        pesquisar_termos_linhas, pesquisar_no_banco, construir_rag_prompt,
         preparar_llm_e_embeddings, responder_com_rag
     )
     print("✅ Funções importadas com sucesso!")
@@ -117,50 +117,19 @@ def processar_pergunta_json_api(entrada_json):
         # Pesquisar no banco de dados
         dados_banco = pesquisar_no_banco(pergunta)
         
-        # Verificar se é uma resposta já formatada (custos por usuários, linhas ociosas, termos)
-        if (dados_banco.startswith("O Usuário") or 
-            dados_banco.startswith("Nos últimos") or 
-            dados_banco.startswith("No último mês") or
-            dados_banco.startswith("Não foram encontrados dados de custos") or 
-            dados_banco.startswith("--- INFORMAÇÕES EXTRAÍDAS DA PERGUNTA ---")):
-            return formatar_resposta_json(dados_banco, pergunta, True)
+        # Resposta já formatada não passa pelo RAG
+        if dados_banco.ja_formatada:
+            return formatar_resposta_json(dados_banco.resposta, pergunta, True)
         
-        # Verificar se é uma resposta de linhas ociosas (já formatada)
-        elif (dados_banco.startswith("O Cliente") and 
-            ("linhas ociosas" in dados_banco or "linha ociosa" in dados_banco or 
-             "possui atualmente" in dados_banco or "possuiu em" in dados_banco or 
-             "possuiu nos últimos" in dados_banco)):
-            return formatar_resposta_json(dados_banco, pergunta, True)
-        
-        # Verificar se é uma resposta sobre termos de linhas (já formatada)
-        elif (dados_banco.startswith("O Cliente") and 
-            ("linhas sem termos" in dados_banco or "linha sem termo" in dados_banco or 
-             "são do tipo" in dados_banco or "estão Ativas são do tipo" in dados_banco)):
-            return formatar_resposta_json(dados_banco, pergunta, True)
-        
-        # Verificar se é uma resposta de linhas normais (deve passar pelo RAG)
-        elif ("--- LINHAS POR FORNECEDOR" in dados_banco or 
-              "--- TOTAL POR FORNECEDOR" in dados_banco or
-              "--- DADOS BRUTOS" in dados_banco or
-              "--- DEBUG:" in dados_banco):
-            # Passar pelo RAG para formatar a resposta
-            if llm_global and embeddings_global:
-                try:
-                    resposta = responder_com_rag(pergunta, dados_banco, llm_global, embeddings_global, top_k=6)
-                    return formatar_resposta_json(resposta, pergunta, True)
-                except Exception as e:
-                    return formatar_resposta_json(f"Dados do banco (sem processamento IA):\n\n{dados_banco}", pergunta, True, {"erro_ia": str(e)})
-            else:
-                return formatar_resposta_json(f"Dados do banco de dados:\n\n{dados_banco}", pergunta, True)
+        # Demais resultados passam pelo RAG para formatar a resposta
+        if llm_global and embeddings_global:
+            try:
+                resposta = responder_com_rag(pergunta, dados_banco, llm_global, embeddings_global, top_k=6)
+                return formatar_resposta_json(resposta, pergunta, True)
+            except Exception as e:
+                return formatar_resposta_json(f"Dados do banco (sem processamento IA):\n\n{dados_banco}", pergunta, True, {"erro_ia": str(e)})
         else:
-            if llm_global and embeddings_global:
-                try:
-                    resposta = responder_com_rag(pergunta, dados_banco, llm_global, embeddings_global, top_k=6)
-                    return formatar_resposta_json(resposta, pergunta, True)
-                except Exception as e:
-                    return formatar_resposta_json(f"Dados do banco (sem processamento IA):\n\n{dados_banco}", pergunta, True, {"erro_ia": str(e)})
-            else:
-                return formatar_resposta_json(f"Dados do banco de dados:\n\n{dados_banco}", pergunta, True)
+            return formatar_resposta_json(f"Dados do banco de dados:\n\n{dados_banco}", pergunta, True)
     
     except Exception as e:
         return formatar_resposta_json(f"Erro interno: {str(e)}", pergunta if 'pergunta' in locals() else "", False)
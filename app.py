@@ -113,6 +113,10 @@ from dotenv import load_dotenv
 from psycopg2 import sql
 import pandas as pd
 import re
+import cache_resultados
+import main as leia_main
+import registro_esquema
+import resultado_pesquisa
 
 load_dotenv()
 
@@ -133,8 +137,9 @@ from main import (
     formatar_moeda, formatar_dataframe_moeda, formatar_valores_monetarios_no_texto,
     formatar_inteiro_ptbr, construir_filtro_mes, detectar_tabela_e_campos,
     pesquisar_linhas, pesquisar_custos_usuarios, pesquisar_linhas_ociosas,
-    pesquisar_termos_linhas, pesquisar_no_banco, _cosine_similarity, construir_rag_prompt,
-    preparar_llm_e_embeddings, responder_com_rag, processar_pergunta_json
+    pesquisar_termos_linhas, pesquisar_no_banco, construir_rag_prompt,
+    preparar_llm_e_embeddings, responder_com_rag, responder_com_rag_stream, processar_pergunta_json,
+    precarregar_modulos, ROTEADOR, chave_intencao
 )
 
 # Configuração da página Streamlit
@@ -235,79 +240,136 @@ if 'modo_sem_llm' not in st.session_state:
 if 'modo_json' not in st.session_state:
     st.session_state.modo_json = False
 
+# Recursos do processo (st.cache_resource): montados pela primeira sessão e compartilhados
+# por todas as outras, então abrir uma aba nova não recria os clientes nem reconecta
+
+@st.cache_resource(show_spinner="Inicializando assistente virtual...")
+def recursos_llm():
+    """LLM e embeddings (clientes Gemini) do processo: (llm, embeddings, erro).
+
+    A falha também fica guardada (ex.: sem GOOGLE_API_KEY), para que cada sessão nova não
+    tente de novo; st.cache_resource.clear() ou reiniciar o app refaz a inicialização.
+    """
+    try:
+        llm, embeddings = preparar_llm_e_embeddings()
+        return llm, embeddings, None
+    except Exception as e:
+        return None, None, str(e)
+
+@st.cache_resource(show_spinner=False)
+def recursos_banco():
+    """Aquece o pool de conexões e o registro de esquema do processo (uma vez); None ou o erro.
+
+    O pool (pool_conexoes) e o registro (registro_esquema) já são do processo; aqui eles são
+    preparados antes da primeira pergunta, junto com os módulos que o RAG importaria nela.
+    """
+    try:
+        precarregar_modulos()
+        conn = conectar_postgres()
+        if conn is None:
+            return "Não foi possível conectar ao banco de dados"
+        try:
+            for tabela in registro_esquema.RESOLVEDORES_PAPEIS:
+                registro_esquema.obter_esquema(conn, tabela)
+        finally:
+            conn.close()
+        if os.getenv('LEIA_ESQUEMA_ESCUTAR', 'False').lower() == 'true':
+            registro_esquema.iniciar_escuta_invalidacao(DB_CONFIG)
+        return None
+    except Exception as e:
+        return str(e)
+
+# Respostas finais (depois do RAG) compartilhadas entre as sessões, pela intenção da pergunta
+CACHE_RESPOSTAS_TTL = float(os.getenv('LEIA_APP_CACHE_TTL', '3600'))
+CACHE_RESPOSTAS_MAX = int(os.getenv('LEIA_APP_CACHE_MAX', '500'))
+
+@st.cache_resource
+def cache_respostas():
+    """Cache de respostas do processo: LRU em memória com TTL (LEIA_APP_CACHE_TTL=0 desliga)"""
+    backend = None
+    if CACHE_RESPOSTAS_TTL > 0:
+        backend = cache_resultados.CacheMemoria(max_itens=CACHE_RESPOSTAS_MAX, ttl=CACHE_RESPOSTAS_TTL)
+    return cache_resultados.CacheResultados(backend)
+
+def chave_resposta(intencao):
+    """Chave da resposta: intenção normalizada da pergunta e o modo (com ou sem LLM)"""
+    return cache_resultados.montar_chave(['app', st.session_state.modo_sem_llm, chave_intencao(intencao)])
+
 def inicializar_llm():
-    """Inicializa o LLM e embeddings se ainda não foram inicializados"""
+    """Liga a sessão ao LLM e embeddings compartilhados (criados só na primeira sessão do processo)"""
     if not st.session_state.llm_initialized:
-        try:
-            with st.spinner("Inicializando assistente virtual..."):
-                st.session_state.llm, st.session_state.embeddings = preparar_llm_e_embeddings()
-                st.session_state.modo_sem_llm = False
-                st.session_state.llm_initialized = True
-                st.success("✅ Assistente virtual inicializado com sucesso!")
-        except Exception as e:
-            st.warning(f"⚠️ Aviso: {e}")
+        recursos_banco()
+        llm, embeddings, erro = recursos_llm()
+        st.session_state.llm, st.session_state.embeddings = llm, embeddings
+        st.session_state.modo_sem_llm = erro is not None
+        st.session_state.llm_initialized = True
+        if erro:
+            st.warning(f"⚠️ Aviso: {erro}")
             st.info("Operando sem LLM. Somente exibindo os resultados da base.")
-            st.session_state.llm, st.session_state.embeddings = None, None
-            st.session_state.modo_sem_llm = True
-            st.session_state.llm_initialized = True
+        else:
+            st.success("✅ Assistente virtual inicializado com sucesso!")
 
-def processar_pergunta(pergunta):
-    """Processa a pergunta e retorna a resposta"""
+def gerar_resposta(pergunta):
+    """Gera a resposta em trechos para st.write_stream; uma pergunta com a mesma intenção de
+    outra já respondida (nesta ou em outra sessão) sai direto do cache de respostas"""
     if not pergunta.strip():
-        return "Por favor, digite uma pergunta."
+        yield "Por favor, digite uma pergunta."
+        return
     
+    cache = cache_respostas()
+    # Roteada uma vez: a mesma Intencao dá a chave das respostas e vai para a pesquisa
+    intencao = ROTEADOR.rotear(pergunta)
+    chave = chave_resposta(intencao)
+    pergunta_original = f"Pergunta: {pergunta}"
+    resposta = cache.obter(chave)
+    if resposta is not None:
+        yield resposta.replace(cache_resultados.MARCA_PERGUNTA, pergunta_original)
+        return
+    
+    partes = []
+    estado = {'cacheavel': True}
+    for parte in _gerar_resposta(pergunta, intencao, estado):
+        partes.append(parte)
+        yield parte
+    # Falhas do banco ou do LLM não vão para o cache
+    if estado['cacheavel']:
+        cache.guardar(chave, "".join(partes).replace(pergunta_original, cache_resultados.MARCA_PERGUNTA))
+
+def _gerar_resposta(pergunta, intencao, estado):
+    """Pesquisa no banco e RAG em trechos (streaming dos tokens do LLM); em erro marca estado['cacheavel']"""
     # Pesquisar no banco de dados
     with st.spinner("🔍 Analisando sua pergunta..."):
-        dados_banco = pesquisar_no_banco(pergunta)
+        dados_banco = pesquisar_no_banco(pergunta, intencao)
+    # Consultas que falharam no meio da pesquisa deixam as seções incompletas (como no cache de resultados)
+    estado['cacheavel'] = (
+        dados_banco.tipo != resultado_pesquisa.TIPO_ERRO
+        and not getattr(leia_main._falhas_consulta, 'quantidade', 0)
+    )
     
-    # Verificar se é uma resposta de custos por usuários (já formatada)
-    if (dados_banco.startswith("O Usuário") or 
-        dados_banco.startswith("Nos últimos") or 
-        dados_banco.startswith("No último mês") or
-        dados_banco.startswith("Não foram encontrados dados de custos") or 
-        dados_banco.startswith("--- INFORMAÇÕES EXTRAÍDAS DA PERGUNTA ---")):
-        return dados_banco
-    
-    # Verificar se é uma resposta de linhas ociosas (já formatada)
-    elif (dados_banco.startswith("O Cliente") and 
-        ("linhas ociosas" in dados_banco or "linha ociosa" in dados_banco or 
-         "possui atualmente" in dados_banco or "possuiu em" in dados_banco or 
-         "possuiu nos últimos" in dados_banco)):
-        return dados_banco
+    # Resposta já formatada não passa pelo RAG
+    if dados_banco.ja_formatada:
+        yield dados_banco.resposta
+        return
     
-    # Verificar se é uma resposta sobre termos de linhas (já formatada)
-    elif (dados_banco.startswith("O Cliente") and 
-        ("linhas sem termos" in dados_banco or "linha sem termo" in dados_banco or 
-         "são do tipo" in dados_banco or "estão Ativas são do tipo" in dados_banco)):
-        return dados_banco
+    # Respostas de linhas normais e demais dados passam pelo RAG quando há LLM
+    if st.session_state.modo_sem_llm:
+        yield f"Dados do banco de dados:\n\n{dados_banco}"
+        return
     
-    # Verificar se é uma resposta de linhas normais (deve passar pelo RAG)
-    elif ("--- LINHAS POR FORNECEDOR" in dados_banco or 
-          "--- TOTAL POR FORNECEDOR" in dados_banco or
-          "--- DADOS BRUTOS" in dados_banco or
-          "--- DEBUG:" in dados_banco):
-        # Passar pelo RAG para formatar a resposta
-        if not st.session_state.modo_sem_llm:
-            try:
-                with st.spinner("🤖 Processando resposta com IA..."):
-                    resposta = responder_com_rag(pergunta, dados_banco, st.session_state.llm, st.session_state.embeddings, top_k=6)
-                return resposta
-            except Exception as e:
-                st.error(f"Erro ao gerar resposta: {e}")
-                return f"Dados do banco (sem processamento IA):\n\n{dados_banco}"
-        else:
-            return f"Dados do banco de dados:\n\n{dados_banco}"
-    else:
-        if st.session_state.modo_sem_llm:
-            return f"Dados do banco de dados:\n\n{dados_banco}"
-        else:
-            try:
-                with st.spinner("🤖 Processando resposta com IA..."):
-                    resposta = responder_com_rag(pergunta, dados_banco, st.session_state.llm, st.session_state.embeddings, top_k=6)
-                return resposta
-            except Exception as e:
-                st.error(f"Erro ao gerar resposta: {e}")
-                return f"Dados do banco (sem processamento IA):\n\n{dados_banco}"
+    gerou_texto = False
+    try:
+        for parte in responder_com_rag_stream(pergunta, dados_banco, st.session_state.llm, st.session_state.embeddings, top_k=6):
+            gerou_texto = True
+            yield parte
+    except Exception as e:
+        st.error(f"Erro ao gerar resposta: {e}")
+        estado['cacheavel'] = False
+        fallback = f"Dados do banco (sem processamento IA):\n\n{dados_banco}"
+        yield f"\n\n{fallback}" if gerou_texto else fallback
+
+def processar_pergunta(pergunta):
+    """Processa a pergunta e retorna a resposta"""
+    return "".join(gerar_resposta(pergunta))
 
 def processar_pergunta_json_streamlit(entrada_json):
     """Processa pergunta em formato JSON e retorna resposta JSON"""
@@ -370,6 +432,18 @@ def main():
         else:
             st.info("🔄 Inicializando sistema...")
         
+        # Cache de respostas compartilhado entre as sessões
+        st.header("⚡ Cache de Respostas")
+        metricas_cache = cache_respostas().estatisticas()
+        if metricas_cache['backend'] == "nenhum":
+            st.info("Cache de respostas desligado (LEIA_APP_CACHE_TTL=0).")
+        else:
+            st.metric("Taxa de acerto", f"{metricas_cache['taxa_acerto']:.0%}")
+            st.caption(
+                f"{metricas_cache['acertos']} acertos · {metricas_cache['faltas']} faltas · "
+                f"{metricas_cache.get('itens') or 0}/{CACHE_RESPOSTAS_MAX} respostas"
+            )
+        
         # Toggle para modo JSON
         st.header("📋 Modo de Entrada")
         modo_json = st.checkbox("🔧 Modo JSON", value=st.session_state.modo_json, help="Ativar para entrada e saída em formato JSON")
@@ -514,8 +588,7 @@ def main():
             
             # Processar pergunta e gerar resposta
             with st.chat_message("assistant"):
-                resposta = processar_pergunta(prompt)
-                st.markdown(resposta)
+                resposta = st.write_stream(gerar_resposta(prompt))
             
             # Adicionar resposta ao histórico
             st.session_state.messages.append({"role": "assistant", "content": resposta})
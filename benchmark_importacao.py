@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Orçamento de tempo de importação (python -X importtime)
+
+    python benchmark_importacao.py [modulo ...]
+
+Importa cada módulo (padrão: main e api_json_final) num interpretador novo com
+-X importtime, algumas vezes, e compara o melhor tempo acumulado com o orçamento
+(LEIA_ORCAMENTO_IMPORTACAO_MS). Também falha se a importação carregar algum dos
+módulos pesados que só devem entrar no primeiro uso ou no aquecimento do worker
+(precarregar_modulos): langchain, google.generativeai, numpy, pandas, pyarrow.
+
+Mostra os módulos que mais pesaram e sai com 1 acima do orçamento, para rodar no CI.
+"""
+
+import os
+import subprocess
+import sys
+
+MODULOS_PADRAO = ('main', 'api_json_final')
+MODULOS_PESADOS = ('langchain', 'langchain_core', 'langchain_google_genai', 'google.generativeai',
+                   'numpy', 'pandas', 'pyarrow')
+
+ORCAMENTO_MS = float(os.getenv('LEIA_ORCAMENTO_IMPORTACAO_MS', '600'))
+RODADAS = int(os.getenv('LEIA_ORCAMENTO_IMPORTACAO_RODADAS', '3'))
+MAIS_PESADOS = 8
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+
+
+def importar(modulo):
+    """Uma importação num interpretador novo: ({módulo: (próprio µs, acumulado µs)}, módulos carregados)"""
+    codigo = f"import sys, {modulo}; print('\\n'.join(sys.modules))"
+    saida = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', codigo],
+        capture_output=True, text=True, cwd=RAIZ, check=True,
+    )
+    tempos = {}
+    for linha in saida.stderr.splitlines():
+        if not linha.startswith('import time:'):
+            continue
+        if tempos.pop('site', None):
+            tempos.clear()  # o que veio até o site é a partida do interpretador, não o módulo
+        partes = linha[len('import time:'):].split('|')
+        if len(partes) != 3 or not partes[0].strip().isdigit():
+            continue  # cabeçalho "self [us] | cumulative | imported package"
+        tempos[partes[2].strip()] = (int(partes[0]), int(partes[1]))
+    return tempos, set(saida.stdout.split())
+
+
+def medir(modulo, rodadas=RODADAS):
+    """Melhor rodada (menor tempo acumulado do módulo) e os módulos carregados"""
+    melhor = None
+    for _ in range(rodadas):
+        tempos, carregados = importar(modulo)
+        if modulo not in tempos:
+            return None  # o módulo desviou o stderr (fd 2) durante a importação
+        if melhor is None or tempos[modulo][1] < melhor[0][modulo][1]:
+            melhor = (tempos, carregados)
+    return melhor
+
+
+if __name__ == '__main__':
+    modulos = sys.argv[1:] or MODULOS_PADRAO
+    problemas = []
+    for modulo in modulos:
+        medicao = medir(modulo)
+        if medicao is None:
+            problemas.append(f"{modulo}: sem a saída de -X importtime (stderr silenciado na importação)")
+            continue
+        tempos, carregados = medicao
+        total_ms = tempos[modulo][1] / 1e3
+        print(f"import {modulo}: {total_ms:.0f} ms (orçamento {ORCAMENTO_MS:.0f} ms)")
+        # Pacotes de topo que mais pesaram (acumulado, sem contar o próprio módulo)
+        topo = sorted(
+            ((acumulado, nome) for nome, (_, acumulado) in tempos.items() if nome != modulo and '.' not in nome),
+            reverse=True,
+        )[:MAIS_PESADOS]
+        for acumulado, nome in topo:
+            print(f"  {acumulado / 1e3:>8.1f} ms  {nome}")
+        if total_ms > ORCAMENTO_MS:
+            problemas.append(f"{modulo}: {total_ms:.0f} ms acima do orçamento de {ORCAMENTO_MS:.0f} ms")
+        pesados = sorted(nome for nome in MODULOS_PESADOS if nome in carregados)
+        if pesados:
+            problemas.append(f"{modulo}: importa {', '.join(pesados)} na carga do módulo")
+    for problema in problemas:
+        print(f"FALHA: {problema}")
+    sys.exit(1 if problemas else 0)
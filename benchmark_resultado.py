@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark: ResultadoConsulta (tuplas do cursor) x DataFrame por consulta
+
+    python benchmark_resultado.py [repeticoes]
+
+Mede o custo por consulta depois do fetchall(), nos formatos de resultado que as
+pesquisas usam: uma linha com um agregado (COUNT/SUM), uma linha com várias colunas
+(maior custo do mês), algumas linhas percorridas uma a uma (por operadora/tipo) e a
+soma de uma coluna. O caminho tabular (texto das seções para o RAG) monta o
+DataFrame nos dois lados e aparece só como referência. Ao final, o tempo de
+"import pandas", que o caminho por tuplas evita nos workers.
+"""
+
+import datetime
+import subprocess
+import sys
+import time
+from decimal import Decimal
+
+import resultado_pesquisa
+from resultado_consulta import ResultadoConsulta
+
+CASOS = {
+    'escalar (COUNT)': (['total_ociosas'], [(42,)]),
+    'uma linha': (
+        ['nome_usuario', 'total', 'mes_referencia'],
+        [('MARIA SILVA', Decimal('1234.56'), datetime.date(2025, 7, 1))],
+    ),
+    'registros (12 linhas)': (
+        ['operadora', 'total_ociosas'],
+        [(f'OPERADORA {i}', i * 3) for i in range(12)],
+    ),
+    'soma (20 linhas)': (
+        ['fornecedor', 'total_linhas'],
+        [(f'FORNECEDOR {i}', i * 7) for i in range(20)],
+    ),
+}
+
+
+def uso_dataframe(pd, caso, colunas, linhas):
+    """Como as pesquisas usavam o DataFrame de executar_query_direta"""
+    df = pd.DataFrame(linhas, columns=colunas)
+    if df.empty:
+        return None
+    if caso == 'escalar (COUNT)':
+        return df.iloc[0]['total_ociosas'] or 0
+    if caso == 'uma linha':
+        return (df.iloc[0]['nome_usuario'], df.iloc[0]['total'], df.iloc[0]['mes_referencia'])
+    if caso == 'registros (12 linhas)':
+        return [(row['operadora'], row['total_ociosas']) for _, row in df.iterrows()]
+    return df['total_linhas'].sum()
+
+
+def uso_resultado(caso, colunas, linhas):
+    resultado = ResultadoConsulta(colunas, linhas)
+    if resultado.empty:
+        return None
+    if caso == 'escalar (COUNT)':
+        return resultado.valor('total_ociosas') or 0
+    if caso == 'uma linha':
+        return (resultado.valor('nome_usuario'), resultado.valor('total'), resultado.valor('mes_referencia'))
+    if caso == 'registros (12 linhas)':
+        return [(row['operadora'], row['total_ociosas']) for row in resultado.registros()]
+    return resultado.soma('total_linhas')
+
+
+def tabular_dataframe(pd, colunas, linhas):
+    return pd.DataFrame(linhas, columns=colunas).to_string(index=False)
+
+
+def tabular_resultado(colunas, linhas):
+    return resultado_pesquisa.tabela(ResultadoConsulta(colunas, linhas)).renderizar()
+
+
+def medir(funcoes, repeticoes, rodadas=7):
+    """Microssegundos por chamada de cada função (melhor rodada; rodadas intercaladas)"""
+    melhores = [float('inf')] * len(funcoes)
+    for _ in range(rodadas):
+        for indice, funcao in enumerate(funcoes):
+            inicio = time.perf_counter()
+            for _ in range(repeticoes):
+                funcao()
+            melhores[indice] = min(melhores[indice], time.perf_counter() - inicio)
+    return [melhor / repeticoes * 1e6 for melhor in melhores]
+
+
+def tempo_import_pandas():
+    """Milissegundos de "import pandas" num interpretador novo"""
+    codigo = "import time; t = time.perf_counter(); import pandas; print(time.perf_counter() - t)"
+    saida = subprocess.run([sys.executable, '-c', codigo], capture_output=True, text=True, check=True)
+    return float(saida.stdout) * 1e3
+
+
+if __name__ == '__main__':
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    import pandas as pd
+
+    divergencias = []
+    print(f"{'por consulta':26}{'DataFrame':>12}{'tuplas':>12}{'ganho':>8}")
+    for caso, (colunas, linhas) in CASOS.items():
+        if uso_dataframe(pd, caso, colunas, linhas) != uso_resultado(caso, colunas, linhas):
+            divergencias.append(caso)
+        antes, depois = medir([
+            lambda: uso_dataframe(pd, caso, colunas, linhas),
+            lambda: uso_resultado(caso, colunas, linhas),
+        ], repeticoes)
+        print(f"{caso:26}{antes:>10.2f}µs{depois:>10.2f}µs{antes / depois:>7.1f}x")
+
+    colunas, linhas = CASOS['soma (20 linhas)']
+    if tabular_dataframe(pd, colunas, linhas) != tabular_resultado(colunas, linhas):
+        divergencias.append('tabular')
+    antes, depois = medir([
+        lambda: tabular_dataframe(pd, colunas, linhas),
+        lambda: tabular_resultado(colunas, linhas),
+    ], max(repeticoes // 20, 1))
+    print(f"{'tabular (to_string)':26}{antes:>10.2f}µs{depois:>10.2f}µs{antes / depois:>7.1f}x")
+
+    print(f"import pandas: {tempo_import_pandas():.0f} ms (só no caminho tabular)")
+    for caso in divergencias:
+        print(f"DIVERGE: {caso}")
+    print(f"Divergências: {len(divergencias)}")
+    sys.exit(1 if divergencias else 0)
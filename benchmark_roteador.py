@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark: roteador compilado (roteador.py) x cascata de substrings/regex anterior
+
+    python benchmark_roteador.py [repeticoes]
+
+Compara, numa amostra de perguntas reais, a escolha da rota e a intenção usada na
+chave do cache (marcadores + status), e confere que as duas abordagens concordam.
+Cliente e período usam os mesmos extratores nos dois lados e ficam fora dessas duas medições.
+
+A terceira medição é o fluxo de uma pesquisa: antes, a intenção da chave do cache, a rota de
+novo no despacho e a pesquisa extraindo cliente, período e status outra vez; agora, um único
+rotear() cuja Intencao vai para a pesquisa. O dicionário de clientes é montado em memória.
+"""
+
+import re
+import sys
+import time
+
+import clientes
+import main
+import roteador
+
+CLIENTES = ['Safra', 'Sonda', 'Verzani', 'MDR', 'Sotreq S.A.', 'Direcional']
+
+PERGUNTAS = [
+    "Quantas linhas ativas tem o cliente Safra?",
+    "Quantas linhas ativas possui o Cliente Safra no mês atual?",
+    "Quantas linhas bloqueadas tem o cliente Sonda?",
+    "Quantas linhas bloqueadas possui o Cliente Sonda em Julho/2025?",
+    "Quantas linhas ativas tem o cliente Safra em março de 2025?",
+    "Qual o fornecedor com maior custo?",
+    "Qual o fornecedor com maior custo em janeiro de 2024?",
+    "Qual o fornecedor com maior custo no mês de janeiro de 2024 do cliente Safra?",
+    "Quais são os custos do cliente Safra em dezembro de 2023?",
+    "Qual usuário teve maior custo no mês atual?",
+    "Qual usuário do Cliente Safra possui o maior custo no mês atual?",
+    "Qual usuário do Cliente Sonda teve o maior custo no mês de Agosto/2025?",
+    "Quem foi o usuário com maior custo em agosto de 2024?",
+    "Quais são os usuários do Cliente Verzani que tiveram os maiores custos nos últimos 6 meses?",
+    "Quais usuários tiveram os maiores custos nos últimos 3 meses no cliente MDR?",
+    "Quantas linhas ociosas tem o cliente Safra?",
+    "Quantas linhas ociosas possui o Cliente Safra atualmente?",
+    "Quantas linhas ociosas por operadora tem o Sotreq?",
+    "Quantas linhas ociosas possui o Cliente Sonda por operadora atualmente?",
+    "Quantas linhas ociosas nos últimos 2 meses no cliente Verzani?",
+    "Quantas linhas no Cliente Safra não possuem termo?",
+    "Do total de linhas sem termos no Cliente Safra, me mostre o total por tipo de linha",
+    "Do total de linhas sem termos no Cliente Safra por tipo de linha, me mostre o total por tipo linhas ativas",
+    "Qual o status das licenças canceladas do cliente Direcional?",
+    "Olá, sou a sua assistente virtual LeIA, como posso te ajudar hoje?",
+]
+
+
+def rota_cascata(pergunta):
+    """Escolha de rota anterior (_pesquisar_no_banco), só a decisão"""
+    pergunta_lower = pergunta.lower()
+    termos_termos = ['termo', 'termos', 'possui termo', 'não possuem termo', 'nao possuem termo', 'sem termo']
+    if any(termo in pergunta_lower for termo in termos_termos):
+        return roteador.ROTA_TERMOS
+    padroes_custos_usuarios = [
+        'usuário.*maior.*custo', 'usuario.*maior.*custo',
+        'maior.*custo.*usuário', 'maior.*custo.*usuario',
+        'custo.*usuário', 'custo.*usuario', 'usuário.*custo', 'usuario.*custo'
+    ]
+    for padrao in padroes_custos_usuarios:
+        if re.search(padrao, pergunta_lower):
+            return roteador.ROTA_CUSTOS_USUARIOS
+    if any(termo in pergunta_lower for termo in ['usuário', 'usuario']) and 'custo' in pergunta_lower:
+        return roteador.ROTA_CUSTOS_USUARIOS
+    for termo in ['ociosa', 'ociosas', 'ocioso', 'ociosos']:
+        if termo in pergunta_lower:
+            return roteador.ROTA_LINHAS_OCIOSAS
+    if any(termo in pergunta_lower for termo in ['custo', 'maior custo', 'fornecedor.*custo', 'custo.*fornecedor']):
+        return roteador.ROTA_CUSTOS_FORNECEDOR
+    if any(termo in pergunta_lower for termo in ['linha', 'licenca', 'status', 'ativa', 'bloqueada', 'cancelada', 'total_linhas']):
+        return roteador.ROTA_LINHAS
+    return roteador.ROTA_CUSTOS_FORNECEDOR
+
+
+def intencao_cascata(pergunta):
+    """Rota + marcadores + status como eram calculados antes (rota e intenção em passadas separadas)"""
+    pergunta_lower = pergunta.lower()
+    return (
+        rota_cascata(pergunta),
+        tuple(m for m in roteador.MARCADORES_INTENCAO if m in pergunta_lower),
+        next((s for s in ['ativa', 'bloqueada', 'cancelada'] if s in pergunta_lower), None),
+    )
+
+
+def roteador_com_extratores():
+    """Roteador com os extratores de main e o dicionário de CLIENTES (sem banco)"""
+    indice = clientes.IndiceClientes(CLIENTES)
+    return roteador.Roteador(
+        extrair_cliente=indice.encontrar,
+        extrair_periodo=main.extrair_mes_ano,
+        extrair_quantidade_meses=main.extrair_quantidade_meses,
+    )
+
+
+def fluxo_anterior(rot, pergunta):
+    """Chave do cache (rotear), despacho (rota de novo) e a pesquisa extraindo as entidades outra vez"""
+    intencao = rot.rotear(pergunta)
+    rot.rota_da_pergunta(pergunta)
+    pergunta_lower = pergunta.lower()
+    ano, mes, mes_nome = rot.extrair_periodo(pergunta)
+    cliente = rot.extrair_cliente(pergunta)
+    status = next((s for s in ['ativa', 'bloqueada', 'cancelada'] if s in pergunta_lower), None)
+    return intencao.rota, cliente, ano, mes, status
+
+
+def fluxo_unico(rot, pergunta):
+    """Uma passada: a Intencao da chave do cache é a que a pesquisa lê"""
+    intencao = rot.rotear(pergunta)
+    return intencao.rota, intencao.cliente, intencao.ano, intencao.mes, intencao.status
+
+
+def intencao_roteador(rot, pergunta):
+    intencao = rot.rotear(pergunta)
+    return intencao.rota, intencao.marcadores, intencao.status
+
+
+def medir(funcoes, repeticoes, rodadas=15):
+    """Microssegundos por pergunta de cada função (melhor rodada; rodadas intercaladas entre as funções
+    para que a variação da máquina afete todas igualmente)"""
+    melhores = [float('inf')] * len(funcoes)
+    for _ in range(rodadas):
+        for indice, funcao in enumerate(funcoes):
+            inicio = time.perf_counter()
+            for _ in range(repeticoes):
+                for pergunta in PERGUNTAS:
+                    funcao(pergunta)
+            melhores[indice] = min(melhores[indice], time.perf_counter() - inicio)
+    return [melhor / (repeticoes * len(PERGUNTAS)) * 1e6 for melhor in melhores]
+
+
+if __name__ == '__main__':
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    rot = roteador.Roteador()
+
+    divergencias = [p for p in PERGUNTAS if intencao_cascata(p) != intencao_roteador(rot, p)]
+    for pergunta in divergencias:
+        print(f"DIVERGE: {pergunta}\n  cascata:  {intencao_cascata(pergunta)}\n  roteador: {intencao_roteador(rot, pergunta)}")
+
+    inicio = time.perf_counter()
+    roteador.Roteador()
+    compilacao = (time.perf_counter() - inicio) * 1e3
+
+    rota_antes, rota_depois = medir([rota_cascata, rot.rota_da_pergunta], repeticoes)
+    intencao_antes, intencao_depois = medir([intencao_cascata, rot.rotear], repeticoes)
+    completo = roteador_com_extratores()
+    fluxo_antes, fluxo_depois = medir(
+        [lambda p: fluxo_anterior(completo, p), lambda p: fluxo_unico(completo, p)], max(1, repeticoes // 5)
+    )
+
+    print(f"{len(PERGUNTAS)} perguntas x {repeticoes} repetições; compilação do roteador: {compilacao:.2f} ms")
+    print(f"{'':22}{'cascata':>12}{'roteador':>12}{'ganho':>8}")
+    print(f"{'rota':22}{rota_antes:>10.2f}µs{rota_depois:>10.2f}µs{rota_antes / rota_depois:>7.1f}x")
+    print(f"{'rota + intenção':22}{intencao_antes:>10.2f}µs{intencao_depois:>10.2f}µs"
+          f"{intencao_antes / intencao_depois:>7.1f}x")
+    print(f"{'fluxo da pesquisa':22}{fluxo_antes:>10.2f}µs{fluxo_depois:>10.2f}µs{fluxo_antes / fluxo_depois:>7.1f}x")
+    print(f"Divergências: {len(divergencias)}")
+    sys.exit(1 if divergencias else 0)
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache de embeddings em disco, endereçado pelo conteúdo (hash do modelo + texto -> vetor)
+
+Os vetores ficam em arquivos float32 só de acréscimo (um por dimensão), lidos via
+np.memmap, e um índice em texto liga cada hash à sua linha. Vários processos
+(workers do gunicorn, Streamlit, CLI) compartilham o mesmo diretório: a escrita é
+serializada por um lock de arquivo e cada processo relê só o trecho novo do índice.
+O numpy só é importado quando há vetores para ler ou gravar.
+"""
+
+import asyncio
+import hashlib
+import inspect
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem lock entre processos, apenas entre threads
+    fcntl = None
+
+DIRETORIO_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache_embeddings')
+
+_ARMAZENS = {}
+_ARMAZENS_LOCK = threading.Lock()
+
+
+class _LockArquivo:
+    """Lock exclusivo entre processos (fcntl) e entre threads do processo"""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._lock_thread = threading.Lock()
+        self._arquivo = None
+
+    def __enter__(self):
+        self._lock_thread.acquire()
+        if fcntl is not None:
+            self._arquivo = open(self.caminho, 'a+')
+            fcntl.flock(self._arquivo.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._arquivo is not None:
+            fcntl.flock(self._arquivo.fileno(), fcntl.LOCK_UN)
+            self._arquivo.close()
+            self._arquivo = None
+        self._lock_thread.release()
+
+
+class ArmazemEmbeddings:
+    """Armazém de vetores float32 em disco com índice hash -> (dimensão, linha)"""
+
+    def __init__(self, diretorio):
+        self.diretorio = diretorio
+        os.makedirs(diretorio, exist_ok=True)
+        self._caminho_indice = os.path.join(diretorio, 'indice.txt')
+        self._lock_escrita = _LockArquivo(os.path.join(diretorio, '.lock'))
+        self._lock = threading.Lock()
+        self._indice = {}
+        self._bytes_indice_lidos = 0
+        self._mapas = {}
+        self._metricas = {
+            'consultas': 0,
+            'acertos': 0,
+            'faltas': 0,
+            'chamadas_remotas': 0,
+            'chamadas_evitadas': 0,
+            'vetores_gravados': 0,
+        }
+
+    def _caminho_vetores(self, dimensao):
+        return os.path.join(self.diretorio, f'vetores_{dimensao}.f32')
+
+    def _atualizar_indice(self):
+        """Lê as entradas acrescentadas ao índice por este ou outros processos (chamar com self._lock)"""
+        try:
+            tamanho = os.path.getsize(self._caminho_indice)
+        except OSError:
+            return
+        if tamanho <= self._bytes_indice_lidos:
+            return
+        with open(self._caminho_indice, 'rb') as arquivo:
+            arquivo.seek(self._bytes_indice_lidos)
+            novo = arquivo.read(tamanho - self._bytes_indice_lidos)
+        # Só consome linhas completas; uma escrita em andamento fica para a próxima leitura
+        completo = novo[:novo.rfind(b'\n') + 1]
+        for linha in completo.decode('ascii').splitlines():
+            partes = linha.split()
+            if len(partes) == 3:
+                self._indice[partes[0]] = (int(partes[1]), int(partes[2]))
+        self._bytes_indice_lidos += len(completo)
+
+    def _mapa(self, dimensao, linha_necessaria):
+        """memmap do arquivo de vetores da dimensão, remapeado quando o arquivo cresce"""
+        import numpy as np
+
+        mapa = self._mapas.get(dimensao)
+        if mapa is None or mapa.shape[0] <= linha_necessaria:
+            caminho = self._caminho_vetores(dimensao)
+            linhas = os.path.getsize(caminho) // (4 * dimensao)
+            mapa = np.memmap(caminho, dtype=np.float32, mode='r', shape=(linhas, dimensao))
+            self._mapas[dimensao] = mapa
+        return mapa
+
+    def obter(self, chaves):
+        """Retorna a lista de vetores (np.float32) ou None para cada chave ausente"""
+        import numpy as np
+
+        with self._lock:
+            self._atualizar_indice()
+            vetores = []
+            for chave in chaves:
+                posicao = self._indice.get(chave)
+                if posicao is None:
+                    vetores.append(None)
+                    continue
+                dimensao, linha = posicao
+                vetores.append(np.array(self._mapa(dimensao, linha)[linha]))
+            acertos = sum(1 for v in vetores if v is not None)
+            self._metricas['consultas'] += len(chaves)
+            self._metricas['acertos'] += acertos
+            self._metricas['faltas'] += len(chaves) - acertos
+        return vetores
+
+    def gravar(self, chaves, vetores):
+        """Acrescenta os vetores ao arquivo da dimensão e depois registra as chaves no índice"""
+        if not chaves:
+            return
+        import numpy as np
+
+        matriz = np.asarray(vetores, dtype=np.float32)
+        dimensao = matriz.shape[1]
+        caminho = self._caminho_vetores(dimensao)
+        with self._lock_escrita:
+            with self._lock:
+                self._atualizar_indice()
+                vistas = set(self._indice)
+                pendentes = []
+                for i, chave in enumerate(chaves):
+                    if chave not in vistas:
+                        vistas.add(chave)
+                        pendentes.append(i)
+            if not pendentes:
+                return
+            with open(caminho, 'ab') as arquivo:
+                tamanho = arquivo.seek(0, os.SEEK_END)
+                # Linha incompleta no fim (processo morto no meio de uma escrita): sem o corte, todas
+                # as linhas acrescentadas depois ficariam deslocadas em relação ao índice
+                resto = tamanho % (4 * dimensao)
+                if resto:
+                    arquivo.truncate(tamanho - resto)
+                    tamanho -= resto
+                primeira_linha = tamanho // (4 * dimensao)
+                arquivo.write(matriz[pendentes].tobytes())
+                arquivo.flush()
+                os.fsync(arquivo.fileno())
+            # O índice só aponta para vetores já gravados por completo
+            entradas = "".join(
+                f"{chaves[i]} {dimensao} {primeira_linha + n}\n" for n, i in enumerate(pendentes)
+            )
+            with open(self._caminho_indice, 'ab') as arquivo:
+                arquivo.write(entradas.encode('ascii'))
+        with self._lock:
+            self._metricas['vetores_gravados'] += len(pendentes)
+
+    def contar_chamada(self, remota):
+        with self._lock:
+            self._metricas['chamadas_remotas' if remota else 'chamadas_evitadas'] += 1
+
+    def estatisticas(self):
+        with self._lock:
+            self._atualizar_indice()
+            metricas = dict(self._metricas)
+            metricas['vetores_em_disco'] = len(self._indice)
+        metricas['taxa_acerto'] = (
+            round(metricas['acertos'] / metricas['consultas'], 4) if metricas['consultas'] else 0.0
+        )
+        metricas['diretorio'] = self.diretorio
+        return metricas
+
+
+def obter_armazem(diretorio=None):
+    """Armazém compartilhado do processo para o diretório (LEIA_EMBEDDINGS_CACHE_DIR por padrão)"""
+    diretorio = os.path.abspath(diretorio or os.getenv('LEIA_EMBEDDINGS_CACHE_DIR') or DIRETORIO_PADRAO)
+    with _ARMAZENS_LOCK:
+        armazem = _ARMAZENS.get(diretorio)
+        if armazem is None:
+            armazem = ArmazemEmbeddings(diretorio)
+            _ARMAZENS[diretorio] = armazem
+    return armazem
+
+
+def chave_embedding(modelo, tipo, texto):
+    """Hash do conteúdo: modelo + tipo (documento/consulta usam task types diferentes) + texto"""
+    return hashlib.sha256(f"{modelo}\x00{tipo}\x00{texto}".encode('utf-8')).hexdigest()
+
+
+def calcular_embeddings_consultas(embeddings, textos):
+    """Embeddings de várias perguntas numa única chamada, com o mesmo task type de embed_query.
+
+    Os embeddings do Google aceitam task_type em embed_documents; nos demais, uma chamada por pergunta.
+    """
+    textos = list(textos)
+    if 'task_type' in inspect.signature(embeddings.embed_documents).parameters:
+        task_type = getattr(embeddings, 'task_type', None) or "RETRIEVAL_QUERY"
+        return embeddings.embed_documents(textos, task_type=task_type)
+    return [embeddings.embed_query(texto) for texto in textos]
+
+
+class EmbeddingsComCache:
+    """Envolve um objeto de embeddings do LangChain consultando o cache em disco antes da API remota"""
+
+    def __init__(self, embeddings, armazem=None):
+        self.embeddings = embeddings
+        self.armazem = armazem or obter_armazem()
+        self.modelo = str(getattr(embeddings, 'model', None) or type(embeddings).__name__)
+
+    def __getattr__(self, nome):
+        return getattr(self.embeddings, nome)
+
+    def _consultar(self, textos, tipo):
+        """Chaves, vetores do cache (None nas faltas) e chaves distintas a calcular"""
+        chaves = [chave_embedding(self.modelo, tipo, texto) for texto in textos]
+        vetores = self.armazem.obter(chaves)
+        faltantes = [i for i, vetor in enumerate(vetores) if vetor is None]
+        unicos = list(dict.fromkeys(chaves[i] for i in faltantes))
+        self.armazem.contar_chamada(remota=bool(unicos))
+        return chaves, vetores, faltantes, unicos
+
+    def _completar(self, chaves, vetores, faltantes, unicos, novos):
+        """Grava os vetores calculados e preenche as faltas"""
+        self.armazem.gravar(unicos, novos)
+        vetor_por_chave = dict(zip(unicos, novos))
+        for i in faltantes:
+            vetores[i] = vetor_por_chave[chaves[i]]
+        return [v.tolist() if hasattr(v, 'tolist') else list(v) for v in vetores]
+
+    def _embed(self, textos, tipo, calcular):
+        chaves, vetores, faltantes, unicos = self._consultar(textos, tipo)
+        if not unicos:
+            return [vetor.tolist() for vetor in vetores]
+        # Uma única chamada remota só com os textos distintos que não estão no cache
+        texto_por_chave = {chaves[i]: textos[i] for i in faltantes}
+        novos = calcular([texto_por_chave[chave] for chave in unicos])
+        return self._completar(chaves, vetores, faltantes, unicos, novos)
+
+    async def _aembed(self, textos, tipo, calcular):
+        chaves, vetores, faltantes, unicos = self._consultar(textos, tipo)
+        if not unicos:
+            return [vetor.tolist() for vetor in vetores]
+        texto_por_chave = {chaves[i]: textos[i] for i in faltantes}
+        novos = await calcular([texto_por_chave[chave] for chave in unicos])
+        # A gravação faz fsync: fica numa thread para não travar o event loop
+        return await asyncio.to_thread(self._completar, chaves, vetores, faltantes, unicos, novos)
+
+    def embed_documents(self, textos):
+        return self._embed(list(textos), 'documento', self.embeddings.embed_documents)
+
+    def embed_query(self, texto):
+        return self._embed([texto], 'consulta', lambda t: [self.embeddings.embed_query(t[0])])[0]
+
+    def embed_queries(self, textos):
+        """Várias perguntas numa única chamada remota (só as que não estão no cache)"""
+        return self._embed(list(textos), 'consulta', lambda t: calcular_embeddings_consultas(self.embeddings, t))
+
+    async def aembed_documents(self, textos):
+        return await self._aembed(list(textos), 'documento', self.embeddings.aembed_documents)
+
+    async def aembed_query(self, texto):
+        async def _calcular(t):
+            return [await self.embeddings.aembed_query(t[0])]
+        return (await self._aembed([texto], 'consulta', _calcular))[0]
+
+
+def com_cache(embeddings):
+    """Aplica o cache em disco aos embeddings, exceto se LEIA_EMBEDDINGS_CACHE=False"""
+    if embeddings is None or os.getenv('LEIA_EMBEDDINGS_CACHE', 'True').lower() != 'true':
+        return embeddings
+    if isinstance(embeddings, EmbeddingsComCache):
+        return embeddings
+    return EmbeddingsComCache(embeddings)
+
+
+def estatisticas_embeddings():
+    """Métricas dos armazéns do processo: taxa de acerto e chamadas remotas evitadas"""
+    with _ARMAZENS_LOCK:
+        armazens = list(_ARMAZENS.values())
+    return {armazem.diretorio: armazem.estatisticas() for armazem in armazens}
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache de resultados das pesquisas no banco, indexado pela intenção extraída da pergunta
+
+Backends:
+- memoria: dicionário LRU do processo com TTL e limite de itens (padrão)
+- redis: servidor Redis (ou compatível) compartilhado entre processos; requer o pacote `redis`
+- nenhum: cache desligado
+
+Os valores são os Resultados das pesquisas (resultado_pesquisa.py); no Redis vão serializados
+com pickle, então o servidor deve ser de uso exclusivo da aplicação.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+# "v2": valores passaram de texto para Resultado serializado (entradas antigas são ignoradas)
+PREFIXO_CHAVE = "leia:resultado:v2:"
+# Algumas seções repetem a pergunta original ("Pergunta: ..."); no cache ela é guardada como este marcador
+MARCA_PERGUNTA = "\x00pergunta\x00"
+
+_ESTADO = {'cache': None}
+_ESTADO_LOCK = threading.Lock()
+
+
+class CacheMemoria:
+    """LRU em memória com expiração por TTL"""
+
+    nome = "memoria"
+
+    def __init__(self, max_itens=1000, ttl=3600.0):
+        self.max_itens = max(1, max_itens)
+        self.ttl = ttl
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+        self.expulsoes = 0
+
+    def obter(self, chave):
+        agora = time.monotonic()
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                return None
+            expira, valor = item
+            if expira <= agora:
+                del self._itens[chave]
+                return None
+            self._itens.move_to_end(chave)
+            return valor
+
+    def guardar(self, chave, valor):
+        with self._lock:
+            self._itens[chave] = (time.monotonic() + self.ttl, valor)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+                self.expulsoes += 1
+
+    def limpar(self):
+        with self._lock:
+            removidos = len(self._itens)
+            self._itens.clear()
+        return removidos
+
+    def tamanho(self):
+        with self._lock:
+            return len(self._itens)
+
+
+class CacheRedis:
+    """Cache em Redis com SETEX; o limite de tamanho fica a cargo do maxmemory-policy do servidor (ex.: allkeys-lru)"""
+
+    nome = "redis"
+
+    def __init__(self, url, ttl=3600.0):
+        import redis  # dependência opcional
+        self.ttl = ttl
+        self.expulsoes = 0
+        self._cliente = redis.Redis.from_url(url, socket_timeout=1.0, socket_connect_timeout=1.0)
+
+    def obter(self, chave):
+        valor = self._cliente.get(PREFIXO_CHAVE + chave)
+        return pickle.loads(valor) if valor is not None else None
+
+    def guardar(self, chave, valor):
+        self._cliente.setex(PREFIXO_CHAVE + chave, max(1, int(self.ttl)), pickle.dumps(valor))
+
+    def limpar(self):
+        removidos = 0
+        for chave in self._cliente.scan_iter(match=PREFIXO_CHAVE + "*", count=500):
+            removidos += self._cliente.delete(chave)
+        return removidos
+
+    def tamanho(self):
+        return sum(1 for _ in self._cliente.scan_iter(match=PREFIXO_CHAVE + "*", count=500))
+
+
+class CacheResultados:
+    """Fachada sobre o backend com contadores de acerto/erro (falhas do backend contam como miss)"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._metricas = {'acertos': 0, 'faltas': 0, 'gravacoes': 0, 'erros_backend': 0}
+
+    def _contar(self, campo):
+        with self._lock:
+            self._metricas[campo] += 1
+
+    def obter(self, chave):
+        if self.backend is None:
+            return None
+        try:
+            valor = self.backend.obter(chave)
+        except Exception as e:
+            print(f"Aviso: falha ao ler do cache de resultados: {e}")
+            self._contar('erros_backend')
+            valor = None
+        self._contar('acertos' if valor is not None else 'faltas')
+        return valor
+
+    def guardar(self, chave, valor):
+        if self.backend is None:
+            return
+        try:
+            self.backend.guardar(chave, valor)
+            self._contar('gravacoes')
+        except Exception as e:
+            print(f"Aviso: falha ao gravar no cache de resultados: {e}")
+            self._contar('erros_backend')
+
+    def limpar(self):
+        if self.backend is None:
+            return 0
+        return self.backend.limpar()
+
+    def estatisticas(self):
+        with self._lock:
+            metricas = dict(self._metricas)
+        consultas = metricas['acertos'] + metricas['faltas']
+        metricas['taxa_acerto'] = round(metricas['acertos'] / consultas, 4) if consultas else 0.0
+        metricas['backend'] = self.backend.nome if self.backend is not None else "nenhum"
+        if self.backend is not None:
+            metricas['expulsoes'] = self.backend.expulsoes
+            try:
+                metricas['itens'] = self.backend.tamanho()
+            except Exception:
+                metricas['itens'] = None
+        return metricas
+
+
+def _criar_backend():
+    """Cria o backend conforme LEIA_CACHE_BACKEND (memoria, redis ou nenhum)"""
+    tipo = os.getenv('LEIA_CACHE_BACKEND', 'memoria').lower()
+    ttl = float(os.getenv('LEIA_CACHE_TTL', '3600'))
+    if tipo in ('nenhum', 'false', 'desligado'):
+        return None
+    if tipo == 'redis':
+        try:
+            return CacheRedis(os.getenv('LEIA_CACHE_URL', 'redis://localhost:6379/0'), ttl=ttl)
+        except Exception as e:
+            print(f"Aviso: cache Redis indisponível ({e}); usando cache em memória")
+    return CacheMemoria(max_itens=int(os.getenv('LEIA_CACHE_MAX', '1000')), ttl=ttl)
+
+
+def obter_cache():
+    """Cache de resultados do processo (criado na primeira chamada)"""
+    if _ESTADO['cache'] is None:
+        with _ESTADO_LOCK:
+            if _ESTADO['cache'] is None:
+                _ESTADO['cache'] = CacheResultados(_criar_backend())
+    return _ESTADO['cache']
+
+
+def montar_chave(partes):
+    """Chave estável (hash) a partir das partes da intenção"""
+    texto = json.dumps(partes, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(texto.encode('utf-8')).hexdigest()
+
+
+def invalidar_cache():
+    """Remove todos os resultados em cache (ex.: após a carga mensal). Retorna a quantidade removida."""
+    return obter_cache().limpar()
+
+
+def estatisticas_cache():
+    """Acertos, faltas, taxa de acerto, expulsões e tamanho do cache de resultados"""
+    return obter_cache().estatisticas()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Dicionário de clientes: nomes canônicos (como gravados no banco) encontrados no texto da pergunta
+
+O dicionário é carregado de SELECT DISTINCT cliente nas tabelas ia_* e recarregado
+a cada LEIA_CLIENTES_TTL segundos. Há um dicionário por fábrica de conexões (main usa
+conectar_postgres, a API conectar_postgres_api): cada ponto de entrada lê os nomes do
+banco que ele mesmo consulta. A pergunta é varrida uma única vez por um
+autômato Aho-Corasick com todos os nomes, sem diferenciar maiúsculas nem acentos,
+e o filtro de cliente vira igualdade com o valor exato (usa índice btree).
+"""
+
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import deque
+
+import registro_esquema
+
+# Tabelas de onde vêm os nomes de cliente (coluna resolvida pelo registro de esquema)
+TABELAS_CLIENTES = [
+    'ia_linhas', 'ia_custo_fornecedor', 'ia_custo_usuarios_linhas',
+    'ia_linhas_ociosas', 'ia_termos_numeros',
+]
+
+# Sufixos societários que o usuário costuma omitir ("Sotreq S.A." -> "sotreq")
+_SUFIXOS = {'ltda', 'sa', 's a', 'eireli', 'me', 'epp', 'cia'}
+
+_NAO_ALFANUMERICO = re.compile(r"[^0-9a-z]+")
+
+# Por fábrica de conexões: {'indice', 'expira', 'recarga' (lock de recarga)}
+_ESTADOS = {}
+_ESTADO_LOCK = threading.Lock()
+
+
+def normalizar(texto):
+    """Minúsculas, sem acentos e com pontuação/espaços reduzidos a um espaço"""
+    decomposto = unicodedata.normalize('NFKD', texto.lower())
+    sem_acentos = "".join(c for c in decomposto if not unicodedata.combining(c))
+    return _NAO_ALFANUMERICO.sub(" ", sem_acentos).strip()
+
+
+def _apelidos(nome_normalizado):
+    """Formas com que o cliente pode aparecer na pergunta: nome completo e sem sufixo societário"""
+    apelidos = {nome_normalizado}
+    palavras = nome_normalizado.split()
+    while len(palavras) > 1:
+        if len(palavras) > 2 and " ".join(palavras[-2:]) in _SUFIXOS:
+            palavras = palavras[:-2]
+        elif palavras[-1] in _SUFIXOS:
+            palavras = palavras[:-1]
+        else:
+            break
+        apelidos.add(" ".join(palavras))
+    return apelidos
+
+
+def _preferido(variantes):
+    """Grafia exibida quando as tabelas divergem ('Safra' antes de 'SAFRA' ou 'safra')"""
+    return sorted(variantes, key=lambda v: (v.isupper() or v.islower(), v))[0]
+
+
+class IndiceClientes:
+    """Autômato Aho-Corasick sobre os nomes normalizados dos clientes"""
+
+    def __init__(self, nomes):
+        # nome normalizado -> grafias encontradas nas tabelas
+        self.variantes = {}
+        for nome in nomes:
+            if nome and nome.strip():
+                self.variantes.setdefault(normalizar(nome), set()).add(nome)
+        self.canonicos = {chave: _preferido(valores) for chave, valores in self.variantes.items()}
+
+        self._transicoes = [{}]
+        self._falha = [0]
+        self._saidas = [[]]
+        for chave in self.variantes:
+            for apelido in _apelidos(chave):
+                self._inserir(apelido, chave)
+        self._construir_falhas()
+
+    def _inserir(self, padrao, chave):
+        estado = 0
+        for caractere in padrao:
+            proximo = self._transicoes[estado].get(caractere)
+            if proximo is None:
+                proximo = len(self._transicoes)
+                self._transicoes[estado][caractere] = proximo
+                self._transicoes.append({})
+                self._falha.append(0)
+                self._saidas.append([])
+            estado = proximo
+        self._saidas[estado].append((len(padrao), chave))
+
+    def _construir_falhas(self):
+        fila = deque(self._transicoes[0].values())
+        while fila:
+            estado = fila.popleft()
+            for caractere, proximo in self._transicoes[estado].items():
+                fila.append(proximo)
+                falha = self._falha[estado]
+                while falha and caractere not in self._transicoes[falha]:
+                    falha = self._falha[falha]
+                destino = self._transicoes[falha].get(caractere, 0)
+                self._falha[proximo] = destino if destino != proximo else 0
+                self._saidas[proximo] = self._saidas[proximo] + self._saidas[self._falha[proximo]]
+
+    def encontrar(self, texto):
+        """Cliente canônico citado no texto (a ocorrência mais longa, em palavras inteiras), ou None"""
+        texto = f" {normalizar(texto)} "
+        melhor = None
+        estado = 0
+        for posicao, caractere in enumerate(texto):
+            while estado and caractere not in self._transicoes[estado]:
+                estado = self._falha[estado]
+            estado = self._transicoes[estado].get(caractere, 0)
+            for tamanho, chave in self._saidas[estado]:
+                inicio = posicao - tamanho + 1
+                # "mdr" não vale dentro de "mdrx" nem "sonda" dentro de "sondagem"
+                if texto[inicio - 1] != " " or texto[posicao + 1] != " ":
+                    continue
+                if melhor is None or tamanho > melhor[0]:
+                    melhor = (tamanho, chave)
+        return self.canonicos[melhor[1]] if melhor else None
+
+    def grafias(self, nome):
+        """Valores exatos gravados nas tabelas para o cliente (lista vazia se desconhecido)"""
+        return sorted(self.variantes.get(normalizar(nome), ()))
+
+    def __len__(self):
+        return len(self.variantes)
+
+
+def carregar_nomes(conn):
+    """SELECT DISTINCT dos clientes em todas as tabelas ia_* existentes"""
+    consultas = []
+    for tabela in TABELAS_CLIENTES:
+        esquema = registro_esquema.obter_esquema(conn, tabela)
+        if esquema and esquema.get('cliente'):
+            coluna = esquema['cliente']
+            consultas.append(f"SELECT DISTINCT {coluna}::text FROM {tabela} WHERE {coluna} IS NOT NULL")
+    if not consultas:
+        return []
+    with conn.cursor() as cursor:
+        cursor.execute(" UNION ".join(consultas))
+        nomes = [linha[0] for linha in cursor.fetchall()]
+    conn.commit()
+    return nomes
+
+
+def _ttl_segundos():
+    return float(os.getenv('LEIA_CLIENTES_TTL', '300'))
+
+
+def _estado(obter_conexao):
+    with _ESTADO_LOCK:
+        estado = _ESTADOS.get(obter_conexao)
+        if estado is None:
+            estado = _ESTADOS[obter_conexao] = {'indice': None, 'expira': 0.0, 'recarga': threading.Lock()}
+        return estado
+
+
+def _adiar_recarga(estado):
+    """Após uma falha de carga, tenta de novo em alguns segundos (e não a cada pergunta)"""
+    with _ESTADO_LOCK:
+        estado['expira'] = time.monotonic() + min(_ttl_segundos(), 30.0)
+
+
+def obter_indice(obter_conexao):
+    """Índice de clientes do banco de obter_conexao, recarregado quando expira (uma thread recarrega,
+    as demais seguem com o índice anterior). obter_conexao() deve devolver uma conexão; ela é fechada
+    após a carga."""
+    estado = _estado(obter_conexao)
+    with _ESTADO_LOCK:
+        indice, expira = estado['indice'], estado['expira']
+    if expira > time.monotonic():
+        return indice
+    if not estado['recarga'].acquire(blocking=indice is None):
+        return indice
+    try:
+        with _ESTADO_LOCK:
+            if estado['expira'] > time.monotonic():
+                return estado['indice']
+        conn = obter_conexao()
+        if conn is None:
+            _adiar_recarga(estado)
+            return indice
+        try:
+            novo = IndiceClientes(carregar_nomes(conn))
+        except Exception as e:
+            print(f"Aviso: não foi possível carregar o dicionário de clientes: {e}")
+            conn.rollback()
+            _adiar_recarga(estado)
+            return indice
+        finally:
+            conn.close()
+        with _ESTADO_LOCK:
+            estado.update({'indice': novo, 'expira': time.monotonic() + _ttl_segundos()})
+        return novo
+    finally:
+        estado['recarga'].release()
+
+
+def indice_atual(obter_conexao):
+    """Último índice carregado do banco de obter_conexao (sem recarregar; None antes da primeira carga)"""
+    with _ESTADO_LOCK:
+        estado = _ESTADOS.get(obter_conexao)
+        return estado['indice'] if estado is not None else None
+
+
+def invalidar_clientes():
+    """Força a recarga dos dicionários na próxima pergunta (ex.: após a carga mensal)"""
+    with _ESTADO_LOCK:
+        for estado in _ESTADOS.values():
+            estado['expira'] = 0.0
+
+
+def grafias_cliente(nome, obter_conexao):
+    """Valores exatos do cliente nas tabelas, pelo último índice carregado do banco de obter_conexao"""
+    indice = indice_atual(obter_conexao)
+    return indice.grafias(nome) if indice is not None and nome else []
+
+
+def estatisticas_clientes(obter_conexao):
+    """Clientes no dicionário do banco de obter_conexao e segundos até a próxima recarga"""
+    with _ESTADO_LOCK:
+        estado = _ESTADOS.get(obter_conexao) or {'indice': None, 'expira': 0.0}
+        indice, restante = estado['indice'], estado['expira'] - time.monotonic()
+    return {
+        'clientes': len(indice) if indice is not None else 0,
+        'recarga_em_segundos': round(max(restante, 0.0), 1),
+    }
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Catálogo de consultas parametrizadas preparadas no servidor (PREPARE/EXECUTE)
+
+Cada texto de consulta (com parâmetros %s) vira um template identificado pelo hash
+do SQL. O template é preparado uma vez por conexão do pool e as execuções
+seguintes reaproveitam o plano, recebendo cliente/status/datas como parâmetros.
+
+O catálogo do processo e os statements de cada conexão são LRU limitados a
+LEIA_CONSULTAS_PREPARADAS_MAX: o template menos usado de uma conexão cheia recebe
+DEALLOCATE nessa mesma conexão antes de preparar o novo.
+"""
+
+import hashlib
+import os
+import re
+import threading
+import weakref
+from collections import OrderedDict
+
+from psycopg2 import errors
+
+_PLACEHOLDER = re.compile(r"%%|%s")
+
+# Templates por conexão e no catálogo do processo (SQL montado com valores literais não cresce sem limite);
+# 0 (ou negativo) desliga o PREPARE: as consultas rodam sem preparo
+MAX_TEMPLATES = max(0, int(os.getenv('LEIA_CONSULTAS_PREPARADAS_MAX', '200')))
+
+# Templates conhecidos pelo processo e estatísticas de uso (LRU)
+_CATALOGO = OrderedDict()
+_CATALOGO_LOCK = threading.Lock()
+_DESCARTES = {'catalogo': 0, 'conexoes': 0}
+
+# Nomes já preparados em cada conexão física, em ordem de uso (some junto com a conexão)
+_PREPARADAS_POR_CONEXAO = weakref.WeakKeyDictionary()
+
+# statement_timeout pedido em cada empréstimo de conexão, refeito após um rollback de executar_consulta
+_TIMEOUT_POR_CONEXAO = weakref.WeakKeyDictionary()
+
+
+def prepared_statements_habilitados(porta):
+    """DB_PREPARED_STATEMENTS=true/false/auto. Em 'auto' desliga no pooler do Supabase em modo transação (porta 6543)"""
+    modo = os.getenv('DB_PREPARED_STATEMENTS', 'auto').lower()
+    if modo in ('true', '1', 'sim'):
+        return True
+    if modo in ('false', '0', 'nao', 'não'):
+        return False
+    return str(porta) != '6543'
+
+
+def _preparo_habilitado(conn):
+    try:
+        porta = conn.get_dsn_parameters().get('port')
+    except Exception:
+        porta = None
+    return prepared_statements_habilitados(porta)
+
+
+def _converter_placeholders(query):
+    """Troca %s por $1..$n (e %% por %) para o texto do PREPARE"""
+    contador = [0]
+
+    def _sub(m):
+        if m.group(0) == '%%':
+            return '%'
+        contador[0] += 1
+        return f"${contador[0]}"
+
+    return _PLACEHOLDER.sub(_sub, query), contador[0]
+
+
+def _registrar_template(query, params):
+    """Obtém (ou cria) o template do catálogo correspondente ao texto da consulta"""
+    chave = (query, params is not None)
+    with _CATALOGO_LOCK:
+        template = _CATALOGO.get(chave)
+        if template is not None:
+            _CATALOGO.move_to_end(chave)
+            return template
+    if params is None:
+        texto, quantidade = query, 0
+    else:
+        texto, quantidade = _converter_placeholders(query)
+    nome = "leia_" + hashlib.sha1(texto.encode('utf-8')).hexdigest()[:16]
+    with _CATALOGO_LOCK:
+        template = _CATALOGO.setdefault(chave, {
+            'nome': nome,
+            'sql': texto,
+            'parametros': quantidade,
+            # Valores da primeira execução, para reproduzir a consulta em ferramentas de análise
+            'exemplo_parametros': tuple(params) if params is not None else (),
+            'preparos': 0,
+            'execucoes': 0,
+            'reusos_plano': 0,
+            'execucoes_sem_preparo': 0,
+        })
+        while _CATALOGO and len(_CATALOGO) > MAX_TEMPLATES:
+            _CATALOGO.popitem(last=False)
+            _DESCARTES['catalogo'] += 1
+    return template
+
+
+def _contar(template, campo):
+    with _CATALOGO_LOCK:
+        template[campo] += 1
+
+
+def definir_statement_timeout(conn, cursor, milissegundos):
+    """SET statement_timeout na transação da conexão, lembrado para executar_consulta refazer
+    depois de desfazer a transação (o rollback também desfaz o SET)"""
+    milissegundos = int(milissegundos)
+    cursor.execute(f"SET statement_timeout TO '{milissegundos}ms'")
+    _TIMEOUT_POR_CONEXAO[conn] = milissegundos
+
+
+def _reaplicar_statement_timeout(conn, cursor):
+    milissegundos = _TIMEOUT_POR_CONEXAO.get(conn)
+    if milissegundos is None:
+        return
+    try:
+        cursor.execute(f"SET statement_timeout TO '{milissegundos}ms'")
+    except Exception:
+        conn.rollback()
+
+
+def _preparar(cursor, preparadas, template):
+    """PREPARE do template na conexão, liberando antes o menos usado se a conexão estiver cheia"""
+    while preparadas and len(preparadas) >= MAX_TEMPLATES:
+        antigo, _ = preparadas.popitem(last=False)
+        cursor.execute(f"DEALLOCATE {antigo}")
+        with _CATALOGO_LOCK:
+            _DESCARTES['conexoes'] += 1
+    cursor.execute(f"PREPARE {template['nome']} AS {template['sql']}")
+    preparadas[template['nome']] = True
+
+
+def executar_consulta(conn, cursor, query, params=None, preparar=None):
+    """Executa a consulta no cursor como statement preparado (ou direto, se preparar=False).
+
+    params=None mantém o texto literal; com params (lista/tupla) os %s são parâmetros ligados.
+    preparar=None segue DB_PREPARED_STATEMENTS para a porta da conexão. Com
+    LEIA_CONSULTAS_PREPARADAS_MAX=0 nada é preparado.
+    """
+    template = _registrar_template(query, params)
+    argumentos = tuple(params) if params is not None else ()
+    if len(argumentos) != template['parametros']:
+        raise ValueError(
+            f"Consulta espera {template['parametros']} parâmetros, recebeu {len(argumentos)}"
+        )
+
+    if MAX_TEMPLATES <= 0:
+        preparar = False
+    elif preparar is None:
+        preparar = _preparo_habilitado(conn)
+    if not preparar:
+        _contar(template, 'execucoes_sem_preparo')
+        if params is None:
+            cursor.execute(query)
+        else:
+            cursor.execute(query, argumentos)
+        return template
+
+    conn_real = getattr(conn, 'conexao_real', conn)
+    preparadas = _PREPARADAS_POR_CONEXAO.setdefault(conn_real, OrderedDict())
+    nome = template['nome']
+    execute_sql = f"EXECUTE {nome}" + (f"({', '.join(['%s'] * len(argumentos))})" if argumentos else "")
+
+    for tentativa in range(2):
+        try:
+            if nome in preparadas:
+                preparadas.move_to_end(nome)
+                _contar(template, 'reusos_plano')
+            else:
+                _preparar(cursor, preparadas, template)
+                _contar(template, 'preparos')
+            cursor.execute(execute_sql, argumentos)
+            _contar(template, 'execucoes')
+            return template
+        except (errors.InvalidSqlStatementName, errors.DuplicatePreparedStatement):
+            # O estado do servidor divergiu do que sabemos (ex.: sessão trocada pelo pooler):
+            # desfaz a transação abortada e recomeça sem supor nada sobre a sessão
+            conn.rollback()
+            preparadas.clear()
+            if tentativa == 0:
+                try:
+                    cursor.execute("DEALLOCATE ALL")
+                except Exception:
+                    conn.rollback()
+            # O rollback levou junto o statement_timeout de quem chamou
+            _reaplicar_statement_timeout(conn, cursor)
+            if tentativa == 1:
+                raise
+    return template
+
+
+def estatisticas_consultas():
+    """Estatísticas do catálogo: preparos, execuções e taxa de reuso de plano"""
+    with _CATALOGO_LOCK:
+        templates = [dict(t) for t in _CATALOGO.values()]
+        descartes = dict(_DESCARTES)
+    execucoes = sum(t['execucoes'] for t in templates)
+    reusos = sum(t['reusos_plano'] for t in templates)
+    return {
+        'templates': len(templates),
+        'preparos': sum(t['preparos'] for t in templates),
+        'execucoes': execucoes,
+        'reusos_plano': reusos,
+        'taxa_reuso_plano': round(reusos / execucoes, 4) if execucoes else 0.0,
+        'execucoes_sem_preparo': sum(t['execucoes_sem_preparo'] for t in templates),
+        'templates_descartados': descartes['catalogo'],
+        'deallocate_por_limite': descartes['conexoes'],
+        'por_template': {
+            t['nome']: {k: t[k] for k in ('preparos', 'execucoes', 'reusos_plano', 'execucoes_sem_preparo')}
+            for t in templates
+        },
+    }
+
+
+def templates_catalogados():
+    """Textos SQL dos templates conhecidos (nome -> SQL com $n), para ferramentas de análise"""
+    with _CATALOGO_LOCK:
+        return {t['nome']: t['sql'] for t in _CATALOGO.values()}
+
+
+def templates_com_exemplos():
+    """Templates conhecidos com os parâmetros da primeira execução (nome -> (SQL com $n, parâmetros))"""
+    with _CATALOGO_LOCK:
+        return {t['nome']: (t['sql'], t['exemplo_parametros']) for t in _CATALOGO.values()}
@@ -0,0 +1,472 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Consultor de índices para as tabelas ia_*
+
+Roda um conjunto de perguntas pelas pesquisas de main.py e api_json_final.py para
+popular o catálogo de consultas preparadas, mede cada template com
+EXPLAIN (ANALYZE, BUFFERS) e propõe índices a partir dos predicados:
+- igualdade/intervalo (+ ORDER BY ... LIMIT): btree composto, ex. (cliente, mes_referencia, total DESC)
+- ILIKE com parâmetro: GIN com pg_trgm
+- filtros fixos de status/termo: índice parcial
+
+Cada índice candidato é criado dentro de uma transação, as consultas da tabela são
+medidas de novo e a transação é desfeita; os aprovados vão para uma migração
+versionada em migracoes/ com os tempos antes/depois.
+
+    python consultor_indices.py analisar [arquivo_de_perguntas.txt]
+    python consultor_indices.py aplicar
+
+Use um banco local/de homologação: CREATE INDEX dentro da transação bloqueia as
+escritas na tabela enquanto ela é medida.
+"""
+
+import hashlib
+import os
+import re
+import statistics
+import sys
+import time
+from collections import namedtuple
+
+import psycopg2
+
+DIRETORIO_MIGRACOES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migracoes')
+
+# Execuções de EXPLAIN ANALYZE por consulta (vale a mediana)
+EXECUCOES = int(os.getenv('LEIA_CONSULTOR_EXECUCOES', '3'))
+
+# Perguntas usadas quando nenhum arquivo é informado: cobrem os caminhos de todas as tabelas
+PERGUNTAS_ANALISE = [
+    "Quantas linhas ativas tem o cliente Safra?",
+    "Quantas linhas ativas tem o cliente Safra em março de 2025?",
+    "Quantas linhas bloqueadas tem o cliente Sonda?",
+    "Qual o fornecedor com maior custo em janeiro de 2024 do cliente Safra?",
+    "Quais são os custos do cliente Safra em dezembro de 2023?",
+    "Qual usuário teve maior custo no mês atual do cliente Safra?",
+    "Quem foi o usuário com maior custo em agosto de 2024 no cliente Safra?",
+    "Quais usuários tiveram os maiores custos nos últimos 3 meses no cliente Safra?",
+    "Quantas linhas ociosas tem o cliente Safra atualmente?",
+    "Quantas linhas ociosas o cliente Safra teve em maio de 2024?",
+    "Quantas linhas ociosas por operadora tem o cliente Safra?",
+    "Quantas linhas no Cliente Safra não possuem termo?",
+    "Do total de linhas sem termos no Cliente Safra, me mostre o total por tipo de linha",
+    "Do total de linhas sem termos no Cliente Safra por tipo de linha, me mostre o total por tipo linhas ativas",
+]
+
+_TABELA = re.compile(r"\bFROM\s+(ia_\w+)", re.IGNORECASE)
+_IGUALDADE = re.compile(r"(?<![:\w])(\w+)\s*=\s*\$\d+")
+_INTERVALO = re.compile(r"(?<![:\w])(\w+)\s*(?:>=|<=|>|<)\s*\$\d+")
+_ILIKE = re.compile(r"(?<![:\w])(\w+)\s+ILIKE\s+\$\d+", re.IGNORECASE)
+_ORDEM_LIMITE = re.compile(r"ORDER BY\s+(\w+)(\s+DESC)?\s+LIMIT\b", re.IGNORECASE)
+_GRUPO_LITERAL = re.compile(r"\(([^()$]+)\)")
+_COLUNA_COMPARADA = re.compile(r"(\w+)\s*(?:=|\bILIKE\b|\bIS\b)", re.IGNORECASE)
+
+Indice = namedtuple('Indice', ['tabela', 'colunas', 'metodo', 'predicado'])
+Medicao = namedtuple('Medicao', ['tempo_ms', 'buffers', 'varreduras_sequenciais', 'indices_usados'])
+
+
+def _unicos(itens):
+    return list(dict.fromkeys(itens))
+
+
+def nome_indice(indice):
+    """Nome estável (até 63 caracteres) derivado da tabela, colunas e predicado"""
+    colunas = [c.split()[0] + ("_desc" if c.endswith(" DESC") else "") for c in indice.colunas]
+    sufixo = "_trgm" if indice.metodo == 'gin' else ""
+    if indice.predicado:
+        sufixo += "_p" + hashlib.sha1(indice.predicado.encode('utf-8')).hexdigest()[:6]
+    nome = f"ix_{indice.tabela}_{'_'.join(colunas)}{sufixo}"
+    if len(nome) > 63:
+        resumo = hashlib.sha1(nome.encode('utf-8')).hexdigest()[:8]
+        nome = f"{nome[:54]}_{resumo}"
+    return nome
+
+
+def sql_criacao(indice, concorrente=False):
+    modo = "CONCURRENTLY " if concorrente else ""
+    sql = (
+        f"CREATE INDEX {modo}IF NOT EXISTS {nome_indice(indice)} "
+        f"ON {indice.tabela} USING {indice.metodo} ({', '.join(indice.colunas)})"
+    )
+    if indice.predicado:
+        sql += f" WHERE {indice.predicado}"
+    return sql
+
+
+def tabela_do_template(sql):
+    """Tabela ia_* consultada pelo template (None se nenhuma ou mais de uma, ou se for visão materializada)"""
+    tabelas = set(_TABELA.findall(sql))
+    if len(tabelas) != 1:
+        return None
+    tabela = tabelas.pop()
+    return None if tabela.startswith('ia_mv_') else tabela
+
+
+def propor_indices(sql):
+    """Índices candidatos para um template, a partir dos predicados da cláusula WHERE"""
+    tabela = tabela_do_template(sql)
+    if tabela is None:
+        return []
+    igualdade = _unicos(_IGUALDADE.findall(sql))
+    intervalo = [c for c in _unicos(_INTERVALO.findall(sql)) if c not in igualdade]
+    chave = igualdade + intervalo[:1]
+
+    ordem = _ORDEM_LIMITE.search(sql)
+    # ORDER BY sobre um apelido do SELECT (ex.: SUM(total) as custo_total) não vira coluna de índice
+    if ordem:
+        apelido = re.search(rf"(\S+)\s+AS\s+{ordem.group(1)}\b", sql, re.IGNORECASE)
+        if apelido and apelido.group(1) != ordem.group(1):
+            ordem = None
+    if ordem and ordem.group(1) not in chave:
+        chave.append(f"{ordem.group(1)} DESC" if ordem.group(2) else ordem.group(1))
+
+    propostas = []
+    if chave:
+        propostas.append(Indice(tabela, tuple(chave), 'btree', None))
+    for coluna in _unicos(_ILIKE.findall(sql)):
+        propostas.append(Indice(tabela, (f"{coluna} gin_trgm_ops",), 'gin', None))
+
+    # Filtros fixos sobre uma única coluna (ex.: possui_termo = 'N' OR ...): índice parcial
+    for grupo in _GRUPO_LITERAL.findall(sql):
+        colunas = set(_COLUNA_COMPARADA.findall(grupo))
+        if len(colunas) != 1:
+            continue
+        coluna = colunas.pop()
+        if coluna in igualdade + intervalo:
+            continue
+        base = tuple(igualdade + intervalo[:1]) or (coluna,)
+        propostas.append(Indice(tabela, base, 'btree', f"({grupo.strip()})"))
+    return propostas
+
+
+def consolidar(propostas):
+    """Remove repetidos e btree sem predicado cujas colunas são prefixo de outro da mesma tabela
+    (a direção não importa: o btree também é percorrido de trás para frente)"""
+    unicas = _unicos(propostas)
+
+    def _nomes(indice):
+        return tuple(c.split()[0] for c in indice.colunas)
+
+    resultado = []
+    for posicao, indice in enumerate(unicas):
+        coberto = indice.metodo == 'btree' and not indice.predicado and any(
+            outro is not indice and outro.tabela == indice.tabela and outro.metodo == 'btree'
+            and not outro.predicado and _nomes(outro)[:len(indice.colunas)] == _nomes(indice)
+            and (len(outro.colunas) > len(indice.colunas) or unicas.index(outro) < posicao)
+            for outro in unicas
+        )
+        if not coberto:
+            resultado.append(indice)
+    return resultado
+
+
+def _percorrer_plano(no):
+    yield no
+    for filho in no.get('Plans', []):
+        yield from _percorrer_plano(filho)
+
+
+def medir(conn, apelido, sql, parametros, execucoes=EXECUCOES):
+    """EXPLAIN (ANALYZE, BUFFERS) do template preparado; tempo é a mediana das execuções"""
+    argumentos = f"({', '.join(['%s'] * len(parametros))})" if parametros else ""
+    tempos = []
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_prepared_statements WHERE name = %s", (apelido,))
+        if cursor.fetchone():
+            cursor.execute(f"DEALLOCATE {apelido}")
+        cursor.execute(f"PREPARE {apelido} AS {sql}")
+        for _ in range(max(1, execucoes)):
+            cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) EXECUTE {apelido}{argumentos}", parametros)
+            plano = cursor.fetchone()[0][0]
+            tempos.append(plano['Execution Time'])
+        cursor.execute(f"DEALLOCATE {apelido}")
+    raiz = plano['Plan']
+    nos = list(_percorrer_plano(raiz))
+    return Medicao(
+        tempo_ms=round(statistics.median(tempos), 3),
+        buffers=raiz.get('Shared Hit Blocks', 0) + raiz.get('Shared Read Blocks', 0),
+        varreduras_sequenciais=sorted({n['Relation Name'] for n in nos if n['Node Type'] == 'Seq Scan'}),
+        indices_usados=sorted({n['Index Name'] for n in nos if 'Index Name' in n}),
+    )
+
+
+def medir_templates(conn, alvos, execucoes=EXECUCOES, sem_seqscan=False):
+    """Mede os templates {nome: (sql, parametros, tabela)} numa transação desfeita no fim"""
+    medicoes = {}
+    try:
+        if sem_seqscan:
+            with conn.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+        for nome, (sql, parametros, _) in alvos.items():
+            try:
+                medicoes[nome] = medir(conn, f"consultor_{nome}", sql, parametros, execucoes)
+            except Exception as e:
+                print(f"Aviso: não foi possível medir {nome}: {e}")
+                conn.rollback()
+                return medicoes
+    finally:
+        conn.rollback()
+    return medicoes
+
+
+def situacao_pg_trgm(conn):
+    """'instalada', 'disponivel' ou None"""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT installed_version FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        linha = cursor.fetchone()
+    conn.rollback()
+    if linha is None:
+        return None
+    return 'instalada' if linha[0] else 'disponivel'
+
+
+def avaliar_indice(conn, indice, alvos, trgm, execucoes=EXECUCOES):
+    """Cria o índice numa transação, mede as consultas da tabela e desfaz.
+
+    Retorna (situação, {template: Medicao}) com situação 'usado', 'utilizável'
+    (o planner só escolhe o índice sem seq scan, típico de tabela ainda pequena),
+    'não usado' ou 'não medido'.
+    """
+    if indice.metodo == 'gin' and trgm is None:
+        return 'não medido', {}
+    da_tabela = {nome: alvo for nome, alvo in alvos.items() if alvo[2] == indice.tabela}
+    nome = nome_indice(indice)
+
+    def _com_indice(sem_seqscan):
+        try:
+            with conn.cursor() as cursor:
+                if indice.metodo == 'gin' and trgm == 'disponivel':
+                    cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+                cursor.execute(sql_criacao(indice))
+                if sem_seqscan:
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+            medicoes = {}
+            for template, (sql, parametros, _) in da_tabela.items():
+                medicoes[template] = medir(conn, f"consultor_{template}", sql, parametros, execucoes)
+            return medicoes
+        finally:
+            conn.rollback()
+
+    try:
+        depois = _com_indice(False)
+        if any(nome in m.indices_usados for m in depois.values()):
+            return 'usado', depois
+        forcado = _com_indice(True)
+        if any(nome in m.indices_usados for m in forcado.values()):
+            return 'utilizável', depois
+        return 'não usado', depois
+    except Exception as e:
+        print(f"Aviso: não foi possível avaliar {nome}: {e}")
+        return 'não medido', {}
+
+
+def popular_catalogo(perguntas):
+    """Roda as perguntas pelas pesquisas da CLI e da API para registrar os templates usados"""
+    import api_json_final
+    import main
+
+    for pergunta in perguntas:
+        main.pesquisar_no_banco(pergunta)
+        api_json_final.pesquisar_no_banco_api(pergunta)
+
+
+def analisar(conn, templates, execucoes=EXECUCOES):
+    """Mede os templates, avalia os índices candidatos e retorna o relatório"""
+    alvos = {}
+    propostas = []
+    for nome, (sql, parametros) in sorted(templates.items()):
+        tabela = tabela_do_template(sql)
+        if tabela is None:
+            continue
+        alvos[nome] = (sql, parametros, tabela)
+        propostas.extend(propor_indices(sql))
+
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT indexname FROM pg_indexes WHERE schemaname = current_schema()")
+        existentes = {linha[0] for linha in cursor.fetchall()}
+    conn.rollback()
+
+    candidatos = [i for i in consolidar(propostas) if nome_indice(i) not in existentes]
+    antes = medir_templates(conn, alvos, execucoes)
+    trgm = situacao_pg_trgm(conn)
+
+    avaliacao = {}
+    for indice in candidatos:
+        avaliacao[indice] = avaliar_indice(conn, indice, alvos, trgm, execucoes)[0]
+        print(f"  {nome_indice(indice)}: {avaliacao[indice]}")
+
+    recomendados = [i for i in candidatos if avaliacao[i] != 'não usado']
+    medidos = [i for i in recomendados if avaliacao[i] != 'não medido']
+
+    # Tempos finais com todos os índices medidos criados juntos
+    depois = {}
+    try:
+        with conn.cursor() as cursor:
+            if trgm == 'disponivel' and any(i.metodo == 'gin' for i in medidos):
+                cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            for indice in medidos:
+                cursor.execute(sql_criacao(indice))
+        for nome, (sql, parametros, _) in alvos.items():
+            depois[nome] = medir(conn, f"consultor_{nome}", sql, parametros, execucoes)
+    except Exception as e:
+        print(f"Aviso: não foi possível medir com os índices recomendados: {e}")
+    finally:
+        conn.rollback()
+
+    # Com todos criados, descarta os que o planner deixou de usar (cobertos por outro recomendado)
+    if depois:
+        usados = set().union(*(m.indices_usados for m in depois.values()))
+        recomendados = [i for i in recomendados if avaliacao[i] != 'usado' or nome_indice(i) in usados]
+
+    return {
+        'alvos': alvos,
+        'antes': antes,
+        'depois': depois,
+        'avaliacao': avaliacao,
+        'recomendados': recomendados,
+        'pg_trgm': trgm,
+    }
+
+
+def linhas_relatorio(relatorio):
+    """Tempos antes/depois por template (ms, buffers e seq scans)"""
+    linhas = []
+    for nome, (_, _, tabela) in relatorio['alvos'].items():
+        antes = relatorio['antes'].get(nome)
+        depois = relatorio['depois'].get(nome)
+        if antes is None:
+            continue
+        texto = f"{nome} {tabela}: {antes.tempo_ms:.3f} ms, {antes.buffers} buffers"
+        if antes.varreduras_sequenciais:
+            texto += " (seq scan)"
+        if depois is not None:
+            texto += f" -> {depois.tempo_ms:.3f} ms, {depois.buffers} buffers"
+            if depois.indices_usados:
+                texto += f" ({', '.join(depois.indices_usados)})"
+        linhas.append(texto)
+    return linhas
+
+
+def proxima_versao(diretorio=DIRETORIO_MIGRACOES):
+    versoes = [int(m.group(1)) for m in (re.match(r"(\d+)_", f) for f in os.listdir(diretorio)) if m] \
+        if os.path.isdir(diretorio) else []
+    return max(versoes, default=0) + 1
+
+
+def escrever_migracao(relatorio, diretorio=DIRETORIO_MIGRACOES):
+    """Grava a migração versionada com os índices recomendados. Retorna o caminho (None se não há índices)."""
+    recomendados = relatorio['recomendados']
+    if not recomendados:
+        return None
+    os.makedirs(diretorio, exist_ok=True)
+    versao = proxima_versao(diretorio)
+    caminho = os.path.join(diretorio, f"{versao:04d}_indices_ia.sql")
+
+    linhas = [
+        f"-- Migração {versao:04d}: índices para as pesquisas das tabelas ia_*",
+        f"-- Gerada por consultor_indices.py em {time.strftime('%Y-%m-%d %H:%M:%S')}",
+        "-- CREATE INDEX CONCURRENTLY não roda em transação: aplique com",
+        "--     python consultor_indices.py aplicar",
+        "--",
+        "-- EXPLAIN (ANALYZE, BUFFERS), mediana por template: antes -> depois",
+    ]
+    linhas += [f"--   {linha}" for linha in linhas_relatorio(relatorio)]
+    linhas.append("")
+    if any(i.metodo == 'gin' for i in recomendados):
+        linhas += ["CREATE EXTENSION IF NOT EXISTS pg_trgm;", ""]
+    for indice in recomendados:
+        situacao = relatorio['avaliacao'][indice]
+        if situacao == 'não medido':
+            linhas.append("-- não medido (pg_trgm indisponível no banco analisado)")
+        elif situacao == 'utilizável':
+            linhas.append("-- utilizável: o planner só o escolhe com a tabela maior que a analisada")
+        linhas.append(sql_criacao(indice, concorrente=True) + ";")
+        linhas.append("")
+    with open(caminho, 'w', encoding='utf-8') as arquivo:
+        arquivo.write("\n".join(linhas))
+    return caminho
+
+
+def comandos_sql(texto):
+    """Separa o script em comandos por ';', sem cortar corpos de função entre $$ e sem comentários de linha"""
+    sem_comentarios = "\n".join(l for l in texto.splitlines() if not l.lstrip().startswith('--'))
+    comandos, inicio = [], 0
+    for trecho in re.finditer(r"\$(\w*)\$.*?\$\1\$|;", sem_comentarios, re.S):
+        if trecho.group() == ';':
+            comandos.append(sem_comentarios[inicio:trecho.start()].strip())
+            inicio = trecho.end()
+    comandos.append(sem_comentarios[inicio:].strip())
+    return [c for c in comandos if c]
+
+
+def aplicar_migracoes(conn, diretorio=DIRETORIO_MIGRACOES):
+    """Aplica, em ordem, as migrações ainda não registradas em leia_migracoes (autocommit)"""
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "CREATE TABLE IF NOT EXISTS leia_migracoes ("
+            "versao text PRIMARY KEY, aplicada_em timestamptz NOT NULL DEFAULT now())"
+        )
+        cursor.execute("SELECT versao FROM leia_migracoes")
+        aplicadas = {linha[0] for linha in cursor.fetchall()}
+
+    resultado = []
+    arquivos = sorted(f for f in os.listdir(diretorio) if f.endswith('.sql')) if os.path.isdir(diretorio) else []
+    for arquivo in arquivos:
+        versao = arquivo[:-4]
+        if versao in aplicadas:
+            continue
+        with open(os.path.join(diretorio, arquivo), encoding='utf-8') as f:
+            comandos = comandos_sql(f.read())
+        try:
+            with conn.cursor() as cursor:
+                for comando in comandos:
+                    cursor.execute(comando)
+                cursor.execute("INSERT INTO leia_migracoes (versao) VALUES (%s)", (versao,))
+        except Exception as e:
+            # Comandos já executados ficam (IF NOT EXISTS torna a reaplicação segura);
+            # um CREATE INDEX CONCURRENTLY interrompido deixa índice INVALID: remova antes de reaplicar
+            print(f"Erro ao aplicar a migração {versao}: {e}")
+            break
+        resultado.append(versao)
+    return resultado
+
+
+if __name__ == '__main__':
+    # A análise precisa das consultas reais nas tabelas base, a cada execução (antes de importar main)
+    os.environ['LEIA_VISOES'] = 'False'
+    os.environ['LEIA_CACHE_BACKEND'] = 'nenhum'
+
+    import consultas_preparadas
+    import pool_conexoes
+    from main import DB_CONFIG
+
+    acao = sys.argv[1] if len(sys.argv) > 1 else 'analisar'
+    if acao not in ('analisar', 'aplicar'):
+        print("Uso: python consultor_indices.py [analisar [arquivo_de_perguntas.txt]|aplicar]")
+        sys.exit(1)
+
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        if acao == 'aplicar':
+            aplicadas = aplicar_migracoes(conn)
+            print(f"Migrações aplicadas: {', '.join(aplicadas) or 'nenhuma'}")
+            sys.exit(0)
+
+        perguntas = PERGUNTAS_ANALISE
+        if len(sys.argv) > 2:
+            with open(sys.argv[2], encoding='utf-8') as arquivo:
+                perguntas = [linha.strip() for linha in arquivo if linha.strip()]
+        print(f"Executando {len(perguntas)} perguntas para coletar as consultas...")
+        popular_catalogo(perguntas)
+        pool_conexoes.fechar_pools()
+
+        templates = consultas_preparadas.templates_com_exemplos()
+        print(f"Avaliando índices para {len(templates)} consultas...")
+        relatorio = analisar(conn, templates)
+        print("\n".join(linhas_relatorio(relatorio)))
+        caminho = escrever_migracao(relatorio)
+        print(f"Migração gerada: {caminho}" if caminho else "Nenhum índice recomendado")
+    finally:
+        conn.close()
@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Exportação dos dados por trás das respostas em CSV, Arrow IPC (stream) ou Parquet
+
+A pergunta passa pelo mesmo roteador das pesquisas (rota, cliente, período, status) e vira
+uma consulta de detalhe na tabela da rota, com os mesmos filtros e sem LIMIT:
+
+    consulta = exportacao.montar_consulta(conn, "Custos dos usuários do cliente Safra nos últimos 6 meses")
+    for trecho in exportacao.exportar(conn, consulta, 'parquet'):
+        arquivo.write(trecho)
+
+As linhas vêm de um cursor no servidor em lotes de LEIA_CURSOR_ITERSIZE (executar_query_em_lotes)
+e cada lote é serializado e liberado antes do próximo: a memória não cresce com o resultado.
+Em CSV há também o caminho COPY (...) TO STDOUT, que deixa o próprio PostgreSQL gerar o CSV.
+Arrow e Parquet usam o pyarrow (dependência opcional).
+"""
+
+import csv
+import io
+import json
+import queue
+import threading
+from typing import List, NamedTuple
+
+from psycopg2 import extensions
+
+import main
+import registro_esquema
+import roteador
+
+# formato -> (Content-Type, extensão do arquivo)
+FORMATOS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+# Tabela de cada rota (as mesmas das pesquisas)
+TABELAS_ROTA = {
+    roteador.ROTA_TERMOS: 'ia_termos_numeros',
+    roteador.ROTA_CUSTOS_USUARIOS: 'ia_custo_usuarios_linhas',
+    roteador.ROTA_LINHAS_OCIOSAS: 'ia_linhas_ociosas',
+    roteador.ROTA_CUSTOS_FORNECEDOR: 'ia_custo_fornecedor',
+    roteador.ROTA_LINHAS: 'ia_linhas',
+}
+
+# Papéis do registro de esquema que não são colunas
+_PAPEIS_INTERNOS = {'tipo_mes_referencia'}
+
+# Trechos do COPY acumulados até este tamanho antes de ir para a fila
+TAMANHO_TRECHO_COPY = 64 * 1024
+
+# Trechos do COPY aguardando o cliente (o COPY espera quando a fila enche)
+FILA_COPY = 16
+
+
+class ConsultaExportacao(NamedTuple):
+    """Consulta de detalhe de uma pergunta, pronta para executar"""
+    rota: str
+    tabela: str
+    query: str
+    params: list
+    colunas: List[str]
+    periodo: str
+
+    def nome_arquivo(self, formato):
+        return f"leia_{self.rota}.{FORMATOS[formato][1]}"
+
+
+def pyarrow_disponivel():
+    try:
+        import pyarrow  # noqa: F401  (dependência opcional)
+        return True
+    except ImportError:
+        return False
+
+
+def _filtro_periodo(intencao, tabela, coluna_mes, tipo_mes, filtro_cliente, params_cliente):
+    """(fragmento, params, descrição) do período pedido, com a mesma leitura das pesquisas:
+    mês atual, mês/ano citado ou últimos X meses (3 se o número não vier); sem período, tudo"""
+    marcadores = set(intencao.marcadores)
+    if 'atual' in marcadores:
+        if tabela == 'ia_linhas':
+            # Como em pesquisar_linhas: "atualmente" é o mês mais recente com dados do cliente
+            return (
+                f"AND {coluna_mes} = (SELECT MAX({coluna_mes}) FROM {tabela} WHERE {filtro_cliente})",
+                list(params_cliente),
+                "mês mais recente",
+            )
+        from datetime import datetime
+        hoje = datetime.now()
+        filtro, params = main.construir_filtro_mes(coluna_mes, tipo_mes, str(hoje.year), str(hoje.month).zfill(2))
+        return filtro, params, f"{hoje.month:02d}/{hoje.year}"
+    if intencao.mes and intencao.ano:
+        filtro, params = main.construir_filtro_mes(coluna_mes, tipo_mes, intencao.ano, intencao.mes)
+        return filtro, params, f"{intencao.mes}/{intencao.ano}"
+    if 'último' in marcadores and marcadores & {'mês', 'mes', 'meses'}:
+        quantidade_meses = intencao.quantidade_meses or 3
+        data_inicio, data_fim = main.periodo_ultimos_meses(quantidade_meses)
+        return (
+            f"AND {coluna_mes} >= %s::date AND {coluna_mes} < %s::date",
+            [data_inicio.date(), data_fim.date()],
+            f"últimos {quantidade_meses} meses",
+        )
+    return "", [], "todos os meses"
+
+
+def montar_consulta(conn, pergunta, roteador_intencao=None, obter_conexao=None):
+    """Consulta de exportação da pergunta (None se a tabela da rota não existe).
+
+    Seleciona as colunas com papel no registro de esquema, com os nomes dos papéis
+    (cliente, nome_usuario, total, mes_referencia...), e aplica cliente, status e período.
+    roteador_intencao e obter_conexao indicam o banco do dicionário de clientes (padrão: o de main).
+    """
+    intencao = (roteador_intencao or main.ROTEADOR).rotear(pergunta)
+    tabela = TABELAS_ROTA[intencao.rota]
+    esquema = registro_esquema.obter_esquema(conn, tabela)
+    if esquema is None or not esquema.get('cliente'):
+        return None
+
+    selecionadas = [(papel, coluna) for papel, coluna in esquema.items() if coluna and papel not in _PAPEIS_INTERNOS]
+    filtro_cliente, params_cliente = main.construir_filtro_cliente(esquema['cliente'], intencao.cliente, obter_conexao)
+    filtros, params = [filtro_cliente], list(params_cliente)
+
+    if intencao.status and esquema.get('status_licenca'):
+        filtros.append(f"AND {esquema['status_licenca']} ILIKE %s")
+        params.append(f"%{intencao.status}%")
+
+    periodo = "todos os meses"
+    ordem = [esquema['cliente']]
+    coluna_mes = esquema.get('mes_referencia')
+    if coluna_mes:
+        filtro_mes, params_mes, periodo = _filtro_periodo(
+            intencao, tabela, coluna_mes, esquema.get('tipo_mes_referencia'), filtro_cliente, params_cliente
+        )
+        if filtro_mes:
+            filtros.append(filtro_mes)
+            params.extend(params_mes)
+        ordem.insert(0, coluna_mes)
+
+    query = f"""
+    SELECT {", ".join(f"{coluna} AS {papel}" for papel, coluna in selecionadas)}
+    FROM {tabela}
+    WHERE {" ".join(filtros)}
+    ORDER BY {", ".join(ordem)}
+    """
+    return ConsultaExportacao(intencao.rota, tabela, query, params, [papel for papel, _ in selecionadas], periodo)
+
+
+def _texto(valor):
+    """Valor como texto para CSV/Arrow (json vira JSON, não o repr do dict)"""
+    if valor is None or isinstance(valor, str):
+        return valor
+    if isinstance(valor, (dict, list)):
+        return json.dumps(valor, ensure_ascii=False, default=str)
+    return str(valor)
+
+
+def csv_em_lotes(lotes, colunas):
+    """Gera o CSV (bytes, UTF-8) lote a lote, com cabeçalho mesmo sem linhas"""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, lineterminator='\n')
+    escritor.writerow(colunas)
+    for lote in lotes:
+        escritor.writerows([[_texto(valor) for valor in linha] for linha in lote.linhas])
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+# OIDs do PostgreSQL com tipo Arrow direto; os demais vão como texto
+_TIPOS_INTEIROS = {20, 21, 23}
+_TIPOS_REAIS = {700, 701}
+_TIPO_NUMERIC = 1700
+_TIPO_BOOL = 16
+_TIPO_DATE = 1082
+_TIPO_TIMESTAMP = 1114
+_TIPO_TIMESTAMPTZ = 1184
+
+
+def _tipo_arrow(pa, coluna):
+    """Tipo Arrow de uma coluna de cursor.description"""
+    codigo = coluna.type_code
+    if codigo in _TIPOS_INTEIROS:
+        return pa.int64()
+    if codigo in _TIPOS_REAIS:
+        return pa.float64()
+    if codigo == _TIPO_NUMERIC and coluna.scale is not None and coluna.precision and coluna.precision <= 38:
+        return pa.decimal128(coluna.precision, coluna.scale)
+    if codigo == _TIPO_BOOL:
+        return pa.bool_()
+    if codigo == _TIPO_DATE:
+        return pa.date32()
+    if codigo == _TIPO_TIMESTAMP:
+        return pa.timestamp('us')
+    if codigo == _TIPO_TIMESTAMPTZ:
+        return pa.timestamp('us', tz='UTC')
+    # numeric sem precisão declarada, texto, json e demais
+    return pa.string()
+
+
+def _esquema_arrow(pa, lote, colunas):
+    if lote is None or lote.descricao is None:
+        return pa.schema([(nome, pa.string()) for nome in colunas])
+    return pa.schema([(nome, _tipo_arrow(pa, coluna)) for nome, coluna in zip(lote.colunas, lote.descricao)])
+
+
+def _lote_arrow(pa, esquema, lote):
+    colunas = []
+    for campo, valores in zip(esquema, lote.colunar()):
+        if pa.types.is_string(campo.type):
+            valores = [_texto(valor) for valor in valores]
+        colunas.append(pa.array(valores, type=campo.type))
+    return pa.RecordBatch.from_arrays(colunas, schema=esquema)
+
+
+class _Vazao(io.RawIOBase):
+    """Arquivo só de escrita que guarda os bytes até serem retirados, mantendo a posição absoluta
+    (o Parquet grava no rodapé os deslocamentos dos row groups)"""
+
+    def __init__(self):
+        super().__init__()
+        self._partes = []
+        self._posicao = 0
+
+    def writable(self):
+        return True
+
+    def write(self, dados):
+        dados = bytes(dados)
+        self._partes.append(dados)
+        self._posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self._posicao
+
+    def retirar(self):
+        dados = b"".join(self._partes)
+        self._partes.clear()
+        return dados
+
+
+def _pyarrow_em_lotes(lotes, colunas, abrir_escritor):
+    """Um lote Arrow por lote do cursor; os bytes escritos saem a cada lote"""
+    import pyarrow as pa
+
+    lotes = iter(lotes)
+    primeiro = next(lotes, None)
+    esquema = _esquema_arrow(pa, primeiro, colunas)
+    vazao = _Vazao()
+    escritor = abrir_escritor(pa, vazao, esquema)
+    try:
+        if primeiro is not None:
+            escritor.write_batch(_lote_arrow(pa, esquema, primeiro))
+            yield vazao.retirar()
+            for lote in lotes:
+                escritor.write_batch(_lote_arrow(pa, esquema, lote))
+                yield vazao.retirar()
+    finally:
+        escritor.close()
+    yield vazao.retirar()
+
+
+def arrow_em_lotes(lotes, colunas):
+    """Gera um stream Arrow IPC (um record batch por lote)"""
+    return _pyarrow_em_lotes(lotes, colunas, lambda pa, vazao, esquema: pa.ipc.new_stream(vazao, esquema))
+
+
+def parquet_em_lotes(lotes, colunas):
+    """Gera um arquivo Parquet (um row group por lote; o rodapé sai no final)"""
+    def abrir(pa, vazao, esquema):
+        import pyarrow.parquet as pq
+        return pq.ParquetWriter(vazao, esquema)
+    return _pyarrow_em_lotes(lotes, colunas, abrir)
+
+
+SERIALIZADORES = {
+    'csv': csv_em_lotes,
+    'arrow': arrow_em_lotes,
+    'parquet': parquet_em_lotes,
+}
+
+
+def exportar(conn, consulta, formato, itersize=None):
+    """Bytes do arquivo no formato pedido, lidos do cursor no servidor lote a lote"""
+    def lotes():
+        falhas = getattr(main._falhas_consulta, 'quantidade', 0)
+        yield from main.executar_query_em_lotes(conn, consulta.query, consulta.params, itersize=itersize)
+        # Arquivo truncado não pode parecer completo: a falha interrompe a resposta
+        if getattr(main._falhas_consulta, 'quantidade', 0) != falhas:
+            raise RuntimeError("Exportação interrompida: falha ao ler o resultado no banco")
+
+    return SERIALIZADORES[formato](lotes(), consulta.colunas)
+
+
+class _SaidaCopy:
+    """Arquivo de escrita do copy_expert: junta os trechos e os entrega numa fila limitada"""
+
+    def __init__(self, fila):
+        self.fila = fila
+        self.cancelada = False
+        self._buffer = bytearray()
+
+    def write(self, dados):
+        if not self.cancelada:
+            self._buffer += dados
+            if len(self._buffer) >= TAMANHO_TRECHO_COPY:
+                self.descarregar()
+        return len(dados)
+
+    def descarregar(self):
+        if self._buffer and not self.cancelada:
+            self.fila.put(bytes(self._buffer))
+        self._buffer.clear()
+
+
+_FIM_COPY = object()
+
+
+def _esvaziar(fila):
+    try:
+        while True:
+            fila.get_nowait()
+    except queue.Empty:
+        pass
+
+
+def exportar_csv_copy(conn, consulta):
+    """CSV gerado pelo PostgreSQL (COPY (...) TO STDOUT), para extrações grandes.
+
+    O copy_expert roda numa thread e entrega os trechos por uma fila limitada (FILA_COPY):
+    se o cliente lê devagar o COPY espera; se o cliente desiste a consulta é cancelada.
+    """
+    with conn.cursor() as cursor:
+        # COPY não aceita parâmetros ligados: os valores entram escapados pelo próprio psycopg2
+        sql = cursor.mogrify(consulta.query, consulta.params).decode(extensions.encodings[conn.encoding])
+    comando = f"COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER true)"
+
+    fila = queue.Queue(maxsize=FILA_COPY)
+    saida = _SaidaCopy(fila)
+    erros = []
+
+    def copiar():
+        try:
+            with conn.cursor() as cursor:
+                cursor.copy_expert(comando, saida)
+            saida.descarregar()
+        except Exception as e:
+            if not saida.cancelada:
+                erros.append(e)
+        finally:
+            if not saida.cancelada:
+                fila.put(_FIM_COPY)
+
+    thread = threading.Thread(target=copiar, name="leia-copy", daemon=True)
+    thread.start()
+    concluido = False
+    try:
+        while True:
+            trecho = fila.get()
+            if trecho is _FIM_COPY:
+                break
+            yield trecho
+        concluido = True
+        if erros:
+            raise RuntimeError(f"Exportação via COPY interrompida: {erros[0]}") from erros[0]
+    finally:
+        if not concluido:
+            # Cliente desistiu: descarta o que vier, cancela o COPY e libera a thread presa na fila
+            saida.cancelada = True
+            try:
+                conn.cancel()
+            except Exception:
+                pass
+            while thread.is_alive():
+                _esvaziar(fila)
+                thread.join(0.05)
+        thread.join()
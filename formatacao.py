@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Formatação de números no padrão brasileiro (moeda R$ 1.234,56 e inteiros 1.234.567)
+
+Módulo sem dependências do resto da aplicação: main, renderizador e resultado_pesquisa
+o importam na carga, sem o ciclo com main.
+"""
+
+import re
+
+
+def formatar_moeda(valor):
+    """Formata valores para o padrão monetário brasileiro R$ 1.234.567,89"""
+    try:
+        if valor is None:
+            return "R$ 0,00"
+        
+        # Converter para float se for string
+        if isinstance(valor, str):
+            # Remover possíveis formatações existentes
+            valor = valor.replace('R$', '').replace('.', '').replace(',', '.').strip()
+            valor = float(valor)
+        
+        # Formatar para o padrão brasileiro
+        valor_formatado = f"R$ {valor:,.2f}"
+        valor_formatado = valor_formatado.replace(',', 'X').replace('.', ',').replace('X', '.')
+        return valor_formatado
+    except (ValueError, TypeError):
+        return f"R$ {valor}"
+
+
+def formatar_valores_monetarios_no_texto(texto):
+    """Encontra números monetários no texto e aplica formato BR (R$ 1.234.567,89)."""
+    if not isinstance(texto, str) or not texto:
+        return texto
+    # Captura valores com 2 casas decimais, tolerando separadores de milhar (.,) em qualquer ordem
+    padrao = re.compile(r"\b\d{1,3}(?:[\.,]\d{3})*[\.,]\d{2}\b|\b\d+[\.,]\d{2}\b")
+    def _sub(m):
+        raw = m.group(0)
+        s = raw.strip().replace('R$', '').strip()
+        try:
+            if ',' in s and '.' in s:
+                # Define o separador decimal como o último entre '.' e ','
+                last_dot = s.rfind('.')
+                last_comma = s.rfind(',')
+                if last_comma > last_dot:
+                    decimal_sep, thousand_sep = ',', '.'
+                else:
+                    decimal_sep, thousand_sep = '.', ','
+                s_std = s.replace(thousand_sep, '').replace(decimal_sep, '.')
+            elif ',' in s:
+                parte_int, parte_frac = s.rsplit(',', 1)
+                if len(parte_frac) == 2:
+                    s_std = parte_int.replace('.', '').replace(' ', '') + '.' + parte_frac
+                else:
+                    s_std = s.replace(',', '')
+            elif '.' in s:
+                parte_int, parte_frac = s.rsplit('.', 1)
+                if len(parte_frac) == 2:
+                    s_std = parte_int.replace(',', '').replace(' ', '') + '.' + parte_frac
+                else:
+                    s_std = s.replace('.', '')
+            else:
+                s_std = s
+            valor = float(s_std)
+            return formatar_moeda(valor)
+        except Exception:
+            return raw
+    return padrao.sub(_sub, texto)
+
+
+def formatar_inteiro_ptbr(valor):
+    """Formata inteiros com separador de milhar em ponto (ex: 1.234.567)."""
+    try:
+        if valor is None:
+            return "0"
+        # Garante inteiro e aplica formatação US, depois troca vírgulas por pontos
+        return f"{int(round(valor)):,}".replace(',', '.')
+    except Exception:
+        return str(valor)
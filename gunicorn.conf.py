@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Configuração do gunicorn para produção da API (api_json_final:app)
+
+    gunicorn -c gunicorn.conf.py api_json_final:app
+
+Cada worker inicializa LLM, embeddings, pool de conexões e esquema logo após o fork,
+em segundo plano; /ready responde 503 e as perguntas aguardam até o worker ficar pronto.
+Reload gracioso: kill -HUP <pid do master> (workers novos sobem antes dos antigos saírem).
+"""
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', os.getenv('API_PORT', '5000'))}"
+
+# Workers com threads: chamadas ao Gemini liberam o GIL enquanto aguardam a rede,
+# então cada worker atende várias perguntas simultâneas
+worker_class = "gthread"
+workers = int(os.getenv('LEIA_WORKERS', os.getenv('WEB_CONCURRENCY', str(min(4, multiprocessing.cpu_count() * 2)))))
+threads = int(os.getenv('LEIA_THREADS', '8'))
+
+timeout = int(os.getenv('LEIA_WORKER_TIMEOUT', '120'))
+graceful_timeout = int(os.getenv('LEIA_GRACEFUL_TIMEOUT', '30'))
+keepalive = 5
+
+# Recicla workers periodicamente (com jitter para não reiniciarem todos juntos)
+max_requests = int(os.getenv('LEIA_MAX_REQUESTS', '2000'))
+max_requests_jitter = int(os.getenv('LEIA_MAX_REQUESTS_JITTER', '200'))
+
+# Cada worker importa a aplicação por conta própria (nada de conexões abertas no master)
+preload_app = False
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv('LEIA_LOG_LEVEL', 'info')
+
+
+def post_fork(server, worker):
+    """Inicialização por worker, em segundo plano para não atrasar o aceite de conexões"""
+    import pool_conexoes
+    import api_json_final
+
+    # Conexões herdadas do master (se houver preload) não podem ser usadas pelo filho
+    pool_conexoes.descartar_pools_herdados()
+    api_json_final.iniciar_inicializacao_worker()
+    server.log.info("Worker %s: inicialização iniciada (threads=%s)", worker.pid, threads)
+
+
+def worker_exit(server, worker):
+    """Fecha as conexões do pool ao encerrar o worker (reload, max_requests ou shutdown)"""
+    import pool_conexoes
+    import registro_esquema
+
+    registro_esquema.parar_escuta_invalidacao()
+    pool_conexoes.fechar_pools()
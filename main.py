@@ -7,87 +7,54 @@ os.environ.setdefault("GLOG_minloglevel", "3")
 os.environ.setdefault("ABSL_LOG_LEVEL", "3")  # 0=INFO,1=WARNING,2=ERROR,3=FATAL
 os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "3")
 
-# Supressão global de stderr (Python e C) para eliminar WARNINGS nativos precoces
-_SILENCE_ACTIVE = False
-_SAVED_FD2 = None
-_DEVNULL_FD = None
-_DEVNULL_PY = None
-
-def _silence_stderr_start():
-    global _SILENCE_ACTIVE, _SAVED_FD2, _DEVNULL_FD, _DEVNULL_PY
-    if _SILENCE_ACTIVE:
-        return
-    _SILENCE_ACTIVE = True
-    _DEVNULL_PY = open(os.devnull, 'w')
-    sys.stderr = _DEVNULL_PY
-    _SAVED_FD2 = os.dup(2)
-    _DEVNULL_FD = os.open(os.devnull, os.O_WRONLY)
-    os.dup2(_DEVNULL_FD, 2)
-
-def _silence_stderr_stop():
-    global _SILENCE_ACTIVE, _SAVED_FD2, _DEVNULL_FD, _DEVNULL_PY
-    if not _SILENCE_ACTIVE:
-        return
-    try:
-        os.dup2(_SAVED_FD2, 2)
-    finally:
-        try:
-            os.close(_SAVED_FD2)
-        except Exception:
-            pass
-        try:
-            os.close(_DEVNULL_FD)
-        except Exception:
-            pass
-        try:
-            _DEVNULL_PY.close()
-        except Exception:
-            pass
-        sys.stderr = sys.__stderr__
-        _SILENCE_ACTIVE = False
-
-# Inicia supressão cedo (antes de imports que podem disparar logs nativos)
-_silence_stderr_start()
-
+# langchain, google.generativeai e numpy são importados no primeiro uso (importar main fica
+# barato para a API e os scripts); precarregar_modulos() adianta esses imports num worker
 from contextlib import contextmanager
+import threading
+
+# Desvio do stderr compartilhado entre threads: o primeiro a entrar troca, o último a sair restaura
+_STDERR_LOCK = threading.Lock()
+_STDERR_DESVIO = {'usos': 0, 'stderr': None, 'devnull': None, 'fd_salvo': None}
 
 @contextmanager
 def _suppress_stderr_during_imports():
-    """Suprime stderr Python e também o stderr de nível C (fd 2) temporariamente."""
-    original_stderr = sys.stderr
-    devnull_py = open(os.devnull, 'w')
-    # Redireciona stderr Python
-    sys.stderr = devnull_py
-    # Redireciona fd 2 (C-level)
-    saved_fd = os.dup(2)
-    devnull_fd = os.open(os.devnull, os.O_WRONLY)
-    os.dup2(devnull_fd, 2)
+    """Suprime stderr Python e também o stderr de nível C (fd 2) durante os imports do Google.
+
+    Só para a inicialização (imports e criação dos clientes), nunca por requisição: o fd 2 é do
+    processo inteiro. Chamadas sobrepostas contam referências em vez de salvar o /dev/null da outra.
+    """
+    with _STDERR_LOCK:
+        if _STDERR_DESVIO['usos'] == 0:
+            devnull_py = open(os.devnull, 'w')
+            # Redireciona fd 2 (C-level)
+            saved_fd = os.dup(2)
+            devnull_fd = os.open(os.devnull, os.O_WRONLY)
+            os.dup2(devnull_fd, 2)
+            os.close(devnull_fd)
+            _STDERR_DESVIO.update(stderr=sys.stderr, devnull=devnull_py, fd_salvo=saved_fd)
+            # Redireciona stderr Python
+            sys.stderr = devnull_py
+        _STDERR_DESVIO['usos'] += 1
     try:
         yield
     finally:
-        try:
-            os.dup2(saved_fd, 2)
-        finally:
-            try:
-                os.close(saved_fd)
-            except Exception:
-                pass
-            try:
-                os.close(devnull_fd)
-            except Exception:
-                pass
-            sys.stderr = original_stderr
-            try:
-                devnull_py.close()
-            except Exception:
-                pass
+        with _STDERR_LOCK:
+            _STDERR_DESVIO['usos'] -= 1
+            if _STDERR_DESVIO['usos'] == 0:
+                try:
+                    os.dup2(_STDERR_DESVIO['fd_salvo'], 2)
+                finally:
+                    try:
+                        os.close(_STDERR_DESVIO['fd_salvo'])
+                    except Exception:
+                        pass
+                    sys.stderr = _STDERR_DESVIO['stderr']
+                    try:
+                        _STDERR_DESVIO['devnull'].close()
+                    except Exception:
+                        pass
+                    _STDERR_DESVIO.update(stderr=None, devnull=None, fd_salvo=None)
 
-from langchain.prompts import PromptTemplate
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-with _suppress_stderr_during_imports():
-    import google.generativeai as genai
-    from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
-import numpy as np
 from dotenv import load_dotenv, find_dotenv
 
 # Carrega variáveis do .env de forma robusta (ordem: pasta do script, detectado via find_dotenv, diretório atual)
@@ -103,13 +70,26 @@ try:
     _env_loaded = load_dotenv() or _env_loaded
 except Exception:
     pass
-import psycopg2
-from dotenv import load_dotenv
-from psycopg2 import sql
-import pandas as pd
+import pool_conexoes
+import metricas
+import rastreamento
+import registro_esquema
+import consultas_preparadas
+import cache_resultados
+import cache_embeddings
+import renderizador
+from formatacao import formatar_inteiro_ptbr, formatar_moeda, formatar_valores_monetarios_no_texto
+import resultado_pesquisa
+from resultado_consulta import ResultadoConsulta
+import visoes_materializadas
+import clientes
+import roteador
 import re
 import time
-import sys
+import functools
+import itertools
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 
 load_dotenv()
 
@@ -123,10 +103,21 @@ DB_CONFIG = {
     'sslmode': os.getenv('DB_SSLMODE', 'require')
 }
 
+# Seções de depuração/amostra nas respostas (desligar em produção com LEIA_SECOES_DEPURACAO=False)
+SECOES_DEPURACAO = os.getenv('LEIA_SECOES_DEPURACAO', 'True').lower() == 'true'
+
+# Linhas por fornecedor e maior custo por fornecedor saem prontos do resultado da consulta;
+# LEIA_RESPOSTA_VIA_LLM=True devolve as seções de dados para o RAG formatar a resposta
+RESPOSTA_VIA_LLM = os.getenv('LEIA_RESPOSTA_VIA_LLM', 'False').lower() == 'true'
+
+# Linhas por ida ao servidor nos cursores nomeados (executar_query_em_lotes, usado pelas exportações)
+ITERSIZE_CURSOR = int(os.getenv('LEIA_CURSOR_ITERSIZE', '2000'))
+
 def conectar_postgres():
-    """Conecta ao banco de dados PostgreSQL"""
+    """Obtém uma conexão do pool PostgreSQL do processo (conn.close() devolve ao pool)"""
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
+        with rastreamento.span('conectar_postgres', {'db.system': 'postgresql', 'db.name': DB_CONFIG['database']}):
+            conn = pool_conexoes.obter_conexao(DB_CONFIG)
         return conn
     except Exception as e:
         print(f"Erro ao conectar com o PostgreSQL: {e}")
@@ -167,7 +158,8 @@ def formatar_resposta_json(resposta_texto, pergunta, sucesso=True, dados_extras=
         if dados_extras:
             resposta_json["dados_extras"] = dados_extras
         
-        return json.dumps(resposta_json, ensure_ascii=False, indent=2)
+        with metricas.medir_etapa('json'):
+            return json.dumps(resposta_json, ensure_ascii=False, indent=2)
     
     except Exception as e:
         erro_json = {
@@ -193,50 +185,19 @@ def processar_pergunta_json(entrada_json, llm=None, embeddings=None):
         # Pesquisar no banco de dados
         dados_banco = pesquisar_no_banco(pergunta)
         
-        # Verificar se é uma resposta já formatada (custos por usuários, linhas ociosas, termos)
-        if (dados_banco.startswith("O Usuário") or 
-            dados_banco.startswith("Nos últimos") or 
-            dados_banco.startswith("No último mês") or
-            dados_banco.startswith("Não foram encontrados dados de custos") or 
-            dados_banco.startswith("--- INFORMAÇÕES EXTRAÍDAS DA PERGUNTA ---")):
-            return formatar_resposta_json(dados_banco, pergunta, True)
-        
-        # Verificar se é uma resposta de linhas ociosas (já formatada)
-        elif (dados_banco.startswith("O Cliente") and 
-            ("linhas ociosas" in dados_banco or "linha ociosa" in dados_banco or 
-             "possui atualmente" in dados_banco or "possuiu em" in dados_banco or 
-             "possuiu nos últimos" in dados_banco)):
-            return formatar_resposta_json(dados_banco, pergunta, True)
-        
-        # Verificar se é uma resposta sobre termos de linhas (já formatada)
-        elif (dados_banco.startswith("O Cliente") and 
-            ("linhas sem termos" in dados_banco or "linha sem termo" in dados_banco or 
-             "são do tipo" in dados_banco or "estão Ativas são do tipo" in dados_banco)):
-            return formatar_resposta_json(dados_banco, pergunta, True)
+        # Resposta já formatada não passa pelo RAG
+        if dados_banco.ja_formatada:
+            return formatar_resposta_json(dados_banco.resposta, pergunta, True)
         
-        # Verificar se é uma resposta de linhas normais (deve passar pelo RAG)
-        elif ("--- LINHAS POR FORNECEDOR" in dados_banco or 
-              "--- TOTAL POR FORNECEDOR" in dados_banco or
-              "--- DADOS BRUTOS" in dados_banco or
-              "--- DEBUG:" in dados_banco):
-            # Passar pelo RAG para formatar a resposta
-            if llm and embeddings:
-                try:
-                    resposta = responder_com_rag(pergunta, dados_banco, llm, embeddings, top_k=6)
-                    return formatar_resposta_json(resposta, pergunta, True)
-                except Exception as e:
-                    return formatar_resposta_json(f"Dados do banco (sem processamento IA):\n\n{dados_banco}", pergunta, True, {"erro_ia": str(e)})
-            else:
-                return formatar_resposta_json(f"Dados do banco de dados:\n\n{dados_banco}", pergunta, True)
+        # Demais resultados passam pelo RAG para formatar a resposta
+        if llm and embeddings:
+            try:
+                resposta = responder_com_rag(pergunta, dados_banco, llm, embeddings, top_k=6)
+                return formatar_resposta_json(resposta, pergunta, True)
+            except Exception as e:
+                return formatar_resposta_json(f"Dados do banco (sem processamento IA):\n\n{dados_banco}", pergunta, True, {"erro_ia": str(e)})
         else:
-            if llm and embeddings:
-                try:
-                    resposta = responder_com_rag(pergunta, dados_banco, llm, embeddings, top_k=6)
-                    return formatar_resposta_json(resposta, pergunta, True)
-                except Exception as e:
-                    return formatar_resposta_json(f"Dados do banco (sem processamento IA):\n\n{dados_banco}", pergunta, True, {"erro_ia": str(e)})
-            else:
-                return formatar_resposta_json(f"Dados do banco de dados:\n\n{dados_banco}", pergunta, True)
+            return formatar_resposta_json(f"Dados do banco de dados:\n\n{dados_banco}", pergunta, True)
     
     except Exception as e:
         return formatar_resposta_json(f"Erro interno: {str(e)}", pergunta if 'pergunta' in locals() else "", False)
@@ -249,86 +210,136 @@ def extrair_palavras_chave(pergunta):
     palavras_chave = [p for p in palavras if p not in stop_words and len(p) > 2]
     return palavras_chave
 
-def imprimir_digitando(texto, delay_segundos=0.02):
-    """Imprime o texto simulando digitação, caractere por caractere."""
-    try:
-        for caractere in str(texto):
-            sys.stdout.write(caractere)
-            sys.stdout.flush()
-            time.sleep(delay_segundos)
-    finally:
-        if not str(texto).endswith("\n"):
-            sys.stdout.write("\n")
-            sys.stdout.flush()
+def imprimir_stream(partes):
+    """Imprime os pedaços de uma resposta em streaming assim que chegam e retorna o texto completo."""
+    texto = []
+    for parte in partes:
+        sys.stdout.write(parte)
+        sys.stdout.flush()
+        texto.append(parte)
+    texto = "".join(texto)
+    if not texto.endswith("\n"):
+        sys.stdout.write("\n")
+        sys.stdout.flush()
+    return texto
+
+def _consulta_tabela_especifica(conn, tabela, palavras_chave, limite):
+    """SELECT * com ILIKE de cada palavra em cada coluna da tabela; (query, params) ou None"""
+    with conn.cursor() as cursor, metricas.medir_etapa('sql'):
+        # Obter colunas da tabela
+        cursor.execute("""
+            SELECT column_name 
+            FROM information_schema.columns 
+            WHERE table_name = %s
+        """, (tabela,))
+        colunas = [row[0] for row in cursor.fetchall()]
+    
+    if not colunas:
+        return None
+    
+    # Construir query de pesquisa mais inteligente
+    conditions = []
+    params = []
+    
+    for coluna in colunas:
+        for palavra in palavras_chave:
+            conditions.append(f"{coluna}::text ILIKE %s")
+            params.append(f"%{palavra}%")
+    
+    if not conditions:
+        return None
+    where_clause = " OR ".join(conditions)
+    query = f"SELECT * FROM {tabela} WHERE {where_clause}"
+    if limite is not None:
+        # LIMIT ligado como parâmetro: um único template preparado para qualquer limite
+        query += " LIMIT %s"
+        params.append(int(limite))
+    return query, params
 
 def pesquisar_tabela_especifica(conn, tabela, palavras_chave):
     """Pesquisa em uma tabela específica com palavras-chave"""
     try:
-        with conn.cursor() as cursor:
-            # Obter colunas da tabela
-            cursor.execute(f"""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_name = '{tabela}'
-            """)
-            colunas = [row[0] for row in cursor.fetchall()]
-            
-            if not colunas:
-                return None
-            
-            # Construir query de pesquisa mais inteligente
-            conditions = []
-            params = []
-            
-            for coluna in colunas:
-                for palavra in palavras_chave:
-                    conditions.append(f"{coluna}::text ILIKE %s")
-                    params.append(f"%{palavra}%")
-            
-            if conditions:
-                where_clause = " OR ".join(conditions)
-                query = f"SELECT * FROM {tabela} WHERE {where_clause} LIMIT 20"
-                
-                cursor.execute(query, params)
-                rows = cursor.fetchall()
-                
-                if rows:
-                    col_names = [desc[0] for desc in cursor.description]
-                    df = pd.DataFrame(rows, columns=col_names)
-                    return df
+        consulta = _consulta_tabela_especifica(conn, tabela, palavras_chave, 20)
+        if consulta:
+            with conn.cursor() as cursor:
+                consultas_preparadas.executar_consulta(conn, cursor, *consulta)
+                resultado = ResultadoConsulta.do_cursor(cursor)
+                if resultado is not None:
+                    return resultado.dataframe()
                     
     except Exception as e:
         print(f"Erro ao pesquisar na tabela {tabela}: {e}")
     
     return None
 
-def executar_query_direta(conn, query):
-    """Executa uma query SQL diretamente"""
+# Falhas de executar_query_direta na thread atual (resultados parciais não vão para o cache)
+_falhas_consulta = threading.local()
+
+def executar_query_direta(conn, query, params=None):
+    """Executa uma query SQL (template preparado no servidor quando há params ligados aos %s).
+
+    Retorna um ResultadoConsulta (tuplas do cursor; DataFrame só via .dataframe()) ou None sem linhas.
+    """
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(query)
-            rows = cursor.fetchall()
-            if rows:
-                col_names = [desc[0] for desc in cursor.description]
-                df = pd.DataFrame(rows, columns=col_names)
-                return df
+        with rastreamento.span('executar_query_direta', rastreamento.atributos_sql(query)) as span, \
+                conn.cursor() as cursor, metricas.medir_etapa('sql'):
+            consultas_preparadas.executar_consulta(conn, cursor, query, params)
+            resultado = ResultadoConsulta.do_cursor(cursor)
+            span.set_attribute('leia.linhas', len(resultado) if resultado is not None else 0)
+            return resultado
     except Exception as e:
         print(f"Erro ao executar query: {e}")
+        _falhas_consulta.quantidade = getattr(_falhas_consulta, 'quantidade', 0) + 1
     return None
 
-def extrair_cliente_pergunta(pergunta):
-    """Extrai o nome do cliente da pergunta do usuário"""
-    # Lista de clientes conhecidos (pode ser expandida)
-    clientes_conhecidos = ['safra', 'sotreq', 'verzani', 'sonda', 'direcional', 'mdr']
+_contador_cursores = itertools.count(1)
+
+def executar_query_em_lotes(conn, query, params=None, itersize=None):
+    """Executa a query num cursor nomeado (no servidor) e gera um ResultadoConsulta por lote de
+    itersize linhas (LEIA_CURSOR_ITERSIZE), para resultados grandes (exportações, SELECT * sem LIMIT).
+
+    Só um lote fica em memória por vez: quem consome formata ou serializa lote a lote. Cursores
+    nomeados não usam o PREPARE de consultas_preparadas. Parar de consumir fecha o cursor no
+    servidor; a transação é desfeita quando a conexão volta ao pool.
+    """
+    itersize = itersize or ITERSIZE_CURSOR
+    nome = f"leia_lotes_{os.getpid()}_{next(_contador_cursores)}"
+    # Tempo no banco (execute e fetchmany), sem o tempo de quem consome os lotes: uma observação de 'sql'
+    tempo_banco = 0.0
+    try:
+        # Em autocommit o cursor precisa de WITH HOLD para existir fora de uma transação
+        with conn.cursor(name=nome, withhold=conn.autocommit) as cursor:
+            cursor.itersize = itersize
+            inicio = time.perf_counter()
+            cursor.execute(query, params)
+            while True:
+                linhas = cursor.fetchmany(itersize)
+                tempo_banco += time.perf_counter() - inicio
+                if not linhas:
+                    break
+                yield ResultadoConsulta([desc[0] for desc in cursor.description], linhas, cursor.description)
+                inicio = time.perf_counter()
+    except Exception as e:
+        print(f"Erro ao executar query em lotes: {e}")
+        _falhas_consulta.quantidade = getattr(_falhas_consulta, 'quantidade', 0) + 1
+    finally:
+        metricas.observar('sql', tempo_banco)
+
+@metricas.cronometrar('entidades')
+def extrair_cliente_pergunta(pergunta, obter_conexao=None):
+    """Extrai o cliente da pergunta: o nome canônico, como gravado no banco, pelo dicionário de
+    clientes (sem diferenciar maiúsculas/acentos); sem correspondência, o termo após "cliente".
+
+    obter_conexao escolhe o banco do dicionário (padrão: conectar_postgres, o DB_CONFIG)."""
+    indice = clientes.obter_indice(obter_conexao or conectar_postgres)
+    if indice is not None:
+        cliente = indice.encontrar(pergunta)
+        if cliente:
+            return cliente
     
     pergunta_lower = pergunta.lower()
     
-    # Procurar por clientes conhecidos na pergunta
-    for cliente in clientes_conhecidos:
-        if cliente in pergunta_lower:
-            return cliente
-    
-    # Se não encontrou cliente específico, procurar padrões comuns
+    # Cliente fora do dicionário: procurar padrões comuns
     padroes_cliente = [
         r'cliente\s+(\w+)',
         r'do\s+cliente\s+(\w+)',
@@ -350,6 +361,7 @@ def extrair_cliente_pergunta(pergunta):
     # Se não encontrou nenhum cliente específico, retorna None
     return None    
 
+@metricas.cronometrar('entidades')
 def extrair_mes_ano(pergunta):
     """Extrai mês e ano da pergunta de forma mais precisa"""
     pergunta_lower = pergunta.lower()
@@ -389,84 +401,43 @@ def extrair_mes_ano(pergunta):
     
     return ano, mes_numero, mes_nome
 
-def formatar_moeda(valor):
-    """Formata valores para o padrão monetário brasileiro R$ 1.234.567,89"""
-    try:
-        if valor is None:
-            return "R$ 0,00"
-        
-        # Converter para float se for string
-        if isinstance(valor, str):
-            # Remover possíveis formatações existentes
-            valor = valor.replace('R$', '').replace('.', '').replace(',', '.').strip()
-            valor = float(valor)
-        
-        # Formatar para o padrão brasileiro
-        valor_formatado = f"R$ {valor:,.2f}"
-        valor_formatado = valor_formatado.replace(',', 'X').replace('.', ',').replace('X', '.')
-        return valor_formatado
-    except (ValueError, TypeError):
-        return f"R$ {valor}"
-
 def formatar_dataframe_moeda(df, coluna_custo):
     """Formata a coluna de custo de um DataFrame para moeda brasileira"""
     if coluna_custo in df.columns:
         df[coluna_custo] = df[coluna_custo].apply(formatar_moeda)
     return df    
 
-def formatar_valores_monetarios_no_texto(texto):
-    """Encontra números monetários no texto e aplica formato BR (R$ 1.234.567,89)."""
-    if not isinstance(texto, str) or not texto:
-        return texto
-    # Captura valores com 2 casas decimais, tolerando separadores de milhar (.,) em qualquer ordem
-    padrao = re.compile(r"\b\d{1,3}(?:[\.,]\d{3})*[\.,]\d{2}\b|\b\d+[\.,]\d{2}\b")
-    def _sub(m):
-        raw = m.group(0)
-        s = raw.strip().replace('R$', '').strip()
-        try:
-            if ',' in s and '.' in s:
-                # Define o separador decimal como o último entre '.' e ','
-                last_dot = s.rfind('.')
-                last_comma = s.rfind(',')
-                if last_comma > last_dot:
-                    decimal_sep, thousand_sep = ',', '.'
-                else:
-                    decimal_sep, thousand_sep = '.', ','
-                s_std = s.replace(thousand_sep, '').replace(decimal_sep, '.')
-            elif ',' in s:
-                parte_int, parte_frac = s.rsplit(',', 1)
-                if len(parte_frac) == 2:
-                    s_std = parte_int.replace('.', '').replace(' ', '') + '.' + parte_frac
-                else:
-                    s_std = s.replace(',', '')
-            elif '.' in s:
-                parte_int, parte_frac = s.rsplit('.', 1)
-                if len(parte_frac) == 2:
-                    s_std = parte_int.replace(',', '').replace(' ', '') + '.' + parte_frac
-                else:
-                    s_std = s.replace('.', '')
-            else:
-                s_std = s
-            valor = float(s_std)
-            return formatar_moeda(valor)
-        except Exception:
-            return raw
-    return padrao.sub(_sub, texto)
-
-def formatar_inteiro_ptbr(valor):
-    """Formata inteiros com separador de milhar em ponto (ex: 1.234.567)."""
-    try:
-        if valor is None:
-            return "0"
-        # Garante inteiro e aplica formatação US, depois troca vírgulas por pontos
-        return f"{int(round(valor)):,}".replace(',', '.')
-    except Exception:
-        return str(valor)
+class FormatadorMonetarioIncremental:
+    """Aplica formatar_valores_monetarios_no_texto a um texto que chega em pedaços (streaming).
+
+    Valores monetários nunca contêm espaço, então o texto é liberado até o último espaço
+    em branco recebido; o restante espera o próximo pedaço (ou finalizar()).
+    """
+
+    def __init__(self):
+        self._pendente = ""
+
+    def adicionar(self, pedaco):
+        """Recebe um pedaço e devolve o trecho já seguro para exibir (pode ser vazio)"""
+        self._pendente += pedaco
+        corte = max(self._pendente.rfind(c) for c in " \n\t\r") + 1
+        if corte <= 0:
+            return ""
+        pronto, self._pendente = self._pendente[:corte], self._pendente[corte:]
+        return formatar_valores_monetarios_no_texto(pronto)
+
+    def finalizar(self):
+        """Devolve o que sobrou no buffer, formatado"""
+        pronto, self._pendente = self._pendente, ""
+        return formatar_valores_monetarios_no_texto(pronto)
 
 def construir_filtro_mes(coluna_mes, tipo_mes, ano, mes_numero):
-    """Constroi filtro de mês eficiente. Usa faixa de datas quando a coluna é date/timestamp."""
+    """Constroi filtro de mês parametrizado. Usa faixa de datas quando a coluna é date/timestamp.
+
+    Retorna (fragmento_sql, parametros) para compor a query com os valores ligados aos %s.
+    """
     if not (coluna_mes and ano and mes_numero):
-        return ""
+        return "", []
     tipo_normalizado = (tipo_mes or "").lower()
     # Calcular primeiro dia do mês e primeiro dia do próximo mês
     try:
@@ -477,14 +448,29 @@ def construir_filtro_mes(coluna_mes, tipo_mes, ano, mes_numero):
         inicio = f"{ano_i:04d}-{mes_i:02d}-01"
         prox_inicio = f"{prox_ano:04d}-{prox_mes:02d}-01"
     except Exception:
-        inicio = f"{ano}-{mes_numero}-01"
         # fallback mais permissivo
-        return f"AND {coluna_mes}::text ILIKE '%{ano}-{mes_numero}%'"
+        return f"AND {coluna_mes}::text ILIKE %s", [f"%{ano}-{mes_numero}%"]
 
     if any(t in tipo_normalizado for t in ["date", "timestamp"]):
-        return f"AND {coluna_mes} >= DATE '{inicio}' AND {coluna_mes} < DATE '{prox_inicio}'"
+        return f"AND {coluna_mes} >= %s::date AND {coluna_mes} < %s::date", [inicio, prox_inicio]
     else:
-        return f"AND {coluna_mes}::text ILIKE '%{ano}-{mes_numero}%'"
+        return f"AND {coluna_mes}::text ILIKE %s", [f"%{ano}-{mes_numero}%"]
+
+def construir_filtro_cliente(coluna_cliente, cliente, obter_conexao=None):
+    """Constroi filtro de cliente parametrizado. Retorna (fragmento_sql, parametros).
+
+    Cliente do dicionário (do banco de obter_conexao, padrão conectar_postgres) vira igualdade
+    com o valor gravado (ou = ANY quando as tabelas grafam o nome de formas diferentes);
+    fora dele, ILIKE parcial.
+    """
+    if not cliente:
+        return f"{coluna_cliente} IS NOT NULL", []
+    grafias = clientes.grafias_cliente(cliente, obter_conexao or conectar_postgres)
+    if len(grafias) == 1:
+        return f"{coluna_cliente} = %s", grafias
+    if grafias:
+        return f"{coluna_cliente} = ANY(%s)", [grafias]
+    return f"{coluna_cliente} ILIKE %s", [f"%{cliente}%"]
 
 def detectar_tabela_e_campos(pergunta):
     """Detecta automaticamente qual tabela e campos pesquisar baseado na pergunta"""
@@ -497,11 +483,12 @@ def detectar_tabela_e_campos(pergunta):
     # Padrão: se não detectar nada específico, usa a tabela de custos
     return 'ia_custo_fornecedor', ['cliente', 'fornecedor', 'custo', 'mes_referencia', 'total']    
     
-def pesquisar_linhas(pergunta):
-    """Pesquisa específica para a tabela ia_linhas"""
+def pesquisar_linhas(pergunta, incluir_depuracao=None, intencao=None):
+    """Pesquisa específica para a tabela ia_linhas (uma única consulta para todas as seções)"""
+    intencao = _intencao_da_pesquisa(pergunta, intencao)
     conn = conectar_postgres()
     if not conn:
-        return "Não foi possível conectar ao banco de dados."
+        return resultado_pesquisa.erro("Não foi possível conectar ao banco de dados.")
     
     resultados = []
     tempo_inicio = time.time()
@@ -510,221 +497,175 @@ def pesquisar_linhas(pergunta):
         with conn.cursor() as cursor:
             # Evita queries demoradas
             try:
-                cursor.execute("SET statement_timeout TO '15000ms'")
+                consultas_preparadas.definir_statement_timeout(conn, cursor, 15000)
             except Exception:
                 pass
             
-            # Verificar se a tabela ia_linhas existe
-            cursor.execute("""
-                SELECT COUNT(*) 
-                FROM information_schema.tables 
-                WHERE table_name = 'ia_linhas'
-            """)
-            tabela_existe = cursor.fetchone()[0]
+            # Estrutura da tabela ia_linhas (registro de esquema em cache)
+            esquema = registro_esquema.obter_esquema(conn, 'ia_linhas')
             
-            if tabela_existe == 0:
+            if esquema is None:
                 resultados.append(f"\n--- ERRO: TABELA NÃO ENCONTRADA ---")
                 resultados.append(f"A tabela 'ia_linhas' não existe no banco de dados.")
                 resultados.append(f"Verifique se:")
                 resultados.append(f"- O banco de dados está correto")
                 resultados.append(f"- A tabela foi criada")
                 resultados.append(f"- O nome da tabela está correto")
-                return "\n".join(resultados)
-            
-            # Descobrir a estrutura real da tabela ia_linhas
-            cursor.execute("""
-                SELECT column_name, data_type 
-                FROM information_schema.columns 
-                WHERE table_name = 'ia_linhas'
-                ORDER BY ordinal_position
-            """)
-            colunas_tabela = cursor.fetchall()
-            
-            # Encontrar nomes reais das colunas
-            coluna_cliente = None
-            coluna_status_licenca = None
-            coluna_fornecedor = None
-            coluna_total_linhas = None
-            coluna_mes_referencia = None
-            tipo_mes_referencia = None
-            coluna_tipo_contrato = None
-            
-            for coluna, tipo in colunas_tabela:
-                coluna_lower = coluna.lower()
-                if 'cliente' in coluna_lower:
-                    coluna_cliente = coluna
-                elif 'status' in coluna_lower and 'licenca' in coluna_lower:
-                    coluna_status_licenca = coluna
-                elif 'fornecedor' in coluna_lower:
-                    coluna_fornecedor = coluna
-                elif 'total_linhas' in coluna_lower or ('total' in coluna_lower and 'linha' in coluna_lower):
-                    coluna_total_linhas = coluna
-                elif 'mes' in coluna_lower or 'referencia' in coluna_lower or 'data' in coluna_lower:
-                    coluna_mes_referencia = coluna
-                    tipo_mes_referencia = tipo
-                elif 'tipo' in coluna_lower and 'contrato' in coluna_lower:
-                    coluna_tipo_contrato = coluna
-            
-            # Extrair informações da pergunta
-            ano, mes_numero, mes_nome = extrair_mes_ano(pergunta)
-            cliente_extraido = extrair_cliente_pergunta(pergunta)
-            
-            # Extrair status da licença da pergunta
-            status_extraido = None
-            status_opcoes = ['ativa', 'bloqueada', 'cancelada']
-            pergunta_lower = pergunta.lower()
-            
-            for status in status_opcoes:
-                if status in pergunta_lower:
-                    status_extraido = status
-                    break
-            
+                return resultado_pesquisa.dados(resultados)
+            
+            # Nomes reais das colunas
+            coluna_cliente = esquema['cliente']
+            coluna_status_licenca = esquema['status_licenca']
+            coluna_fornecedor = esquema['fornecedor']
+            coluna_total_linhas = esquema['total_linhas']
+            coluna_mes_referencia = esquema['mes_referencia']
+            tipo_mes_referencia = esquema['tipo_mes_referencia']
+            coluna_tipo_contrato = esquema['tipo_contrato']
+            
+            # Informações da pergunta, extraídas uma vez pelo roteador
+            ano, mes_numero, mes_nome = intencao.ano, intencao.mes, intencao.mes_nome
+            cliente_extraido = intencao.cliente
+            status_extraido = intencao.status
+            marcadores = set(intencao.marcadores)
             
             # Configurar filtros
-            filtro_cliente = f"{coluna_cliente} ILIKE '%{cliente_extraido}%'" if cliente_extraido else f"{coluna_cliente} IS NOT NULL"
-            filtro_status = f"AND {coluna_status_licenca} ILIKE '%{status_extraido}%'" if status_extraido else ""
-            filtro_mes = construir_filtro_mes(coluna_mes_referencia, tipo_mes_referencia, ano, mes_numero) if (mes_numero and ano) else ""
+            filtro_cliente, params_cliente = construir_filtro_cliente(coluna_cliente, cliente_extraido)
+            filtro_status = f"AND {coluna_status_licenca} ILIKE %s" if status_extraido else ""
+            params_status = [f"%{status_extraido}%"] if status_extraido else []
+            filtro_mes, params_mes = construir_filtro_mes(coluna_mes_referencia, tipo_mes_referencia, ano, mes_numero)
             
             nome_cliente_filtro = cliente_extraido if cliente_extraido else "todos os clientes"
             
-            # CONSULTA 1: Dados brutos para análise
-            query_dados_brutos = f"""
-            SELECT 
-                {coluna_cliente} as cliente,
-                {coluna_fornecedor} as fornecedor,
-                {coluna_status_licenca} as status_licenca,
-                {coluna_mes_referencia} as mes_referencia,
-                {coluna_total_linhas} as total_linhas
-            FROM ia_linhas
-            WHERE {filtro_cliente}
-            {filtro_status}
-            {filtro_mes}
-            ORDER BY {coluna_total_linhas} DESC
-            LIMIT 20
+            # CONSULTA ÚNICA: todas as seções saem de uma só varredura da tabela filtrada
+            # (posição no ranking e SUM/MAX via funções de janela; a amostra só se habilitada)
+            campo_tipo_contrato = coluna_tipo_contrato if coluna_tipo_contrato else "NULL"
+            eh_atual = 'atualmente' in marcadores or 'atual' in marcadores
+            secao_por_contrato = bool(coluna_fornecedor and coluna_total_linhas)
+            
+            if not secao_por_contrato:
+                condicao_por_contrato = "FALSE"
+            elif eh_atual:
+                # Para "atualmente", usar o mês mais recente disponível
+                condicao_por_contrato = "mes_referencia = mes_mais_recente"
+            else:
+                condicao_por_contrato = "total_linhas > 0"
+            
+            campo_amostra = "NULL::json"
+            condicao_amostra = "FALSE"
+            if incluir_depuracao is None:
+                incluir_depuracao = SECOES_DEPURACAO
+            if incluir_depuracao:
+                campo_amostra = "CASE WHEN ROW_NUMBER() OVER () <= 5 THEN row_to_json(ia_linhas) END"
+                condicao_amostra = "amostra IS NOT NULL"
+            
+            query_consolidada = f"""
+            WITH filtrado AS (
+                SELECT 
+                    {coluna_cliente} as cliente,
+                    {coluna_fornecedor} as fornecedor,
+                    {coluna_status_licenca} as status_licenca,
+                    {coluna_mes_referencia} as mes_referencia,
+                    {coluna_total_linhas} as total_linhas,
+                    {campo_tipo_contrato} as tipo_contrato,
+                    ROW_NUMBER() OVER (ORDER BY {coluna_total_linhas} DESC) as posicao,
+                    SUM({coluna_total_linhas}) OVER () as total_geral,
+                    MAX({coluna_mes_referencia}) OVER () as mes_mais_recente,
+                    {campo_amostra} as amostra
+                FROM ia_linhas
+                WHERE {filtro_cliente}
+                {filtro_status}
+                {filtro_mes}
+            )
+            SELECT *
+            FROM filtrado
+            WHERE posicao <= 20
+            OR {condicao_por_contrato}
+            OR {condicao_amostra}
+            ORDER BY posicao
             """
             
-            resultado_bruto = executar_query_direta(conn, query_dados_brutos)
-            if resultado_bruto is not None and not resultado_bruto.empty:
-                resultados.append(f"\n--- DADOS BRUTOS - CLIENTE {nome_cliente_filtro.upper()} ---")
-                resultados.append(resultado_bruto.to_string(index=False))
+            resultado = executar_query_direta(conn, query_consolidada, params_cliente + params_status + params_mes)
+            
+            def filtro_por_contrato(registro):
+                """Recorte da seção 3.1 (mesma condição de condicao_por_contrato na consulta)"""
+                if eh_atual:
+                    return registro['mes_referencia'] is not None and registro['mes_referencia'] == registro['mes_mais_recente']
+                return registro['total_linhas'] is not None and registro['total_linhas'] > 0
+            
+            # Só o filtro de mês da pergunta garante um único mês de referência
+            mes_unico = bool(mes_numero and ano)
+            
+            def filtro_resposta_direta(registro):
+                """Seção 3.1 restrita a um mês: o da pergunta ou, sem mês, o mais recente (não soma meses)"""
+                if not filtro_por_contrato(registro):
+                    return False
+                return mes_unico or (registro['mes_referencia'] is not None and registro['mes_referencia'] == registro['mes_mais_recente'])
+            
+            if resultado is not None and not resultado.empty and secao_por_contrato and not RESPOSTA_VIA_LLM:
+                # Resposta direta: linhas por fornecedor e tipo de contrato num único mês
+                # Soma por (fornecedor, tipo de contrato) na ordem em que aparecem; maiores totais primeiro
+                grupos = {}
+                for registro in resultado.registros():
+                    if filtro_resposta_direta(registro):
+                        chave = (registro['fornecedor'], registro['tipo_contrato'])
+                        grupos[chave] = grupos.get(chave, 0) + (registro['total_linhas'] or 0)
+                if grupos:
+                    grupos = sorted(grupos.items(), key=lambda item: item[1], reverse=True)
+                    return resultado_pesquisa.pronta(renderizador.renderizar_linhas_por_fornecedor(
+                        nome_cliente_filtro,
+                        [(fornecedor, tipo, total) for (fornecedor, tipo), total in grupos],
+                        status=status_extraido,
+                        mes_nome=mes_nome if mes_unico else None,
+                        ano=ano,
+                        atual=eh_atual or not mes_unico,
+                    ))
+            if resultado is not None and not resultado.empty:
+                colunas_brutas = ['cliente', 'fornecedor', 'status_licenca', 'mes_referencia', 'total_linhas']
                 
-                # Calcular total manualmente
-                if coluna_total_linhas in resultado_bruto.columns:
-                    total_calculado = resultado_bruto[coluna_total_linhas].sum()
-                    resultados.append(f"\n--- TOTAL CALCULADO: {formatar_inteiro_ptbr(total_calculado)} linhas ---")
-            
-            # CONSULTA 2: Total por fornecedor (sem SUM, assumindo que já é total)
-            # Incluir tipo_contrato se a coluna existir
-            campos_select_fornecedor = f"""
-                {coluna_cliente} as cliente,
-                {coluna_fornecedor} as fornecedor,
-                {coluna_status_licenca} as status_licenca,
-                {coluna_mes_referencia} as mes_referencia,
-                {coluna_total_linhas} as total_linhas"""
-            
-            if coluna_tipo_contrato:
-                campos_select_fornecedor += f",\n                {coluna_tipo_contrato} as tipo_contrato"
-            
-            query_por_fornecedor = f"""
-            SELECT 
-                {campos_select_fornecedor}
-            FROM ia_linhas
-            WHERE {filtro_cliente}
-            {filtro_status}
-            {filtro_mes}
-            ORDER BY {coluna_total_linhas} DESC
-            LIMIT 10
-            """
-            
-            resultado_fornecedor = executar_query_direta(conn, query_por_fornecedor)
-            if resultado_fornecedor is not None and not resultado_fornecedor.empty:
-                titulo = f"\n--- LINHAS POR FORNECEDOR - CLIENTE {nome_cliente_filtro.upper()} ---"
-                if status_extraido:
-                    titulo += f" STATUS {status_extraido.upper()}"
-                if mes_nome and ano:
-                    titulo += f" MÊS {mes_nome} {ano}"
+                # SEÇÃO 1: Dados brutos para análise (top 20)
+                resultado_bruto = resultado.recorte(colunas_brutas, onde=lambda registro: registro['posicao'] <= 20)
+                if not resultado_bruto.empty:
+                    resultados.append(f"\n--- DADOS BRUTOS - CLIENTE {nome_cliente_filtro.upper()} ---")
+                    resultados.append(resultado_pesquisa.tabela(resultado_bruto))
+                    
+                    # Calcular total manualmente
+                    if coluna_total_linhas in resultado_bruto.colunas:
+                        total_calculado = resultado_bruto.soma(coluna_total_linhas)
+                        resultados.append(f"\n--- TOTAL CALCULADO: {formatar_inteiro_ptbr(total_calculado)} linhas ---")
                 
-                resultados.append(titulo)
-                resultados.append(resultado_fornecedor.to_string(index=False))
-            
-            # CONSULTA 3: Tentar SUM apenas para verificar
-            query_soma = f"""
-            SELECT 
-                SUM({coluna_total_linhas}) as total_geral
-            FROM ia_linhas
-            WHERE {filtro_cliente}
-            {filtro_status}
-            {filtro_mes}
-            """
-            
-            resultado_soma = executar_query_direta(conn, query_soma)
-            if resultado_soma is not None and not resultado_soma.empty:
-                total_geral = resultado_soma.iloc[0]['total_geral']
+                # SEÇÃO 2: Linhas por fornecedor (top 10, com tipo_contrato se a coluna existir)
+                colunas_fornecedor = colunas_brutas + (['tipo_contrato'] if coluna_tipo_contrato else [])
+                resultado_fornecedor = resultado.recorte(colunas_fornecedor, onde=lambda registro: registro['posicao'] <= 10)
+                if not resultado_fornecedor.empty:
+                    titulo = f"\n--- LINHAS POR FORNECEDOR - CLIENTE {nome_cliente_filtro.upper()} ---"
+                    if status_extraido:
+                        titulo += f" STATUS {status_extraido.upper()}"
+                    if mes_nome and ano:
+                        titulo += f" MÊS {mes_nome} {ano}"
+                    
+                    resultados.append(titulo)
+                    resultados.append(resultado_pesquisa.tabela(resultado_fornecedor))
+                
+                # SEÇÃO 3: Total geral (SUM sobre todas as linhas filtradas, via janela)
+                total_geral = resultado.valor('total_geral')
                 if total_geral is not None:
                     resultados.append(f"\n--- TOTAL GERAL (USANDO SUM): {formatar_inteiro_ptbr(total_geral)} linhas ---")
-            
-            
-            # CONSULTA 3.1: Total de linhas por fornecedor (dados diretos da tabela)
-            if coluna_fornecedor and coluna_total_linhas:
-                # Usar filtros dinâmicos baseados na pergunta
-                if 'atualmente' in pergunta_lower or 'atual' in pergunta_lower:
-                    # Para "atualmente", usar o mês mais recente disponível
-                    query_linhas_por_fornecedor = f"""
-                    SELECT 
-                        {coluna_fornecedor} AS fornecedor,
-                        {coluna_total_linhas} AS total_linhas,
-                        {coluna_tipo_contrato} AS tipo_contrato
-                    FROM ia_linhas
-                    WHERE {coluna_cliente} = 'Safra'
-                    AND {coluna_status_licenca} = 'ATIVA'
-                    AND {coluna_mes_referencia} = (
-                        SELECT MAX({coluna_mes_referencia}) 
-                        FROM ia_linhas 
-                        WHERE {coluna_cliente} = 'Safra' 
-                        AND {coluna_status_licenca} = 'ATIVA'
-                    )
-                    ORDER BY {coluna_total_linhas} DESC
-                    """
-                else:
-                    # Para mês específico, usar os filtros extraídos
-                    query_linhas_por_fornecedor = f"""
-                    SELECT 
-                        {coluna_fornecedor} AS fornecedor,
-                        {coluna_total_linhas} AS total_linhas,
-                        {coluna_tipo_contrato} AS tipo_contrato
-                    FROM ia_linhas
-                    WHERE {filtro_cliente}
-                    {filtro_status}
-                    {filtro_mes}
-                    AND {coluna_total_linhas} > 0
-                    ORDER BY {coluna_total_linhas} DESC
-                    """
                 
-                resultado_linhas = executar_query_direta(conn, query_linhas_por_fornecedor)
-                if resultado_linhas is not None and not resultado_linhas.empty:
-                    titulo_agregado = "\n--- LINHAS POR FORNECEDOR E TIPO DE CONTRATO ---"
-                    resultados.append(titulo_agregado)
-                    
-                    # Mostrar dados diretos da tabela
-                    resultados.append(resultado_linhas.to_string(index=False))
-            
-            # CONSULTA 4: Ver estrutura dos dados
-            query_amostra = f"""
-            SELECT *
-            FROM ia_linhas
-            WHERE {filtro_cliente}
-            {filtro_status}
-            {filtro_mes}
-            LIMIT 5
-            """
-            
-            resultado_amostra = executar_query_direta(conn, query_amostra)
-            if resultado_amostra is not None and not resultado_amostra.empty:
-                resultados.append(f"\n--- AMOSTRA DOS DADOS (PRIMEIRAS 5 LINHAS) ---")
-                resultados.append(resultado_amostra.to_string(index=False))
+                # SEÇÃO 3.1: Total de linhas por fornecedor e tipo de contrato
+                if secao_por_contrato:
+                    resultado_linhas = resultado.recorte(['fornecedor', 'total_linhas', 'tipo_contrato'], onde=filtro_por_contrato)
+                    if not resultado_linhas.empty:
+                        resultados.append("\n--- LINHAS POR FORNECEDOR E TIPO DE CONTRATO ---")
+                        resultados.append(resultado_pesquisa.tabela(resultado_linhas))
+                
+                # SEÇÃO 4: Amostra da estrutura dos dados (depuração)
+                amostras = [registro for registro in resultado.coluna('amostra') if registro is not None]
+                if amostras:
+                    resultados.append(f"\n--- AMOSTRA DOS DADOS (PRIMEIRAS 5 LINHAS) ---")
+                    resultados.append(resultado_pesquisa.tabela(ResultadoConsulta.de_registros(amostras)))
                     
     except Exception as e:
-        return f"Erro durante a pesquisa: {e}"
+        return resultado_pesquisa.erro(f"Erro durante a pesquisa: {e}")
     finally:
         conn.close()
     
@@ -732,10 +673,11 @@ def pesquisar_linhas(pergunta):
     resultados.append(f"\n--- TEMPO DE EXECUÇÃO: {tempo_total:.2f} segundos ---")
     
     if len(resultados) <= 5:  # Apenas headers e tempo
-        return "Nenhum resultado encontrado na tabela ia_linhas para a pesquisa."
+        return resultado_pesquisa.dados(["Nenhum resultado encontrado na tabela ia_linhas para a pesquisa."])
     
-    return "\n".join(resultados)
+    return resultado_pesquisa.dados(resultados)
 
+@metricas.cronometrar('entidades')
 def extrair_quantidade_meses(pergunta):
     """Extrai a quantidade de meses mencionada na pergunta"""
     import re
@@ -772,12 +714,21 @@ def extrair_quantidade_meses(pergunta):
     
     return None
 
-def pesquisar_custos_usuarios(pergunta):
+def periodo_ultimos_meses(quantidade_meses, hoje=None):
+    """(data_inicio, data_fim) dos últimos X meses: do primeiro dia do mês de X meses atrás
+    até o primeiro dia do mês atual (exclusivo)"""
+    from datetime import datetime
+    hoje = hoje or datetime.now()
+    ano_inicio, indice_mes = divmod(hoje.year * 12 + hoje.month - 1 - quantidade_meses, 12)
+    return datetime(ano_inicio, indice_mes + 1, 1), datetime(hoje.year, hoje.month, 1)
+
+def pesquisar_custos_usuarios(pergunta, intencao=None):
     """Pesquisa específica para a tabela ia_custo_usuarios_linhas"""
+    intencao = _intencao_da_pesquisa(pergunta, intencao)
     try:
         conn = conectar_postgres()
         if not conn:
-            return "Não foi possível conectar ao banco de dados."
+            return resultado_pesquisa.erro("Não foi possível conectar ao banco de dados.")
         
         resultados = []
         tempo_inicio = time.time()
@@ -785,62 +736,34 @@ def pesquisar_custos_usuarios(pergunta):
         with conn.cursor() as cursor:
             # Evita queries demoradas
             try:
-                cursor.execute("SET statement_timeout TO '15000ms'")
+                consultas_preparadas.definir_statement_timeout(conn, cursor, 15000)
             except Exception:
                 pass
             
-            # Verificar se a tabela ia_custo_usuarios_linhas existe
-            cursor.execute("""
-                SELECT COUNT(*) 
-                FROM information_schema.tables 
-                WHERE table_name = 'ia_custo_usuarios_linhas'
-            """)
-            tabela_existe = cursor.fetchone()[0]
+            # Estrutura da tabela ia_custo_usuarios_linhas (registro de esquema em cache)
+            esquema = registro_esquema.obter_esquema(conn, 'ia_custo_usuarios_linhas')
             
-            if tabela_existe == 0:
+            if esquema is None:
                 resultados.append(f"\n--- ERRO: TABELA NÃO ENCONTRADA ---")
                 resultados.append(f"A tabela 'ia_custo_usuarios_linhas' não existe no banco de dados.")
                 resultados.append(f"Verifique se:")
                 resultados.append(f"- O banco de dados está correto")
                 resultados.append(f"- A tabela foi criada")
                 resultados.append(f"- O nome da tabela está correto")
-                return "\n".join(resultados)
-            
-            # Descobrir a estrutura real da tabela ia_custo_usuarios_linhas
-            cursor.execute("""
-                SELECT column_name, data_type 
-                FROM information_schema.columns 
-                WHERE table_name = 'ia_custo_usuarios_linhas'
-                ORDER BY ordinal_position
-            """)
-            colunas_tabela = cursor.fetchall()
-        
-        # Encontrar nomes reais das colunas
-        coluna_cliente = None
-        coluna_nome_usuario = None
-        coluna_operadora = None
-        coluna_total = None
-        coluna_mes_referencia = None
-        tipo_mes_referencia = None
+                return resultado_pesquisa.dados(resultados)
         
-        for coluna, tipo in colunas_tabela:
-            coluna_lower = coluna.lower()
-            if 'cliente' in coluna_lower:
-                coluna_cliente = coluna
-            elif 'nome_usuario' in coluna_lower or 'usuario' in coluna_lower:
-                coluna_nome_usuario = coluna
-            elif 'operadora' in coluna_lower:
-                coluna_operadora = coluna
-            elif 'total' in coluna_lower or 'custo' in coluna_lower or 'valor' in coluna_lower:
-                coluna_total = coluna
-            elif 'mes' in coluna_lower or 'referencia' in coluna_lower or 'data' in coluna_lower:
-                coluna_mes_referencia = coluna
-                tipo_mes_referencia = tipo
+        # Nomes reais das colunas
+        coluna_cliente = esquema['cliente']
+        coluna_nome_usuario = esquema['nome_usuario']
+        coluna_operadora = esquema['operadora']
+        coluna_total = esquema['total']
+        coluna_mes_referencia = esquema['mes_referencia']
+        tipo_mes_referencia = esquema['tipo_mes_referencia']
         
-        # Extrair informações da pergunta
-        ano, mes_numero, mes_nome = extrair_mes_ano(pergunta)
-        cliente_extraido = extrair_cliente_pergunta(pergunta)
-        pergunta_lower = pergunta.lower()
+        # Informações da pergunta, extraídas uma vez pelo roteador
+        ano, mes_numero, mes_nome = intencao.ano, intencao.mes, intencao.mes_nome
+        cliente_extraido = intencao.cliente
+        marcadores = set(intencao.marcadores)
         
         # DEBUG: Mostrar o que foi extraído
         resultados.append(f"\n--- INFORMAÇÕES EXTRAÍDAS DA PERGUNTA ---")
@@ -849,14 +772,12 @@ def pesquisar_custos_usuarios(pergunta):
         resultados.append(f"Mês extraído: {mes_nome} ({mes_numero})")
         resultados.append(f"Cliente extraído: {cliente_extraido}")
         
-        # Configurar filtros - capitalizar primeira letra do cliente
-        cliente_capitalizado = cliente_extraido.capitalize() if cliente_extraido else None
-        filtro_cliente = f"{coluna_cliente} = '{cliente_capitalizado}'" if cliente_capitalizado else f"{coluna_cliente} IS NOT NULL"
-        nome_cliente_filtro = cliente_capitalizado if cliente_capitalizado else "todos os clientes"
+        # Configurar filtros
+        filtro_cliente, params_cliente = construir_filtro_cliente(coluna_cliente, cliente_extraido)
+        nome_cliente_filtro = cliente_extraido if cliente_extraido else "todos os clientes"
         
         # DEBUG: Mostrar filtros aplicados
-        resultados.append(f"Cliente capitalizado: {cliente_capitalizado}")
-        resultados.append(f"Filtro cliente: {filtro_cliente}")
+        resultados.append(f"Filtro cliente: {filtro_cliente} {params_cliente}")
         resultados.append(f"Coluna mes_referencia: {coluna_mes_referencia}")
         resultados.append(f"Tipo mes_referencia: {tipo_mes_referencia}")
         resultados.append(f"Coluna cliente: {coluna_cliente}")
@@ -864,65 +785,70 @@ def pesquisar_custos_usuarios(pergunta):
         resultados.append(f"Coluna total: {coluna_total}")
         
         # Detectar tipo de pergunta
-        if 'atualmente' in pergunta_lower or 'mês atual' in pergunta_lower or 'mês vigente' in pergunta_lower:
+        if 'atualmente' in marcadores or 'mês atual' in marcadores or 'mês vigente' in marcadores:
             # Pergunta 1: Maior custo no mês atual
             from datetime import datetime
             hoje = datetime.now()
             ano_atual = str(hoje.year)
             mes_atual = str(hoje.month).zfill(2)
-            filtro_mes = construir_filtro_mes(coluna_mes_referencia, tipo_mes_referencia, ano_atual, mes_atual)
+            filtro_mes, params_mes = construir_filtro_mes(coluna_mes_referencia, tipo_mes_referencia, ano_atual, mes_atual)
+            
+            # Ranking por cliente/mês pré-calculado na visão materializada quando disponível
+            fonte_ranking = visoes_materializadas.fonte(conn, 'ia_mv_custo_usuarios_ranking', limite=1)
             
             query_maior_custo_atual = f"""
             SELECT 
                 {coluna_nome_usuario} as nome_usuario,
                 {coluna_total} as total,
                 {coluna_mes_referencia} as mes_referencia
-            FROM ia_custo_usuarios_linhas
+            FROM {fonte_ranking.tabela}
             WHERE {filtro_cliente}
             {filtro_mes}
             ORDER BY {coluna_total} DESC
             LIMIT 1
             """
             
-            resultado_atual = executar_query_direta(conn, query_maior_custo_atual)
+            resultado_atual = executar_query_direta(conn, query_maior_custo_atual, params_cliente + params_mes)
             if resultado_atual is not None and not resultado_atual.empty:
-                usuario = resultado_atual.iloc[0]['nome_usuario']
-                total = resultado_atual.iloc[0]['total']
-                mes_ref = resultado_atual.iloc[0]['mes_referencia']
+                usuario = resultado_atual.valor('nome_usuario')
+                total = resultado_atual.valor('total')
+                mes_ref = resultado_atual.valor('mes_referencia')
                 
                 # Formatar resposta
                 total_formatado = formatar_moeda(total)
                 mes_formatado = f"{mes_atual}/{ano_atual}"
-                return f"O Usuário {usuario} possui o custo no valor de {total_formatado} no mês atual ({mes_formatado})."
+                return resultado_pesquisa.pronta(f"O Usuário {usuario} possui o custo no valor de {total_formatado} no mês atual ({mes_formatado}).")
             else:
-                return f"Não foram encontrados dados de custos para o Cliente {nome_cliente_filtro} no mês atual."
+                return resultado_pesquisa.pronta(f"Não foram encontrados dados de custos para o Cliente {nome_cliente_filtro} no mês atual.")
         
         elif mes_numero and ano:
             # Pergunta 2: Maior custo em mês específico
-            filtro_mes = construir_filtro_mes(coluna_mes_referencia, tipo_mes_referencia, ano, mes_numero)
-            resultados.append(f"Filtro mês aplicado: {filtro_mes}")
+            filtro_mes, params_mes = construir_filtro_mes(coluna_mes_referencia, tipo_mes_referencia, ano, mes_numero)
+            resultados.append(f"Filtro mês aplicado: {filtro_mes} {params_mes}")
+            
+            fonte_ranking = visoes_materializadas.fonte(conn, 'ia_mv_custo_usuarios_ranking', limite=1)
             
             query_maior_custo_mes = f"""
             SELECT 
                 {coluna_nome_usuario} as nome_usuario,
                 {coluna_total} as total,
                 {coluna_mes_referencia} as mes_referencia
-            FROM ia_custo_usuarios_linhas
+            FROM {fonte_ranking.tabela}
             WHERE {filtro_cliente}
             {filtro_mes}
             ORDER BY {coluna_total} DESC
             LIMIT 1
             """
             
-            resultado_mes = executar_query_direta(conn, query_maior_custo_mes)
+            resultado_mes = executar_query_direta(conn, query_maior_custo_mes, params_cliente + params_mes)
             if resultado_mes is not None and not resultado_mes.empty:
-                usuario = resultado_mes.iloc[0]['nome_usuario']
-                total = resultado_mes.iloc[0]['total']
+                usuario = resultado_mes.valor('nome_usuario')
+                total = resultado_mes.valor('total')
                 
                 # Formatar resposta
                 total_formatado = formatar_moeda(total)
                 mes_formatado = f"{mes_numero}/{ano}"
-                return f"O Usuário {usuario} teve o custo no valor de {total_formatado} no mês {mes_formatado}."
+                return resultado_pesquisa.pronta(f"O Usuário {usuario} teve o custo no valor de {total_formatado} no mês {mes_formatado}.")
             else:
                 # DEBUG: Verificar se existem dados para o cliente em qualquer mês
                 query_verificar_dados = f"""
@@ -933,10 +859,10 @@ def pesquisar_custos_usuarios(pergunta):
                 LIMIT 10
                 """
                 
-                resultado_verificar = executar_query_direta(conn, query_verificar_dados)
+                resultado_verificar = executar_query_direta(conn, query_verificar_dados, params_cliente)
                 if resultado_verificar is not None and not resultado_verificar.empty:
                     resultados.append(f"\n--- DATAS DISPONÍVEIS PARA {nome_cliente_filtro.upper()} ---")
-                    resultados.append(resultado_verificar.to_string(index=False))
+                    resultados.append(resultado_pesquisa.tabela(resultado_verificar))
                 
                 # Verificar se o cliente existe na tabela
                 query_verificar_cliente = f"""
@@ -945,9 +871,9 @@ def pesquisar_custos_usuarios(pergunta):
                 WHERE {filtro_cliente}
                 """
                 
-                resultado_cliente = executar_query_direta(conn, query_verificar_cliente)
+                resultado_cliente = executar_query_direta(conn, query_verificar_cliente, params_cliente)
                 if resultado_cliente is not None and not resultado_cliente.empty:
-                    total_registros = resultado_cliente.iloc[0]['total_registros'] or 0
+                    total_registros = resultado_cliente.valor('total_registros') or 0
                     resultados.append(f"\n--- TOTAL DE REGISTROS PARA {nome_cliente_filtro.upper()} (TODOS OS MESES) ---")
                     resultados.append(f"Total: {formatar_inteiro_ptbr(total_registros)} registros")
                 
@@ -959,60 +885,51 @@ def pesquisar_custos_usuarios(pergunta):
                 LIMIT 5
                 """
                 
-                resultado_amostra = executar_query_direta(conn, query_amostra)
+                resultado_amostra = executar_query_direta(conn, query_amostra, params_cliente)
                 if resultado_amostra is not None and not resultado_amostra.empty:
                     resultados.append(f"\n--- AMOSTRA DOS DADOS PARA {nome_cliente_filtro.upper()} ---")
-                    resultados.append(resultado_amostra.to_string(index=False))
+                    resultados.append(resultado_pesquisa.tabela(resultado_amostra))
                 
                 # Se não há dados de debug, retornar mensagem simples
                 if len(resultados) <= 2:  # Apenas headers de debug
-                    return f"Não foram encontrados dados de custos para o Cliente {nome_cliente_filtro} no mês {mes_nome} de {ano}."
+                    return resultado_pesquisa.pronta(f"Não foram encontrados dados de custos para o Cliente {nome_cliente_filtro} no mês {mes_nome} de {ano}.")
                 else:
                     # Retornar dados de debug para análise
-                    return "\n".join(resultados)
+                    return resultado_pesquisa.dados(resultados)
         
-        elif 'último' in pergunta_lower and ('mês' in pergunta_lower or 'mes' in pergunta_lower or 'meses' in pergunta_lower):
+        elif 'último' in marcadores and ('mês' in marcadores or 'mes' in marcadores or 'meses' in marcadores):
             # Pergunta 3: Maiores custos nos últimos X meses
-            quantidade_meses = extrair_quantidade_meses(pergunta)
+            quantidade_meses = intencao.quantidade_meses
             
             # Se não conseguiu extrair quantidade, usar 3 como padrão (compatibilidade)
             if quantidade_meses is None:
                 quantidade_meses = 3
             
-            from datetime import datetime, timedelta
-            hoje = datetime.now()
-            
-            # Calcular data de início (X meses atrás do mês atual)
-            if hoje.month <= quantidade_meses:
-                ano_inicio = hoje.year - 1
-                mes_inicio = hoje.month + (12 - quantidade_meses)
-            else:
-                ano_inicio = hoje.year
-                mes_inicio = hoje.month - quantidade_meses
-            
-            # Data de início (primeiro dia do mês de X meses atrás)
-            data_inicio = datetime(ano_inicio, mes_inicio, 1)
+            # Do primeiro dia do mês de X meses atrás ao primeiro dia do mês atual (exclusivo)
+            data_inicio, data_fim = periodo_ultimos_meses(quantidade_meses)
             
-            # Data fim (primeiro dia do mês atual)
-            data_fim = datetime(hoje.year, hoje.month, 1)
+            fonte_ranking = visoes_materializadas.fonte(conn, 'ia_mv_custo_usuarios_ranking', limite=quantidade_meses)
             
             query_meses = f"""
             SELECT 
                 {coluna_nome_usuario} as nome_usuario,
                 {coluna_total} as total,
                 {coluna_mes_referencia} as mes_referencia
-            FROM ia_custo_usuarios_linhas
+            FROM {fonte_ranking.tabela}
             WHERE {filtro_cliente}
-            AND {coluna_mes_referencia} >= DATE '{data_inicio.strftime('%Y-%m-%d')}'
-            AND {coluna_mes_referencia} < DATE '{data_fim.strftime('%Y-%m-%d')}'
+            AND {coluna_mes_referencia} >= %s::date
+            AND {coluna_mes_referencia} < %s::date
             ORDER BY {coluna_total} DESC
-            LIMIT {quantidade_meses}
+            LIMIT %s
             """
             
-            resultado_meses = executar_query_direta(conn, query_meses)
+            resultado_meses = executar_query_direta(
+                conn, query_meses,
+                params_cliente + [data_inicio.date(), data_fim.date(), quantidade_meses]
+            )
             if resultado_meses is not None and not resultado_meses.empty:
                 usuarios_info = []
-                for _, row in resultado_meses.iterrows():
+                for row in resultado_meses.registros():
                     usuario = row['nome_usuario']
                     total = row['total']
                     mes_ref = row['mes_referencia']
@@ -1049,41 +966,43 @@ def pesquisar_custos_usuarios(pergunta):
                 
                 if usuarios_info:
                     if quantidade_meses == 1:
-                        return f"No último mês o usuário que teve o maior custo foi: {'; '.join(usuarios_info)}."
+                        return resultado_pesquisa.pronta(f"No último mês o usuário que teve o maior custo foi: {'; '.join(usuarios_info)}.")
                     else:
-                        return f"Nos últimos {quantidade_meses} meses os usuários que tiveram os maiores custos foram: {'; '.join(usuarios_info)}."
+                        return resultado_pesquisa.pronta(f"Nos últimos {quantidade_meses} meses os usuários que tiveram os maiores custos foram: {'; '.join(usuarios_info)}.")
                 else:
                     if quantidade_meses == 1:
-                        return f"Não foram encontrados dados de custos para o Cliente {nome_cliente_filtro} no último mês."
+                        return resultado_pesquisa.pronta(f"Não foram encontrados dados de custos para o Cliente {nome_cliente_filtro} no último mês.")
                     else:
-                        return f"Não foram encontrados dados de custos para o Cliente {nome_cliente_filtro} nos últimos {quantidade_meses} meses."
+                        return resultado_pesquisa.pronta(f"Não foram encontrados dados de custos para o Cliente {nome_cliente_filtro} nos últimos {quantidade_meses} meses.")
             else:
                 if quantidade_meses == 1:
-                    return f"Não foram encontrados dados de custos para o Cliente {nome_cliente_filtro} no último mês."
+                    return resultado_pesquisa.pronta(f"Não foram encontrados dados de custos para o Cliente {nome_cliente_filtro} no último mês.")
                 else:
-                    return f"Não foram encontrados dados de custos para o Cliente {nome_cliente_filtro} nos últimos {quantidade_meses} meses."
+                    return resultado_pesquisa.pronta(f"Não foram encontrados dados de custos para o Cliente {nome_cliente_filtro} nos últimos {quantidade_meses} meses.")
         
         # Se não conseguiu identificar o tipo de pergunta, retornar dados gerais
+        fonte_ranking = visoes_materializadas.fonte(conn, 'ia_mv_custo_usuarios_ranking', limite=10)
+        
         query_geral = f"""
         SELECT 
             {coluna_nome_usuario} as nome_usuario,
             {coluna_total} as total,
             {coluna_mes_referencia} as mes_referencia
-        FROM ia_custo_usuarios_linhas
+        FROM {fonte_ranking.tabela}
         WHERE {filtro_cliente}
         ORDER BY {coluna_total} DESC
         LIMIT 10
         """
         
-        resultado_geral = executar_query_direta(conn, query_geral)
+        resultado_geral = executar_query_direta(conn, query_geral, params_cliente)
         if resultado_geral is not None and not resultado_geral.empty:
             resultados.append(f"\n--- CUSTOS POR USUÁRIOS - CLIENTE {nome_cliente_filtro.upper()} ---")
-            resultados.append(resultado_geral.to_string(index=False))
+            resultados.append(resultado_pesquisa.tabela(resultado_geral))
         else:
-            return f"Não foram encontrados dados de custos por usuários para o Cliente {nome_cliente_filtro}."
+            return resultado_pesquisa.pronta(f"Não foram encontrados dados de custos por usuários para o Cliente {nome_cliente_filtro}.")
                     
     except Exception as e:
-        return f"Erro durante a pesquisa de custos por usuários: {e}"
+        return resultado_pesquisa.erro(f"Erro durante a pesquisa de custos por usuários: {e}")
     finally:
         if 'conn' in locals():
             conn.close()
@@ -1092,16 +1011,17 @@ def pesquisar_custos_usuarios(pergunta):
     resultados.append(f"\n--- TEMPO DE EXECUÇÃO: {tempo_total:.2f} segundos ---")
     
     if len(resultados) <= 1:  # Apenas tempo
-        return "Nenhum resultado encontrado na tabela ia_custo_usuarios_linhas para a pesquisa."
+        return resultado_pesquisa.dados(["Nenhum resultado encontrado na tabela ia_custo_usuarios_linhas para a pesquisa."])
     
-    return "\n".join(resultados)
+    return resultado_pesquisa.dados(resultados)
 
-def pesquisar_termos_linhas(pergunta):
+def pesquisar_termos_linhas(pergunta, intencao=None):
     """Pesquisa específica para a tabela ia_termos_numeros"""
+    intencao = _intencao_da_pesquisa(pergunta, intencao)
     try:
         conn = conectar_postgres()
         if not conn:
-            return "Não foi possível conectar ao banco de dados."
+            return resultado_pesquisa.erro("Não foi possível conectar ao banco de dados.")
         
         resultados = []
         tempo_inicio = time.time()
@@ -1109,113 +1029,78 @@ def pesquisar_termos_linhas(pergunta):
         with conn.cursor() as cursor:
             # Evita queries demoradas
             try:
-                cursor.execute("SET statement_timeout TO '15000ms'")
+                consultas_preparadas.definir_statement_timeout(conn, cursor, 15000)
             except Exception:
                 pass
             
-            # Verificar se a tabela ia_termos_numeros existe
-            cursor.execute("""
-                SELECT COUNT(*) 
-                FROM information_schema.tables 
-                WHERE table_name = 'ia_termos_numeros'
-            """)
-            tabela_existe = cursor.fetchone()[0]
+            # Estrutura da tabela ia_termos_numeros (registro de esquema em cache)
+            esquema = registro_esquema.obter_esquema(conn, 'ia_termos_numeros')
             
-            if tabela_existe == 0:
+            if esquema is None:
                 resultados.append(f"\n--- ERRO: TABELA NÃO ENCONTRADA ---")
                 resultados.append(f"A tabela 'ia_termos_numeros' não existe no banco de dados.")
                 resultados.append(f"Verifique se:")
                 resultados.append(f"- O banco de dados está correto")
                 resultados.append(f"- A tabela foi criada")
                 resultados.append(f"- O nome da tabela está correto")
-                return "\n".join(resultados)
-            
-            # Descobrir a estrutura real da tabela ia_termos_numeros
-            cursor.execute("""
-                SELECT column_name, data_type 
-                FROM information_schema.columns 
-                WHERE table_name = 'ia_termos_numeros'
-                ORDER BY ordinal_position
-            """)
-            colunas_tabela = cursor.fetchall()
+                return resultado_pesquisa.dados(resultados)
         
-        # Encontrar nomes reais das colunas
-        coluna_cliente = None
-        coluna_numero_linha = None
-        coluna_status_linha = None
-        coluna_conta_linha = None
-        coluna_tipo_numero = None
-        coluna_tipo_linha = None
-        coluna_possui_termo = None
-        coluna_status_termo = None
-        coluna_tipo_termo = None
-        coluna_nome_usuario = None
+        # Nomes reais das colunas
+        coluna_cliente = esquema['cliente']
+        coluna_numero_linha = esquema['numero_linha']
+        coluna_status_linha = esquema['status_linha']
+        coluna_conta_linha = esquema['conta_linha']
+        coluna_tipo_numero = esquema['tipo_numero']
+        coluna_tipo_linha = esquema['tipo_linha']
+        coluna_possui_termo = esquema['possui_termo']
+        coluna_status_termo = esquema['status_termo']
+        coluna_tipo_termo = esquema['tipo_termo']
+        coluna_nome_usuario = esquema['nome_usuario']
         
-        for coluna, tipo in colunas_tabela:
-            coluna_lower = coluna.lower()
-            if 'cliente' in coluna_lower:
-                coluna_cliente = coluna
-            elif 'numero_linha' in coluna_lower or 'numero' in coluna_lower:
-                coluna_numero_linha = coluna
-            elif 'status_linha' in coluna_lower:
-                coluna_status_linha = coluna
-            elif 'conta_linha' in coluna_lower:
-                coluna_conta_linha = coluna
-            elif 'tipo_numero' in coluna_lower:
-                coluna_tipo_numero = coluna
-            elif 'tipo_linha' in coluna_lower:
-                coluna_tipo_linha = coluna
-            elif 'possui_termo' in coluna_lower:
-                coluna_possui_termo = coluna
-            elif 'status_termo' in coluna_lower:
-                coluna_status_termo = coluna
-            elif 'tipo_termo' in coluna_lower:
-                coluna_tipo_termo = coluna
-            elif 'nome_usuario' in coluna_lower:
-                coluna_nome_usuario = coluna
+        # Contagens saem da visão materializada por cliente/tipo/status/termo quando disponível
+        fonte_termos = visoes_materializadas.fonte(conn, 'ia_mv_termos_tipo_status')
         
-        # Extrair informações da pergunta
-        cliente_extraido = extrair_cliente_pergunta(pergunta)
-        pergunta_lower = pergunta.lower()
+        # Informações da pergunta, extraídas uma vez pelo roteador
+        cliente_extraido = intencao.cliente
+        marcadores = set(intencao.marcadores)
         
-        # Configurar filtros - capitalizar primeira letra do cliente
-        cliente_capitalizado = cliente_extraido.capitalize() if cliente_extraido else None
-        filtro_cliente = f"{coluna_cliente} = '{cliente_capitalizado}'" if cliente_capitalizado else f"{coluna_cliente} IS NOT NULL"
-        nome_cliente_filtro = cliente_capitalizado if cliente_capitalizado else "todos os clientes"
+        # Configurar filtros
+        filtro_cliente, params_cliente = construir_filtro_cliente(coluna_cliente, cliente_extraido)
+        nome_cliente_filtro = cliente_extraido if cliente_extraido else "todos os clientes"
         
         # Detectar tipo de pergunta - PRIORIDADE para pergunta 3 (linhas ativas por tipo)
-        if ('linhas sem termos' in pergunta_lower and 'tipo de linha' in pergunta_lower and 'linhas ativas' in pergunta_lower) or ('estão ativas' in pergunta_lower and 'tipo' in pergunta_lower):
+        if ('linhas sem termos' in marcadores and 'tipo de linha' in marcadores and 'linhas ativas' in marcadores) or ('estão ativas' in marcadores and 'tipo' in marcadores):
             # Pergunta 3: Total de linhas sem termos ativas por tipo de linha
             # Primeiro, contar total de linhas sem termos
             query_total_sem_termo = f"""
-            SELECT COUNT(*) as total_sem_termo
-            FROM ia_termos_numeros
+            SELECT {fonte_termos.contagem} as total_sem_termo
+            FROM {fonte_termos.tabela}
             WHERE {filtro_cliente}
             AND ({coluna_possui_termo} = 'N' OR {coluna_possui_termo} = 'Não' OR {coluna_possui_termo} = 'NAO' OR {coluna_possui_termo} = 'NÃO' OR {coluna_possui_termo} IS NULL OR {coluna_possui_termo} = '')
             """
             
-            resultado_total = executar_query_direta(conn, query_total_sem_termo)
-            total_sem_termo = resultado_total.iloc[0]['total_sem_termo'] or 0 if resultado_total is not None and not resultado_total.empty else 0
+            resultado_total = executar_query_direta(conn, query_total_sem_termo, params_cliente)
+            total_sem_termo = resultado_total.valor('total_sem_termo') or 0 if resultado_total is not None and not resultado_total.empty else 0
             
             # Agora, contar linhas sem termos ativas por tipo
             query_ativas_por_tipo = f"""
             SELECT 
                 {coluna_tipo_linha} as tipo_linha,
                 {coluna_status_linha} as status_linha,
-                COUNT(*) as total_ativas
-            FROM ia_termos_numeros
+                {fonte_termos.contagem} as total_ativas
+            FROM {fonte_termos.tabela}
             WHERE {filtro_cliente}
             AND ({coluna_possui_termo} = 'N' OR {coluna_possui_termo} = 'Não' OR {coluna_possui_termo} = 'NAO' OR {coluna_possui_termo} = 'NÃO' OR {coluna_possui_termo} IS NULL OR {coluna_possui_termo} = '')
-            AND ({coluna_status_linha} ILIKE '%ATIVA%' OR {coluna_status_linha} ILIKE '%ATIVO%')
+            AND ({coluna_status_linha} ILIKE '%%ATIVA%%' OR {coluna_status_linha} ILIKE '%%ATIVO%%')
             GROUP BY {coluna_tipo_linha}, {coluna_status_linha}
             ORDER BY total_ativas DESC
             """
             
-            resultado_ativas = executar_query_direta(conn, query_ativas_por_tipo)
+            resultado_ativas = executar_query_direta(conn, query_ativas_por_tipo, params_cliente)
             if resultado_ativas is not None and not resultado_ativas.empty:
                 # Construir resposta detalhada - agrupar por tipo_linha
                 tipos_agrupados = {}
-                for _, row in resultado_ativas.iterrows():
+                for row in resultado_ativas.registros():
                     tipo_linha = row['tipo_linha'] if row['tipo_linha'] else 'N/A'
                     total_ativas = row['total_ativas']
                     
@@ -1229,56 +1114,56 @@ def pesquisar_termos_linhas(pergunta):
                     detalhes_ativas.append(f"{formatar_inteiro_ptbr(total)} linhas que estão Ativas são do tipo {tipo_linha}")
                 
                 resposta = f"O Cliente {nome_cliente_filtro} possui {formatar_inteiro_ptbr(total_sem_termo)} linhas sem termos e {', '.join(detalhes_ativas)}."
-                return resposta
+                return resultado_pesquisa.pronta(resposta)
             else:
-                return f"O Cliente {nome_cliente_filtro} possui {formatar_inteiro_ptbr(total_sem_termo)} linhas sem termos, mas nenhuma está ativa."
+                return resultado_pesquisa.pronta(f"O Cliente {nome_cliente_filtro} possui {formatar_inteiro_ptbr(total_sem_termo)} linhas sem termos, mas nenhuma está ativa.")
         
         # Detectar tipo de pergunta - PRIORIDADE para pergunta 2 (total por tipo)
-        elif ('total de linhas sem termos' in pergunta_lower and 'tipo de linha' in pergunta_lower) or ('me mostre o total por tipo' in pergunta_lower) or ('por tipo de linha' in pergunta_lower):
+        elif ('total de linhas sem termos' in marcadores and 'tipo de linha' in marcadores) or ('me mostre o total por tipo' in marcadores) or ('por tipo de linha' in marcadores):
             # Pergunta 2: Total por tipo de linha das linhas sem termos
             query_por_tipo_linha = f"""
             SELECT 
                 {coluna_tipo_linha} as tipo_linha,
-                COUNT(*) as total_sem_termo
-            FROM ia_termos_numeros
+                {fonte_termos.contagem} as total_sem_termo
+            FROM {fonte_termos.tabela}
             WHERE {filtro_cliente}
             AND ({coluna_possui_termo} = 'N' OR {coluna_possui_termo} = 'Não' OR {coluna_possui_termo} = 'NAO' OR {coluna_possui_termo} = 'NÃO' OR {coluna_possui_termo} IS NULL OR {coluna_possui_termo} = '')
             GROUP BY {coluna_tipo_linha}
             ORDER BY total_sem_termo DESC
             """
             
-            resultado_por_tipo = executar_query_direta(conn, query_por_tipo_linha)
+            resultado_por_tipo = executar_query_direta(conn, query_por_tipo_linha, params_cliente)
             if resultado_por_tipo is not None and not resultado_por_tipo.empty:
                 # Calcular total geral
-                total_geral = resultado_por_tipo['total_sem_termo'].sum()
+                total_geral = resultado_por_tipo.soma('total_sem_termo')
                 
                 # Construir resposta detalhada
                 detalhes_tipo = []
-                for _, row in resultado_por_tipo.iterrows():
+                for row in resultado_por_tipo.registros():
                     tipo_linha = row['tipo_linha'] if row['tipo_linha'] else 'N/A'
                     total_tipo = row['total_sem_termo']
                     detalhes_tipo.append(f"{formatar_inteiro_ptbr(total_tipo)} linhas são do tipo {tipo_linha}")
                 
                 resposta = f"O Cliente {nome_cliente_filtro} possui {formatar_inteiro_ptbr(total_geral)} linhas sem termos, sendo que {', '.join(detalhes_tipo)}."
-                return resposta
+                return resultado_pesquisa.pronta(resposta)
             else:
-                return f"O Cliente {nome_cliente_filtro} possui 0 linhas sem termos."
+                return resultado_pesquisa.pronta(f"O Cliente {nome_cliente_filtro} possui 0 linhas sem termos.")
         
-        elif 'não possuem termo' in pergunta_lower or 'nao possuem termo' in pergunta_lower or 'sem termo' in pergunta_lower:
+        elif 'não possuem termo' in marcadores or 'nao possuem termo' in marcadores or 'sem termo' in marcadores:
             # Pergunta 1: Quantas linhas não possuem termo
             query_linhas_sem_termo = f"""
-            SELECT COUNT(*) as total_sem_termo
-            FROM ia_termos_numeros
+            SELECT {fonte_termos.contagem} as total_sem_termo
+            FROM {fonte_termos.tabela}
             WHERE {filtro_cliente}
             AND ({coluna_possui_termo} = 'N' OR {coluna_possui_termo} = 'Não' OR {coluna_possui_termo} = 'NAO' OR {coluna_possui_termo} = 'NÃO' OR {coluna_possui_termo} IS NULL OR {coluna_possui_termo} = '')
             """
             
-            resultado_sem_termo = executar_query_direta(conn, query_linhas_sem_termo)
+            resultado_sem_termo = executar_query_direta(conn, query_linhas_sem_termo, params_cliente)
             if resultado_sem_termo is not None and not resultado_sem_termo.empty:
-                total_sem_termo = resultado_sem_termo.iloc[0]['total_sem_termo'] or 0
-                return f"O Cliente {nome_cliente_filtro} possui {formatar_inteiro_ptbr(total_sem_termo)} linhas sem termos."
+                total_sem_termo = resultado_sem_termo.valor('total_sem_termo') or 0
+                return resultado_pesquisa.pronta(f"O Cliente {nome_cliente_filtro} possui {formatar_inteiro_ptbr(total_sem_termo)} linhas sem termos.")
             else:
-                return f"O Cliente {nome_cliente_filtro} possui 0 linhas sem termos."
+                return resultado_pesquisa.pronta(f"O Cliente {nome_cliente_filtro} possui 0 linhas sem termos.")
         
         # Se não conseguiu identificar o tipo de pergunta, retornar dados gerais
         query_geral = f"""
@@ -1294,15 +1179,15 @@ def pesquisar_termos_linhas(pergunta):
         LIMIT 10
         """
         
-        resultado_geral = executar_query_direta(conn, query_geral)
+        resultado_geral = executar_query_direta(conn, query_geral, params_cliente)
         if resultado_geral is not None and not resultado_geral.empty:
             resultados.append(f"\n--- DADOS DE TERMOS - CLIENTE {nome_cliente_filtro.upper()} ---")
-            resultados.append(resultado_geral.to_string(index=False))
+            resultados.append(resultado_pesquisa.tabela(resultado_geral))
         else:
-            return f"Não foram encontrados dados de termos para o Cliente {nome_cliente_filtro}."
+            return resultado_pesquisa.dados([f"Não foram encontrados dados de termos para o Cliente {nome_cliente_filtro}."])
                     
     except Exception as e:
-        return f"Erro durante a pesquisa de termos: {e}"
+        return resultado_pesquisa.erro(f"Erro durante a pesquisa de termos: {e}")
     finally:
         if 'conn' in locals():
             conn.close()
@@ -1311,16 +1196,17 @@ def pesquisar_termos_linhas(pergunta):
     resultados.append(f"\n--- TEMPO DE EXECUÇÃO: {tempo_total:.2f} segundos ---")
     
     if len(resultados) <= 1:  # Apenas tempo
-        return "Nenhum resultado encontrado na tabela ia_termos_numeros para a pesquisa."
+        return resultado_pesquisa.dados(["Nenhum resultado encontrado na tabela ia_termos_numeros para a pesquisa."])
     
-    return "\n".join(resultados)
+    return resultado_pesquisa.dados(resultados)
 
-def pesquisar_linhas_ociosas(pergunta):
+def pesquisar_linhas_ociosas(pergunta, intencao=None):
     """Pesquisa específica para a tabela ia_linhas_ociosas"""
+    intencao = _intencao_da_pesquisa(pergunta, intencao)
     try:
         conn = conectar_postgres()
         if not conn:
-            return "Não foi possível conectar ao banco de dados."
+            return resultado_pesquisa.erro("Não foi possível conectar ao banco de dados.")
         
         resultados = []
         tempo_inicio = time.time()
@@ -1328,92 +1214,67 @@ def pesquisar_linhas_ociosas(pergunta):
         with conn.cursor() as cursor:
             # Evita queries demoradas
             try:
-                cursor.execute("SET statement_timeout TO '15000ms'")
+                consultas_preparadas.definir_statement_timeout(conn, cursor, 15000)
             except Exception:
                 pass
             
-            # Verificar se a tabela ia_linhas_ociosas existe
-            cursor.execute("""
-                SELECT COUNT(*) 
-                FROM information_schema.tables 
-                WHERE table_name = 'ia_linhas_ociosas'
-            """)
-            tabela_existe = cursor.fetchone()[0]
+            # Estrutura da tabela ia_linhas_ociosas (registro de esquema em cache)
+            esquema = registro_esquema.obter_esquema(conn, 'ia_linhas_ociosas')
             
-            if tabela_existe == 0:
+            if esquema is None:
                 resultados.append(f"\n--- ERRO: TABELA NÃO ENCONTRADA ---")
                 resultados.append(f"A tabela 'ia_linhas_ociosas' não existe no banco de dados.")
                 resultados.append(f"Verifique se:")
                 resultados.append(f"- O banco de dados está correto")
                 resultados.append(f"- A tabela foi criada")
                 resultados.append(f"- O nome da tabela está correto")
-                return "\n".join(resultados)
-            
-            # Descobrir a estrutura real da tabela ia_linhas_ociosas
-            cursor.execute("""
-                SELECT column_name, data_type 
-                FROM information_schema.columns 
-                WHERE table_name = 'ia_linhas_ociosas'
-                ORDER BY ordinal_position
-            """)
-            colunas_tabela = cursor.fetchall()
+                return resultado_pesquisa.dados(resultados)
         
-        # Encontrar nomes reais das colunas
-        coluna_cliente = None
-        coluna_operadora = None
-        coluna_mes_referencia = None
-        coluna_quantidade = None
-        tipo_mes_referencia = None
+        # Nomes reais das colunas
+        coluna_cliente = esquema['cliente']
+        coluna_operadora = esquema['operadora']
+        coluna_mes_referencia = esquema['mes_referencia']
+        coluna_quantidade = esquema['quantidade']
+        tipo_mes_referencia = esquema['tipo_mes_referencia']
         
-        for coluna, tipo in colunas_tabela:
-            coluna_lower = coluna.lower()
-            if 'cliente' in coluna_lower:
-                coluna_cliente = coluna
-            elif 'operadora' in coluna_lower or 'fornecedor' in coluna_lower:
-                coluna_operadora = coluna
-            elif 'mes' in coluna_lower or 'referencia' in coluna_lower or 'data' in coluna_lower:
-                coluna_mes_referencia = coluna
-                tipo_mes_referencia = tipo
-            elif 'quantidade' in coluna_lower or 'total' in coluna_lower or 'qtd' in coluna_lower:
-                coluna_quantidade = coluna
+        # Contagens saem da visão materializada por cliente/mês/operadora quando disponível
+        fonte_ociosas = visoes_materializadas.fonte(conn, 'ia_mv_ociosas_mes_operadora')
         
-        # Extrair informações da pergunta
-        ano, mes_numero, mes_nome = extrair_mes_ano(pergunta)
-        cliente_extraido = extrair_cliente_pergunta(pergunta)
-        pergunta_lower = pergunta.lower()
+        # Informações da pergunta, extraídas uma vez pelo roteador
+        ano, mes_numero, mes_nome = intencao.ano, intencao.mes, intencao.mes_nome
+        cliente_extraido = intencao.cliente
+        marcadores = set(intencao.marcadores)
         
         # Configurar filtros
-        # Capitalizar a primeira letra do nome do cliente para corresponder ao banco
-        cliente_capitalizado = cliente_extraido.capitalize() if cliente_extraido else None
-        filtro_cliente = f"{coluna_cliente} = '{cliente_capitalizado}'" if cliente_capitalizado else f"{coluna_cliente} IS NOT NULL"
-        nome_cliente_filtro = cliente_capitalizado if cliente_capitalizado else "todos os clientes"
+        filtro_cliente, params_cliente = construir_filtro_cliente(coluna_cliente, cliente_extraido)
+        nome_cliente_filtro = cliente_extraido if cliente_extraido else "todos os clientes"
         
         # Detectar tipo de pergunta (prioridade para operadora)
-        if 'operadora' in pergunta_lower:
+        if 'operadora' in marcadores:
             # Pergunta 4: Por operadora (mês atual)
             from datetime import datetime
             hoje = datetime.now()
             ano_atual = str(hoje.year)
             mes_atual = str(hoje.month).zfill(2)
             # Usar a mesma lógica de filtro que funciona em pesquisar_linhas
-            filtro_mes = construir_filtro_mes(coluna_mes_referencia, tipo_mes_referencia, ano_atual, mes_atual)
+            filtro_mes, params_mes = construir_filtro_mes(coluna_mes_referencia, tipo_mes_referencia, ano_atual, mes_atual)
             
             query_por_operadora = f"""
             SELECT 
                 {coluna_operadora} as operadora,
-                COUNT(*) as total_ociosas
-            FROM ia_linhas_ociosas
+                {fonte_ociosas.contagem} as total_ociosas
+            FROM {fonte_ociosas.tabela}
             WHERE {filtro_cliente}
             {filtro_mes}
             GROUP BY {coluna_operadora}
             ORDER BY total_ociosas DESC
             """
             
-            resultado_operadoras = executar_query_direta(conn, query_por_operadora)
+            resultado_operadoras = executar_query_direta(conn, query_por_operadora, params_cliente + params_mes)
             if resultado_operadoras is not None and not resultado_operadoras.empty:
                 # Formatar resposta diretamente
                 respostas_operadoras = []
-                for _, row in resultado_operadoras.iterrows():
+                for row in resultado_operadoras.registros():
                     operadora = str(row['operadora']) if 'operadora' in row else 'N/A'
                     total = row['total_ociosas'] if 'total_ociosas' in row else 0
                     if total == 1:
@@ -1422,31 +1283,31 @@ def pesquisar_linhas_ociosas(pergunta):
                         respostas_operadoras.append(f"{total} linhas ociosas, Operadora {operadora}")
                 
                 if respostas_operadoras:
-                    return f"O Cliente {nome_cliente_filtro} possui atualmente {', '.join(respostas_operadoras)}."
+                    return resultado_pesquisa.pronta(f"O Cliente {nome_cliente_filtro} possui atualmente {', '.join(respostas_operadoras)}.")
                 else:
-                    return f"O Cliente {nome_cliente_filtro} não possui linhas ociosas atualmente."
+                    return resultado_pesquisa.pronta(f"O Cliente {nome_cliente_filtro} não possui linhas ociosas atualmente.")
             else:
-                return f"O Cliente {nome_cliente_filtro} não possui linhas ociosas atualmente."
+                return resultado_pesquisa.pronta(f"O Cliente {nome_cliente_filtro} não possui linhas ociosas atualmente.")
         
-        elif 'atualmente' in pergunta_lower or 'mês atual' in pergunta_lower or 'mês vigente' in pergunta_lower:
+        elif 'atualmente' in marcadores or 'mês atual' in marcadores or 'mês vigente' in marcadores:
             # Pergunta 1: Mês atual
             from datetime import datetime
             hoje = datetime.now()
             ano_atual = str(hoje.year)
             mes_atual = str(hoje.month).zfill(2)
             # Usar a mesma lógica de filtro que funciona em pesquisar_linhas
-            filtro_mes = construir_filtro_mes(coluna_mes_referencia, tipo_mes_referencia, ano_atual, mes_atual)
+            filtro_mes, params_mes = construir_filtro_mes(coluna_mes_referencia, tipo_mes_referencia, ano_atual, mes_atual)
             
             query_total_atual = f"""
-            SELECT COUNT(*) as total_ociosas
-            FROM ia_linhas_ociosas
+            SELECT {fonte_ociosas.contagem} as total_ociosas
+            FROM {fonte_ociosas.tabela}
             WHERE {filtro_cliente}
             {filtro_mes}
             """
             
-            resultado_atual = executar_query_direta(conn, query_total_atual)
+            resultado_atual = executar_query_direta(conn, query_total_atual, params_cliente + params_mes)
             if resultado_atual is not None and not resultado_atual.empty:
-                total = resultado_atual.iloc[0]['total_ociosas'] or 0
+                total = resultado_atual.valor('total_ociosas') or 0
                 resultados.append(f"\n--- LINHAS OCIOSAS ATUAIS - CLIENTE {nome_cliente_filtro.upper()} ---")
                 resultados.append(f"Total de linhas ociosas em {mes_atual}/{ano_atual}: {formatar_inteiro_ptbr(total)}")
             else:
@@ -1456,93 +1317,80 @@ def pesquisar_linhas_ociosas(pergunta):
             # Verificar se existem dados para o cliente em qualquer mês
             query_verificar_dados = f"""
             SELECT DISTINCT {coluna_mes_referencia}
-            FROM ia_linhas_ociosas
+            FROM {fonte_ociosas.tabela}
             WHERE {filtro_cliente}
             ORDER BY {coluna_mes_referencia} DESC
             LIMIT 5
             """
             
-            resultado_verificar = executar_query_direta(conn, query_verificar_dados)
+            resultado_verificar = executar_query_direta(conn, query_verificar_dados, params_cliente)
             if resultado_verificar is not None and not resultado_verificar.empty:
                 resultados.append(f"\n--- DATAS DISPONÍVEIS PARA {nome_cliente_filtro.upper()} ---")
-                resultados.append(resultado_verificar.to_string(index=False))
+                resultados.append(resultado_pesquisa.tabela(resultado_verificar))
             else:
                 resultados.append(f"\n--- NENHUMA DATA ENCONTRADA PARA {nome_cliente_filtro.upper()} ---")
             
             # Verificar se o cliente existe na tabela
             query_verificar_cliente = f"""
-            SELECT COUNT(*) as total_registros
-            FROM ia_linhas_ociosas
+            SELECT {fonte_ociosas.contagem} as total_registros
+            FROM {fonte_ociosas.tabela}
             WHERE {filtro_cliente}
             """
             
-            resultado_cliente = executar_query_direta(conn, query_verificar_cliente)
+            resultado_cliente = executar_query_direta(conn, query_verificar_cliente, params_cliente)
             if resultado_cliente is not None and not resultado_cliente.empty:
-                total_registros = resultado_cliente.iloc[0]['total_registros'] or 0
+                total_registros = resultado_cliente.valor('total_registros') or 0
                 resultados.append(f"\n--- TOTAL DE REGISTROS PARA {nome_cliente_filtro.upper()} (TODOS OS MESES) ---")
                 resultados.append(f"Total: {formatar_inteiro_ptbr(total_registros)} registros")
         
         elif mes_numero and ano:
             # Pergunta 2: Mês específico
             # Usar a mesma lógica de filtro que funciona em pesquisar_linhas
-            filtro_mes = construir_filtro_mes(coluna_mes_referencia, tipo_mes_referencia, ano, mes_numero)
+            filtro_mes, params_mes = construir_filtro_mes(coluna_mes_referencia, tipo_mes_referencia, ano, mes_numero)
             
             query_mes_especifico = f"""
-            SELECT COUNT(*) as total_ociosas
-            FROM ia_linhas_ociosas
+            SELECT {fonte_ociosas.contagem} as total_ociosas
+            FROM {fonte_ociosas.tabela}
             WHERE {filtro_cliente}
             {filtro_mes}
             """
             
-            resultado_mes = executar_query_direta(conn, query_mes_especifico)
+            resultado_mes = executar_query_direta(conn, query_mes_especifico, params_cliente + params_mes)
             if resultado_mes is not None and not resultado_mes.empty:
-                total = resultado_mes.iloc[0]['total_ociosas'] or 0
+                total = resultado_mes.valor('total_ociosas') or 0
                 # Formatar resposta diretamente
                 if total == 1:
-                    return f"O Cliente {nome_cliente_filtro} possuiu em {mes_nome} de {ano} {total} linha ociosa."
+                    return resultado_pesquisa.pronta(f"O Cliente {nome_cliente_filtro} possuiu em {mes_nome} de {ano} {total} linha ociosa.")
                 else:
-                    return f"O Cliente {nome_cliente_filtro} possuiu em {mes_nome} de {ano} {total} linhas ociosas."
+                    return resultado_pesquisa.pronta(f"O Cliente {nome_cliente_filtro} possuiu em {mes_nome} de {ano} {total} linhas ociosas.")
             else:
-                return f"O Cliente {nome_cliente_filtro} possuiu em {mes_nome} de {ano} 0 linhas ociosas."
+                return resultado_pesquisa.pronta(f"O Cliente {nome_cliente_filtro} possuiu em {mes_nome} de {ano} 0 linhas ociosas.")
         
-        elif 'último' in pergunta_lower and ('mês' in pergunta_lower or 'mes' in pergunta_lower):
+        elif 'último' in marcadores and ('mês' in marcadores or 'mes' in marcadores):
             # Pergunta 3: Últimos X meses - Query simplificada com range de datas
-            quantidade_meses = extrair_quantidade_meses(pergunta)
+            quantidade_meses = intencao.quantidade_meses
             
             # Se não conseguiu extrair quantidade, usar 3 como padrão (compatibilidade)
             if quantidade_meses is None:
                 quantidade_meses = 3
             
-            from datetime import datetime, timedelta
-            hoje = datetime.now()
-            
-            # Calcular data de início (X meses atrás do mês atual)
-            if hoje.month <= quantidade_meses:
-                # Se estamos nos primeiros X meses do ano, pegar do ano anterior
-                ano_inicio = hoje.year - 1
-                mes_inicio = hoje.month + (12 - quantidade_meses)
-            else:
-                ano_inicio = hoje.year
-                mes_inicio = hoje.month - quantidade_meses
+            from datetime import timedelta
             
-            # Data de início (primeiro dia do mês de X meses atrás)
-            data_inicio = datetime(ano_inicio, mes_inicio, 1)
-            
-            # Data fim (primeiro dia do mês atual)
-            data_fim = datetime(hoje.year, hoje.month, 1)
+            # Do primeiro dia do mês de X meses atrás ao primeiro dia do mês atual (exclusivo)
+            data_inicio, data_fim = periodo_ultimos_meses(quantidade_meses)
             
             # Query simplificada com range de datas
             query_meses = f"""
-            SELECT COUNT(*) as total_ociosas
-            FROM ia_linhas_ociosas
+            SELECT {fonte_ociosas.contagem} as total_ociosas
+            FROM {fonte_ociosas.tabela}
             WHERE {filtro_cliente}
-            AND {coluna_mes_referencia} >= DATE '{data_inicio.strftime('%Y-%m-%d')}'
-            AND {coluna_mes_referencia} < DATE '{data_fim.strftime('%Y-%m-%d')}'
+            AND {coluna_mes_referencia} >= %s::date
+            AND {coluna_mes_referencia} < %s::date
             """
             
-            resultado_meses = executar_query_direta(conn, query_meses)
+            resultado_meses = executar_query_direta(conn, query_meses, params_cliente + [data_inicio.date(), data_fim.date()])
             if resultado_meses is not None and not resultado_meses.empty:
-                total_meses = resultado_meses.iloc[0]['total_ociosas'] or 0
+                total_meses = resultado_meses.valor('total_ociosas') or 0
                 if quantidade_meses == 1:
                     resultados.append(f"\n--- LINHAS OCIOSAS ÚLTIMO MÊS - CLIENTE {nome_cliente_filtro.upper()} ---")
                     resultados.append(f"Período: {data_inicio.strftime('%m/%Y')}")
@@ -1568,13 +1416,13 @@ def pesquisar_linhas_ociosas(pergunta):
         LIMIT 5
         """
         
-        resultado_amostra = executar_query_direta(conn, query_amostra)
+        resultado_amostra = executar_query_direta(conn, query_amostra, params_cliente)
         if resultado_amostra is not None and not resultado_amostra.empty:
             resultados.append(f"\n--- AMOSTRA DOS DADOS (PRIMEIRAS 5 LINHAS) ---")
-            resultados.append(resultado_amostra.to_string(index=False))
+            resultados.append(resultado_pesquisa.tabela(resultado_amostra))
                     
     except Exception as e:
-        return f"Erro durante a pesquisa de linhas ociosas: {e}"
+        return resultado_pesquisa.erro(f"Erro durante a pesquisa de linhas ociosas: {e}")
     finally:
         if 'conn' in locals():
             conn.close()
@@ -1583,36 +1431,38 @@ def pesquisar_linhas_ociosas(pergunta):
     resultados.append(f"\n--- TEMPO DE EXECUÇÃO: {tempo_total:.2f} segundos ---")
     
     if len(resultados) <= 5:  # Apenas headers e tempo
-        return "Nenhum resultado encontrado na tabela ia_linhas_ociosas para a pesquisa."
+        return resultado_pesquisa.dados(["Nenhum resultado encontrado na tabela ia_linhas_ociosas para a pesquisa."])
     
-    # Retornar resposta formatada diretamente para linhas ociosas
-    resultado_final = "\n".join(resultados)
+    # Retornar resposta formatada diretamente para linhas ociosas (a partir das linhas de texto;
+    # as tabelas não precisam ser renderizadas)
+    linhas_texto = [parte for parte in resultados if isinstance(parte, str)]
+    resultado_final = "\n".join(linhas_texto)
     
     # Extrair informações para resposta direta
-    if 'atualmente' in pergunta_lower or 'mês atual' in pergunta_lower or 'mês vigente' in pergunta_lower:
+    if 'atualmente' in marcadores or 'mês atual' in marcadores or 'mês vigente' in marcadores:
         # Resposta para mês atual
         if 'Total de linhas ociosas em' in resultado_final:
-            linha_resultado = [linha for linha in resultados if 'Total de linhas ociosas em' in linha][0]
+            linha_resultado = [linha for linha in linhas_texto if 'Total de linhas ociosas em' in linha][0]
             total = linha_resultado.split(': ')[1]
             # Adicionar "linha ociosa" ou "linhas ociosas" baseado no número
             if total == "1":
-                return f"O Cliente {nome_cliente_filtro} possui atualmente {total} linha ociosa."
+                return resultado_pesquisa.pronta(f"O Cliente {nome_cliente_filtro} possui atualmente {total} linha ociosa.")
             else:
-                return f"O Cliente {nome_cliente_filtro} possui atualmente {total} linhas ociosas."
+                return resultado_pesquisa.pronta(f"O Cliente {nome_cliente_filtro} possui atualmente {total} linhas ociosas.")
         else:
-            return f"O Cliente {nome_cliente_filtro} possui atualmente 0 linhas ociosas."
+            return resultado_pesquisa.pronta(f"O Cliente {nome_cliente_filtro} possui atualmente 0 linhas ociosas.")
     
     elif mes_numero and ano:
         # Resposta para mês específico
         if 'Total de linhas ociosas:' in resultado_final:
-            linha_resultado = [linha for linha in resultados if 'Total de linhas ociosas:' in linha][0]
-            return f"O Cliente {nome_cliente_filtro} possuiu em {mes_nome} de {ano} {linha_resultado.split(': ')[1]}."
+            linha_resultado = [linha for linha in linhas_texto if 'Total de linhas ociosas:' in linha][0]
+            return resultado_pesquisa.pronta(f"O Cliente {nome_cliente_filtro} possuiu em {mes_nome} de {ano} {linha_resultado.split(': ')[1]}.")
         else:
-            return f"O Cliente {nome_cliente_filtro} possuiu em {mes_nome} de {ano} 0 linhas ociosas."
+            return resultado_pesquisa.pronta(f"O Cliente {nome_cliente_filtro} possuiu em {mes_nome} de {ano} 0 linhas ociosas.")
     
-    elif 'último' in pergunta_lower and ('mês' in pergunta_lower or 'mes' in pergunta_lower):
+    elif 'último' in marcadores and ('mês' in marcadores or 'mes' in marcadores):
         # Resposta para últimos X meses
-        quantidade_meses = extrair_quantidade_meses(pergunta)
+        quantidade_meses = intencao.quantidade_meses
         
         # Se não conseguiu extrair quantidade, usar 3 como padrão (compatibilidade)
         if quantidade_meses is None:
@@ -1620,24 +1470,24 @@ def pesquisar_linhas_ociosas(pergunta):
         
         if quantidade_meses == 1:
             if 'TOTAL DO ÚLTIMO MÊS:' in resultado_final:
-                linha_total = [linha for linha in resultados if 'TOTAL DO ÚLTIMO MÊS:' in linha][0]
+                linha_total = [linha for linha in linhas_texto if 'TOTAL DO ÚLTIMO MÊS:' in linha][0]
                 total_mes = linha_total.split(': ')[1]
-                return f"O Cliente {nome_cliente_filtro} possuiu no último mês {total_mes}."
+                return resultado_pesquisa.pronta(f"O Cliente {nome_cliente_filtro} possuiu no último mês {total_mes}.")
             else:
-                return f"O Cliente {nome_cliente_filtro} possuiu no último mês 0 linhas ociosas."
+                return resultado_pesquisa.pronta(f"O Cliente {nome_cliente_filtro} possuiu no último mês 0 linhas ociosas.")
         else:
             if f'TOTAL DOS {quantidade_meses} MESES:' in resultado_final:
-                linha_total = [linha for linha in resultados if f'TOTAL DOS {quantidade_meses} MESES:' in linha][0]
+                linha_total = [linha for linha in linhas_texto if f'TOTAL DOS {quantidade_meses} MESES:' in linha][0]
                 total_meses = linha_total.split(': ')[1]
-                return f"O Cliente {nome_cliente_filtro} possuiu nos últimos {quantidade_meses} meses {total_meses}."
+                return resultado_pesquisa.pronta(f"O Cliente {nome_cliente_filtro} possuiu nos últimos {quantidade_meses} meses {total_meses}.")
             else:
-                return f"O Cliente {nome_cliente_filtro} possuiu nos últimos {quantidade_meses} meses 0 linhas ociosas."
+                return resultado_pesquisa.pronta(f"O Cliente {nome_cliente_filtro} possuiu nos últimos {quantidade_meses} meses 0 linhas ociosas.")
     
-    elif 'operadora' in pergunta_lower and ('atualmente' in pergunta_lower or 'atual' in pergunta_lower):
+    elif 'operadora' in marcadores and ('atualmente' in marcadores or 'atual' in marcadores):
         # Resposta para por operadora
         if 'LINHAS OCIOSAS POR OPERADORA' in resultado_final:
             operadoras = []
-            for linha in resultados:
+            for linha in linhas_texto:
                 if ':' in linha and 'linhas' in linha and 'LINHAS OCIOSAS POR OPERADORA' not in linha:
                     operadoras.append(linha)
             
@@ -1654,67 +1504,130 @@ def pesquisar_linhas_ociosas(pergunta):
                             respostas_operadoras.append(f"{total_limpo} linhas ociosas, Operadora {operadora}")
                 
                 if respostas_operadoras:
-                    return f"O Cliente {nome_cliente_filtro} possui atualmente {', '.join(respostas_operadoras)}."
+                    return resultado_pesquisa.pronta(f"O Cliente {nome_cliente_filtro} possui atualmente {', '.join(respostas_operadoras)}.")
                 else:
-                    return f"O Cliente {nome_cliente_filtro} não possui linhas ociosas atualmente."
+                    return resultado_pesquisa.pronta(f"O Cliente {nome_cliente_filtro} não possui linhas ociosas atualmente.")
             else:
-                return f"O Cliente {nome_cliente_filtro} não possui linhas ociosas atualmente."
+                return resultado_pesquisa.pronta(f"O Cliente {nome_cliente_filtro} não possui linhas ociosas atualmente.")
         else:
-            return f"O Cliente {nome_cliente_filtro} não possui linhas ociosas atualmente."
+            return resultado_pesquisa.pronta(f"O Cliente {nome_cliente_filtro} não possui linhas ociosas atualmente.")
     
     # Se não conseguir extrair resposta específica, retornar dados completos
-    return resultado_final
+    return resultado_pesquisa.dados(resultados)
 
-def pesquisar_no_banco(pergunta):
-    """Pesquisa inteligente no banco de dados - Mantida a versão original"""
-    pergunta_lower = pergunta.lower()
-    
-    # Verificar PRIMEIRO se a pergunta é sobre termos de linhas (prioridade)
-    termos_termos = ['termo', 'termos', 'possui termo', 'não possuem termo', 'nao possuem termo', 'sem termo']
-    if any(termo in pergunta_lower for termo in termos_termos):
-        return pesquisar_termos_linhas(pergunta)
-    
-    # Verificar se a pergunta é sobre custos por usuários
-    # Detectar padrões específicos de perguntas sobre custos por usuários
-    padroes_custos_usuarios = [
-        'usuário.*maior.*custo',
-        'usuario.*maior.*custo', 
-        'maior.*custo.*usuário',
-        'maior.*custo.*usuario',
-        'custo.*usuário',
-        'custo.*usuario',
-        'usuário.*custo',
-        'usuario.*custo'
-    ]
-    
-    for padrao in padroes_custos_usuarios:
-        if re.search(padrao, pergunta_lower):
-            return pesquisar_custos_usuarios(pergunta)
+def criar_roteador(obter_conexao):
+    """Roteador de intenção com os extratores deste módulo; o cliente vem do dicionário do banco de obter_conexao"""
+    return roteador.Roteador(
+        extrair_cliente=functools.partial(extrair_cliente_pergunta, obter_conexao=obter_conexao),
+        extrair_periodo=extrair_mes_ano,
+        extrair_quantidade_meses=extrair_quantidade_meses,
+    )
+
+# Roteador do banco de DB_CONFIG (a API cria o seu com conectar_postgres_api)
+ROTEADOR = criar_roteador(conectar_postgres)
+
+def _intencao_da_pesquisa(pergunta, intencao):
+    """A intenção já roteada por quem chamou ou, numa chamada direta da pesquisa, a do ROTEADOR"""
+    return intencao if intencao is not None else ROTEADOR.rotear(pergunta)
+
+def chave_intencao(intencao):
+    """Intenção normalizada (dict): tudo o que decide a rota, o ramo e os filtros da pesquisa"""
+    chave = intencao.como_dict()
+    # Perguntas sobre o "mês atual" mudam de resposta na virada do mês
+    chave['mes_corrente'] = time.strftime('%Y-%m')
+    return chave
+
+def pesquisar_com_cache(pergunta, pesquisar, namespace, roteador_intencao=None, intencao=None):
+    """Executa pesquisar(pergunta, intencao) usando o cache de resultados indexado pela intenção da pergunta.
+
+    A pergunta é roteada uma única vez (ou chega já roteada em intencao): a mesma Intencao dá a
+    chave do cache e é entregue à pesquisa, que não extrai cliente, período nem marcadores de novo.
+    """
+    if intencao is None:
+        intencao = (roteador_intencao or ROTEADOR).rotear(pergunta)
+    cache = cache_resultados.obter_cache()
+    chave = chave_pesquisa(namespace, intencao)
+    pergunta_original = f"Pergunta: {pergunta}"
+    # Zerado nos dois caminhos: quem chama lê as falhas desta pesquisa, não as de uma anterior na thread
+    _falhas_consulta.quantidade = 0
     
-    # Verificar também termos simples
-    termos_custos_usuarios = ['usuário', 'usuario']
-    if any(termo in pergunta_lower for termo in termos_custos_usuarios) and 'custo' in pergunta_lower:
-        return pesquisar_custos_usuarios(pergunta)
+    resultado = cache.obter(chave)
+    if resultado is not None:
+        return resultado.trocar_texto(cache_resultados.MARCA_PERGUNTA, pergunta_original)
     
-    # Verificar se a pergunta é sobre linhas ociosas
-    termos_ociosas = ['ociosa', 'ociosas', 'ocioso', 'ociosos']
-    for termo in termos_ociosas:
-        if termo in pergunta_lower:
-            return pesquisar_linhas_ociosas(pergunta)
+    inicio = time.perf_counter()
+    resultado = pesquisar(pergunta, intencao)
+    resultado.tempos['pesquisa'] = round(time.perf_counter() - inicio, 4)
+    # Erros de conexão/consulta (inclusive consultas que falharam no meio da pesquisa) não vão para o cache
+    if resultado.tipo != resultado_pesquisa.TIPO_ERRO and not _falhas_consulta.quantidade:
+        cache.guardar(chave, resultado.trocar_texto(pergunta_original, cache_resultados.MARCA_PERGUNTA))
+    return resultado
+
+def chave_pesquisa(namespace, intencao):
+    """Chave do cache de resultados de uma pesquisa (namespace, modo de resposta e intenção)"""
+    return cache_resultados.montar_chave([
+        namespace, SECOES_DEPURACAO, RESPOSTA_VIA_LLM, chave_intencao(intencao),
+    ])
+
+def pesquisar_lote_com_cache(perguntas, intencoes, pesquisar_lote, namespace):
+    """pesquisar_com_cache para várias perguntas já roteadas de uma vez.
+
+    As que não estão no cache vão numa única chamada pesquisar_lote(intencoes), que devolve um
+    Resultado por intenção (ou None quando o lote não se aplica). Retorna um Resultado por pergunta;
+    None nas que quem chama deve pesquisar uma a uma (lote não aplicável ou consulta que falhou).
+    """
+    cache = cache_resultados.obter_cache()
+    chaves = [chave_pesquisa(namespace, intencao) for intencao in intencoes]
+    resultados = [None] * len(perguntas)
+    faltantes = []
+    for i, chave in enumerate(chaves):
+        resultado = cache.obter(chave)
+        if resultado is not None:
+            resultados[i] = resultado.trocar_texto(cache_resultados.MARCA_PERGUNTA, f"Pergunta: {perguntas[i]}")
+        else:
+            faltantes.append(i)
+    if not faltantes:
+        return resultados
     
-    # Verificar se a pergunta é sobre custos (prioridade sobre linhas)
-    termos_custos = ['custo', 'maior custo', 'fornecedor.*custo', 'custo.*fornecedor']
-    if any(termo in pergunta_lower for termo in termos_custos):
-        # Não redirecionar, usar a lógica de custos abaixo
-        pass
-    # Verificar se a pergunta é sobre linhas normais
-    elif any(termo in pergunta_lower for termo in ['linha', 'licenca', 'status', 'ativa', 'bloqueada', 'cancelada', 'total_linhas']):
-        return pesquisar_linhas(pergunta)
+    _falhas_consulta.quantidade = 0
+    inicio = time.perf_counter()
+    pesquisados = pesquisar_lote([intencoes[i] for i in faltantes])
+    # Consulta do lote falhou: as faltantes voltam como None e seguem pela pesquisa unitária
+    if pesquisados is None or _falhas_consulta.quantidade:
+        return resultados
+    tempo = round(time.perf_counter() - inicio, 4)
+    for i, resultado in zip(faltantes, pesquisados):
+        resultado.tempos['pesquisa'] = tempo
+        if resultado.tipo != resultado_pesquisa.TIPO_ERRO:
+            cache.guardar(chaves[i], resultado.trocar_texto(f"Pergunta: {perguntas[i]}", cache_resultados.MARCA_PERGUNTA))
+        resultados[i] = resultado
+    return resultados
+
+def pesquisar_no_banco(pergunta, intencao=None):
+    """Pesquisa inteligente no banco de dados, com cache de resultados por intenção.
+
+    intencao: a pergunta já roteada por ROTEADOR (ex.: app.py, que usa a mesma na sua chave).
+    Retorna um resultado_pesquisa.Resultado: .ja_formatada decide se vai direto ao usuário;
+    str(resultado) monta o texto das seções (contexto do RAG ou exibição em bruto).
+    """
+    return pesquisar_com_cache(pergunta, _pesquisar_no_banco, 'main', intencao=intencao)
+
+def _pesquisar_no_banco(pergunta, intencao=None):
+    """Pesquisa inteligente no banco de dados - Mantida a versão original"""
+    intencao = _intencao_da_pesquisa(pergunta, intencao)
+    pesquisa = {
+        roteador.ROTA_TERMOS: pesquisar_termos_linhas,
+        roteador.ROTA_CUSTOS_USUARIOS: pesquisar_custos_usuarios,
+        roteador.ROTA_LINHAS_OCIOSAS: pesquisar_linhas_ociosas,
+        roteador.ROTA_LINHAS: pesquisar_linhas,
+    }.get(intencao.rota)
+    if pesquisa is not None:
+        return pesquisa(pergunta, intencao=intencao)
     
-    # Se não for sobre linhas, usa a versão original para custos
+    # Custos por fornecedor (rota padrão): lógica abaixo
     conn = conectar_postgres()
     if not conn:
-        return "Não foi possível conectar ao banco de dados."
+        return resultado_pesquisa.erro("Não foi possível conectar ao banco de dados.")
     
     resultados = []
     tempo_inicio = time.time()
@@ -1723,19 +1636,14 @@ def pesquisar_no_banco(pergunta):
         with conn.cursor() as cursor:
             # Evita queries demoradas
             try:
-                cursor.execute("SET statement_timeout TO '15000ms'")
+                consultas_preparadas.definir_statement_timeout(conn, cursor, 15000)
             except Exception:
                 pass
             
-            # Verificar se a tabela ia_custo_fornecedor existe
-            cursor.execute("""
-                SELECT COUNT(*) 
-                FROM information_schema.tables 
-                WHERE table_name = 'ia_custo_fornecedor'
-            """)
-            tabela_existe = cursor.fetchone()[0]
+            # Estrutura da tabela ia_custo_fornecedor (registro de esquema em cache)
+            esquema = registro_esquema.obter_esquema(conn, 'ia_custo_fornecedor')
             
-            if tabela_existe == 0:
+            if esquema is None:
                 resultados.append(f"\n--- ERRO: TABELA NÃO ENCONTRADA ---")
                 resultados.append(f"A tabela 'ia_custo_fornecedor' não existe no banco de dados.")
                 resultados.append(f"Verifique se:")
@@ -1756,40 +1664,19 @@ def pesquisar_no_banco(pergunta):
                 for schema, tabela in tabelas_disponiveis:
                     resultados.append(f"- {schema}.{tabela}")
                 
-                return "\n".join(resultados)
-            
-            # Descobrir a estrutura real da tabela ia_custo_fornecedor
-            cursor.execute("""
-                SELECT column_name, data_type 
-                FROM information_schema.columns 
-                WHERE table_name = 'ia_custo_fornecedor'
-                ORDER BY ordinal_position
-            """)
-            colunas_tabela = cursor.fetchall()
-            
-            # Encontrar nomes reais das colunas
-            coluna_cliente = None
-            coluna_fornecedor = None
-            coluna_custo = None
-            coluna_mes_referencia = None
-            coluna_tipo_contrato = None
-            
-            for coluna, tipo in colunas_tabela:
-                coluna_lower = coluna.lower()
-                if 'cliente' in coluna_lower:
-                    coluna_cliente = coluna
-                elif 'fornecedor' in coluna_lower:
-                    coluna_fornecedor = coluna
-                elif coluna_lower == 'total' or 'custo' in coluna_lower or 'valor' in coluna_lower or tipo in ['numeric', 'decimal', 'money', 'double precision']:
-                    coluna_custo = coluna
-                elif 'mes' in coluna_lower or 'referencia' in coluna_lower or 'data' in coluna_lower or tipo in ['date', 'timestamp', 'varchar', 'text']:
-                    coluna_mes_referencia = coluna
-                elif 'tipo' in coluna_lower and 'contrato' in coluna_lower:
-                    coluna_tipo_contrato = coluna
-            
-            # Extrair informações da pergunta
-            ano, mes_numero, mes_nome = extrair_mes_ano(pergunta)
-            cliente_extraido = extrair_cliente_pergunta(pergunta)
+                return resultado_pesquisa.dados(resultados)
+            
+            # Nomes reais das colunas
+            coluna_cliente = esquema['cliente']
+            coluna_fornecedor = esquema['fornecedor']
+            coluna_custo = esquema['custo']
+            coluna_mes_referencia = esquema['mes_referencia']
+            tipo_mes_referencia = esquema['tipo_mes_referencia']
+            coluna_tipo_contrato = esquema['tipo_contrato']
+            
+            # Informações da pergunta, extraídas uma vez pelo roteador
+            ano, mes_numero, mes_nome = intencao.ano, intencao.mes, intencao.mes_nome
+            cliente_extraido = intencao.cliente
             
             # DEBUG: Mostrar o que foi extraído
             resultados.append(f"\n--- INFORMAÇÕES EXTRAÍDAS DA PERGUNTA ---")
@@ -1799,14 +1686,14 @@ def pesquisar_no_banco(pergunta):
             resultados.append(f"Cliente extraído: {cliente_extraido}")
             
             # Se não extraiu cliente, usar 'safra' como padrão ou buscar todos
-            filtro_cliente = f"{coluna_cliente} ILIKE '%{cliente_extraido}%'" if cliente_extraido else f"{coluna_cliente} IS NOT NULL"
+            filtro_cliente, params_cliente = construir_filtro_cliente(coluna_cliente, cliente_extraido)
             nome_cliente_filtro = cliente_extraido if cliente_extraido else "todos os clientes"
             
             # CONSULTA PRINCIPAL: Para o mês específico solicitado (DYNAMIC)
             if mes_numero and ano and coluna_mes_referencia and coluna_cliente and coluna_fornecedor and coluna_custo:
                 
                 # CONSULTA 1: Buscar dados EXATOS para o mês/ano solicitado
-                filtro_mes = construir_filtro_mes(coluna_mes_referencia, None, ano, mes_numero)
+                filtro_mes, params_mes = construir_filtro_mes(coluna_mes_referencia, tipo_mes_referencia, ano, mes_numero)
                 
                 # Incluir tipo_contrato se a coluna existir
                 campos_select = f"""
@@ -1828,20 +1715,17 @@ def pesquisar_no_banco(pergunta):
                 LIMIT 10
                 """
                 
-                resultado_mes_exato = executar_query_direta(conn, query_mes_exato)
+                resultado_mes_exato = executar_query_direta(conn, query_mes_exato, params_cliente + params_mes)
                 if resultado_mes_exato is not None and not resultado_mes_exato.empty:
                     resultados.append(f"\n--- DADOS EXATOS PARA {mes_nome} {ano} - CLIENTE {nome_cliente_filtro.upper()} ---")
                     # Formatar valores monetários
-                    df_formatado = resultado_mes_exato.copy()
-                    if coluna_custo in df_formatado.columns:
-                        df_formatado[coluna_custo] = df_formatado[coluna_custo].apply(formatar_moeda)
-                    resultados.append(df_formatado.to_string(index=False))
+                    resultados.append(resultado_pesquisa.tabela(resultado_mes_exato, colunas_moeda=[coluna_custo]))
                 else:
                     resultados.append(f"\n--- NENHUM DADO ENCONTRADO PARA {mes_nome} {ano} - CLIENTE {nome_cliente_filtro.upper()} ---")
             
             # CONSULTA 2: Verificar se o mês/ano solicitado existe na base
             if mes_numero and ano and coluna_mes_referencia:
-                filtro_mes = construir_filtro_mes(coluna_mes_referencia, None, ano, mes_numero)
+                filtro_mes, params_mes = construir_filtro_mes(coluna_mes_referencia, tipo_mes_referencia, ano, mes_numero)
                 query_verificar_mes = f"""
                 SELECT DISTINCT {coluna_mes_referencia}
                 FROM ia_custo_fornecedor
@@ -1849,14 +1733,14 @@ def pesquisar_no_banco(pergunta):
                 {filtro_mes}
                 """
                 
-                resultado_verificar = executar_query_direta(conn, query_verificar_mes)
+                resultado_verificar = executar_query_direta(conn, query_verificar_mes, params_cliente + params_mes)
                 if resultado_verificar is not None and not resultado_verificar.empty:
                     resultados.append(f"\n--- VERIFICAÇÃO: DADOS DE {mes_nome} {ano} EXISTEM PARA {nome_cliente_filtro.upper()} ---")
-                    resultados.append(resultado_verificar.to_string(index=False))
+                    resultados.append(resultado_pesquisa.tabela(resultado_verificar))
             
             # CONSULTA 3: Fornecedor com maior custo no mês/ano solicitado (MAIOR VALOR INDIVIDUAL)
             if mes_numero and ano and coluna_mes_referencia and coluna_cliente and coluna_fornecedor and coluna_custo:
-                filtro_mes = construir_filtro_mes(coluna_mes_referencia, None, ano, mes_numero)
+                filtro_mes, params_mes = construir_filtro_mes(coluna_mes_referencia, tipo_mes_referencia, ano, mes_numero)
                 
                 # Incluir tipo_contrato se a coluna existir
                 campos_select_maior = f"""
@@ -1878,18 +1762,22 @@ def pesquisar_no_banco(pergunta):
                 LIMIT 1
                 """
                 
-                resultado_maior_custo = executar_query_direta(conn, query_maior_custo_mes)
+                resultado_maior_custo = executar_query_direta(conn, query_maior_custo_mes, params_cliente + params_mes)
+                if (resultado_maior_custo is not None and not resultado_maior_custo.empty
+                        and not RESPOSTA_VIA_LLM and 'maior' in intencao.marcadores):
+                    linha_maior = resultado_maior_custo.primeira()
+                    return resultado_pesquisa.pronta(renderizador.renderizar_maior_custo_fornecedor(
+                        nome_cliente_filtro, linha_maior['fornecedor'], linha_maior['custo_total'],
+                        mes_nome, ano, linha_maior.get('tipo_contrato')
+                    ))
                 if resultado_maior_custo is not None and not resultado_maior_custo.empty:
                     resultados.append(f"\n--- FORNECEDOR COM MAIOR CUSTO EM {mes_nome} {ano} - CLIENTE {nome_cliente_filtro.upper()} ---")
                     # Formatar o resultado com moeda brasileira
-                    df_formatado = resultado_maior_custo.copy()
-                    if 'custo_total' in df_formatado.columns:
-                        df_formatado['custo_total'] = df_formatado['custo_total'].apply(formatar_moeda)
-                    resultados.append(df_formatado.to_string(index=False))
+                    resultados.append(resultado_pesquisa.tabela(resultado_maior_custo, colunas_moeda=['custo_total']))
             
             # CONSULTA 4: Todos os dados do mês/ano solicitado para análise (DYNAMIC)
             if mes_numero and ano and coluna_cliente and coluna_mes_referencia:
-                filtro_mes = construir_filtro_mes(coluna_mes_referencia, None, ano, mes_numero)
+                filtro_mes, params_mes = construir_filtro_mes(coluna_mes_referencia, tipo_mes_referencia, ano, mes_numero)
                 query_todos_mes = f"""
                 SELECT *
                 FROM ia_custo_fornecedor 
@@ -1899,14 +1787,11 @@ def pesquisar_no_banco(pergunta):
                 LIMIT 10
                 """
                 
-                resultado_todos_mes = executar_query_direta(conn, query_todos_mes)
+                resultado_todos_mes = executar_query_direta(conn, query_todos_mes, params_cliente + params_mes)
                 if resultado_todos_mes is not None and not resultado_todos_mes.empty:
                     resultados.append(f"\n--- TODOS OS DADOS DE {mes_nome} {ano} - CLIENTE {nome_cliente_filtro.upper()} ---")
                     # Formatar valores monetários
-                    df_formatado = resultado_todos_mes.copy()
-                    if coluna_custo in df_formatado.columns:
-                        df_formatado[coluna_custo] = df_formatado[coluna_custo].apply(formatar_moeda)
-                    resultados.append(df_formatado.to_string(index=False))
+                    resultados.append(resultado_pesquisa.tabela(resultado_todos_mes, colunas_moeda=[coluna_custo]))
             
             # CONSULTA 5: Datas disponíveis para referência
             if coluna_mes_referencia:
@@ -1919,10 +1804,10 @@ def pesquisar_no_banco(pergunta):
                 LIMIT 12
                 """
                 
-                resultado_datas = executar_query_direta(conn, query_datas)
+                resultado_datas = executar_query_direta(conn, query_datas, params_cliente)
                 if resultado_datas is not None and not resultado_datas.empty:
                     resultados.append(f"\n--- DATAS DISPONÍVEIS PARA {nome_cliente_filtro.upper()} ---")
-                    resultados.append(resultado_datas.to_string(index=False))
+                    resultados.append(resultado_pesquisa.tabela(resultado_datas))
             
             # CONSULTA 6: Total geral por fornecedor
             if coluna_cliente and coluna_fornecedor and coluna_custo:
@@ -1948,14 +1833,11 @@ def pesquisar_no_banco(pergunta):
                 LIMIT 10
                 """
                 
-                resultado_total = executar_query_direta(conn, query_total_geral)
+                resultado_total = executar_query_direta(conn, query_total_geral, params_cliente)
                 if resultado_total is not None and not resultado_total.empty:
                     resultados.append(f"\n--- CUSTO TOTAL POR FORNECEDOR - CLIENTE {nome_cliente_filtro.upper()} ---")
                     # Formatar valores monetários
-                    df_formatado = resultado_total.copy()
-                    if 'custo_total' in df_formatado.columns:
-                        df_formatado['custo_total'] = df_formatado['custo_total'].apply(formatar_moeda)
-                    resultados.append(df_formatado.to_string(index=False))
+                    resultados.append(resultado_pesquisa.tabela(resultado_total, colunas_moeda=['custo_total']))
             
             # CONSULTA 7: Lista de clientes disponíveis
             if coluna_cliente:
@@ -1970,21 +1852,10 @@ def pesquisar_no_banco(pergunta):
                 resultado_clientes = executar_query_direta(conn, query_clientes)
                 if resultado_clientes is not None and not resultado_clientes.empty:
                     resultados.append(f"\n--- CLIENTES DISPONÍVEIS NO BANCO ---")
-                    resultados.append(resultado_clientes.to_string(index=False))
-                    
-            # Descobrir a estrutura real da tabela ia_custo_fornecedor
-            cursor.execute("""
-                SELECT column_name, data_type 
-                FROM information_schema.columns 
-                WHERE table_name = 'ia_custo_fornecedor'
-                ORDER BY ordinal_position
-            """)
-            colunas_tabela = cursor.fetchall()
-            
-            # ... (todo o resto do código original)
+                    resultados.append(resultado_pesquisa.tabela(resultado_clientes))
             
     except Exception as e:
-        return f"Erro durante a pesquisa: {e}"
+        return resultado_pesquisa.erro(f"Erro durante a pesquisa: {e}")
     finally:
         conn.close()
     
@@ -1992,18 +1863,10 @@ def pesquisar_no_banco(pergunta):
     resultados.append(f"\n--- TEMPO DE EXECUÇÃO: {tempo_total:.2f} segundos ---")
     
     if not resultados:
-        return "Nenhum resultado encontrado no banco de dados para a pesquisa."
+        return resultado_pesquisa.dados(["Nenhum resultado encontrado no banco de dados para a pesquisa."])
     
-    return "\n".join(resultados)
-
+    return resultado_pesquisa.dados(resultados)
 
-def _cosine_similarity(a_vec, b_vec):
-    """Calcula similaridade do cosseno entre vetores numpy 1D."""
-    a_norm = np.linalg.norm(a_vec)
-    b_norm = np.linalg.norm(b_vec)
-    if a_norm == 0.0 or b_norm == 0.0:
-        return 0.0
-    return float(np.dot(a_vec, b_vec) / (a_norm * b_norm))
 
 def construir_rag_prompt():
     """Cria o template de prompt para RAG."""
@@ -2021,6 +1884,8 @@ def construir_rag_prompt():
         "Contexto (trechos relevantes):\n{contexto}\n\n"
         "Resposta objetiva e concisa em PT-BR:"
     )
+    from langchain.prompts import PromptTemplate
+
     return PromptTemplate.from_template(template)
 
 def preparar_llm_e_embeddings():
@@ -2029,9 +1894,9 @@ def preparar_llm_e_embeddings():
     if not api_key or not api_key.strip():
         raise RuntimeError("Defina a variável de ambiente GOOGLE_API_KEY para usar o Gemini.")
     with _suppress_stderr_during_imports():
+        import google.generativeai as genai
+        from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
         genai.configure(api_key=api_key)
-    # Interrompe a supressão global após inicializações críticas
-    _silence_stderr_stop()
     llm_local = ChatGoogleGenerativeAI(
         model="gemini-2.5-flash",
         temperature=0.0,
@@ -2039,59 +1904,241 @@ def preparar_llm_e_embeddings():
     # Para embeddings, a API espera o nome completo do recurso "models/<id>"
     with _suppress_stderr_during_imports():
         emb_local = GoogleGenerativeAIEmbeddings(model="models/text-embedding-004")
-    return llm_local, emb_local
+    # Chunks e perguntas já vistos não voltam à API de embeddings (cache em disco por conteúdo)
+    return llm_local, cache_embeddings.com_cache(emb_local)
 
-def responder_com_rag(pergunta, dados_textuais, llm, embeddings, top_k=6):
-    """Executa RAG sobre os dados_textuais: chunking, embeddings, recuperação e geração de resposta."""
+def precarregar_modulos(tabelas=True):
+    """Importa agora o que o RAG importaria na primeira pergunta (LLM, embeddings, numpy e,
+    com tabelas=True, o pandas das seções tabulares), para que nenhuma requisição pague isso"""
+    with _suppress_stderr_during_imports():
+        import google.generativeai  # noqa: F401
+        import langchain_google_genai  # noqa: F401
+        import langchain.prompts  # noqa: F401
+        import langchain_text_splitters  # noqa: F401
+        import similaridade  # noqa: F401
+        if tabelas:
+            import pandas  # noqa: F401
+
+@metricas.cronometrar('chunks')
+def dividir_em_chunks(dados_textuais):
+    """Split dos dados textuais em chunks para o RAG."""
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=300, chunk_overlap=30)
+    return splitter.split_text(str(dados_textuais))
+
+@metricas.cronometrar('recuperacao')
+def selecionar_contexto(chunks, chunk_embeddings, query_embedding, top_k):
+    """Top-K chunks por similaridade do cosseno (produto matriz-vetor + argpartition), unidos como contexto."""
+    import similaridade
+
+    indices, _ = similaridade.IndiceSimilaridade(chunk_embeddings).buscar(query_embedding, top_k)
+    return "\n\n".join(chunks[i] for i in indices)
+
+def texto_resposta_llm(resposta):
+    """Extrai o texto da resposta do LLM e aplica a formatação monetária."""
+    try:
+        if hasattr(resposta, "content") and isinstance(resposta.content, str):
+            return formatar_valores_monetarios_no_texto(resposta.content)
+        # Alguns wrappers podem retornar dict-like
+        if isinstance(resposta, dict) and "content" in resposta:
+            return formatar_valores_monetarios_no_texto(str(resposta["content"]))
+        return formatar_valores_monetarios_no_texto(str(resposta))
+    except Exception:
+        return formatar_valores_monetarios_no_texto(str(resposta))
+
+def preparar_contexto_rag(pergunta, dados_textuais, embeddings, top_k=6):
+    """Chunking, embeddings e seleção Top-K. Retorna (contexto, None) ou (None, mensagem de falha)."""
     if not dados_textuais or not str(dados_textuais).strip():
-        return "Não há dados disponíveis no banco para responder à pergunta."
+        return None, "Não há dados disponíveis no banco para responder à pergunta."
 
     # 1) Split em chunks
-    splitter = RecursiveCharacterTextSplitter(chunk_size=300, chunk_overlap=30)
-    chunks = splitter.split_text(str(dados_textuais))
+    chunks = dividir_em_chunks(dados_textuais)
     if not chunks:
-        return "Não foi possível preparar o contexto para a resposta."
+        return None, "Não foi possível preparar o contexto para a resposta."
 
     # 2) Embeddings de chunks e da pergunta
     try:
-        with _suppress_stderr_during_imports():
+        with metricas.medir_etapa('embeddings'), rastreamento.span('embeddings', {'leia.chunks': len(chunks)}):
             chunk_embeddings = embeddings.embed_documents(chunks)
             query_embedding = embeddings.embed_query(pergunta)
     except Exception as e:
-        return (
+        return None, (
             "Não foi possível gerar embeddings para recuperar o contexto. "
             "Verifique sua chave de API e o modelo de embeddings. Detalhe: " + str(e)
         )
-    query_vec = np.array(query_embedding, dtype=float)
 
     # 3) Similaridade e seleção Top-K
-    scores = []
-    for idx, emb in enumerate(chunk_embeddings):
-        vec = np.array(emb, dtype=float)
-        score = _cosine_similarity(query_vec, vec)
-        scores.append((score, idx))
-    scores.sort(key=lambda x: x[0], reverse=True)
-    selecionados = [chunks[i] for _, i in scores[:max(1, min(top_k, len(chunks)))] ]
-    contexto = "\n\n".join(selecionados)
+    return selecionar_contexto(chunks, chunk_embeddings, query_embedding, top_k), None
+
+def atributos_llm(llm, contexto):
+    """Atributos do span da chamada ao LLM"""
+    return {'gen_ai.request.model': str(getattr(llm, 'model', '')), 'leia.contexto_caracteres': len(contexto)}
+
+@rastreamento.rastreado()
+def responder_com_rag(pergunta, dados_textuais, llm, embeddings, top_k=6):
+    """Executa RAG sobre os dados_textuais: chunking, embeddings, recuperação e geração de resposta."""
+    contexto, mensagem = preparar_contexto_rag(pergunta, dados_textuais, embeddings, top_k)
+    if mensagem:
+        return mensagem
 
     # 4) Prompt RAG e geração
     prompt = construir_rag_prompt()
     chain_local = prompt | llm
-    with _suppress_stderr_during_imports():
+    with metricas.medir_etapa('llm'), rastreamento.span('llm', atributos_llm(llm, contexto)):
         resposta = chain_local.invoke({
         "pergunta": pergunta,
         "contexto": contexto,
         })
     # Garantir que retornamos apenas o texto da resposta
+    return texto_resposta_llm(resposta)
+
+def responder_com_rag_stream(pergunta, dados_textuais, llm, embeddings, top_k=6):
+    """Como responder_com_rag, mas gera a resposta em pedaços conforme os tokens chegam do LLM.
+
+    Os valores monetários são formatados de forma incremental (FormatadorMonetarioIncremental),
+    então a concatenação dos pedaços é igual à resposta de responder_com_rag.
+    """
+    contexto, mensagem = preparar_contexto_rag(pergunta, dados_textuais, embeddings, top_k)
+    if mensagem:
+        yield mensagem
+        return
+
+    chain_local = construir_rag_prompt() | llm
+    formatador = FormatadorMonetarioIncremental()
+    # Tempo do LLM sem o tempo de quem consome os pedaços
+    tempo_llm = 0.0
+    # O span não vira o atual: o gerador é retomado por quem consome, entre um pedaço e outro
+    span_llm = rastreamento.iniciar_span('llm', dict(atributos_llm(llm, contexto), **{'leia.stream': True}))
+    inicio = time.perf_counter()
     try:
-        if hasattr(resposta, "content") and isinstance(resposta.content, str):
-            return formatar_valores_monetarios_no_texto(resposta.content)
-        # Alguns wrappers podem retornar dict-like
-        if isinstance(resposta, dict) and "content" in resposta:
-            return formatar_valores_monetarios_no_texto(str(resposta["content"]))
-        return formatar_valores_monetarios_no_texto(str(resposta))
-    except Exception:
-        return formatar_valores_monetarios_no_texto(str(resposta))
+        for parte in chain_local.stream({"pergunta": pergunta, "contexto": contexto}):
+            conteudo = getattr(parte, "content", parte)
+            if not isinstance(conteudo, str):
+                conteudo = str(conteudo)
+            trecho = formatador.adicionar(conteudo)
+            if trecho:
+                tempo_llm += time.perf_counter() - inicio
+                yield trecho
+                inicio = time.perf_counter()
+        tempo_llm += time.perf_counter() - inicio
+    finally:
+        metricas.observar('llm', tempo_llm)
+        span_llm.end()
+    final = formatador.finalizar()
+    if final:
+        yield final
+
+def responder_com_rag_lote(perguntas, dados_textuais, llm, embeddings, top_k=6, max_concorrencia=4):
+    """RAG para várias perguntas de uma vez: uma chamada de embeddings para todos os chunks,
+    outra para todas as perguntas, e as chamadas ao LLM em paralelo (até max_concorrencia).
+
+    Retorna uma lista, na ordem de entrada, de dicts com 'resposta', 'erro_ia' (ou None)
+    e 'tempos' (segundos de embeddings, compartilhado pelo lote, e de LLM, por item).
+    """
+    resultados = [{'resposta': None, 'erro_ia': None, 'tempos': {'embeddings': 0.0, 'llm': 0.0}} for _ in perguntas]
+    chunks_por_item = {}
+    for i, dados in enumerate(dados_textuais):
+        if not dados or not str(dados).strip():
+            resultados[i]['resposta'] = "Não há dados disponíveis no banco para responder à pergunta."
+            continue
+        chunks = dividir_em_chunks(dados)
+        if not chunks:
+            resultados[i]['resposta'] = "Não foi possível preparar o contexto para a resposta."
+            continue
+        chunks_por_item[i] = chunks
+    if not chunks_por_item:
+        return resultados
+
+    # Embeddings compartilhados: cada chunk e cada pergunta distintos são enviados uma única vez
+    chunks_unicos = list(dict.fromkeys(c for chunks in chunks_por_item.values() for c in chunks))
+    perguntas_unicas = list(dict.fromkeys(perguntas[i] for i in chunks_por_item))
+    inicio = time.perf_counter()
+    try:
+        vetores_chunks = embeddings.embed_documents(chunks_unicos)
+        if hasattr(embeddings, 'embed_queries'):
+            vetores_perguntas = embeddings.embed_queries(perguntas_unicas)
+        else:
+            vetores_perguntas = cache_embeddings.calcular_embeddings_consultas(embeddings, perguntas_unicas)
+    except Exception as e:
+        mensagem = (
+            "Não foi possível gerar embeddings para recuperar o contexto. "
+            "Verifique sua chave de API e o modelo de embeddings. Detalhe: " + str(e)
+        )
+        for i in chunks_por_item:
+            resultados[i]['resposta'] = mensagem
+        return resultados
+    tempo_embeddings = time.perf_counter() - inicio
+    metricas.observar('embeddings', tempo_embeddings)
+    vetor_chunk = dict(zip(chunks_unicos, vetores_chunks))
+    vetor_pergunta = dict(zip(perguntas_unicas, vetores_perguntas))
+
+    chain_local = construir_rag_prompt() | llm
+
+    def _gerar(i):
+        chunks = chunks_por_item[i]
+        contexto = selecionar_contexto(chunks, [vetor_chunk[c] for c in chunks], vetor_pergunta[perguntas[i]], top_k)
+        inicio_llm = time.perf_counter()
+        try:
+            resposta = chain_local.invoke({"pergunta": perguntas[i], "contexto": contexto})
+            resultados[i]['resposta'] = texto_resposta_llm(resposta)
+        except Exception as e:
+            resultados[i]['erro_ia'] = str(e)
+        tempo_llm = time.perf_counter() - inicio_llm
+        metricas.observar('llm', tempo_llm)
+        resultados[i]['tempos'] = {
+            'embeddings': round(tempo_embeddings, 4),
+            'llm': round(tempo_llm, 4),
+        }
+
+    with ThreadPoolExecutor(max_workers=max(1, max_concorrencia), thread_name_prefix="leia-rag") as executor:
+        list(executor.map(_gerar, chunks_por_item))
+    return resultados
+
+async def responder_com_rag_async(pergunta, dados_textuais, llm, embeddings, top_k=6,
+                                  timeout_embeddings=None, timeout_llm=None):
+    """Versão asyncio de responder_com_rag: embeddings e LLM são aguardados sem ocupar uma thread.
+
+    Estouro de timeout_embeddings vira a mesma mensagem de falha de embeddings;
+    estouro de timeout_llm levanta asyncio.TimeoutError para quem chamou decidir o fallback.
+    """
+    # Montar o texto (DataFrames inclusive) e dividir em chunks é CPU: fora do event loop
+    texto = await asyncio.to_thread(str, dados_textuais) if dados_textuais else ""
+    if not texto.strip():
+        return "Não há dados disponíveis no banco para responder à pergunta."
+
+    chunks = await asyncio.to_thread(dividir_em_chunks, texto)
+    if not chunks:
+        return "Não foi possível preparar o contexto para a resposta."
+
+    # Chunks e pergunta são enviados em paralelo
+    try:
+        with metricas.medir_etapa('embeddings'), rastreamento.span('embeddings', {'leia.chunks': len(chunks)}):
+            chunk_embeddings, query_embedding = await asyncio.wait_for(
+                asyncio.gather(embeddings.aembed_documents(chunks), embeddings.aembed_query(pergunta)),
+                timeout_embeddings,
+            )
+    except asyncio.TimeoutError:
+        return (
+            "Não foi possível gerar embeddings para recuperar o contexto. "
+            f"Detalhe: tempo limite de {timeout_embeddings}s excedido"
+        )
+    except Exception as e:
+        return (
+            "Não foi possível gerar embeddings para recuperar o contexto. "
+            "Verifique sua chave de API e o modelo de embeddings. Detalhe: " + str(e)
+        )
+
+    # Top-k com numpy também numa thread (to_thread leva o contexto: métricas e span atual)
+    contexto = await asyncio.to_thread(selecionar_contexto, chunks, chunk_embeddings, query_embedding, top_k)
+
+    chain_local = construir_rag_prompt() | llm
+    with metricas.medir_etapa('llm'), rastreamento.span('llm', atributos_llm(llm, contexto)):
+        resposta = await asyncio.wait_for(
+            chain_local.ainvoke({"pergunta": pergunta, "contexto": contexto}),
+            timeout_llm,
+        )
+    return texto_resposta_llm(resposta)
 
 # Loop principal só executa se o arquivo for executado diretamente
 if __name__ == "__main__":
@@ -2119,63 +2166,21 @@ if __name__ == "__main__":
         print("LeIA: Aguarde um momento, por gentileza...")
         dados_banco = pesquisar_no_banco(pergunta)
         
-        # Verificar se é uma resposta de custos por usuários (já formatada)
-        if (dados_banco.startswith("O Usuário") or 
-            dados_banco.startswith("Nos últimos") or 
-            dados_banco.startswith("No último mês") or
-            dados_banco.startswith("Não foram encontrados dados de custos") or 
-            dados_banco.startswith("--- INFORMAÇÕES EXTRAÍDAS DA PERGUNTA ---")):
-            print("LeIA: ", end="")
-            imprimir_digitando(dados_banco)
-            print("")
-        # Verificar se é uma resposta de linhas ociosas (já formatada)
-        elif (dados_banco.startswith("O Cliente") and 
-            ("linhas ociosas" in dados_banco or "linha ociosa" in dados_banco or 
-             "possui atualmente" in dados_banco or "possuiu em" in dados_banco or 
-             "possuiu nos últimos" in dados_banco)):
-            print("LeIA: ", end="")
-            imprimir_digitando(dados_banco)
-            print("")
-        # Verificar se é uma resposta sobre termos de linhas (já formatada)
-        elif (dados_banco.startswith("O Cliente") and 
-            ("linhas sem termos" in dados_banco or "linha sem termo" in dados_banco or 
-             "são do tipo" in dados_banco or "estão Ativas são do tipo" in dados_banco)):
-            print("LeIA: ", end="")
-            imprimir_digitando(dados_banco)
+        # Resposta já formatada não passa pelo RAG e sai de uma vez (sem simular digitação)
+        if dados_banco.ja_formatada:
+            print(f"LeIA: {dados_banco.resposta}", flush=True)
             print("")
-        # Verificar se é uma resposta de linhas normais (deve passar pelo RAG)
-        elif ("--- LINHAS POR FORNECEDOR" in dados_banco or 
-              "--- TOTAL POR FORNECEDOR" in dados_banco or
-              "--- DADOS BRUTOS" in dados_banco or
-              "--- DEBUG:" in dados_banco):
-            # Passar pelo RAG para formatar a resposta
-            if not modo_sem_llm:
-                try:
-                    resposta = responder_com_rag(pergunta, dados_banco, llm, embeddings, top_k=6)
-                    print("LeIA: ", end="")
-                    imprimir_digitando(resposta)
-                    print("")
-                except Exception as e:
-                    print(f"Erro ao gerar resposta: {e}")
-                    print("Mostrando apenas resultados do banco:")
-                    imprimir_digitando(dados_banco)
-                    print("")
-            else:
-                print(f"\nResultados do banco de dados:")
-                print(dados_banco)
-                print("\n")
         elif modo_sem_llm:
             print(f"\nResultados do banco de dados:")
             print(dados_banco)
             print("\n")
         else:
             try:
-                resposta = responder_com_rag(pergunta, dados_banco, llm, embeddings, top_k=6)
-                print("LeIA: ", end="")
-                imprimir_digitando(resposta)
+                print("LeIA: ", end="", flush=True)
+                imprimir_stream(responder_com_rag_stream(pergunta, dados_banco, llm, embeddings, top_k=6))
                 print("")
             except Exception as e:
                 print(f"Erro ao gerar resposta: {e}")
                 print("Mostrando apenas resultados do banco:")
-                imprimir_digitando(dados_banco)
+                print(dados_banco, flush=True)
                 print("")
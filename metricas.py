@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Latência por etapa do pipeline de perguntas, em histogramas no formato do Prometheus
+
+Etapas medidas:
+- rota: detecção da rota (roteador)
+- entidades: extração de cliente, período e quantidade de meses
+- esquema: registro de esquema (cache ou information_schema)
+- sql: cada consulta ao banco (execução e leitura das linhas)
+- tabela: montagem do texto tabular / DataFrame de uma consulta
+- chunks, embeddings, recuperacao, llm: as etapas do RAG
+- json: serialização da resposta
+
+    with metricas.medir_etapa('sql'):
+        ...
+
+GET /metrics devolve exposicao() (text/plain, formato de texto do Prometheus). Dentro de
+coletar(), os segundos de cada etapa também são somados num dict da requisição, que as APIs
+devolvem em dados_extras["tempos_etapas"] quando pedido.
+
+Os histogramas são do processo: com vários workers do gunicorn cada scrape vê só o worker
+que atendeu (use um worker por porta ou agregue por instância).
+"""
+
+import bisect
+import contextvars
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+NOME_METRICA = "leia_etapa_duracao_segundos"
+BUCKETS_PADRAO = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+HABILITADAS = os.getenv('LEIA_METRICAS', 'True').lower() == 'true'
+TEMPOS_NA_RESPOSTA = os.getenv('LEIA_TEMPOS_NA_RESPOSTA', 'False').lower() == 'true'
+
+
+def _buckets():
+    """Limites dos buckets (LEIA_METRICAS_BUCKETS, em segundos separados por vírgula)"""
+    texto = os.getenv('LEIA_METRICAS_BUCKETS', '')
+    if not texto.strip():
+        return BUCKETS_PADRAO
+    return tuple(sorted(float(valor) for valor in texto.split(',') if valor.strip()))
+
+
+class Histograma:
+    """Contagem por bucket (não cumulativa; acumulada só na exposição), soma e total"""
+
+    __slots__ = ('limites', 'contagens', 'soma', 'total', '_lock')
+
+    def __init__(self, limites):
+        self.limites = limites
+        self.contagens = [0] * (len(limites) + 1)  # o último é o +Inf
+        self.soma = 0.0
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def observar(self, valor):
+        indice = bisect.bisect_left(self.limites, valor)
+        with self._lock:
+            self.contagens[indice] += 1
+            self.soma += valor
+            self.total += 1
+
+    def retrato(self):
+        with self._lock:
+            return list(self.contagens), self.soma, self.total
+
+
+_LIMITES = _buckets()
+_HISTOGRAMAS = {}
+_HISTOGRAMAS_LOCK = threading.Lock()
+
+# Segundos por etapa da requisição em andamento (None fora de coletar())
+_COLETA = contextvars.ContextVar('leia_coleta_etapas', default=None)
+
+
+def observar(etapa, segundos):
+    """Registra a duração de uma etapa no histograma e na coleta da requisição, se houver"""
+    if not HABILITADAS:
+        return
+    histograma = _HISTOGRAMAS.get(etapa)
+    if histograma is None:
+        with _HISTOGRAMAS_LOCK:
+            histograma = _HISTOGRAMAS.setdefault(etapa, Histograma(_LIMITES))
+    histograma.observar(segundos)
+    coleta = _COLETA.get()
+    if coleta is not None:
+        coleta[etapa] = coleta.get(etapa, 0.0) + segundos
+
+
+class MedicaoEtapa:
+    """Context manager que mede o bloco e registra em observar() (também em caso de exceção)"""
+
+    __slots__ = ('etapa', 'inicio')
+
+    def __init__(self, etapa):
+        self.etapa = etapa
+        self.inicio = None
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observar(self.etapa, time.perf_counter() - self.inicio)
+        return False
+
+
+def medir_etapa(etapa):
+    """with medir_etapa('sql'): ... registra a duração do bloco na etapa"""
+    return MedicaoEtapa(etapa)
+
+
+def cronometrar(etapa):
+    """Decorador: cada chamada da função é uma observação da etapa"""
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def envolvida(*args, **kwargs):
+            with MedicaoEtapa(etapa):
+                return funcao(*args, **kwargs)
+        return envolvida
+    return decorador
+
+
+@contextmanager
+def coletar():
+    """Soma os segundos por etapa observados no contexto atual (a requisição) num dict.
+
+    O contexto vale para a thread/tarefa atual; trabalho enviado a um executor só entra na
+    coleta se rodar dentro de contextvars.copy_context() (como em api_asgi).
+    """
+    coleta = {}
+    token = _COLETA.set(coleta)
+    try:
+        yield coleta
+    finally:
+        _COLETA.reset(token)
+
+
+def tempos_etapas(coleta):
+    """Coleta arredondada para a resposta JSON"""
+    return {etapa: round(segundos, 4) for etapa, segundos in coleta.items()}
+
+
+def tempos_pedidos(dados_json):
+    """A requisição pediu os tempos por etapa ("incluir_tempos": true) ou LEIA_TEMPOS_NA_RESPOSTA=True"""
+    if isinstance(dados_json, dict) and 'incluir_tempos' in dados_json:
+        return bool(dados_json['incluir_tempos'])
+    return TEMPOS_NA_RESPOSTA
+
+
+def _formatar_limite(limite):
+    return repr(float(limite))
+
+
+def exposicao():
+    """Histogramas no formato de texto do Prometheus (version=0.0.4)"""
+    linhas = [
+        f"# HELP {NOME_METRICA} Duração de cada etapa do pipeline de perguntas, em segundos",
+        f"# TYPE {NOME_METRICA} histogram",
+    ]
+    with _HISTOGRAMAS_LOCK:
+        etapas = sorted(_HISTOGRAMAS.items())
+    for etapa, histograma in etapas:
+        contagens, soma, total = histograma.retrato()
+        acumulado = 0
+        for limite, contagem in zip(histograma.limites, contagens):
+            acumulado += contagem
+            linhas.append(f'{NOME_METRICA}_bucket{{etapa="{etapa}",le="{_formatar_limite(limite)}"}} {acumulado}')
+        linhas.append(f'{NOME_METRICA}_bucket{{etapa="{etapa}",le="+Inf"}} {total}')
+        linhas.append(f'{NOME_METRICA}_sum{{etapa="{etapa}"}} {soma!r}')
+        linhas.append(f'{NOME_METRICA}_count{{etapa="{etapa}"}} {total}')
+    return "\n".join(linhas) + "\n"
+
+
+def estatisticas_metricas():
+    """Observações, soma e média (ms) por etapa, para o /health"""
+    with _HISTOGRAMAS_LOCK:
+        etapas = sorted(_HISTOGRAMAS.items())
+    estatisticas = {}
+    for etapa, histograma in etapas:
+        _, soma, total = histograma.retrato()
+        estatisticas[etapa] = {
+            'observacoes': total,
+            'soma_segundos': round(soma, 4),
+            'media_ms': round(soma / total * 1e3, 2) if total else 0.0,
+        }
+    return estatisticas
+
+
+def zerar_metricas():
+    """Descarta os histogramas (ex.: entre rodadas de benchmark)"""
+    with _HISTOGRAMAS_LOCK:
+        _HISTOGRAMAS.clear()
@@ -0,0 +1,59 @@
+-- Migração 0001: índices para as pesquisas das tabelas ia_*
+-- Gerada por consultor_indices.py em 2026-10-18 16:14:52
+-- CREATE INDEX CONCURRENTLY não roda em transação: aplique com
+--     python consultor_indices.py aplicar
+--
+-- EXPLAIN (ANALYZE, BUFFERS), mediana por template: antes -> depois
+--   leia_017e6a28aa8f1ea2 ia_linhas_ociosas: 0.019 ms, 1 buffers (seq scan) -> 0.018 ms, 1 buffers
+--   leia_01fce6c9202cdeb3 ia_linhas_ociosas: 0.525 ms, 23 buffers (seq scan) -> 0.049 ms, 3 buffers (ix_ia_linhas_ociosas_cliente_mes_referencia_desc)
+--   leia_0a057d640e9af22a ia_custo_fornecedor: 1.172 ms, 13 buffers (seq scan) -> 0.084 ms, 3 buffers (ix_ia_custo_fornecedor_mes_referencia_total_desc)
+--   leia_0b6c66f76ca1253b ia_termos_numeros: 0.635 ms, 42 buffers (seq scan) -> 0.219 ms, 9 buffers (ix_ia_termos_numeros_cliente_pf3c840)
+--   leia_0e0f2d2f9c091e9b ia_custo_fornecedor: 1.190 ms, 13 buffers (seq scan) -> 0.075 ms, 3 buffers (ix_ia_custo_fornecedor_mes_referencia_total_desc)
+--   leia_16684de3d78b4f82 ia_custo_fornecedor: 1.313 ms, 13 buffers (seq scan) -> 1.310 ms, 13 buffers
+--   leia_2287d19aba93721f ia_linhas_ociosas: 0.338 ms, 23 buffers (seq scan) -> 0.035 ms, 3 buffers (ix_ia_linhas_ociosas_cliente_mes_referencia_desc)
+--   leia_23fe1bf52708c55d ia_linhas: 1.378 ms, 14 buffers (seq scan) -> 0.404 ms, 269 buffers (ix_ia_linhas_total_linhas_desc)
+--   leia_41b9c190c1b14b31 ia_custo_usuarios_linhas: 3.912 ms, 280 buffers (seq scan) -> 0.817 ms, 250 buffers (ix_ia_custo_usuarios_linhas_cliente_mes_referencia_total_desc)
+--   leia_4b2b940b96d33ea5 ia_custo_usuarios_linhas: 3.476 ms, 280 buffers (seq scan) -> 0.367 ms, 203 buffers (ix_ia_custo_usuarios_linhas_cliente_mes_referencia_total_desc)
+--   leia_6722ef8016efea22 ia_custo_fornecedor: 1.152 ms, 13 buffers (seq scan) -> 0.025 ms, 2 buffers (ix_ia_custo_fornecedor_mes_referencia_total_desc)
+--   leia_6b7f8ae6fc058e32 ia_linhas_ociosas: 0.391 ms, 23 buffers (seq scan) -> 0.122 ms, 3 buffers (ix_ia_linhas_ociosas_cliente_mes_referencia_desc)
+--   leia_6e9ab60fe0b582bb ia_custo_fornecedor: 1.383 ms, 13 buffers (seq scan) -> 1.326 ms, 13 buffers
+--   leia_8397d867aa6bb35a ia_custo_fornecedor: 1.227 ms, 13 buffers (seq scan) -> 0.071 ms, 3 buffers (ix_ia_custo_fornecedor_mes_referencia_total_desc)
+--   leia_83dbe42419d5df25 ia_custo_fornecedor: 0.599 ms, 13 buffers (seq scan) -> 0.561 ms, 13 buffers
+--   leia_843534526f3a3756 ia_termos_numeros: 0.572 ms, 42 buffers (seq scan) -> 0.093 ms, 4 buffers (ix_ia_termos_numeros_cliente_pf3c840)
+--   leia_8f6a31910a56c174 ia_linhas: 1.561 ms, 14 buffers (seq scan) -> 1.494 ms, 14 buffers
+--   leia_a5d97eafa454de59 ia_linhas: 1.427 ms, 14 buffers (seq scan) -> 0.152 ms, 5 buffers (ix_ia_linhas_mes_referencia_total_linhas_desc)
+--   leia_c48e92e26d0ab046 ia_custo_usuarios_linhas: 5.929 ms, 280 buffers (seq scan) -> 0.477 ms, 12 buffers (ix_ia_custo_usuarios_linhas_cliente_mes_referencia_total_desc)
+--   leia_c8fe24a4806c791a ia_custo_usuarios_linhas: 0.017 ms, 1 buffers (seq scan) -> 0.017 ms, 1 buffers
+--   leia_cdf9c53bf7159cb6 ia_termos_numeros: 1.182 ms, 42 buffers (seq scan) -> 0.195 ms, 8 buffers (ix_ia_termos_numeros_cliente_p7862b9)
+--   leia_d6d9aaa73658cc8b ia_custo_usuarios_linhas: 3.682 ms, 280 buffers (seq scan) -> 1.276 ms, 27 buffers (ix_ia_custo_usuarios_linhas_cliente_mes_referencia_total_desc)
+--   leia_ec0696dd6ac4c4c2 ia_linhas: 1.425 ms, 14 buffers (seq scan) -> 0.237 ms, 5 buffers (ix_ia_linhas_mes_referencia_total_linhas_desc)
+--   leia_f671cc7d0282813f ia_linhas_ociosas: 0.364 ms, 23 buffers (seq scan) -> 0.081 ms, 16 buffers (ix_ia_linhas_ociosas_cliente_mes_referencia_desc)
+--   leia_f96c612727ce3c3d ia_custo_fornecedor: 1.196 ms, 13 buffers (seq scan) -> 0.072 ms, 3 buffers (ix_ia_custo_fornecedor_mes_referencia_total_desc)
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ia_linhas_ociosas_cliente_mes_referencia_desc ON ia_linhas_ociosas USING btree (cliente, mes_referencia DESC);
+
+-- não medido (pg_trgm indisponível no banco analisado)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ia_custo_fornecedor_cliente_trgm ON ia_custo_fornecedor USING gin (cliente gin_trgm_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ia_termos_numeros_cliente_pf3c840 ON ia_termos_numeros USING btree (cliente) WHERE (possui_termo = 'N' OR possui_termo = 'Não' OR possui_termo = 'NAO' OR possui_termo = 'NÃO' OR possui_termo IS NULL OR possui_termo = '');
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ia_custo_fornecedor_mes_referencia_total_desc ON ia_custo_fornecedor USING btree (mes_referencia, total DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ia_linhas_total_linhas_desc ON ia_linhas USING btree (total_linhas DESC);
+
+-- não medido (pg_trgm indisponível no banco analisado)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ia_linhas_cliente_trgm ON ia_linhas USING gin (cliente gin_trgm_ops);
+
+-- não medido (pg_trgm indisponível no banco analisado)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ia_linhas_status_licenca_trgm ON ia_linhas USING gin (status_licenca gin_trgm_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ia_custo_usuarios_linhas_cliente_mes_referencia_total_desc ON ia_custo_usuarios_linhas USING btree (cliente, mes_referencia, total DESC);
+
+-- utilizável: o planner só o escolhe com a tabela maior que a analisada
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ia_custo_fornecedor_cliente ON ia_custo_fornecedor USING btree (cliente);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ia_linhas_mes_referencia_total_linhas_desc ON ia_linhas USING btree (mes_referencia, total_linhas DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ia_termos_numeros_cliente_p7862b9 ON ia_termos_numeros USING btree (cliente) WHERE (status_linha ILIKE '%ATIVA%' OR status_linha ILIKE '%ATIVO%');
@@ -0,0 +1,18 @@
+-- Migração 0002: gatilho de eventos DDL que notifica o canal de invalidação do registro de esquema
+-- Com LEIA_ESQUEMA_ESCUTAR=True, registro_esquema escuta o canal e invalida o cache a cada DDL.
+-- Requer superusuário; aplique com
+--     python consultor_indices.py aplicar
+-- Se LEIA_ESQUEMA_CANAL não for o padrão, troque 'leia_esquema' abaixo antes de aplicar.
+
+CREATE OR REPLACE FUNCTION leia_notificar_esquema() RETURNS event_trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_notify('leia_esquema', tg_tag);
+END;
+$$;
+
+DROP EVENT TRIGGER IF EXISTS leia_esquema_ddl;
+
+CREATE EVENT TRIGGER leia_esquema_ddl ON ddl_command_end
+    WHEN TAG IN ('CREATE TABLE', 'ALTER TABLE', 'DROP TABLE', 'CREATE TABLE AS')
+    EXECUTE FUNCTION leia_notificar_esquema();
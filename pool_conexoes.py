@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pool de conexões PostgreSQL compartilhado pelo processo (main.py e api_json_final.py)
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+import psycopg2
+from psycopg2 import extensions
+
+# Pools por configuração de banco (main.py usa DB_CONFIG, a API usa API_DB_CONFIG)
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+# Pools herdados do pai num fork: nunca usados nem finalizados pelo filho (ver descartar_pools_herdados)
+_POOLS_HERDADOS = []
+
+
+def _configuracao_pool():
+    """Lê os limites do pool das variáveis de ambiente (após o load_dotenv dos módulos)"""
+    return {
+        'minimo': int(os.getenv('DB_POOL_MIN', '1')),
+        'maximo': int(os.getenv('DB_POOL_MAX', '10')),
+        'vida_maxima': float(os.getenv('DB_POOL_MAX_LIFETIME', '1800')),
+        'ociosidade_verificacao': float(os.getenv('DB_POOL_HEALTHCHECK_IDLE', '30')),
+        'timeout_espera': float(os.getenv('DB_POOL_TIMEOUT', '10')),
+    }
+
+
+class ConexaoPool:
+    """Conexão emprestada do pool. close() devolve a conexão ao pool em vez de fechá-la."""
+
+    def __init__(self, pool, conn, criada_em):
+        self._pool = pool
+        self._conn = conn
+        self.criada_em = criada_em
+        # Configuração de banco de origem (continua disponível depois do close)
+        self.chave_banco = pool.chave_banco
+        self.devolvida_em = None
+
+    def __getattr__(self, nome):
+        return getattr(self._conn, nome)
+
+    @property
+    def conexao_real(self):
+        return self._conn
+
+    def close(self):
+        """Devolve a conexão ao pool (idempotente)"""
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            pool.devolver(self)
+
+    # Métodos especiais não passam por __getattr__: sem eles, `with conn:` não funcionaria
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, rastreamento):
+        """Como no psycopg2, confirma a transação (ou desfaz, se houve exceção); depois devolve a conexão ao pool"""
+        try:
+            if self._pool is not None and not self._conn.closed:
+                if tipo is None:
+                    self._conn.commit()
+                else:
+                    self._conn.rollback()
+        finally:
+            self.close()
+        return False
+
+
+class PoolConexoes:
+    """Pool thread-safe com tamanho mínimo/máximo, verificação na retirada e reciclagem por tempo de vida"""
+
+    def __init__(self, db_config, nome, minimo=1, maximo=10, vida_maxima=1800.0,
+                 ociosidade_verificacao=30.0, timeout_espera=10.0):
+        self.db_config = dict(db_config)
+        self.chave_banco = _chave_config(db_config)
+        self.nome = nome
+        self.minimo = max(0, minimo)
+        self.maximo = max(1, maximo, self.minimo)
+        self.vida_maxima = vida_maxima
+        self.ociosidade_verificacao = ociosidade_verificacao
+        self.timeout_espera = timeout_espera
+
+        self._ociosas = deque()
+        self._abertas = 0
+        self._condicao = threading.Condition(threading.Lock())
+        self._metricas = {
+            'retiradas': 0,
+            'esperas': 0,
+            'timeouts': 0,
+            'tempo_espera_total_ms': 0.0,
+            'tempo_espera_max_ms': 0.0,
+            'conexoes_criadas': 0,
+            'conexoes_recicladas': 0,
+            'conexoes_descartadas': 0,
+            'falhas_verificacao': 0,
+        }
+
+        # Pré-aquece o mínimo de conexões; falhas aqui não impedem o uso posterior
+        for _ in range(self.minimo):
+            self._abertas += 1
+            try:
+                conexao = self._nova_conexao()
+            except Exception:
+                break
+            conexao.devolvida_em = time.monotonic()
+            self._ociosas.append(conexao)
+
+    def _nova_conexao(self):
+        """Abre uma conexão física para uma vaga já reservada em _abertas (chamar fora do lock)"""
+        try:
+            conn = psycopg2.connect(**self.db_config)
+        except Exception:
+            with self._condicao:
+                self._abertas -= 1
+                self._condicao.notify()
+            raise
+        with self._condicao:
+            self._metricas['conexoes_criadas'] += 1
+        return ConexaoPool(self, conn, time.monotonic())
+
+    def _fechar_fisica(self, conexao, motivo):
+        try:
+            conexao.conexao_real.close()
+        except Exception:
+            pass
+        with self._condicao:
+            self._abertas -= 1
+            self._metricas[motivo] += 1
+            self._condicao.notify()
+
+    def _expirada(self, conexao, agora):
+        return self.vida_maxima > 0 and agora - conexao.criada_em >= self.vida_maxima
+
+    def _saudavel(self, conexao, agora):
+        """Verifica a conexão na retirada: sempre checa se está fechada e faz SELECT 1 se ficou ociosa demais"""
+        conn = conexao.conexao_real
+        if conn.closed:
+            return False
+        if conexao.devolvida_em is None or agora - conexao.devolvida_em < self.ociosidade_verificacao:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def obter(self):
+        """Retira uma conexão do pool, abrindo uma nova se houver espaço ou aguardando até timeout_espera"""
+        inicio = time.monotonic()
+        limite = inicio + self.timeout_espera
+        esperou = False
+        while True:
+            conexao = None
+            abrir_nova = False
+            with self._condicao:
+                while not self._ociosas and self._abertas >= self.maximo:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        self._metricas['timeouts'] += 1
+                        raise RuntimeError(
+                            f"Pool de conexões '{self.nome}' esgotado após {self.timeout_espera:.1f}s "
+                            f"({self.maximo} conexões em uso)"
+                        )
+                    esperou = True
+                    self._condicao.wait(restante)
+                if self._ociosas:
+                    conexao = self._ociosas.pop()
+                else:
+                    self._abertas += 1
+                    abrir_nova = True
+
+            if abrir_nova:
+                conexao = self._nova_conexao()
+            else:
+                agora = time.monotonic()
+                if self._expirada(conexao, agora):
+                    self._fechar_fisica(conexao, 'conexoes_recicladas')
+                    continue
+                if not self._saudavel(conexao, agora):
+                    with self._condicao:
+                        self._metricas['falhas_verificacao'] += 1
+                    self._fechar_fisica(conexao, 'conexoes_descartadas')
+                    continue
+
+            espera_ms = (time.monotonic() - inicio) * 1000.0
+            with self._condicao:
+                self._metricas['retiradas'] += 1
+                if esperou:
+                    self._metricas['esperas'] += 1
+                self._metricas['tempo_espera_total_ms'] += espera_ms
+                self._metricas['tempo_espera_max_ms'] = max(self._metricas['tempo_espera_max_ms'], espera_ms)
+            # Novo empréstimo: o objeto devolvido anteriormente não pode mais devolver esta conexão
+            return ConexaoPool(self, conexao.conexao_real, conexao.criada_em)
+
+    def devolver(self, conexao):
+        """Recebe a conexão de volta: desfaz transação aberta e recicla se expirou"""
+        conn = conexao.conexao_real
+        if conn.closed:
+            self._fechar_fisica(conexao, 'conexoes_descartadas')
+            return
+        try:
+            if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                # Desfaz também o SET statement_timeout feito dentro da transação
+                conn.rollback()
+        except Exception:
+            self._fechar_fisica(conexao, 'conexoes_descartadas')
+            return
+        if self._expirada(conexao, time.monotonic()):
+            self._fechar_fisica(conexao, 'conexoes_recicladas')
+            return
+        conexao.devolvida_em = time.monotonic()
+        with self._condicao:
+            self._ociosas.append(conexao)
+            self._condicao.notify()
+
+    def fechar(self):
+        """Fecha as conexões ociosas (as emprestadas são fechadas ao serem devolvidas)"""
+        with self._condicao:
+            ociosas = list(self._ociosas)
+            self._ociosas.clear()
+        for conexao in ociosas:
+            self._fechar_fisica(conexao, 'conexoes_descartadas')
+
+    def estatisticas(self):
+        """Retorna métricas do pool (tamanho, uso e espera por conexão)"""
+        with self._condicao:
+            metricas = dict(self._metricas)
+            abertas = self._abertas
+            ociosas = len(self._ociosas)
+        metricas['tempo_espera_total_ms'] = round(metricas['tempo_espera_total_ms'], 2)
+        metricas['tempo_espera_max_ms'] = round(metricas['tempo_espera_max_ms'], 2)
+        metricas.update({
+            'tamanho_minimo': self.minimo,
+            'tamanho_maximo': self.maximo,
+            'conexoes_abertas': abertas,
+            'conexoes_ociosas': ociosas,
+            'conexoes_em_uso': abertas - ociosas,
+        })
+        return metricas
+
+
+def _chave_config(db_config):
+    return tuple(sorted((k, str(v)) for k, v in db_config.items()))
+
+
+def chave_conexao(conn):
+    """Chave do banco de uma conexão (a de _chave_config, para as conexões do pool).
+
+    Caches por banco (registro_esquema, visoes_materializadas) usam-na para não misturar os
+    bancos de DB_CONFIG e API_DB_CONFIG no mesmo processo. Conexões fora do pool usam os
+    parâmetros do DSN; objetos sem eles (dublês de teste) compartilham a chave None.
+    """
+    chave = getattr(conn, 'chave_banco', None)
+    if chave is not None:
+        return chave
+    try:
+        return _chave_config(conn.get_dsn_parameters())
+    except Exception:
+        return None
+
+
+def nome_banco(chave_banco):
+    """Nome do banco numa chave de chave_conexao (para métricas e diagnóstico)"""
+    parametros = dict(chave_banco or ())
+    return parametros.get('database') or parametros.get('dbname') or '?'
+
+
+def _obter_pool(db_config):
+    chave = _chave_config(db_config)
+    pool = _POOLS.get(chave)
+    if pool is None:
+        with _POOLS_LOCK:
+            pool = _POOLS.get(chave)
+            if pool is None:
+                nome = f"{db_config.get('user')}@{db_config.get('host')}:{db_config.get('port')}/{db_config.get('database')}"
+                pool = PoolConexoes(db_config, nome, **_configuracao_pool())
+                _POOLS[chave] = pool
+    return pool
+
+
+def obter_conexao(db_config):
+    """Retira uma conexão do pool associado a db_config (criando o pool na primeira chamada)"""
+    return _obter_pool(db_config).obter()
+
+
+def estatisticas_pools():
+    """Métricas de todos os pools do processo, indexadas por usuário@host:porta/banco"""
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+    return {pool.nome: pool.estatisticas() for pool in pools}
+
+
+def fechar_pools():
+    """Fecha e descarta todos os pools do processo"""
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+        _POOLS.clear()
+    for pool in pools:
+        pool.fechar()
+
+
+def descartar_pools_herdados():
+    """Após um fork: tira de uso os pools herdados do processo pai sem fechá-los.
+
+    Fechar no filho uma conexão aberta pelo pai encerraria a sessão do pai no servidor, e isso
+    inclui deixar o coletor de lixo finalizar a conexão (o psycopg2 fecha a conexão libpq ao ser
+    destruído). Os pools herdados ficam referenciados em _POOLS_HERDADOS até o fim do processo;
+    o filho abre as suas conexões.
+    """
+    with _POOLS_LOCK:
+        _POOLS_HERDADOS.extend(_POOLS.values())
+        _POOLS.clear()
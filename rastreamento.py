@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Rastreamento opcional (spans OpenTelemetry) de cada requisição, de ponta a ponta
+
+LEIA_RASTREAMENTO escolhe o destino:
+- nenhum (padrão): span() devolve um context manager vazio e @rastreado não envolve a função
+- otlp: coletor OTLP via HTTP/protobuf (OTEL_EXPORTER_OTLP_ENDPOINT, padrão http://localhost:4318);
+  requer opentelemetry-sdk e opentelemetry-exporter-otlp-proto-http
+- arquivo: um span por linha, em JSON, em LEIA_RASTREAMENTO_ARQUIVO (uso offline); requer opentelemetry-sdk
+
+Spans: handlers HTTP (com o traceparent recebido), conexões do pool, cada consulta
+(executar_query_direta, com o SQL e o número de linhas) e o RAG (chunks embedados, contexto,
+chamada ao Gemini). Amostragem e nome do serviço seguem OTEL_TRACES_SAMPLER e OTEL_SERVICE_NAME.
+
+    with rastreamento.span('executar_query_direta', {'db.statement': query}) as span:
+        ...
+        span.set_attribute('leia.linhas', 12)
+"""
+
+import functools
+import json
+import os
+import threading
+
+DESTINO = os.getenv('LEIA_RASTREAMENTO', 'nenhum').lower()
+HABILITADO = DESTINO in ('otlp', 'arquivo')
+ARQUIVO_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rastros.jsonl')
+
+# SQL longo (ex.: ILIKE em todas as colunas) é cortado no atributo db.statement
+MAX_SQL = 2000
+
+_ESTADO = {'tracer': None, 'pid': None, 'erro': None}
+_ESTADO_LOCK = threading.Lock()
+
+
+class SpanVazio:
+    """Span que não faz nada: o custo do rastreamento desligado"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set_attribute(self, chave, valor):
+        pass
+
+    def set_attributes(self, atributos):
+        pass
+
+    def record_exception(self, excecao):
+        pass
+
+    def end(self):
+        pass
+
+
+SPAN_VAZIO = SpanVazio()
+
+
+class ExportadorArquivo:
+    """SpanExporter que acrescenta cada span, em JSON de uma linha, ao arquivo (várias threads e processos)"""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._lock = threading.Lock()
+
+    def export(self, spans):
+        from opentelemetry.sdk.trace.export import SpanExportResult
+
+        linhas = "".join(json.dumps(json.loads(span.to_json()), ensure_ascii=False) + "\n" for span in spans)
+        try:
+            with self._lock, open(self.caminho, 'a', encoding='utf-8') as arquivo:
+                arquivo.write(linhas)
+        except OSError as e:
+            print(f"Aviso: falha ao gravar spans em {self.caminho}: {e}")
+            return SpanExportResult.FAILURE
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+    def force_flush(self, timeout_millis=30000):
+        return True
+
+
+def _criar_tracer():
+    """TracerProvider com o exportador de LEIA_RASTREAMENTO (o BatchSpanProcessor exporta em segundo plano)"""
+    from opentelemetry import trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+    if DESTINO == 'otlp':
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        exportador = OTLPSpanExporter()
+    else:
+        exportador = ExportadorArquivo(os.getenv('LEIA_RASTREAMENTO_ARQUIVO', ARQUIVO_PADRAO))
+
+    provedor = TracerProvider(resource=Resource.create({
+        'service.name': os.getenv('OTEL_SERVICE_NAME', 'leia-api'),
+    }))
+    provedor.add_span_processor(BatchSpanProcessor(exportador))
+    return provedor.get_tracer('leia')
+
+
+def obter_tracer():
+    """Tracer do processo, criado no primeiro span (de novo num worker após o fork); None se indisponível"""
+    pid = os.getpid()
+    if _ESTADO['pid'] != pid:
+        with _ESTADO_LOCK:
+            if _ESTADO['pid'] != pid:
+                try:
+                    _ESTADO['tracer'] = _criar_tracer()
+                    _ESTADO['erro'] = None
+                except Exception as e:  # ImportError sem o opentelemetry-sdk
+                    print(f"Aviso: rastreamento desligado ({e})")
+                    _ESTADO['tracer'], _ESTADO['erro'] = None, str(e)
+                _ESTADO['pid'] = pid
+    return _ESTADO['tracer']
+
+
+def span(nome, atributos=None):
+    """Span filho do span atual (context manager que devolve o span); SPAN_VAZIO se desligado"""
+    if not HABILITADO:
+        return SPAN_VAZIO
+    tracer = obter_tracer()
+    if tracer is None:
+        return SPAN_VAZIO
+    return tracer.start_as_current_span(nome, attributes=atributos)
+
+
+def iniciar_span(nome, atributos=None):
+    """Span filho do atual que não vira o span atual (para geradores: feche com .end())"""
+    if not HABILITADO:
+        return SPAN_VAZIO
+    tracer = obter_tracer()
+    if tracer is None:
+        return SPAN_VAZIO
+    return tracer.start_span(nome, attributes=atributos)
+
+
+def rastreado(nome=None):
+    """Decorador: cada chamada vira um span; com o rastreamento desligado devolve a própria função"""
+    def decorador(funcao):
+        if not HABILITADO:
+            return funcao
+        nome_span = nome or funcao.__name__
+
+        @functools.wraps(funcao)
+        def envolvida(*args, **kwargs):
+            with span(nome_span):
+                return funcao(*args, **kwargs)
+        return envolvida
+    return decorador
+
+
+def atributos_sql(query):
+    """Atributos de uma consulta ao PostgreSQL (o SQL com %s, sem os valores dos parâmetros)"""
+    return {'db.system': 'postgresql', 'db.statement': str(query)[:MAX_SQL]}
+
+
+def abrir_span_requisicao(nome, cabecalhos, atributos=None):
+    """Span SERVER de uma requisição HTTP, como span atual, continuando o traceparent recebido.
+
+    Retorna (span, token) para encerrar_span_requisicao; (None, None) se desligado.
+    """
+    if not HABILITADO:
+        return None, None
+    tracer = obter_tracer()
+    if tracer is None:
+        return None, None
+    from opentelemetry import context, trace
+    from opentelemetry.propagate import extract
+
+    span_requisicao = tracer.start_span(
+        nome, context=extract(cabecalhos), kind=trace.SpanKind.SERVER, attributes=atributos,
+    )
+    token = context.attach(trace.set_span_in_context(span_requisicao))
+    return span_requisicao, token
+
+
+def encerrar_span_requisicao(span_requisicao, token, status_http=None, erro=None):
+    """Fecha o span de abrir_span_requisicao (status HTTP >= 500 ou exceção marcam erro)"""
+    if span_requisicao is None:
+        return
+    from opentelemetry import context, trace
+
+    if status_http is not None:
+        span_requisicao.set_attribute('http.status_code', status_http)
+    if erro is not None:
+        span_requisicao.record_exception(erro)
+    if erro is not None or (status_http is not None and status_http >= 500):
+        span_requisicao.set_status(trace.Status(trace.StatusCode.ERROR))
+    span_requisicao.end()
+    context.detach(token)
+
+
+def estatisticas_rastreamento():
+    """Destino configurado e se o tracer está ativo neste processo"""
+    return {
+        'destino': DESTINO if HABILITADO else 'nenhum',
+        'ativo': _ESTADO['tracer'] is not None,
+        'erro': _ESTADO['erro'],
+    }
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Registro de esquema das tabelas ia_* com cache (TTL) e invalidação explícita
+
+Resolve uma única vez os papéis das colunas (cliente, mês de referência, total, ...)
+de cada tabela e reaproveita o mapeamento nas perguntas seguintes, evitando as
+consultas ao information_schema a cada pergunta.
+"""
+
+import os
+import select
+import threading
+import time
+
+import psycopg2
+
+import metricas
+import pool_conexoes
+
+# Canal usado pelo gatilho de eventos DDL (migracoes/0002_gatilho_invalidacao_esquema.sql) para avisar alterações de esquema
+CANAL_INVALIDACAO = os.getenv('LEIA_ESQUEMA_CANAL', 'leia_esquema')
+
+# (chave do banco, tabela) -> (expira, esquema): main e a API podem apontar para bancos diferentes
+_CACHE = {}
+_CACHE_LOCK = threading.Lock()
+# Uma thread de escuta por banco: chave do banco -> {'thread', 'parar'}
+_ESCUTAS = {}
+
+
+def _ttl_segundos():
+    return float(os.getenv('LEIA_ESQUEMA_TTL', '3600'))
+
+
+def _papeis_linhas(colunas_tabela):
+    """Papéis das colunas de ia_linhas"""
+    esquema = {
+        'cliente': None, 'status_licenca': None, 'fornecedor': None, 'total_linhas': None,
+        'mes_referencia': None, 'tipo_mes_referencia': None, 'tipo_contrato': None,
+    }
+    for coluna, tipo in colunas_tabela:
+        coluna_lower = coluna.lower()
+        if 'cliente' in coluna_lower:
+            esquema['cliente'] = coluna
+        elif 'status' in coluna_lower and 'licenca' in coluna_lower:
+            esquema['status_licenca'] = coluna
+        elif 'fornecedor' in coluna_lower:
+            esquema['fornecedor'] = coluna
+        elif 'total_linhas' in coluna_lower or ('total' in coluna_lower and 'linha' in coluna_lower):
+            esquema['total_linhas'] = coluna
+        elif 'mes' in coluna_lower or 'referencia' in coluna_lower or 'data' in coluna_lower:
+            esquema['mes_referencia'] = coluna
+            esquema['tipo_mes_referencia'] = tipo
+        elif 'tipo' in coluna_lower and 'contrato' in coluna_lower:
+            esquema['tipo_contrato'] = coluna
+    return esquema
+
+
+def _papeis_custo_usuarios(colunas_tabela):
+    """Papéis das colunas de ia_custo_usuarios_linhas"""
+    esquema = {
+        'cliente': None, 'nome_usuario': None, 'operadora': None, 'total': None,
+        'mes_referencia': None, 'tipo_mes_referencia': None,
+    }
+    for coluna, tipo in colunas_tabela:
+        coluna_lower = coluna.lower()
+        if 'cliente' in coluna_lower:
+            esquema['cliente'] = coluna
+        elif 'nome_usuario' in coluna_lower or 'usuario' in coluna_lower:
+            esquema['nome_usuario'] = coluna
+        elif 'operadora' in coluna_lower:
+            esquema['operadora'] = coluna
+        elif 'total' in coluna_lower or 'custo' in coluna_lower or 'valor' in coluna_lower:
+            esquema['total'] = coluna
+        elif 'mes' in coluna_lower or 'referencia' in coluna_lower or 'data' in coluna_lower:
+            esquema['mes_referencia'] = coluna
+            esquema['tipo_mes_referencia'] = tipo
+    return esquema
+
+
+def _papeis_linhas_ociosas(colunas_tabela):
+    """Papéis das colunas de ia_linhas_ociosas"""
+    esquema = {
+        'cliente': None, 'operadora': None, 'mes_referencia': None,
+        'tipo_mes_referencia': None, 'quantidade': None,
+    }
+    for coluna, tipo in colunas_tabela:
+        coluna_lower = coluna.lower()
+        if 'cliente' in coluna_lower:
+            esquema['cliente'] = coluna
+        elif 'operadora' in coluna_lower or 'fornecedor' in coluna_lower:
+            esquema['operadora'] = coluna
+        elif 'mes' in coluna_lower or 'referencia' in coluna_lower or 'data' in coluna_lower:
+            esquema['mes_referencia'] = coluna
+            esquema['tipo_mes_referencia'] = tipo
+        elif 'quantidade' in coluna_lower or 'total' in coluna_lower or 'qtd' in coluna_lower:
+            esquema['quantidade'] = coluna
+    return esquema
+
+
+def _papeis_termos_numeros(colunas_tabela):
+    """Papéis das colunas de ia_termos_numeros"""
+    esquema = {
+        'cliente': None, 'numero_linha': None, 'status_linha': None, 'conta_linha': None,
+        'tipo_numero': None, 'tipo_linha': None, 'possui_termo': None, 'status_termo': None,
+        'tipo_termo': None, 'nome_usuario': None,
+    }
+    for coluna, tipo in colunas_tabela:
+        coluna_lower = coluna.lower()
+        if 'cliente' in coluna_lower:
+            esquema['cliente'] = coluna
+        elif 'numero_linha' in coluna_lower or 'numero' in coluna_lower:
+            esquema['numero_linha'] = coluna
+        elif 'status_linha' in coluna_lower:
+            esquema['status_linha'] = coluna
+        elif 'conta_linha' in coluna_lower:
+            esquema['conta_linha'] = coluna
+        elif 'tipo_numero' in coluna_lower:
+            esquema['tipo_numero'] = coluna
+        elif 'tipo_linha' in coluna_lower:
+            esquema['tipo_linha'] = coluna
+        elif 'possui_termo' in coluna_lower:
+            esquema['possui_termo'] = coluna
+        elif 'status_termo' in coluna_lower:
+            esquema['status_termo'] = coluna
+        elif 'tipo_termo' in coluna_lower:
+            esquema['tipo_termo'] = coluna
+        elif 'nome_usuario' in coluna_lower:
+            esquema['nome_usuario'] = coluna
+    return esquema
+
+
+def _papeis_custo_fornecedor(colunas_tabela):
+    """Papéis das colunas de ia_custo_fornecedor"""
+    esquema = {
+        'cliente': None, 'fornecedor': None, 'custo': None, 'mes_referencia': None,
+        'tipo_mes_referencia': None, 'tipo_contrato': None,
+    }
+    for coluna, tipo in colunas_tabela:
+        coluna_lower = coluna.lower()
+        if 'cliente' in coluna_lower:
+            esquema['cliente'] = coluna
+        elif 'fornecedor' in coluna_lower:
+            esquema['fornecedor'] = coluna
+        elif coluna_lower == 'total' or 'custo' in coluna_lower or 'valor' in coluna_lower or tipo in ['numeric', 'decimal', 'money', 'double precision']:
+            esquema['custo'] = coluna
+        elif 'mes' in coluna_lower or 'referencia' in coluna_lower or 'data' in coluna_lower or tipo in ['date', 'timestamp', 'varchar', 'text']:
+            esquema['mes_referencia'] = coluna
+            esquema['tipo_mes_referencia'] = tipo
+        elif 'tipo' in coluna_lower and 'contrato' in coluna_lower:
+            esquema['tipo_contrato'] = coluna
+    return esquema
+
+
+RESOLVEDORES_PAPEIS = {
+    'ia_linhas': _papeis_linhas,
+    'ia_custo_usuarios_linhas': _papeis_custo_usuarios,
+    'ia_linhas_ociosas': _papeis_linhas_ociosas,
+    'ia_termos_numeros': _papeis_termos_numeros,
+    'ia_custo_fornecedor': _papeis_custo_fornecedor,
+}
+
+
+def _descobrir_esquema(conn, tabela):
+    """Lê as colunas da tabela no information_schema e resolve os papéis (None se a tabela não existe)"""
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT column_name, data_type
+            FROM information_schema.columns
+            WHERE table_name = %s
+            ORDER BY ordinal_position
+        """, (tabela,))
+        colunas_tabela = cursor.fetchall()
+    if not colunas_tabela:
+        return None
+    return RESOLVEDORES_PAPEIS[tabela](colunas_tabela)
+
+
+@metricas.cronometrar('esquema')
+def obter_esquema(conn, tabela):
+    """Retorna o mapeamento papel -> coluna da tabela, usando o cache enquanto o TTL não expirar.
+
+    Retorna None se a tabela não existe no banco (o resultado negativo também fica em cache).
+    """
+    agora = time.monotonic()
+    chave = (pool_conexoes.chave_conexao(conn), tabela)
+    with _CACHE_LOCK:
+        item = _CACHE.get(chave)
+    if item is not None and item[0] > agora:
+        return item[1]
+
+    esquema = _descobrir_esquema(conn, tabela)
+    with _CACHE_LOCK:
+        _CACHE[chave] = (agora + _ttl_segundos(), esquema)
+    return esquema
+
+
+def invalidar_esquema(tabela=None, db_config=None):
+    """Remove do cache o esquema de uma tabela (ou de todas, se tabela for None), em todos os
+    bancos ou só no de db_config. Retorna os nomes das tabelas removidas."""
+    banco = pool_conexoes._chave_config(db_config) if db_config is not None else None
+    with _CACHE_LOCK:
+        chaves = [
+            chave for chave in _CACHE
+            if (tabela is None or chave[1] == tabela) and (banco is None or chave[0] == banco)
+        ]
+        for chave in chaves:
+            del _CACHE[chave]
+    return sorted({chave[1] for chave in chaves})
+
+
+def tabelas_em_cache():
+    """Tabelas com esquema em cache (banco/tabela) e segundos restantes até expirar"""
+    agora = time.monotonic()
+    with _CACHE_LOCK:
+        return {
+            f"{pool_conexoes.nome_banco(banco)}/{tabela}": {'existe': esquema is not None, 'expira_em_segundos': round(expira - agora, 1)}
+            for (banco, tabela), (expira, esquema) in _CACHE.items()
+        }
+
+
+def _escutar_notificacoes(db_config, parar):
+    """Mantém uma sessão dedicada em LISTEN e invalida o cache a cada notificação"""
+    espera_reconexao = 1.0
+    while not parar.is_set():
+        conn = None
+        try:
+            conn = psycopg2.connect(**db_config)
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {CANAL_INVALIDACAO}")
+            # Alterações feitas enquanto estávamos desconectados não foram notificadas
+            invalidar_esquema(db_config=db_config)
+            espera_reconexao = 1.0
+            while not parar.is_set():
+                if select.select([conn], [], [], 5.0) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    conn.notifies.pop(0)
+                    invalidar_esquema(db_config=db_config)
+        except Exception as e:
+            print(f"Aviso: escuta de invalidação de esquema interrompida: {e}")
+            parar.wait(espera_reconexao)
+            espera_reconexao = min(espera_reconexao * 2, 60.0)
+        finally:
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+
+def iniciar_escuta_invalidacao(db_config):
+    """Inicia (uma vez por processo e banco) a thread que escuta o canal de invalidação do esquema.
+
+    Requer uma sessão PostgreSQL direta: em poolers em modo transação o LISTEN não é mantido.
+    """
+    banco = pool_conexoes._chave_config(db_config)
+    escuta = _ESCUTAS.get(banco)
+    if escuta is not None and escuta['thread'].is_alive():
+        return escuta['thread']
+    parar = threading.Event()
+    thread = threading.Thread(
+        target=_escutar_notificacoes, args=(dict(db_config), parar),
+        name="leia-escuta-esquema", daemon=True
+    )
+    _ESCUTAS[banco] = {'thread': thread, 'parar': parar}
+    thread.start()
+    return thread
+
+
+def parar_escuta_invalidacao():
+    """Sinaliza as threads de escuta para encerrar"""
+    for escuta in list(_ESCUTAS.values()):
+        escuta['parar'].set()
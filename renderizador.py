@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Respostas determinísticas em PT-BR montadas direto do resultado das consultas
+
+Seguem os formatos exigidos em construir_rag_prompt, para que as rotas de linhas por
+fornecedor e de fornecedor com maior custo não precisem de embeddings nem do LLM.
+"""
+
+from formatacao import formatar_inteiro_ptbr, formatar_moeda
+
+
+def _periodo(mes_nome=None, ano=None, atual=False):
+    if atual:
+        return " atualmente"
+    if mes_nome and ano:
+        return f" no mês de {mes_nome} de {ano}"
+    return ""
+
+
+def renderizar_linhas_por_fornecedor(nome_cliente, grupos, status=None, mes_nome=None, ano=None, atual=False):
+    """Total de linhas do cliente e uma linha por fornecedor no formato do prompt:
+    '* **[Fornecedor]**: [número] linhas, tipo de contrato [tipo_contrato].'
+
+    grupos: lista de (fornecedor, tipo_contrato, total_linhas), já na ordem de exibição.
+    """
+    total = sum(total_linhas for _, _, total_linhas in grupos)
+    descricao_status = f" {status.lower()}s" if status else ""
+    resposta = [
+        f"O Cliente {nome_cliente} possui{_periodo(mes_nome, ano, atual)} "
+        f"{formatar_inteiro_ptbr(total)} linhas{descricao_status}, sendo:"
+    ]
+    for fornecedor, tipo_contrato, total_linhas in grupos:
+        item = f"* **{fornecedor}**: {formatar_inteiro_ptbr(total_linhas)} linhas"
+        if tipo_contrato:
+            item += f", tipo de contrato {tipo_contrato}"
+        resposta.append(item + ".")
+    return "\n".join(resposta)
+
+
+def renderizar_maior_custo_fornecedor(nome_cliente, fornecedor, custo, mes_nome, ano, tipo_contrato=None):
+    """Fornecedor com maior custo no mês, no formato do prompt"""
+    resposta = (
+        f"O Cliente {nome_cliente}, o fornecedor com o maior custo no mês de {mes_nome} de {ano} "
+        f"é {fornecedor}, com um custo total de {formatar_moeda(custo)}"
+    )
+    if tipo_contrato:
+        resposta += f", tipo de contrato {tipo_contrato}"
+    return resposta + "."
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Resultado leve de uma consulta: as tuplas do cursor, com acesso por nome de coluna
+
+executar_query_direta devolve um ResultadoConsulta em vez de montar um DataFrame a
+cada consulta (a maioria volta uma linha só: COUNT, SUM, o maior custo do mês):
+- valor('total') e primeira(): escalar e linha única, direto da tupla
+- registros(): as linhas como dicts (no lugar de iterrows)
+- soma(coluna) e recorte(colunas, onde): agregação e filtro sem pandas
+- colunar(): as colunas como listas, montadas na primeira chamada (para as Tabelas)
+- dataframe(): o DataFrame, com o pandas importado só aqui
+
+Resultados grandes vêm em lotes (executar_query_em_lotes, cursor no servidor): cada lote é
+um ResultadoConsulta e a exportação (exportacao.py) serializa os lotes um a um, sem juntar tudo.
+
+    resultado = executar_query_direta(conn, "SELECT COUNT(*) AS total FROM ia_linhas")
+    resultado.valor('total')  -> 1234
+"""
+
+import metricas
+
+
+class ResultadoConsulta:
+    """Linhas (tuplas) e nomes das colunas de uma consulta"""
+
+    __slots__ = ('colunas', 'linhas', 'descricao', '_indices', '_colunar')
+
+    def __init__(self, colunas, linhas, descricao=None):
+        self.colunas = list(colunas)
+        self.linhas = linhas
+        # cursor.description (tipos do PostgreSQL), quando quem consome precisa deles (exportação)
+        self.descricao = descricao
+        # Nome repetido (ex.: SELECT *, count(*)) resolve para a primeira coluna, como no cursor
+        self._indices = {}
+        for posicao, nome in enumerate(self.colunas):
+            self._indices.setdefault(nome, posicao)
+        self._colunar = None
+
+    @classmethod
+    def do_cursor(cls, cursor):
+        """fetchall() do cursor já executado; None quando não há linhas"""
+        linhas = cursor.fetchall()
+        if not linhas:
+            return None
+        return cls([descricao[0] for descricao in cursor.description], linhas, cursor.description)
+
+    @classmethod
+    def de_registros(cls, registros):
+        """A partir de dicts (ex.: row_to_json), com as colunas na ordem em que aparecem"""
+        colunas = list(dict.fromkeys(nome for registro in registros for nome in registro))
+        return cls(colunas, [tuple(registro.get(nome) for nome in colunas) for registro in registros])
+
+    def __len__(self):
+        return len(self.linhas)
+
+    @property
+    def empty(self):
+        """Mesmo teste de DataFrame.empty"""
+        return not self.linhas or not self.colunas
+
+    def __repr__(self):
+        return f"ResultadoConsulta(colunas={self.colunas!r}, linhas={len(self.linhas)})"
+
+    def valor(self, coluna, linha=0):
+        """Valor de uma coluna numa linha (a primeira, por padrão)"""
+        return self.linhas[linha][self._indices[coluna]]
+
+    def primeira(self):
+        """Primeira linha como dict"""
+        return dict(zip(self.colunas, self.linhas[0]))
+
+    def registros(self):
+        """Linhas como dicts, na ordem da consulta"""
+        colunas = self.colunas
+        for linha in self.linhas:
+            yield dict(zip(colunas, linha))
+
+    def colunar(self):
+        """Valores por coluna (uma lista por coluna), montados na primeira chamada"""
+        if self._colunar is None:
+            self._colunar = [list(valores) for valores in zip(*self.linhas)] or [[] for _ in self.colunas]
+        return self._colunar
+
+    def coluna(self, nome):
+        return self.colunar()[self._indices[nome]]
+
+    def soma(self, coluna):
+        """Soma da coluna ignorando nulos (como Series.sum)"""
+        return sum(valor for valor in self.coluna(coluna) if valor is not None)
+
+    def recorte(self, colunas=None, onde=None):
+        """Outro ResultadoConsulta com as linhas em que onde(registro) é verdadeiro e só as colunas pedidas"""
+        colunas = self.colunas if colunas is None else list(colunas)
+        posicoes = [self._indices[nome] for nome in colunas]
+        linhas = self.linhas
+        if onde is not None:
+            linhas = [linha for linha, registro in zip(linhas, self.registros()) if onde(registro)]
+        return ResultadoConsulta(colunas, [tuple(linha[p] for p in posicoes) for linha in linhas])
+
+    @metricas.cronometrar('tabela')
+    def dataframe(self):
+        """DataFrame das linhas (importa o pandas na primeira vez)"""
+        import pandas as pd
+
+        return pd.DataFrame(self.linhas, columns=self.colunas)
+
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Resultado tipado das pesquisas no banco
+
+As pesquisas devolvem um Resultado em vez do texto final:
+- tipo: TIPO_RESPOSTA (frase pronta, dispensa o RAG), TIPO_DADOS (seções de dados para o
+  RAG ou para exibição em bruto) ou TIPO_ERRO (conexão/consulta falhou; não vai para o cache)
+- resposta: a frase pronta (ou a mensagem de erro); None nos dados
+- partes: linhas de texto e Tabelas, na ordem das seções
+- tempos: segundos por etapa
+
+Quem chama decide o caminho pelo tipo; o texto das seções (DataFrame.to_string) só é
+montado quando alguém pede str(resultado), isto é, na borda de saída (RAG ou exibição).
+"""
+
+import metricas
+from formatacao import formatar_moeda
+
+TIPO_RESPOSTA = 'resposta'
+TIPO_DADOS = 'dados'
+TIPO_ERRO = 'erro'
+
+
+class Tabela:
+    """Linhas de uma consulta guardadas por coluna; o texto tabular só é montado em renderizar()"""
+
+    def __init__(self, colunas, valores, colunas_moeda=()):
+        self.colunas = list(colunas)
+        self.valores = valores
+        self.colunas_moeda = tuple(colunas_moeda)
+
+    def __len__(self):
+        return len(self.valores[0]) if self.valores else 0
+
+    def linhas(self):
+        return zip(*self.valores)
+
+    @metricas.cronometrar('tabela')
+    def renderizar(self, cabecalho=True):
+        """Mesmo texto de DataFrame.to_string(index=False), com as colunas de moeda em R$"""
+        import pandas as pd
+
+        df = pd.DataFrame(list(self.linhas()), columns=self.colunas)
+        if self.colunas_moeda:
+            for coluna in self.colunas_moeda:
+                if coluna in df.columns:
+                    df[coluna] = df[coluna].apply(formatar_moeda)
+        return df.to_string(index=False, header=cabecalho)
+
+
+class Resultado:
+    """Resultado de uma pesquisa: tipo, resposta pronta ou partes (texto e Tabelas), tempos"""
+
+    def __init__(self, tipo, resposta=None, partes=(), tempos=None):
+        self.tipo = tipo
+        self.resposta = resposta
+        self.partes = list(partes)
+        self.tempos = dict(tempos or {})
+        self._texto = None
+
+    @property
+    def ja_formatada(self):
+        """A frase final já está pronta (custos por usuários, linhas ociosas, termos, linhas e
+        maior custo por fornecedor): vai direto ao usuário, sem RAG"""
+        return self.tipo == TIPO_RESPOSTA
+
+    def texto(self):
+        """Texto completo (montado na primeira chamada e memorizado)"""
+        if self._texto is None:
+            if self.resposta is not None:
+                self._texto = self.resposta
+            else:
+                self._texto = "\n".join(
+                    parte if isinstance(parte, str) else parte.renderizar() for parte in self.partes
+                )
+        return self._texto
+
+    __str__ = texto
+
+    def __repr__(self):
+        return f"Resultado(tipo={self.tipo!r}, partes={len(self.partes)}, tempos={self.tempos!r})"
+
+    def trocar_texto(self, antigo, novo):
+        """Cópia com `antigo` trocado por `novo` na resposta e nas linhas de texto (as Tabelas são
+        compartilhadas); o próprio resultado se o trecho não aparece"""
+        if antigo == novo or not (
+            (self.resposta is not None and antigo in self.resposta)
+            or any(isinstance(parte, str) and antigo in parte for parte in self.partes)
+        ):
+            return self
+        return Resultado(
+            self.tipo,
+            self.resposta.replace(antigo, novo) if self.resposta is not None else None,
+            [parte.replace(antigo, novo) if isinstance(parte, str) else parte for parte in self.partes],
+            self.tempos,
+        )
+
+    def __getstate__(self):
+        # O texto memorizado não vai para o cache (é refeito a partir das partes)
+        estado = dict(self.__dict__)
+        estado['_texto'] = None
+        return estado
+
+
+def pronta(texto):
+    """Frase final montada pela pesquisa"""
+    return Resultado(TIPO_RESPOSTA, resposta=texto)
+
+
+def dados(partes):
+    """Seções de dados (linhas de texto e Tabelas) para o RAG"""
+    return Resultado(TIPO_DADOS, partes=partes)
+
+
+def erro(mensagem):
+    """Falha de conexão ou de consulta"""
+    return Resultado(TIPO_ERRO, resposta=mensagem)
+
+
+def tabela(consulta, colunas_moeda=()):
+    """Tabela a partir do ResultadoConsulta de uma consulta (valores por coluna)"""
+    return Tabela(consulta.colunas, consulta.colunar(), colunas_moeda)
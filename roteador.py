@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Roteador de intenção: decide a pesquisa de cada pergunta numa única passada
+
+As regras de rota ficam como dados (REGRAS, em ordem de prioridade). Os trechos das
+regras, os marcadores que decidem os ramos dentro das pesquisas e os status formam
+um único vocabulário, compilado uma vez: a pergunta é percorrida palavra a palavra
+e cada palavra é resolvida por uma tabela memorizada com os termos que contém.
+Uma passada dá todos os trechos presentes, com a mesma semântica do antigo
+"trecho in pergunta", e deles saem rota, status e marcadores.
+
+    intencao = main.ROTEADOR.rotear("Quantas linhas ativas tem o cliente Safra?")
+    intencao.rota  -> 'linhas'
+"""
+
+from typing import NamedTuple, Optional, Tuple
+
+import metricas
+
+ROTA_TERMOS = 'termos'
+ROTA_CUSTOS_USUARIOS = 'custos_usuarios'
+ROTA_LINHAS_OCIOSAS = 'linhas_ociosas'
+ROTA_CUSTOS_FORNECEDOR = 'custos_fornecedor'
+ROTA_LINHAS = 'linhas'
+
+# Regras em ordem de prioridade: a rota vale quando cada grupo tem ao menos um trecho na pergunta
+REGRAS = (
+    (ROTA_TERMOS, (('termo',),)),
+    (ROTA_CUSTOS_USUARIOS, (('usuário', 'usuario'), ('custo',))),
+    (ROTA_LINHAS_OCIOSAS, (('ociosa', 'ociosas', 'ocioso', 'ociosos'),)),
+    (ROTA_CUSTOS_FORNECEDOR, (('custo',),)),
+    (ROTA_LINHAS, (('linha', 'licenca', 'status', 'ativa', 'bloqueada', 'cancelada', 'total_linhas'),)),
+)
+
+# Sem nenhuma regra satisfeita a pergunta vai para os custos por fornecedor
+ROTA_PADRAO = ROTA_CUSTOS_FORNECEDOR
+
+# Status de licença, em ordem de prioridade quando a pergunta cita mais de um
+STATUS = ('ativa', 'bloqueada', 'cancelada')
+
+# Trechos que decidem o ramo dentro das pesquisas (entram na chave do cache de resultados)
+MARCADORES_INTENCAO = (
+    'termo', 'termos', 'possui termo', 'não possuem termo', 'nao possuem termo', 'sem termo',
+    'linhas sem termos', 'total de linhas sem termos', 'tipo de linha', 'por tipo de linha',
+    'me mostre o total por tipo', 'linhas ativas', 'estão ativas', 'tipo',
+    'usuário', 'usuario', 'custo', 'ociosa', 'ociosas', 'ocioso', 'ociosos', 'operadora',
+    'linha', 'licenca', 'status', 'ativa', 'bloqueada', 'cancelada', 'total_linhas',
+    'atualmente', 'atual', 'mês atual', 'mês vigente', 'último', 'mês', 'mes', 'meses', 'maior',
+)
+
+# Palavras distintas com o resultado memorizado (acima disso, as novas são calculadas a cada vez)
+LIMITE_PALAVRAS_MEMORIZADAS = 20000
+
+# Confiança: uma só regra satisfeita, várias (desempate pela prioridade) ou nenhuma (rota padrão)
+CONFIANCA_UNICA = 1.0
+CONFIANCA_AMBIGUA = 0.7
+CONFIANCA_PADRAO = 0.3
+
+
+class Intencao(NamedTuple):
+    """Rota e entidades extraídas da pergunta"""
+    rota: str
+    cliente: Optional[str]
+    ano: Optional[str]
+    mes: Optional[str]
+    mes_nome: Optional[str]
+    status: Optional[str]
+    quantidade_meses: Optional[int]
+    confianca: float
+    marcadores: Tuple[str, ...]
+
+    def como_dict(self):
+        return dict(self._asdict())
+
+
+class Roteador:
+    """Regras compiladas num único vocabulário; extratores de cliente e período são injetados"""
+
+    def __init__(self, regras=REGRAS, marcadores=MARCADORES_INTENCAO, rota_padrao=ROTA_PADRAO,
+                 extrair_cliente=None, extrair_periodo=None, extrair_quantidade_meses=None):
+        self.regras = tuple((rota, tuple(frozenset(grupo) for grupo in grupos)) for rota, grupos in regras)
+        self.marcadores = tuple(marcadores)
+        self.rota_padrao = rota_padrao
+        self.extrair_cliente = extrair_cliente
+        self.extrair_periodo = extrair_periodo
+        self.extrair_quantidade_meses = extrair_quantidade_meses
+
+        termos = set(self.marcadores) | set(STATUS)
+        for _, grupos in self.regras:
+            for grupo in grupos:
+                termos |= grupo
+        # Termos de uma palavra são procurados dentro de cada palavra da pergunta (o resultado por
+        # palavra fica memorizado: o vocabulário das perguntas se repete muito); frases, no texto todo
+        self._termos_palavra = tuple(sorted(t for t in termos if ' ' not in t))
+        self._termos_frase = tuple(
+            (frase, max((t for t in self._termos_palavra if t in frase), key=len, default=''))
+            for frase in sorted(t for t in termos if ' ' in t)
+        )
+        self._por_palavra = {}
+        self._ordem_marcadores = {m: i for i, m in enumerate(dict.fromkeys(self.marcadores))}
+
+    def trechos_presentes(self, pergunta_lower, frases=True):
+        """Conjunto dos termos conhecidos que aparecem no texto (já em minúsculas), como "termo in texto".
+
+        frases=False procura só os termos de uma palavra (bastam para as regras de rota).
+        """
+        palavras = pergunta_lower.split()
+        achados = list(map(self._por_palavra.get, palavras))
+        if None in achados:
+            achados = list(map(self._termos_da_palavra, palavras))
+        presentes = set().union(*achados)
+        if frases:
+            # Uma frase só pode estar no texto se o termo de uma palavra que ela contém também estiver
+            presentes.update([frase for frase, termo in self._termos_frase if termo in presentes and frase in pergunta_lower])
+        return presentes
+
+    def _termos_da_palavra(self, palavra):
+        achados = self._por_palavra.get(palavra)
+        if achados is None:
+            achados = frozenset([t for t in self._termos_palavra if t in palavra])
+            if len(self._por_palavra) < LIMITE_PALAVRAS_MEMORIZADAS:
+                self._por_palavra[palavra] = achados
+        return achados
+
+    def rota(self, presentes):
+        """(rota, confiança) pela primeira regra satisfeita"""
+        escolhida, satisfeitas = None, 0
+        for rota, grupos in self.regras:
+            for grupo in grupos:
+                if grupo.isdisjoint(presentes):
+                    break
+            else:
+                satisfeitas += 1
+                if escolhida is None:
+                    escolhida = rota
+        if escolhida is None:
+            return self.rota_padrao, CONFIANCA_PADRAO
+        return escolhida, CONFIANCA_UNICA if satisfeitas == 1 else CONFIANCA_AMBIGUA
+
+    def rota_da_pergunta(self, pergunta):
+        """Só a rota (sem extrair entidades), para despachar a pesquisa"""
+        with metricas.medir_etapa('rota'):
+            return self.rota(self.trechos_presentes(pergunta.lower(), frases=False))[0]
+
+    def rotear(self, pergunta):
+        """Intenção completa: rota, marcadores, status e as entidades dos extratores configurados"""
+        with metricas.medir_etapa('rota'):
+            presentes = self.trechos_presentes(pergunta.lower())
+            rota, confianca = self.rota(presentes)
+        ano, mes, mes_nome = self.extrair_periodo(pergunta) if self.extrair_periodo else (None, None, None)
+        return Intencao(
+            rota,
+            self.extrair_cliente(pergunta) if self.extrair_cliente else None,
+            ano,
+            mes,
+            mes_nome,
+            next((s for s in STATUS if s in presentes), None),
+            self.extrair_quantidade_meses(pergunta) if self.extrair_quantidade_meses else None,
+            confianca,
+            tuple(sorted(presentes.intersection(self._ordem_marcadores), key=self._ordem_marcadores.get)),
+        )
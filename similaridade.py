@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Busca top-k por similaridade do cosseno sobre embeddings (vetorizada com numpy)
+
+Os vetores são empilhados numa matriz float32 já normalizada; cada busca é um único
+produto matriz-vetor (ou matriz-matriz, para várias perguntas) seguido de argpartition.
+"""
+
+import numpy as np
+
+
+def normalizar_linhas(vetores):
+    """Empilha os vetores em float32 e normaliza cada linha (linhas nulas continuam nulas)"""
+    matriz = np.asarray(vetores, dtype=np.float32)
+    if matriz.ndim == 1:
+        # Um vetor vira uma linha; a lista vazia vira uma matriz sem linhas
+        matriz = matriz.reshape(1, -1) if matriz.size else matriz.reshape(0, 0)
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    normas[normas == 0.0] = 1.0
+    return matriz / normas
+
+
+def _top_k_linha(scores, k):
+    """Índices dos k maiores scores, em ordem decrescente (empates pelo menor índice)"""
+    if k < len(scores):
+        # argpartition não escolhe entre empates no k-ésimo score: entram todos os iguais a ele
+        limite = scores[np.argpartition(-scores, k - 1)[k - 1]]
+        candidatos = np.flatnonzero(scores >= limite)
+    else:
+        candidatos = np.arange(len(scores))
+    ordem = np.lexsort((candidatos, -scores[candidatos]))
+    return candidatos[ordem[:k]]
+
+
+class IndiceSimilaridade:
+    """Matriz de embeddings pré-normalizada para buscas top-k repetidas"""
+
+    def __init__(self, vetores):
+        self.matriz = normalizar_linhas(vetores)
+
+    def __len__(self):
+        return self.matriz.shape[0]
+
+    def buscar(self, consultas, k):
+        """Top-k por similaridade do cosseno.
+
+        consultas 1D (uma pergunta) -> (indices, scores), cada um com até k itens;
+        consultas 2D (várias perguntas) -> lista de (indices, scores), uma por pergunta.
+        """
+        consultas = np.asarray(consultas, dtype=np.float32)
+        unica = consultas.ndim == 1
+        if len(self) == 0 or consultas.size == 0:
+            vazio = (np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32))
+            return vazio if unica else [vazio for _ in range(len(consultas))]
+        normalizadas = normalizar_linhas(consultas)
+        k = max(1, min(int(k), len(self)))
+
+        # Uma única multiplicação pontua todos os chunks para todas as perguntas
+        todos_scores = normalizadas @ self.matriz.T
+        resultados = []
+        for scores in todos_scores:
+            indices = _top_k_linha(scores, k)
+            resultados.append((indices, scores[indices]))
+        return resultados[0] if unica else resultados
+
+
+def top_k_similares(vetores, consultas, k):
+    """Atalho para uma busca avulsa: IndiceSimilaridade(vetores).buscar(consultas, k)"""
+    return IndiceSimilaridade(vetores).buscar(consultas, k)
@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+"""Os módulos da LeIA ficam na raiz do repositório (scripts planos, sem pacote)"""
+
+import os
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
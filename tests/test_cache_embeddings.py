@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""Cache de embeddings em disco (cache_embeddings.py)"""
+
+import os
+
+import numpy as np
+
+import cache_embeddings
+
+
+class _EmbeddingsFalsos:
+    model = 'falso'
+
+    def __init__(self):
+        self.chamadas = []
+
+    def embed_documents(self, textos):
+        self.chamadas.append(list(textos))
+        return [[float(len(texto)), 1.0, 2.0] for texto in textos]
+
+    def embed_query(self, texto):
+        return self.embed_documents([texto])[0]
+
+
+def test_gravar_e_obter(tmp_path):
+    armazem = cache_embeddings.ArmazemEmbeddings(str(tmp_path))
+    armazem.gravar(['a', 'b'], [[1, 2, 3], [4, 5, 6]])
+    vetores = armazem.obter(['b', 'c', 'a'])
+    assert vetores[1] is None
+    np.testing.assert_array_equal(vetores[0], [4, 5, 6])
+    np.testing.assert_array_equal(vetores[2], [1, 2, 3])
+    # Outro processo (outro armazém no mesmo diretório) lê o que foi gravado
+    np.testing.assert_array_equal(cache_embeddings.ArmazemEmbeddings(str(tmp_path)).obter(['a'])[0], [1, 2, 3])
+
+
+def test_linha_incompleta_no_fim_e_descartada(tmp_path):
+    armazem = cache_embeddings.ArmazemEmbeddings(str(tmp_path))
+    armazem.gravar(['a'], [[1, 2, 3]])
+    caminho = os.path.join(str(tmp_path), 'vetores_3.f32')
+    # Processo morto no meio de uma escrita: meia linha no fim do arquivo, sem entrada no índice
+    with open(caminho, 'ab') as arquivo:
+        arquivo.write(np.asarray([9, 9], dtype=np.float32).tobytes())
+
+    outro = cache_embeddings.ArmazemEmbeddings(str(tmp_path))
+    outro.gravar(['b', 'c'], [[4, 5, 6], [7, 8, 9]])
+    assert os.path.getsize(caminho) == 3 * 3 * 4
+    for armazem_leitura in (outro, cache_embeddings.ArmazemEmbeddings(str(tmp_path))):
+        vetores = armazem_leitura.obter(['a', 'b', 'c'])
+        np.testing.assert_array_equal(np.vstack(vetores), [[1, 2, 3], [4, 5, 6], [7, 8, 9]])
+
+
+def test_embeddings_com_cache_so_calcula_os_faltantes(tmp_path):
+    remoto = _EmbeddingsFalsos()
+    embeddings = cache_embeddings.EmbeddingsComCache(remoto, cache_embeddings.ArmazemEmbeddings(str(tmp_path)))
+    assert embeddings.embed_documents(['x', 'yy', 'x']) == [[1.0, 1.0, 2.0], [2.0, 1.0, 2.0], [1.0, 1.0, 2.0]]
+    assert embeddings.embed_documents(['yy', 'zzz']) == [[2.0, 1.0, 2.0], [3.0, 1.0, 2.0]]
+    assert remoto.chamadas == [['x', 'yy'], ['zzz']]
+    estatisticas = embeddings.armazem.estatisticas()
+    assert (estatisticas['acertos'], estatisticas['faltas'], estatisticas['vetores_em_disco']) == (1, 4, 3)
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""Cache de resultados (cache_resultados.py) e o contador de falhas de main.pesquisar_com_cache"""
+
+import benchmark_roteador
+import cache_resultados
+import main
+import resultado_pesquisa
+
+
+def test_memoria_lru_e_ttl():
+    cache = cache_resultados.CacheMemoria(max_itens=2)
+    cache.guardar('a', 1)
+    cache.guardar('b', 2)
+    assert cache.obter('a') == 1  # 'a' passa a ser o mais recente
+    cache.guardar('c', 3)
+    assert cache.obter('b') is None and cache.obter('a') == 1 and cache.obter('c') == 3
+    assert cache.expulsoes == 1 and cache.tamanho() == 2
+
+    expirado = cache_resultados.CacheMemoria(ttl=0)
+    expirado.guardar('a', 1)
+    assert expirado.obter('a') is None and expirado.tamanho() == 0
+
+
+def test_fachada_conta_acertos_e_trata_falha_do_backend_como_falta():
+    class BackendQuebrado(cache_resultados.CacheMemoria):
+        def obter(self, chave):
+            raise ConnectionError("fora do ar")
+
+    cache = cache_resultados.CacheResultados(cache_resultados.CacheMemoria())
+    cache.guardar('a', 1)
+    assert cache.obter('a') == 1 and cache.obter('b') is None
+    estatisticas = cache.estatisticas()
+    assert (estatisticas['acertos'], estatisticas['faltas'], estatisticas['gravacoes']) == (1, 1, 1)
+    assert estatisticas['taxa_acerto'] == 0.5 and estatisticas['itens'] == 1
+
+    quebrado = cache_resultados.CacheResultados(BackendQuebrado())
+    assert quebrado.obter('a') is None
+    assert quebrado.estatisticas()['erros_backend'] == 1 and quebrado.estatisticas()['faltas'] == 1
+
+    desligado = cache_resultados.CacheResultados(None)
+    desligado.guardar('a', 1)
+    assert desligado.obter('a') is None and desligado.estatisticas()['backend'] == "nenhum"
+
+
+def test_montar_chave_estavel():
+    assert cache_resultados.montar_chave(['api', {'b': 1, 'a': 2}]) == cache_resultados.montar_chave(['api', {'a': 2, 'b': 1}])
+    assert cache_resultados.montar_chave(['api', 1]) != cache_resultados.montar_chave(['main', 1])
+
+
+def test_acerto_do_cache_zera_as_falhas_da_pesquisa_anterior(monkeypatch):
+    monkeypatch.setitem(cache_resultados._ESTADO, 'cache', cache_resultados.CacheResultados(cache_resultados.CacheMemoria()))
+    rot = benchmark_roteador.roteador_com_extratores()
+    pergunta = "Quantas linhas tem o cliente Safra?"
+    main.pesquisar_com_cache(pergunta, lambda p, i: resultado_pesquisa.pronta("ok"), 'teste', rot)
+
+    def pesquisa_com_falha(p, i):
+        main._falhas_consulta.quantidade += 1
+        return resultado_pesquisa.dados(["parcial"])
+
+    main.pesquisar_com_cache("Quantas linhas tem o cliente Sonda?", pesquisa_com_falha, 'teste', rot)
+    assert main._falhas_consulta.quantidade == 1
+    # Pesquisa com consulta falha não foi para o cache; o acerto seguinte não herda a falha
+    assert main.pesquisar_com_cache(pergunta, pesquisa_com_falha, 'teste', rot).resposta == "ok"
+    assert main._falhas_consulta.quantidade == 0
+    assert cache_resultados.obter_cache().estatisticas()['itens'] == 1
+
+
+def test_pergunta_guardada_como_marcador_volta_com_o_texto_de_quem_perguntou(monkeypatch):
+    monkeypatch.setitem(cache_resultados._ESTADO, 'cache', cache_resultados.CacheResultados(cache_resultados.CacheMemoria()))
+    rot = benchmark_roteador.roteador_com_extratores()
+    main.pesquisar_com_cache("Quantas linhas tem o cliente Safra?", lambda p, i: resultado_pesquisa.dados([f"Pergunta: {p}", "dados"]), 'teste', rot)
+
+    guardado = cache_resultados.obter_cache().obter(main.chave_pesquisa('teste', rot.rotear("Quantas linhas tem o cliente Safra?")))
+    assert guardado.partes[0] == cache_resultados.MARCA_PERGUNTA
+    resultado = main.pesquisar_com_cache("quantas linhas o cliente safra tem", None, 'teste', rot)
+    assert resultado.partes[0] == "Pergunta: quantas linhas o cliente safra tem"
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""Dicionário de clientes (clientes.py): autômato Aho-Corasick e um índice por fábrica de conexões"""
+
+import pytest
+
+import clientes
+
+
+@pytest.fixture
+def indice():
+    return clientes.IndiceClientes(['Safra', 'SAFRA', 'Sotreq S.A.', 'Sonda', 'MDR', 'Banco Alfa', 'Alfa', 'São Martinho', None, ' '])
+
+
+@pytest.mark.parametrize('pergunta, cliente', [
+    ("Quantas linhas tem o cliente Safra?", 'Safra'),
+    ("quantas linhas tem o cliente safra", 'Safra'),
+    ("Custos da SOTREQ em março", 'Sotreq S.A.'),
+    ("Custos da Sotreq S/A em março", 'Sotreq S.A.'),
+    ("linhas do sao martinho", 'São Martinho'),
+    # A ocorrência mais longa vence
+    ("linhas do Banco Alfa", 'Banco Alfa'),
+    ("linhas do Alfa", 'Alfa'),
+    # Só palavras inteiras
+    ("resultado da sondagem", None),
+    ("linhas do cliente MDRX", None),
+    ("Quantas linhas existem?", None),
+])
+def test_encontrar(indice, pergunta, cliente):
+    assert indice.encontrar(pergunta) == cliente
+
+
+def test_grafias_e_tamanho(indice):
+    assert indice.grafias('safra') == ['SAFRA', 'Safra']
+    assert indice.grafias('Sotreq S.A.') == ['Sotreq S.A.']
+    assert indice.grafias('Inexistente') == []
+    # Nomes vazios ficam de fora; SAFRA e Safra são o mesmo cliente
+    assert len(indice) == 7
+
+
+def test_um_indice_por_fabrica_de_conexoes(monkeypatch):
+    class Conexao:
+        def __init__(self, nomes):
+            self.nomes = nomes
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(clientes, '_ESTADOS', {})
+    monkeypatch.setattr(clientes, 'carregar_nomes', lambda conn: conn.nomes)
+
+    def banco_main():
+        return Conexao(['Safra'])
+
+    def banco_api():
+        return Conexao(['Sonda'])
+
+    assert clientes.obter_indice(banco_main).encontrar("cliente Safra") == 'Safra'
+    assert clientes.obter_indice(banco_api).encontrar("cliente Safra") is None
+    assert clientes.grafias_cliente('Sonda', banco_api) == ['Sonda']
+    assert clientes.grafias_cliente('Sonda', banco_main) == []
+    assert clientes.estatisticas_clientes(banco_api)['clientes'] == 1
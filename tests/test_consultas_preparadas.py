@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""Consultas preparadas no servidor (consultas_preparadas.py): LRU por conexão, limite e nova tentativa"""
+
+import hashlib
+from collections import OrderedDict
+
+import pytest
+from psycopg2 import errors
+
+import consultas_preparadas
+
+
+class _Cursor:
+    def __init__(self, conexao):
+        self.conexao = conexao
+
+    def execute(self, sql, params=None):
+        if self.conexao.falhar_execute and sql.startswith("EXECUTE"):
+            self.conexao.falhar_execute -= 1
+            raise errors.InvalidSqlStatementName("prepared statement does not exist")
+        self.conexao.comandos.append(sql)
+
+
+class _Conexao:
+    def __init__(self):
+        self.comandos = []
+        self.rollbacks = 0
+        self.falhar_execute = 0
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.comandos.append("ROLLBACK")
+
+    def get_dsn_parameters(self):
+        return {'port': '5432'}
+
+
+@pytest.fixture(autouse=True)
+def catalogo_vazio(monkeypatch):
+    monkeypatch.setattr(consultas_preparadas, '_CATALOGO', OrderedDict())
+    monkeypatch.setattr(consultas_preparadas, '_DESCARTES', {'catalogo': 0, 'conexoes': 0})
+    monkeypatch.setenv('DB_PREPARED_STATEMENTS', 'true')
+
+
+def _executar(conn, numero):
+    consultas_preparadas.executar_consulta(conn, _Cursor(conn), f"SELECT {numero} WHERE x = %s", [numero])
+
+
+def _nome(numero):
+    return "leia_" + hashlib.sha1(f"SELECT {numero} WHERE x = $1".encode('utf-8')).hexdigest()[:16]
+
+
+def test_prepara_uma_vez_e_reusa():
+    conn = _Conexao()
+    for _ in range(3):
+        _executar(conn, 1)
+    assert [c.split()[0] for c in conn.comandos] == ['PREPARE', 'EXECUTE', 'EXECUTE', 'EXECUTE']
+    template = next(iter(consultas_preparadas._CATALOGO.values()))
+    assert (template['preparos'], template['reusos_plano'], template['execucoes']) == (1, 2, 3)
+
+
+def test_lru_por_conexao_faz_deallocate(monkeypatch):
+    monkeypatch.setattr(consultas_preparadas, 'MAX_TEMPLATES', 2)
+    conn = _Conexao()
+    for numero in (1, 2, 1, 3):
+        _executar(conn, numero)
+    # O 2 era o menos usado da conexão quando o 3 chegou
+    assert [c for c in conn.comandos if c.startswith("DEALLOCATE")] == [f"DEALLOCATE {_nome(2)}"]
+    assert list(consultas_preparadas._PREPARADAS_POR_CONEXAO[conn]) == [_nome(1), _nome(3)]
+    assert len(consultas_preparadas._CATALOGO) == 2 and consultas_preparadas._DESCARTES['catalogo'] == 1
+
+
+@pytest.mark.parametrize('limite', [0, -5])
+def test_limite_zero_ou_negativo_executa_sem_preparo(monkeypatch, limite):
+    monkeypatch.setattr(consultas_preparadas, 'MAX_TEMPLATES', max(0, limite))
+    conn = _Conexao()
+    _executar(conn, 1)
+    _executar(conn, 2)
+    assert conn.comandos == ["SELECT 1 WHERE x = %s", "SELECT 2 WHERE x = %s"]
+
+
+def test_nova_tentativa_refaz_o_statement_timeout():
+    conn = _Conexao()
+    cursor = _Cursor(conn)
+    consultas_preparadas.definir_statement_timeout(conn, cursor, 15000)
+    _executar(conn, 1)
+    # Sessão trocada pelo pooler: o statement que supomos preparado não existe mais
+    conn.falhar_execute = 1
+    conn.comandos.clear()
+    _executar(conn, 1)
+    assert conn.comandos[:3] == ["ROLLBACK", "DEALLOCATE ALL", "SET statement_timeout TO '15000ms'"]
+    assert [c.split()[0] for c in conn.comandos[3:]] == ['PREPARE', 'EXECUTE']
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""Consultor de índices (consultor_indices.py): propostas, migração versionada e sua aplicação"""
+
+import os
+
+import consultor_indices
+from consultor_indices import Indice
+
+
+def test_propostas_por_predicado():
+    assert consultor_indices.propor_indices(
+        "SELECT cliente, mes_referencia, total FROM ia_custo_fornecedor "
+        "WHERE cliente = $1 AND mes_referencia >= $2 ORDER BY total DESC LIMIT 5"
+    ) == [Indice('ia_custo_fornecedor', ('cliente', 'mes_referencia', 'total DESC'), 'btree', None)]
+
+    # ORDER BY sobre um apelido do SELECT não vira coluna; ILIKE vira GIN com pg_trgm
+    assert consultor_indices.propor_indices(
+        "SELECT fornecedor, SUM(total) AS custo_total FROM ia_custo_fornecedor "
+        "WHERE cliente ILIKE $1 AND mes_referencia = $2 GROUP BY fornecedor ORDER BY custo_total DESC LIMIT 5"
+    ) == [
+        Indice('ia_custo_fornecedor', ('mes_referencia',), 'btree', None),
+        Indice('ia_custo_fornecedor', ('cliente gin_trgm_ops',), 'gin', None),
+    ]
+
+    # Filtro fixo sobre uma coluna: índice parcial
+    assert consultor_indices.propor_indices(
+        "SELECT tipo_linha, COUNT(*) FROM ia_termos_numeros "
+        "WHERE cliente = $1 AND (possui_termo = 'N' OR possui_termo IS NULL) GROUP BY tipo_linha"
+    )[1] == Indice('ia_termos_numeros', ('cliente',), 'btree', "(possui_termo = 'N' OR possui_termo IS NULL)")
+
+    # Visões materializadas e consultas sobre mais de uma tabela ficam de fora
+    assert consultor_indices.propor_indices("SELECT * FROM ia_mv_linhas WHERE cliente = $1") == []
+    assert consultor_indices.propor_indices(
+        "SELECT * FROM ia_linhas WHERE cliente IN (SELECT cliente FROM ia_termos_numeros WHERE cliente = $1)"
+    ) == []
+
+
+def test_consolidar_remove_prefixos_e_repetidos():
+    curto = Indice('ia_linhas', ('cliente',), 'btree', None)
+    longo = Indice('ia_linhas', ('cliente', 'mes_referencia DESC'), 'btree', None)
+    parcial = Indice('ia_linhas', ('cliente',), 'btree', "(status_licenca = 'Ativa')")
+    outra_tabela = Indice('ia_linhas_ociosas', ('cliente',), 'btree', None)
+    assert consultor_indices.consolidar([curto, longo, curto, parcial, outra_tabela]) == [longo, parcial, outra_tabela]
+
+
+def test_nome_e_sql_de_criacao():
+    indice = Indice('ia_custo_fornecedor', ('cliente', 'total DESC'), 'btree', None)
+    assert consultor_indices.sql_criacao(indice, concorrente=True) == (
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ia_custo_fornecedor_cliente_total_desc "
+        "ON ia_custo_fornecedor USING btree (cliente, total DESC)"
+    )
+    longo = Indice('ia_custo_usuarios_linhas', ('cliente', 'mes_referencia', 'tipo_mes_referencia', 'total DESC'), 'btree', None)
+    assert len(consultor_indices.nome_indice(longo)) <= 63
+    assert consultor_indices.nome_indice(longo) != consultor_indices.nome_indice(longo._replace(colunas=longo.colunas[:3] + ('total',)))
+
+
+def test_comandos_sql_preserva_corpo_entre_cifroes():
+    script = (
+        "-- comentário; com ponto e vírgula\n"
+        "CREATE INDEX a ON t (x);\n"
+        "CREATE FUNCTION f() RETURNS void LANGUAGE plpgsql AS $corpo$\nBEGIN\n    PERFORM 1;\nEND;\n$corpo$;\n"
+        "SELECT 1"
+    )
+    comandos = consultor_indices.comandos_sql(script)
+    assert comandos[0] == "CREATE INDEX a ON t (x)" and comandos[2] == "SELECT 1"
+    assert comandos[1].endswith("PERFORM 1;\nEND;\n$corpo$")
+
+
+class _Cursor:
+    def __init__(self, conexao):
+        self.conexao = conexao
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *erro):
+        return False
+
+    def execute(self, sql, params=None):
+        if sql in self.conexao.falhas:
+            raise RuntimeError(f"falhou: {sql}")
+        self.conexao.comandos.append((sql, params))
+
+    def fetchall(self):
+        return [(versao,) for versao in self.conexao.aplicadas]
+
+
+class _Conexao:
+    def __init__(self, aplicadas=(), falhas=()):
+        self.aplicadas = aplicadas
+        self.falhas = falhas
+        self.comandos = []
+        self.autocommit = False
+
+    def cursor(self):
+        return _Cursor(self)
+
+
+def _migracoes(diretorio):
+    for nome, conteudo in [
+        ('0001_indices_ia.sql', "CREATE INDEX a ON t (x);\nCREATE INDEX b ON t (y);\n"),
+        ('0002_extra.sql', "CREATE INDEX c ON t (z);\n"),
+        ('0003_mais.sql', "CREATE INDEX d ON t (w);\n"),
+        ('leia-me.txt', "ignorado"),
+    ]:
+        (diretorio / nome).write_text(conteudo, encoding='utf-8')
+
+
+def test_aplicar_migracoes_em_ordem_e_so_as_pendentes(tmp_path):
+    _migracoes(tmp_path)
+    conn = _Conexao(aplicadas=['0001_indices_ia'])
+    assert consultor_indices.aplicar_migracoes(conn, str(tmp_path)) == ['0002_extra', '0003_mais']
+    assert conn.autocommit
+    executados = [sql for sql, _ in conn.comandos[2:]]
+    assert executados == [
+        "CREATE INDEX c ON t (z)", "INSERT INTO leia_migracoes (versao) VALUES (%s)",
+        "CREATE INDEX d ON t (w)", "INSERT INTO leia_migracoes (versao) VALUES (%s)",
+    ]
+    assert consultor_indices.proxima_versao(str(tmp_path)) == 4
+
+
+def test_falha_interrompe_sem_registrar_a_versao(tmp_path):
+    _migracoes(tmp_path)
+    conn = _Conexao(falhas={"CREATE INDEX c ON t (z)"})
+    assert consultor_indices.aplicar_migracoes(conn, str(tmp_path)) == ['0001_indices_ia']
+    assert [params for sql, params in conn.comandos if sql.startswith("INSERT")] == [('0001_indices_ia',)]
+
+
+def test_escrever_migracao(tmp_path):
+    indice = Indice('ia_linhas', ('cliente gin_trgm_ops',), 'gin', None)
+    relatorio = {
+        'alvos': {}, 'antes': {}, 'depois': {},
+        'avaliacao': {indice: 'não medido'}, 'recomendados': [indice], 'pg_trgm': None,
+    }
+    (tmp_path / '0001_indices_ia.sql').write_text("", encoding='utf-8')
+    caminho = consultor_indices.escrever_migracao(relatorio, str(tmp_path))
+    assert os.path.basename(caminho) == '0002_indices_ia.sql'
+    assert consultor_indices.comandos_sql(open(caminho, encoding='utf-8').read()) == [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ia_linhas_cliente_trgm ON ia_linhas USING gin (cliente gin_trgm_ops)",
+    ]
+    assert consultor_indices.escrever_migracao(dict(relatorio, recomendados=[]), str(tmp_path)) is None
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""CSV da exportação gerado lote a lote (exportacao.csv_em_lotes)"""
+
+import csv
+import datetime
+import io
+from decimal import Decimal
+
+import exportacao
+from resultado_consulta import ResultadoConsulta
+
+COLUNAS = ['cliente', 'custo', 'mes_referencia', 'detalhes']
+
+
+def _ler(trechos):
+    return list(csv.reader(io.StringIO(b"".join(trechos).decode('utf-8'))))
+
+
+def test_um_trecho_por_lote_com_cabecalho_no_primeiro():
+    lotes = [
+        ResultadoConsulta(COLUNAS, [('Safra', Decimal('10.50'), datetime.date(2025, 3, 1), {'área': 'TI'})]),
+        ResultadoConsulta(COLUNAS, [('Sotreq, S.A.', None, None, ['a', 'b']), ('Sonda', 1, None, None)]),
+    ]
+    trechos = list(exportacao.csv_em_lotes(iter(lotes), COLUNAS))
+    assert len(trechos) == 2 and trechos[0].startswith(b"cliente,custo,mes_referencia,detalhes\n")
+    assert _ler(trechos) == [
+        COLUNAS,
+        ['Safra', '10.50', '2025-03-01', '{"área": "TI"}'],
+        ['Sotreq, S.A.', '', '', '["a", "b"]'],
+        ['Sonda', '1', '', ''],
+    ]
+
+
+def test_sem_linhas_so_o_cabecalho():
+    assert list(exportacao.csv_em_lotes(iter(()), COLUNAS)) == [b"cliente,custo,mes_referencia,detalhes\n"]
+
+
+def test_consumo_preguicoso():
+    consumidos = []
+
+    def lotes():
+        for i in range(3):
+            consumidos.append(i)
+            yield ResultadoConsulta(['n'], [(i,)])
+
+    trechos = exportacao.csv_em_lotes(lotes(), ['n'])
+    assert next(trechos) == b"n\n0\n" and consumidos == [0]
+    assert list(trechos) == [b"1\n", b"2\n"]
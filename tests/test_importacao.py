@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+"""Orçamento de importação (benchmark_importacao.py) como teste: falha acima de LEIA_ORCAMENTO_IMPORTACAO_MS"""
+
+import pytest
+
+import benchmark_importacao
+
+
+@pytest.mark.parametrize('modulo', benchmark_importacao.MODULOS_PADRAO)
+def test_importacao_dentro_do_orcamento(modulo):
+    medicao = benchmark_importacao.medir(modulo)
+    assert medicao is not None, f"{modulo}: sem a saída de -X importtime (stderr silenciado na importação)"
+    tempos, carregados = medicao
+    total_ms = tempos[modulo][1] / 1e3
+    assert total_ms <= benchmark_importacao.ORCAMENTO_MS, \
+        f"import {modulo}: {total_ms:.0f} ms acima do orçamento de {benchmark_importacao.ORCAMENTO_MS:.0f} ms"
+    pesados = sorted(nome for nome in benchmark_importacao.MODULOS_PESADOS if nome in carregados)
+    assert not pesados, f"{modulo} importa {', '.join(pesados)} na carga do módulo"
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""Histogramas de latência por etapa (metricas.py): exposição do Prometheus e coleta por requisição"""
+
+import contextvars
+
+import pytest
+
+import metricas
+
+
+@pytest.fixture(autouse=True)
+def histogramas_vazios(monkeypatch):
+    monkeypatch.setattr(metricas, '_HISTOGRAMAS', {})
+    monkeypatch.setattr(metricas, '_LIMITES', (0.01, 0.1, 1.0))
+    monkeypatch.setattr(metricas, 'HABILITADAS', True)
+
+
+def test_exposicao_acumula_buckets():
+    for segundos in (0.005, 0.01, 0.05, 2.0):
+        metricas.observar('sql', segundos)
+    metricas.observar('rota', 0.001)
+
+    linhas = metricas.exposicao().splitlines()
+    assert linhas[1] == "# TYPE leia_etapa_duracao_segundos histogram"
+    sql = [linha for linha in linhas if 'etapa="sql"' in linha]
+    # le é inclusivo: 0.01 cai no bucket de 0.01
+    assert sql == [
+        'leia_etapa_duracao_segundos_bucket{etapa="sql",le="0.01"} 2',
+        'leia_etapa_duracao_segundos_bucket{etapa="sql",le="0.1"} 3',
+        'leia_etapa_duracao_segundos_bucket{etapa="sql",le="1.0"} 3',
+        'leia_etapa_duracao_segundos_bucket{etapa="sql",le="+Inf"} 4',
+        f'leia_etapa_duracao_segundos_sum{{etapa="sql"}} {0.005 + 0.01 + 0.05 + 2.0!r}',
+        'leia_etapa_duracao_segundos_count{etapa="sql"} 4',
+    ]
+    # Etapas em ordem alfabética
+    assert linhas.index('leia_etapa_duracao_segundos_count{etapa="rota"} 1') < linhas.index(sql[0])
+    assert metricas.estatisticas_metricas()['rota'] == {'observacoes': 1, 'soma_segundos': 0.001, 'media_ms': 1.0}
+
+
+def test_medicao_registrada_mesmo_com_excecao():
+    @metricas.cronometrar('json')
+    def serializar():
+        raise ValueError("falhou")
+
+    with pytest.raises(ValueError):
+        serializar()
+    with metricas.medir_etapa('json'):
+        pass
+    assert metricas.estatisticas_metricas()['json']['observacoes'] == 2
+
+
+def test_coleta_por_requisicao():
+    metricas.observar('sql', 1.0)  # fora de coletar(): só no histograma
+    with metricas.coletar() as coleta:
+        metricas.observar('sql', 0.25)
+        metricas.observar('sql', 0.5)
+        # Outro contexto (outra requisição) não soma nesta coleta
+        contextvars.Context().run(metricas.observar, 'sql', 4.0)
+        metricas.observar('llm', 0.123456)
+    metricas.observar('sql', 1.0)
+    assert metricas.tempos_etapas(coleta) == {'sql': 0.75, 'llm': 0.1235}
+    assert metricas.estatisticas_metricas()['sql']['observacoes'] == 5
+
+
+def test_desabilitadas_nao_registram(monkeypatch):
+    monkeypatch.setattr(metricas, 'HABILITADAS', False)
+    with metricas.coletar() as coleta:
+        metricas.observar('sql', 0.1)
+    assert coleta == {} and metricas.estatisticas_metricas() == {}
+
+
+def test_tempos_pedidos(monkeypatch):
+    monkeypatch.setattr(metricas, 'TEMPOS_NA_RESPOSTA', True)
+    assert metricas.tempos_pedidos({'pergunta': "x"})
+    assert not metricas.tempos_pedidos({'pergunta': "x", 'incluir_tempos': False})
+    monkeypatch.setattr(metricas, 'TEMPOS_NA_RESPOSTA', False)
+    assert metricas.tempos_pedidos({'incluir_tempos': True})
+    assert not metricas.tempos_pedidos(None)
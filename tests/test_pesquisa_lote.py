@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""Pesquisa em lote com cache (main.pesquisar_lote_com_cache), usada pelo /perguntas/batch"""
+
+import pytest
+
+import benchmark_roteador
+import cache_resultados
+import main
+import resultado_pesquisa
+
+PERGUNTAS = [
+    "Quantas linhas tem o cliente Safra?",
+    "Quantas linhas tem o cliente Sonda?",
+    "Quantas linhas tem o cliente Verzani?",
+]
+
+
+@pytest.fixture
+def intencoes(monkeypatch):
+    monkeypatch.setitem(cache_resultados._ESTADO, 'cache', cache_resultados.CacheResultados(cache_resultados.CacheMemoria()))
+    rot = benchmark_roteador.roteador_com_extratores()
+    return [rot.rotear(pergunta) for pergunta in PERGUNTAS]
+
+
+def test_faltantes_numa_chamada_e_depois_do_cache(intencoes):
+    chamadas = []
+
+    def pesquisar_lote(lote):
+        chamadas.append([intencao.cliente for intencao in lote])
+        return [resultado_pesquisa.pronta(f"O Cliente {intencao.cliente} possui 1 linhas.") for intencao in lote]
+
+    # Um item já no cache: só os outros dois vão para o lote
+    main.pesquisar_lote_com_cache(PERGUNTAS[:1], intencoes[:1], pesquisar_lote, 'teste')
+    resultados = main.pesquisar_lote_com_cache(PERGUNTAS, intencoes, pesquisar_lote, 'teste')
+    assert chamadas == [['Safra'], ['Sonda', 'Verzani']]
+    assert [r.resposta for r in resultados] == [f"O Cliente {c} possui 1 linhas." for c in ('Safra', 'Sonda', 'Verzani')]
+
+    assert [r.resposta for r in main.pesquisar_lote_com_cache(PERGUNTAS, intencoes, pesquisar_lote, 'teste')] == \
+        [r.resposta for r in resultados]
+    assert len(chamadas) == 2
+
+
+def test_lote_nao_aplicavel_volta_none_sem_cache(intencoes):
+    chamadas = []
+
+    def pesquisar_lote(lote):
+        chamadas.append(len(lote))
+        return None
+
+    for _ in range(2):
+        assert main.pesquisar_lote_com_cache(PERGUNTAS, intencoes, pesquisar_lote, 'teste') == [None] * len(PERGUNTAS)
+    assert chamadas == [3, 3]
+
+
+def test_consulta_que_falhou_nao_vai_para_o_cache(intencoes):
+    def pesquisar_lote(lote):
+        main._falhas_consulta.quantidade += 1
+        return [resultado_pesquisa.dados(["Não foram encontrados dados"]) for _ in lote]
+
+    assert main.pesquisar_lote_com_cache(PERGUNTAS, intencoes, pesquisar_lote, 'teste') == [None] * len(PERGUNTAS)
+    assert cache_resultados.obter_cache().estatisticas()['itens'] == 0
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""Pool de conexões (pool_conexoes.py): empréstimo e devolução, reciclagem e rollback na devolução"""
+
+import pytest
+from psycopg2 import extensions
+
+import pool_conexoes
+
+
+class _Cursor:
+    def __init__(self, conexao):
+        self.conexao = conexao
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *erro):
+        return False
+
+    def execute(self, sql, params=None):
+        self.conexao.comandos.append(sql)
+        self.conexao.status = extensions.TRANSACTION_STATUS_INTRANS
+
+
+class _Conexao:
+    """Conexão física do psycopg2: registra comandos, commits e rollbacks"""
+
+    def __init__(self, **db_config):
+        self.comandos = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.closed = 0
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+
+    def cursor(self):
+        return _Cursor(self)
+
+    def get_transaction_status(self):
+        return self.status
+
+    def commit(self):
+        self.commits += 1
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(pool_conexoes.psycopg2, 'connect', _Conexao)
+    return pool_conexoes.PoolConexoes({'database': 'leia'}, 'teste', minimo=1, maximo=2, timeout_espera=0.05)
+
+
+def test_retirada_e_devolucao(pool):
+    primeira = pool.obter()
+    segunda = pool.obter()
+    assert primeira.conexao_real is not segunda.conexao_real
+    assert primeira.chave_banco == pool_conexoes._chave_config({'database': 'leia'})
+    with pytest.raises(RuntimeError, match="esgotado"):
+        pool.obter()
+
+    fisica = primeira.conexao_real
+    primeira.close()
+    primeira.close()  # idempotente: a conexão não entra duas vezes na fila de ociosas
+    assert pool.estatisticas()['conexoes_ociosas'] == 1
+    assert pool.obter().conexao_real is fisica
+
+    estatisticas = pool.estatisticas()
+    assert (estatisticas['conexoes_criadas'], estatisticas['conexoes_em_uso'], estatisticas['timeouts']) == (2, 2, 1)
+
+
+def test_with_devolve_ao_pool(pool):
+    with pool.obter() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("INSERT INTO t VALUES (1)")
+    assert conn.conexao_real.commits == 1
+    assert pool.estatisticas()['conexoes_em_uso'] == 0
+
+    with pytest.raises(ValueError):
+        with pool.obter() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("INSERT INTO t VALUES (2)")
+            raise ValueError("falhou")
+    assert (conn.conexao_real.commits, conn.conexao_real.rollbacks) == (1, 1)
+    assert pool.estatisticas()['conexoes_em_uso'] == 0
+
+
+def test_devolucao_desfaz_transacao_aberta(pool):
+    conn = pool.obter()
+    with conn.cursor() as cursor:
+        cursor.execute("SET statement_timeout = 1000")
+    conn.close()
+    assert conn.conexao_real.rollbacks == 1
+    assert conn.conexao_real.get_transaction_status() == extensions.TRANSACTION_STATUS_IDLE
+
+    # Transação já encerrada: nada a desfazer
+    pool.obter().close()
+    assert conn.conexao_real.rollbacks == 1
+
+
+def test_reciclagem_por_tempo_de_vida(pool):
+    # Expirada ao ser devolvida: fechada em vez de voltar às ociosas
+    conn = pool.obter()
+    conn.criada_em -= pool.vida_maxima
+    conn.close()
+    assert conn.conexao_real.closed
+    assert pool.estatisticas()['conexoes_ociosas'] == 0
+
+    # Expirada enquanto ociosa: trocada por uma nova na retirada
+    antiga = pool.obter()
+    antiga.close()
+    pool._ociosas[0].criada_em -= pool.vida_maxima
+    nova = pool.obter()
+    assert antiga.conexao_real.closed and nova.conexao_real is not antiga.conexao_real
+    assert pool.estatisticas()['conexoes_recicladas'] == 2
+
+
+def test_conexao_fechada_e_descartada(pool):
+    conn = pool.obter()
+    conn.conexao_real.closed = 2
+    conn.close()
+    assert pool.estatisticas()['conexoes_descartadas'] == 1
+    assert pool.obter().conexao_real is not conn.conexao_real
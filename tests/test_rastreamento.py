@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""Rastreamento opcional (rastreamento.py): desligado sem custo e spans no exportador de arquivo"""
+
+import json
+
+import pytest
+
+import rastreamento
+
+TRACEPARENT = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+
+
+def test_desligado_nao_cria_spans(monkeypatch):
+    monkeypatch.setattr(rastreamento, 'HABILITADO', False)
+
+    def consultar():
+        return 1
+
+    assert rastreamento.rastreado()(consultar) is consultar
+    with rastreamento.span('executar_query_direta', rastreamento.atributos_sql("SELECT 1")) as span:
+        span.set_attribute('leia.linhas', 1)
+    assert span is rastreamento.SPAN_VAZIO
+    assert rastreamento.iniciar_span('llm') is rastreamento.SPAN_VAZIO
+    assert rastreamento.abrir_span_requisicao('POST /pergunta', {'traceparent': TRACEPARENT}) == (None, None)
+    rastreamento.encerrar_span_requisicao(None, None, 200)
+    assert rastreamento.estatisticas_rastreamento()['destino'] == 'nenhum'
+
+
+@pytest.fixture
+def arquivo_spans(monkeypatch, tmp_path):
+    """Rastreamento ligado com o ExportadorArquivo, exportando cada span ao terminar"""
+    pytest.importorskip('opentelemetry.sdk')
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+
+    caminho = tmp_path / 'rastros.jsonl'
+    provedor = TracerProvider()
+    provedor.add_span_processor(SimpleSpanProcessor(rastreamento.ExportadorArquivo(str(caminho))))
+    monkeypatch.setattr(rastreamento, 'HABILITADO', True)
+    monkeypatch.setattr(rastreamento, '_criar_tracer', lambda: provedor.get_tracer('leia'))
+    monkeypatch.setattr(rastreamento, '_ESTADO', {'tracer': None, 'pid': None, 'erro': None})
+
+    def ler():
+        with open(caminho, encoding='utf-8') as arquivo:
+            return {span['name']: span for span in map(json.loads, arquivo)}
+    return ler
+
+
+def test_spans_da_requisicao_no_arquivo(arquivo_spans):
+    @rastreamento.rastreado('pesquisar_no_banco')
+    def pesquisar():
+        with rastreamento.span('executar_query_direta', rastreamento.atributos_sql("SELECT " + "x" * 3000)) as span:
+            span.set_attribute('leia.linhas', 3)
+
+    requisicao, token = rastreamento.abrir_span_requisicao('POST /pergunta', {'traceparent': TRACEPARENT})
+    pesquisar()
+    rastreamento.encerrar_span_requisicao(requisicao, token, 503)
+
+    spans = arquivo_spans()
+    raiz, pesquisa, consulta = spans['POST /pergunta'], spans['pesquisar_no_banco'], spans['executar_query_direta']
+    # A requisição continua o trace do traceparent recebido; os spans internos são filhos dela
+    assert raiz['context']['trace_id'] == "0x0af7651916cd43dd8448eb211c80319c"
+    assert raiz['parent_id'] == "0xb7ad6b7169203331"
+    assert pesquisa['parent_id'] == raiz['context']['span_id'] and consulta['parent_id'] == pesquisa['context']['span_id']
+    assert raiz['kind'] == "SpanKind.SERVER" and raiz['status']['status_code'] == "ERROR"
+    assert raiz['attributes']['http.status_code'] == 503
+    assert len(consulta['attributes']['db.statement']) == rastreamento.MAX_SQL
+    assert consulta['attributes']['leia.linhas'] == 3
+    assert rastreamento.estatisticas_rastreamento() == {'destino': rastreamento.DESTINO, 'ativo': True, 'erro': None}
+
+
+def test_sem_o_sdk_o_rastreamento_fica_desligado(monkeypatch):
+    def sem_sdk():
+        raise ImportError("No module named 'opentelemetry'")
+
+    monkeypatch.setattr(rastreamento, 'HABILITADO', True)
+    monkeypatch.setattr(rastreamento, '_criar_tracer', sem_sdk)
+    monkeypatch.setattr(rastreamento, '_ESTADO', {'tracer': None, 'pid': None, 'erro': None})
+    assert rastreamento.span('executar_query_direta') is rastreamento.SPAN_VAZIO
+    assert rastreamento.estatisticas_rastreamento()['erro'] == "No module named 'opentelemetry'"
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""Registro de esquema (registro_esquema.py): cache por banco e invalidação"""
+
+import os
+
+import pytest
+
+import consultor_indices
+import pool_conexoes
+import registro_esquema
+
+
+class _Cursor:
+    def __init__(self, conexao):
+        self.conexao = conexao
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *erro):
+        return False
+
+    def execute(self, sql, params=None):
+        self.conexao.consultas += 1
+
+    def fetchall(self):
+        return self.conexao.colunas
+
+
+class _Conexao:
+    """Conexão de um banco com as colunas de ia_linhas; chave_banco como nas conexões do pool"""
+
+    def __init__(self, banco, colunas):
+        self.chave_banco = pool_conexoes._chave_config({'database': banco})
+        self.colunas = colunas
+        self.consultas = 0
+
+    def cursor(self):
+        return _Cursor(self)
+
+
+@pytest.fixture(autouse=True)
+def cache_vazio(monkeypatch):
+    monkeypatch.setattr(registro_esquema, '_CACHE', {})
+
+
+def test_um_esquema_por_banco():
+    principal = _Conexao('principal', [('cliente', 'text'), ('total_linhas', 'integer')])
+    api = _Conexao('api', [('nome_cliente', 'text'), ('qtd_total_linhas', 'integer')])
+
+    assert registro_esquema.obter_esquema(principal, 'ia_linhas')['cliente'] == 'cliente'
+    # O banco da API não recebe as colunas resolvidas no banco principal
+    assert registro_esquema.obter_esquema(api, 'ia_linhas')['cliente'] == 'nome_cliente'
+    assert registro_esquema.obter_esquema(principal, 'ia_linhas')['total_linhas'] == 'total_linhas'
+    assert (principal.consultas, api.consultas) == (1, 1)
+    assert set(registro_esquema.tabelas_em_cache()) == {'principal/ia_linhas', 'api/ia_linhas'}
+
+
+def test_tabela_inexistente_fica_em_cache():
+    conn = _Conexao('principal', [])
+    assert registro_esquema.obter_esquema(conn, 'ia_linhas') is None
+    assert registro_esquema.obter_esquema(conn, 'ia_linhas') is None
+    assert conn.consultas == 1
+
+
+def test_invalidar_por_tabela_e_por_banco():
+    principal = _Conexao('principal', [('cliente', 'text')])
+    api = _Conexao('api', [('cliente', 'text')])
+    for conn in (principal, api):
+        registro_esquema.obter_esquema(conn, 'ia_linhas')
+        registro_esquema.obter_esquema(conn, 'ia_custo_fornecedor')
+
+    assert registro_esquema.invalidar_esquema('ia_linhas', db_config={'database': 'api'}) == ['ia_linhas']
+    assert set(registro_esquema.tabelas_em_cache()) == {'principal/ia_linhas', 'principal/ia_custo_fornecedor', 'api/ia_custo_fornecedor'}
+    assert registro_esquema.invalidar_esquema() == ['ia_custo_fornecedor', 'ia_linhas']
+    assert registro_esquema.tabelas_em_cache() == {}
+
+
+def test_migracao_do_gatilho_separa_o_corpo_da_funcao_inteiro():
+    caminho = os.path.join(consultor_indices.DIRETORIO_MIGRACOES, '0002_gatilho_invalidacao_esquema.sql')
+    with open(caminho, encoding='utf-8') as arquivo:
+        comandos = consultor_indices.comandos_sql(arquivo.read())
+    assert [c.split()[0] for c in comandos] == ['CREATE', 'DROP', 'CREATE']
+    assert f"pg_notify('{registro_esquema.CANAL_INVALIDACAO}', tg_tag);" in comandos[0]
+    assert comandos[0].endswith("$$")
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""Respostas determinísticas (renderizador.py) nos formatos de construir_rag_prompt e o atalho de main.pesquisar_linhas"""
+
+import datetime
+import os
+import subprocess
+import sys
+from decimal import Decimal
+
+import pytest
+
+import benchmark_roteador
+import main
+import renderizador
+from resultado_consulta import ResultadoConsulta
+
+
+def test_linhas_por_fornecedor():
+    grupos = [('Vivo', 'Corporativo', 1200), ('Claro', None, 34)]
+    assert renderizador.renderizar_linhas_por_fornecedor('Safra', grupos, status='ATIVA', mes_nome='Março', ano='2025') == (
+        "O Cliente Safra possui no mês de Março de 2025 1.234 linhas ativas, sendo:\n"
+        "* **Vivo**: 1.200 linhas, tipo de contrato Corporativo.\n"
+        "* **Claro**: 34 linhas."
+    )
+
+
+def test_linhas_por_fornecedor_periodo_atual_e_sem_status():
+    texto = renderizador.renderizar_linhas_por_fornecedor('Sonda', [('TIM', 'Pré-pago', 5)], atual=True)
+    assert texto.splitlines()[0] == "O Cliente Sonda possui atualmente 5 linhas, sendo:"
+    # Sem mês e ano completos, nenhum período
+    assert renderizador.renderizar_linhas_por_fornecedor('Sonda', [], mes_nome='Março') == "O Cliente Sonda possui 0 linhas, sendo:"
+
+
+def test_maior_custo_fornecedor():
+    assert renderizador.renderizar_maior_custo_fornecedor('Safra', 'Vivo', Decimal('92282.4'), 'Janeiro', '2025', 'Corporativo') == (
+        "O Cliente Safra, o fornecedor com o maior custo no mês de Janeiro de 2025 é Vivo, "
+        "com um custo total de R$ 92.282,40, tipo de contrato Corporativo."
+    )
+    assert renderizador.renderizar_maior_custo_fornecedor('Safra', 'Vivo', None, 'Janeiro', '2025').endswith(
+        "com um custo total de R$ 0,00."
+    )
+
+
+class _Cursor:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *erro):
+        return False
+
+    def execute(self, *args):
+        pass
+
+
+class _Conexao:
+    def cursor(self):
+        return _Cursor()
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def linhas_dois_meses(monkeypatch):
+    """pesquisar_linhas sobre dois meses de dados da Safra (janeiro e fevereiro de 2025)"""
+    colunas = ['cliente', 'fornecedor', 'status_licenca', 'mes_referencia', 'total_linhas',
+               'tipo_contrato', 'posicao', 'total_geral', 'mes_mais_recente', 'amostra']
+    janeiro, fevereiro = datetime.date(2025, 1, 1), datetime.date(2025, 2, 1)
+    dados = [
+        ('Vivo', fevereiro, 120), ('Vivo', janeiro, 100), ('Claro', janeiro, 50), ('Claro', fevereiro, 40),
+    ]
+    consultas = []
+
+    def executar(conn, query, params=None):
+        consultas.append(params)
+        linhas = [('Safra', fornecedor, 'ATIVA', mes, total, 'Corporativo', posicao, 310, fevereiro, None)
+                  for posicao, (fornecedor, mes, total) in enumerate(dados, 1)
+                  if not params or '2025-01-01' not in params or mes == janeiro]
+        return ResultadoConsulta(colunas, linhas)
+
+    esquema = {coluna: coluna for coluna in ('cliente', 'status_licenca', 'fornecedor', 'total_linhas', 'mes_referencia', 'tipo_contrato')}
+    esquema['tipo_mes_referencia'] = 'date'
+    monkeypatch.setattr(main, 'conectar_postgres', _Conexao)
+    monkeypatch.setattr(main, 'executar_query_direta', executar)
+    monkeypatch.setattr(main.registro_esquema, 'obter_esquema', lambda conn, tabela: esquema)
+    monkeypatch.setattr(main, 'RESPOSTA_VIA_LLM', False)
+    rot = benchmark_roteador.roteador_com_extratores()
+    return lambda pergunta: main.pesquisar_linhas(pergunta, incluir_depuracao=False, intencao=rot.rotear(pergunta))
+
+
+def test_linhas_sem_mes_usam_so_o_mes_mais_recente(linhas_dois_meses):
+    resultado = linhas_dois_meses("Quantas linhas ativas tem o cliente Safra?")
+    # Fevereiro (120 + 40), não a soma dos dois meses (310)
+    assert resultado.ja_formatada and resultado.resposta == (
+        "O Cliente Safra possui atualmente 160 linhas ativas, sendo:\n"
+        "* **Vivo**: 120 linhas, tipo de contrato Corporativo.\n"
+        "* **Claro**: 40 linhas, tipo de contrato Corporativo."
+    )
+
+
+def test_linhas_com_mes_usam_o_mes_da_pergunta(linhas_dois_meses):
+    resultado = linhas_dois_meses("Quantas linhas ativas tem o cliente Safra em janeiro de 2025?")
+    assert resultado.resposta.splitlines()[0] == "O Cliente Safra possui no mês de Janeiro de 2025 150 linhas ativas, sendo:"
+
+
+def test_renderizador_carrega_sem_main():
+    codigo = "import sys, renderizador, resultado_pesquisa; print('main' in sys.modules)"
+    saida = subprocess.run([sys.executable, '-c', codigo], capture_output=True, text=True, check=True,
+                           cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert saida.stdout.strip() == 'False'
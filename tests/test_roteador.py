@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""Roteador de intenção (roteador.py) e o roteamento único em main.pesquisar_com_cache"""
+
+import pytest
+
+import benchmark_roteador
+import cache_resultados
+import main
+import resultado_pesquisa
+import roteador
+
+
+@pytest.fixture
+def rot():
+    return benchmark_roteador.roteador_com_extratores()
+
+
+@pytest.mark.parametrize('pergunta, rota', [
+    ("Quantas linhas ativas tem o cliente Safra?", roteador.ROTA_LINHAS),
+    ("Qual o fornecedor com maior custo em janeiro de 2024?", roteador.ROTA_CUSTOS_FORNECEDOR),
+    ("Qual usuário teve maior custo no mês atual?", roteador.ROTA_CUSTOS_USUARIOS),
+    ("Quantas linhas ociosas por operadora tem o Sotreq?", roteador.ROTA_LINHAS_OCIOSAS),
+    ("Quantas linhas no Cliente Safra não possuem termo?", roteador.ROTA_TERMOS),
+    ("Olá, como posso te ajudar?", roteador.ROTA_PADRAO),
+])
+def test_rotas(rot, pergunta, rota):
+    assert rot.rotear(pergunta).rota == rota
+    assert rot.rota_da_pergunta(pergunta) == rota
+
+
+@pytest.mark.parametrize('pergunta', benchmark_roteador.PERGUNTAS)
+def test_igual_a_cascata_anterior(pergunta):
+    rot = roteador.Roteador()
+    assert benchmark_roteador.intencao_roteador(rot, pergunta) == benchmark_roteador.intencao_cascata(pergunta)
+
+
+def test_marcadores_com_a_semantica_de_substring():
+    rot = roteador.Roteador()
+    pergunta = "Do total de linhas sem termos no Cliente Safra, me mostre o total por tipo de linha"
+    marcadores = set(rot.rotear(pergunta).marcadores)
+    for marcador in roteador.MARCADORES_INTENCAO:
+        assert (marcador in marcadores) == (marcador in pergunta.lower())
+
+
+def test_confianca():
+    rot = roteador.Roteador()
+    assert rot.rotear("aparelhos ociosos").confianca == roteador.CONFIANCA_UNICA
+    assert rot.rotear("custo das linhas ociosas").confianca == roteador.CONFIANCA_AMBIGUA
+    assert rot.rotear("bom dia").confianca == roteador.CONFIANCA_PADRAO
+
+
+def test_entidades(rot):
+    intencao = rot.rotear("Quantas linhas bloqueadas possui o Cliente sotreq em março de 2025?")
+    assert (intencao.cliente, intencao.ano, intencao.mes, intencao.status) == ('Sotreq S.A.', '2025', '03', 'bloqueada')
+    assert rot.rotear("maiores custos nos últimos 6 meses").quantidade_meses == 6
+
+
+def test_pesquisa_recebe_a_intencao_roteada_uma_vez(rot, monkeypatch):
+    monkeypatch.setitem(cache_resultados._ESTADO, 'cache', cache_resultados.CacheResultados(cache_resultados.CacheMemoria()))
+    chamadas = []
+    rotear = rot.rotear
+    monkeypatch.setattr(rot, 'rotear', lambda pergunta: chamadas.append(pergunta) or rotear(pergunta))
+    recebidas = []
+
+    def pesquisar(pergunta, intencao):
+        recebidas.append(intencao)
+        return resultado_pesquisa.pronta("ok")
+
+    pergunta = "Quantas linhas ativas tem o cliente Safra?"
+    for _ in range(2):
+        assert main.pesquisar_com_cache(pergunta, pesquisar, 'teste', rot).resposta == "ok"
+    # Uma rota por chamada (a segunda vem do cache) e a pesquisa leu a mesma Intencao
+    assert len(chamadas) == 2
+    assert len(recebidas) == 1 and recebidas[0].cliente == 'Safra' and recebidas[0].status == 'ativa'
+
+
+def test_fluxo_unico_mais_rapido_que_o_anterior(rot):
+    """Regressão do micro-benchmark: uma passada custa menos que rotear + extrair de novo na pesquisa"""
+    for pergunta in benchmark_roteador.PERGUNTAS:
+        assert benchmark_roteador.fluxo_unico(rot, pergunta) == benchmark_roteador.fluxo_anterior(rot, pergunta)
+    antes, depois = benchmark_roteador.medir(
+        [lambda p: benchmark_roteador.fluxo_anterior(rot, p), lambda p: benchmark_roteador.fluxo_unico(rot, p)],
+        repeticoes=20, rodadas=5,
+    )
+    assert depois < antes
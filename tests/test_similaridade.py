@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""Top-k por similaridade do cosseno (similaridade.py)"""
+
+import numpy as np
+
+import similaridade
+
+
+def _referencia(vetores, consulta, k):
+    """Ordenação completa e estável: score decrescente, empates pelo menor índice"""
+    matriz = similaridade.normalizar_linhas(vetores)
+    scores = matriz @ similaridade.normalizar_linhas(consulta)[0]
+    return list(np.lexsort((np.arange(len(scores)), -scores))[:k])
+
+
+def test_igual_a_ordenacao_completa():
+    gerador = np.random.default_rng(7)
+    vetores = gerador.random((500, 16))
+    consulta = gerador.random(16)
+    indices, scores = similaridade.top_k_similares(vetores, consulta, 6)
+    assert list(indices) == _referencia(vetores, consulta, 6)
+    assert list(scores) == sorted(scores, reverse=True)
+
+
+def test_empates_na_fronteira_preferem_o_menor_indice():
+    # Oito vetores idênticos: qualquer subconjunto é um top-3 válido para o argpartition
+    vetores = [[0.0, 1.0]] + [[1.0, 0.0]] * 8
+    for k in (1, 3, 5):
+        indices, _ = similaridade.top_k_similares(vetores, [1.0, 0.0], k)
+        assert list(indices) == list(range(1, k + 1))
+
+
+def test_varias_consultas():
+    vetores = [[0.0, 1.0], [1.0, 0.0], [1.0, 0.0], [0.5, 0.5]]
+    resultados = similaridade.top_k_similares(vetores, [[1.0, 0.0], [0.0, 1.0]], 2)
+    assert [list(indices) for indices, _ in resultados] == [[1, 2], [0, 3]]
+
+
+def test_k_maior_que_o_indice():
+    indices, _ = similaridade.top_k_similares([[1.0, 0.0], [0.0, 1.0]], [0.0, 1.0], 10)
+    assert list(indices) == [1, 0]
+
+
+def test_vetor_nulo_nao_gera_nan():
+    _, scores = similaridade.top_k_similares([[0.0, 0.0], [1.0, 0.0]], [1.0, 0.0], 2)
+    assert not np.isnan(scores).any()
+
+
+def test_entrada_vazia():
+    indices, scores = similaridade.top_k_similares([], [1.0, 0.0], 3)
+    assert indices.shape == (0,) and scores.shape == (0,)
+    assert similaridade.top_k_similares([[1.0, 0.0]], np.empty((0, 2)), 3) == []
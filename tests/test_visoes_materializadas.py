@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""Roteamento para as visões materializadas (visoes_materializadas.py): disponibilidade por banco"""
+
+import pytest
+
+import pool_conexoes
+import visoes_materializadas
+
+
+class _Cursor:
+    def __init__(self, conexao):
+        self.conexao = conexao
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *erro):
+        return False
+
+    def execute(self, sql, params=None):
+        self.conexao.consultas += 1
+
+    def fetchall(self):
+        return [(nome,) for nome in self.conexao.visoes]
+
+
+class _Conexao:
+    """Banco com as visões populadas informadas; chave_banco como nas conexões do pool"""
+
+    def __init__(self, banco, visoes):
+        self.chave_banco = pool_conexoes._chave_config({'database': banco})
+        self.visoes = visoes
+        self.consultas = 0
+
+    def cursor(self):
+        return _Cursor(self)
+
+
+@pytest.fixture(autouse=True)
+def disponibilidade_vazia(monkeypatch):
+    monkeypatch.setattr(visoes_materializadas, '_DISPONIVEIS', {})
+    monkeypatch.setenv('LEIA_VISOES', 'True')
+
+
+def test_visao_de_um_banco_nao_vale_para_o_outro():
+    nome = 'ia_mv_ociosas_mes_operadora'
+    com_visao = _Conexao('principal', [nome])
+    sem_visao = _Conexao('api', [])
+
+    assert visoes_materializadas.fonte(com_visao, nome).tabela == nome
+    assert visoes_materializadas.fonte(sem_visao, nome) == visoes_materializadas.Fonte('ia_linhas_ociosas', "COUNT(*)", None)
+    # Cada banco verificado uma vez dentro do TTL
+    visoes_materializadas.fonte(com_visao, nome)
+    visoes_materializadas.fonte(sem_visao, nome)
+    assert (com_visao.consultas, sem_visao.consultas) == (1, 1)
+    assert visoes_materializadas.estatisticas_visoes()['disponiveis'] == {'principal': [nome], 'api': []}
+
+
+def test_invalidar_so_o_banco_da_conexao():
+    nome = 'ia_mv_termos_tipo_status'
+    principal, api = _Conexao('principal', [nome]), _Conexao('api', [nome])
+    for conn in (principal, api):
+        visoes_materializadas.fonte(conn, nome)
+    visoes_materializadas.invalidar_disponibilidade(api)
+    for conn in (principal, api):
+        visoes_materializadas.fonte(conn, nome)
+    assert (principal.consultas, api.consultas) == (1, 2)
+
+
+def test_ranking_acima_do_limite_usa_a_base():
+    nome = 'ia_mv_custo_usuarios_ranking'
+    conn = _Conexao('principal', [nome])
+    assert visoes_materializadas.fonte(conn, nome, limite=12).tabela == nome
+    assert visoes_materializadas.fonte(conn, nome, limite=13).tabela == 'ia_custo_usuarios_linhas'
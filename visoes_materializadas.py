@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Visões materializadas com os agregados mensais das perguntas mais frequentes
+
+Cada visão guarda as colunas da tabela base com os mesmos nomes reais (resolvidos
+pelo registro de esquema), então os filtros montados pelas pesquisas valem sem
+alteração; muda só o FROM e, nas contagens, COUNT(*) vira a soma da contagem
+pré-calculada. Quando a visão não existe ou ainda não foi populada, as pesquisas
+continuam na tabela base.
+
+Após a carga mensal:
+
+    python visoes_materializadas.py atualizar      (REFRESH ... CONCURRENTLY)
+
+ou POST /admin/visoes/atualizar na API (atualiza e limpa o cache de resultados).
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import namedtuple
+
+import pool_conexoes
+import registro_esquema
+
+# Coluna com a contagem pré-calculada nas visões de contagem
+COLUNA_CONTAGEM = "total_agregado"
+
+# Coluna com a posição no ranking nas visões de ranking
+COLUNA_POSICAO = "posicao_ranking"
+
+# Visões gerenciadas: dimensões e colunas são papéis do registro de esquema
+VISOES = {
+    # Linhas ociosas por cliente, mês e operadora (COUNT(*) ... GROUP BY operadora)
+    'ia_mv_ociosas_mes_operadora': {
+        'tabela_base': 'ia_linhas_ociosas',
+        'tipo': 'contagem',
+        'dimensoes': ['cliente', 'mes_referencia', 'operadora'],
+    },
+    # Linhas por cliente, tipo, status e termo (COUNT(*) ... GROUP BY tipo_linha, status_linha)
+    'ia_mv_termos_tipo_status': {
+        'tabela_base': 'ia_termos_numeros',
+        'tipo': 'contagem',
+        'dimensoes': ['cliente', 'tipo_linha', 'status_linha', 'possui_termo'],
+    },
+    # Maiores custos por cliente e mês (ORDER BY total DESC LIMIT n, com n até o limite)
+    'ia_mv_custo_usuarios_ranking': {
+        'tabela_base': 'ia_custo_usuarios_linhas',
+        'tipo': 'ranking',
+        'particao': ['cliente', 'mes_referencia'],
+        'ordem': 'total',
+        'colunas': ['cliente', 'nome_usuario', 'total', 'mes_referencia'],
+        'limite': 12,
+    },
+}
+
+# Origem de uma consulta: tabela do FROM e expressão de contagem correspondente
+Fonte = namedtuple('Fonte', ['tabela', 'contagem', 'visao'])
+
+# Por banco (pool_conexoes.chave_conexao): {'visoes', 'expira'}; main e a API podem usar bancos diferentes
+_DISPONIVEIS = {}
+_DISPONIVEIS_LOCK = threading.Lock()
+_METRICAS = {'consultas_visao': 0, 'consultas_base': 0}
+
+
+def roteamento_habilitado():
+    return os.getenv('LEIA_VISOES', 'True').lower() == 'true'
+
+
+def _ttl_segundos():
+    return float(os.getenv('LEIA_VISOES_TTL', '60'))
+
+
+def _colunas(esquema, papeis):
+    """Nomes reais das colunas para os papéis (None se algum papel não existe na tabela)"""
+    colunas = [esquema.get(papel) for papel in papeis]
+    return None if any(coluna is None for coluna in colunas) else colunas
+
+
+def sql_definicao(nome, esquema):
+    """SELECT que define a visão e colunas do índice único (exigido pelo REFRESH CONCURRENTLY)"""
+    visao = VISOES[nome]
+    base = visao['tabela_base']
+    if visao['tipo'] == 'contagem':
+        dimensoes = _colunas(esquema, visao['dimensoes'])
+        if dimensoes is None:
+            return None, None
+        lista = ", ".join(dimensoes)
+        consulta = (
+            f"SELECT {lista}, COUNT(*)::bigint AS {COLUNA_CONTAGEM} "
+            f"FROM {base} GROUP BY {lista}"
+        )
+        return consulta, dimensoes
+
+    particao = _colunas(esquema, visao['particao'])
+    colunas = _colunas(esquema, visao['colunas'])
+    ordem = esquema.get(visao['ordem'])
+    if particao is None or colunas is None or ordem is None:
+        return None, None
+    lista = ", ".join(colunas)
+    # Mesma ordenação das pesquisas (ORDER BY total DESC), inclusive para NULLs
+    consulta = (
+        f"SELECT {lista}, {COLUNA_POSICAO} FROM ("
+        f"SELECT {lista}, ROW_NUMBER() OVER (PARTITION BY {', '.join(particao)} ORDER BY {ordem} DESC) "
+        f"AS {COLUNA_POSICAO} FROM {base}) ranking "
+        f"WHERE {COLUNA_POSICAO} <= {int(visao['limite'])}"
+    )
+    return consulta, particao + [COLUNA_POSICAO]
+
+
+def criar_visoes(conn, recriar=False):
+    """Cria as visões (e seus índices únicos) que ainda não existem. Retorna {visão: situação}.
+
+    recriar=True remove e recria todas (necessário após mudar colunas das tabelas base).
+    """
+    situacao = {}
+    for nome, visao in VISOES.items():
+        esquema = registro_esquema.obter_esquema(conn, visao['tabela_base'])
+        if esquema is None:
+            situacao[nome] = "tabela base inexistente"
+            continue
+        consulta, chave = sql_definicao(nome, esquema)
+        if consulta is None:
+            situacao[nome] = "colunas necessárias ausentes na tabela base"
+            continue
+        try:
+            with conn.cursor() as cursor:
+                if recriar:
+                    cursor.execute(f"DROP MATERIALIZED VIEW IF EXISTS {nome}")
+                cursor.execute(f"CREATE MATERIALIZED VIEW IF NOT EXISTS {nome} AS {consulta}")
+                cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {nome}_chave ON {nome} ({', '.join(chave)})")
+            conn.commit()
+            situacao[nome] = "criada"
+        except Exception as e:
+            conn.rollback()
+            situacao[nome] = f"erro: {e}"
+    invalidar_disponibilidade(conn)
+    return situacao
+
+
+def atualizar_visoes(conn):
+    """REFRESH de cada visão existente (CONCURRENTLY quando já populada). Retorna {visão: segundos ou erro}."""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT matviewname, ispopulated FROM pg_matviews "
+            "WHERE schemaname = current_schema() AND matviewname = ANY(%s)",
+            (list(VISOES),)
+        )
+        existentes = dict(cursor.fetchall())
+    conn.commit()
+
+    situacao = {}
+    for nome in VISOES:
+        if nome not in existentes:
+            situacao[nome] = "inexistente"
+            continue
+        inicio = time.perf_counter()
+        # CONCURRENTLY não bloqueia as leituras, mas exige a visão já populada
+        modo = "CONCURRENTLY " if existentes[nome] else ""
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(f"REFRESH MATERIALIZED VIEW {modo}{nome}")
+            conn.commit()
+            situacao[nome] = round(time.perf_counter() - inicio, 3)
+        except Exception as e:
+            conn.rollback()
+            situacao[nome] = f"erro: {e}"
+    invalidar_disponibilidade(conn)
+    return situacao
+
+
+def _visoes_disponiveis(conn):
+    """Visões gerenciadas existentes e populadas no banco de conn (em cache por LEIA_VISOES_TTL segundos)"""
+    agora = time.monotonic()
+    banco = pool_conexoes.chave_conexao(conn)
+    with _DISPONIVEIS_LOCK:
+        item = _DISPONIVEIS.get(banco)
+        if item is not None and item['expira'] > agora:
+            return item['visoes']
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT matviewname FROM pg_matviews "
+                "WHERE ispopulated AND schemaname = current_schema() AND matviewname = ANY(%s)",
+                (list(VISOES),)
+            )
+            visoes = frozenset(linha[0] for linha in cursor.fetchall())
+    except Exception as e:
+        print(f"Aviso: não foi possível verificar as visões materializadas: {e}")
+        conn.rollback()
+        visoes = frozenset()
+    with _DISPONIVEIS_LOCK:
+        _DISPONIVEIS[banco] = {'visoes': visoes, 'expira': agora + _ttl_segundos()}
+    return visoes
+
+
+def invalidar_disponibilidade(conn=None):
+    """Força nova verificação das visões disponíveis na próxima consulta (no banco de conn, ou em todos)"""
+    with _DISPONIVEIS_LOCK:
+        if conn is None:
+            _DISPONIVEIS.clear()
+        else:
+            _DISPONIVEIS.pop(pool_conexoes.chave_conexao(conn), None)
+
+
+def fonte(conn, nome, limite=None):
+    """Origem para uma consulta da forma atendida pela visão: a visão, se disponível, senão a tabela base.
+
+    limite: para visões de ranking, quantas posições a consulta precisa (acima do limite, usa a base).
+    """
+    visao = VISOES[nome]
+    atende = limite is None or limite <= visao.get('limite', limite)
+    if atende and roteamento_habilitado() and nome in _visoes_disponiveis(conn):
+        with _DISPONIVEIS_LOCK:
+            _METRICAS['consultas_visao'] += 1
+        return Fonte(nome, f"COALESCE(SUM({COLUNA_CONTAGEM}), 0)::bigint", nome)
+    with _DISPONIVEIS_LOCK:
+        _METRICAS['consultas_base'] += 1
+    return Fonte(visao['tabela_base'], "COUNT(*)", None)
+
+
+def estatisticas_visoes():
+    """Visões disponíveis por banco (última verificação) e consultas atendidas pelas visões ou pelas tabelas base"""
+    with _DISPONIVEIS_LOCK:
+        return {
+            'habilitado': roteamento_habilitado(),
+            'disponiveis': {pool_conexoes.nome_banco(banco): sorted(item['visoes']) for banco, item in _DISPONIVEIS.items()},
+            **_METRICAS,
+        }
+
+
+if __name__ == '__main__':
+    from main import conectar_postgres
+
+    acao = sys.argv[1] if len(sys.argv) > 1 else 'atualizar'
+    if acao not in ('criar', 'recriar', 'atualizar'):
+        print("Uso: python visoes_materializadas.py [criar|recriar|atualizar]")
+        sys.exit(1)
+
+    conn = conectar_postgres()
+    if conn is None:
+        sys.exit(1)
+    try:
+        if acao == 'atualizar':
+            situacao = atualizar_visoes(conn)
+        else:
+            situacao = criar_visoes(conn, recriar=(acao == 'recriar'))
+    finally:
+        conn.close()
+        pool_conexoes.fechar_pools()
+    for nome, estado in situacao.items():
+        print(f"{nome}: {estado}")